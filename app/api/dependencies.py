@@ -1,4 +1,5 @@
 # app/api/dependencies.py
+import math
 import time
 import logging
 import httpx
@@ -11,6 +12,7 @@ from typing import Optional, Any, TYPE_CHECKING # <--- 导入 TYPE_CHECKING
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.ai.speech.speech_service import AISpeechService
+from app.core.ai.chat.instrumentation import bind_ai_user
 from app.core.database.session import get_db
 from app.core.config.settings import settings
 from app.core.auth.jwt_service import TokenPayload # TokenPayload 还是需要的
@@ -95,6 +97,14 @@ def get_http_client_from_state(request: Request) -> Optional[httpx.AsyncClient]:
          if http_client is not None: assert isinstance(http_client, httpx.AsyncClient)
     return http_client
 
+def get_ai_http_client_from_state(request: Request) -> Optional[httpx.AsyncClient]:
+    """依赖项：AI 提供者专用的共享连接池客户端 (见 app.core.http)，未初始化时返回 None"""
+    http_clients = getattr(request.app.state, 'http_clients', None)
+    if http_clients is None:
+        return None
+    from app.core.http import HTTP_POOL_OPENAI
+    return http_clients.get(HTTP_POOL_OPENAI)
+
 def get_chatai_service_from_state(request: Request) -> 'IChatAIService': # 使用协议
     """依赖项：从 app.state 获取 AIService 实例"""
     ai_service = getattr(request.app.state, 'ai_services', None)
@@ -174,27 +184,11 @@ async def get_current_active_user_id(
         from app.core.auth.jwt_service import JwtService
         assert isinstance(redis_service, RedisService)
         assert isinstance(jwt_service, JwtService)
-    print(f"获取当前用户 ID: {token=}, {redis_service=}, {jwt_service=}") # 调试输出
-
-    credentials_exception = UnauthorizedException(
-        message="无法验证凭据或令牌无效",
-    )
-    payload = jwt_service.validate_token(token)
-    if payload is None or payload.sub is None:
-        raise credentials_exception
-
-    redis_key = f"user:token:{payload.sub}"
-    stored_token = await redis_service.get_async(redis_key)
-    if stored_token is None or stored_token != token:
-        logger.warning(f"用户 {payload.sub} 的令牌验证失败 (Redis 不存在或不匹配)。")
-        raise UnauthorizedException(message="登录已失效或已在别处登录")
-
-    try:
-        user_id = int(payload.sub)
-        logger.debug(f"用户 {user_id} 令牌验证通过。")
-        return user_id
-    except ValueError:
-        raise credentials_exception
+    # 已验证令牌缓存命中时为一次字典查找；未命中时验证签名并比对 Redis 中的当前令牌
+    user_id = await jwt_service.authenticate_async(token)
+    # 本次请求中的 AI 调用按该用户汇总用量
+    bind_ai_user(user_id)
+    return user_id
 
 # --- 可选用户 ID 依赖项 (现在可以进行类型检查了) ---
 async def get_optional_user_id_from_token(
@@ -219,36 +213,39 @@ async def get_optional_user_id_from_token(
 
     if not token: return None
 
-    payload = jwt_service.validate_token(token)
-    if payload is None or payload.sub is None: return None
-
-    redis_key = f"user:token:{payload.sub}"
-    stored_token = await redis_service.get_async(redis_key)
-    if stored_token is None or stored_token != token: return None
-
     try:
-        return int(payload.sub)
-    except ValueError:
+        user_id = await jwt_service.authenticate_async(token)
+    except UnauthorizedException:
         return None
+    bind_ai_user(user_id)
+    return user_id
 
 
 # --- 限流器依赖项 (RateLimiterV2) (现在可以进行类型检查了) ---
 class RateLimiterV2:
-    def __init__(self, limit: int, period_seconds: int, limit_type: str = "ip"):
+    """
+    GCRA 限流依赖：limit 次 / period_seconds 的平均速率，允许 burst 个请求突发 (默认等于 limit)。
+    """
+    def __init__(self, limit: int, period_seconds: int, limit_type: str = "ip", burst: Optional[int] = None):
         self.limit = limit
         self.period_seconds = period_seconds
         self.limit_type = limit_type.lower()
+        self.burst = burst
 
     async def __call__(
         self,
         request: Request,
         redis_service: 'RedisService' = Depends(get_redis_service_from_state),
-        optional_user_id: Optional[int] = Depends(get_optional_user_id_from_token)
+        jwt_service: 'JwtService' = Depends(get_jwt_service_from_state)
     ):
         if TYPE_CHECKING:
              from app.core.redis.service import RedisService
              assert isinstance(redis_service, RedisService)
-        # ... (内部逻辑不变) ...
+        # 只有按用户限流时才需要解析令牌
+        optional_user_id: Optional[int] = None
+        if self.limit_type == "user":
+            optional_user_id = await get_optional_user_id_from_token(request, redis_service, jwt_service)
+
         identifier = ""
         path = request.url.path.lower()
         rate_limit_key_prefix = f"ratelimit:{path}"
@@ -267,18 +264,19 @@ class RateLimiterV2:
             identifier = f"ip:{client_host}"
             rate_limit_key_prefix += f":ip:{client_host}"
 
-        allowed = await redis_service.rate_limit_async(
+        result = await redis_service.rate_limit_check_async(
             key_prefix=rate_limit_key_prefix,
             limit=self.limit,
-            period_seconds=self.period_seconds
+            period_seconds=self.period_seconds,
+            burst=self.burst
         )
 
-        if not allowed:
+        if not result.allowed:
             logger.warning(f"速率限制触发: Identifier='{identifier}', Limit={self.limit}/{self.period_seconds}s, Path='{path}'")
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="请求过于频繁，请稍后再试。",
-                headers={"Retry-After": str(max(1, self.period_seconds // 2))},
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after_seconds)))},
             )
 
 # 使用 RateLimiterV2 作为依赖
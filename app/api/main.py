@@ -1,10 +1,8 @@
 # app/api/main.py
 import asyncio
 import logging
-from typing import Optional, Dict
 from fastapi import FastAPI, Depends, Request, status
 from contextlib import asynccontextmanager
-import httpx
 from app.core.config.settings import settings
 
 # --- 配置日志记录 ---
@@ -18,6 +16,8 @@ logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 from app.core.database.session import engine, Base
 from app.api.middleware.exception_handlers import register_exception_handlers
 from app.core.redis.service import RedisService
+from app.core.cache import cache_invalidation_bus
+from app.core.utils.snowflake import start_worker_id_lease, stop_worker_id_lease
 
 # --- 导入自动发现函数 ---
 from app.api.auto_router import discover_and_include_routers
@@ -26,6 +26,9 @@ from app.api.auto_router import discover_and_include_routers
 from app.core.ai.vector.milvus_service import MilvusService
 from app.core.ai.vector.user_docs_milvus_service import UserDocsMilvusService
 from app.core.ai.chat.factory import get_chat_ai_service
+from app.core.http import HTTP_POOL_DEFAULT, HTTP_POOL_OPENAI, check_http2, http_client_registry
+from app.core.ai.chat.instrumentation import ai_usage_aggregator
+from app.core.ai.chat.deferred import deferred_ai_lane
 from app.core.storage.factory import get_storage_service # Storage 使用工厂获取
 from app.core.auth.jwt_service import JwtService # JWT 服务也需要 Redis
 from app.core.ai.speech.factory import get_speech_service # 导入语音服务工厂
@@ -33,59 +36,7 @@ from app.core.ai.speech.factory import get_speech_service # 导入语音服务
 
 # --- 导入 APScheduler 启动/关闭函数 ---
 from app.core.scheduler import start_scheduler, stop_scheduler
-
-# --- 辅助函数：创建带代理的 httpx 客户端 ---
-def create_proxied_http_client() -> Optional[httpx.AsyncClient]:
-    """根据配置创建可能带特定域名代理的 httpx 客户端"""
-    proxies: Optional[Dict[str, Optional[str]]] = None
-
-    if settings.PROXY_ENABLED and settings.PROXY_URL:
-        proxy_url_with_auth = settings.PROXY_URL
-        # 处理认证
-        if settings.PROXY_USERNAME and settings.PROXY_PASSWORD:
-            try:
-                parts = httpx.URL(settings.PROXY_URL)
-                proxy_url_with_auth = str(parts.copy_with(username=settings.PROXY_USERNAME, password=settings.PROXY_PASSWORD))
-                logger.info(f"代理认证信息已准备。")
-            except Exception as e:
-                 logger.error(f"解析代理 URL 或添加认证失败: {e}")
-                 # 如果认证失败，可以选择不启用代理或使用无认证 URL
-                 proxy_url_with_auth = settings.PROXY_URL # 回退
-
-        if settings.PROXY_FORCE_DOMAINS:
-            # --- 按域名配置代理 ---
-            logger.info(f"为特定域名配置代理: {settings.PROXY_FORCE_DOMAINS}")
-            mounts = {}
-            # 为每个需要代理的域名添加规则 (同时匹配 http 和 https)
-            for domain in settings.PROXY_FORCE_DOMAINS:
-                domain = domain.strip()
-                if domain:
-                    # 同时挂载 http 和 https
-                    mounts[f"http://{domain}"] = httpx.AsyncHTTPTransport(proxy=httpx.Proxy(url=proxy_url_with_auth))
-                    mounts[f"https://{domain}"] = httpx.AsyncHTTPTransport(proxy=httpx.Proxy(url=proxy_url_with_auth))
-                    # 注意：httpx v0.23+ 推荐使用 httpx.Proxy 对象
-                    # 对于旧版本可能是直接传字符串:
-                    # mounts[f"all://{domain}"] = proxy_url_with_auth # 匹配 http 和 https
-            # 对于所有其他域名，不使用代理 (mounts 中未指定的默认不走代理)
-            # 如果想让其他域名也走特定配置（比如不走代理），可以添加 'all://': None
-            # 但 httpx 的默认行为就是不走代理，所以通常不需要显式设置 None
-            # ----------------------
-            timeout = httpx.Timeout(120.0, connect=30.0)
-            # 使用 mounts 参数创建客户端
-            return httpx.AsyncClient(mounts=mounts, timeout=timeout, follow_redirects=True)
-
-        else:
-            # --- 如果没有指定域名，则代理所有 HTTPS (之前的逻辑) ---
-            logger.warning("PROXY_FORCE_DOMAINS 未配置或为空，将代理所有 HTTPS 请求。")
-            proxies = {"https://": proxy_url_with_auth, "http://": proxy_url_with_auth} # 同时代理 http 和 https
-            timeout = httpx.Timeout(120.0, connect=30.0)
-            return httpx.AsyncClient(proxies=proxies, timeout=timeout, follow_redirects=True)
-            # ----------------------------------------------------
-
-    else:
-         logger.info("未启用代理或未配置代理 URL。")
-         # 返回不带代理的客户端
-         return httpx.AsyncClient(timeout=60.0, follow_redirects=True)
+from app.core.job.leader import scheduler_coordinator
 
 # --- 应用生命周期事件 (使用 app.state) ---
 @asynccontextmanager
@@ -100,16 +51,23 @@ async def lifespan(app: FastAPI):
     await redis_service_instance.initialize()
     app.state.redis_service = redis_service_instance
     logger.info("Redis Service 已存入 app.state")
+    # 两级缓存失效订阅 (Redis 不可用时各节点仅依赖本地 TTL)
+    if RedisService._pool is not None:
+        cache_invalidation_bus.start()
+
+    # Snowflake worker_id 租约 (每个进程唯一；未启用租约时使用静态配置，启用时 Redis 不可用则启动失败)
+    await start_worker_id_lease(RedisService._pool)
 
     # JWT Service (依赖 Redis)
     logger.info("初始化并存储 JWT Service...")
     app.state.jwt_service = JwtService(settings=settings, redis_service=app.state.redis_service)
 
-    # 创建并存储共享 HTTP 客户端
-    logger.info("创建共享 HTTP 客户端(具备代理能力)...")
-    app.state.http_client = create_proxied_http_client()
-    if app.state.http_client: logger.info("共享 HTTP 客户端已创建并存入 app.state。")
-    else: logger.warning("未能创建共享 HTTP 客户端。")
+    # 共享 HTTP 连接池 (按上游命名，具备代理能力)；http_client 为通用连接池，保持原有用法
+    logger.info("创建共享 HTTP 连接池(具备代理能力)...")
+    check_http2() # 配置了 http2 但缺少 h2 时告警 (回退 HTTP/1.1)
+    app.state.http_clients = http_client_registry
+    app.state.http_client = http_client_registry.get(HTTP_POOL_DEFAULT)
+    logger.info("共享 HTTP 连接池已存入 app.state。")
 
     # Milvus Base Service
     logger.info("初始化并存储 Milvus Service...")
@@ -134,7 +92,7 @@ async def lifespan(app: FastAPI):
     try:
         logger.info("初始化并存储 AI Service...")
         chat_provider = settings.KB_CHAT_PROVIDER or "OpenAI"
-        app.state.ai_services = get_chat_ai_service(chat_provider, app.state.http_client) # 传递 client
+        app.state.ai_services = get_chat_ai_service(chat_provider, http_client_registry.get(HTTP_POOL_OPENAI)) # 传递 AI 提供者连接池
         # embedding如果要用特殊的，那么在具体的AIService里面去实现.
         # embed_provider = settings.KB_EMBEDDING_PROVIDER or chat_provider
         # app.state.ai_services = {} # 使用字典存储
@@ -157,7 +115,8 @@ async def lifespan(app: FastAPI):
         else: logger.info("未配置 Speech Service。")
     except Exception as e: logger.error(f"初始化 Speech Service 失败: {e}")
 
-    # 2. 启动 APScheduler
+    # 2. 参与调度器主节点选举 (多进程/多节点时维护作业只在主节点执行)，然后启动 APScheduler
+    await scheduler_coordinator.start(RedisService._pool)
     start_scheduler() # <--- 调用启动函数
 
     yield # 应用运行
@@ -165,13 +124,17 @@ async def lifespan(app: FastAPI):
     logger.info("--- 应用关闭 ---")
     # 3. 关闭 APScheduler
     stop_scheduler() # <--- 调用关闭函数
+    await scheduler_coordinator.stop() # 释放主节点租约，其他进程立即接管
     
-    # 4. 关闭共享 HTTP 客户端
-    if hasattr(app.state, 'http_client') and app.state.http_client:
-        logger.info("正在关闭共享 HTTP 客户端...")
-        await app.state.http_client.aclose()
-
-    # 5. 关闭其他服务连接
+    # 4. 结束延迟 AI 请求后关闭共享 HTTP 连接池
+    await deferred_ai_lane.stop()
+    logger.info("正在关闭共享 HTTP 连接池...")
+    await http_client_registry.aclose()
+
+    # 5. 关闭其他服务连接 (先写入剩余的 AI 用量汇总)
+    await ai_usage_aggregator.stop()
+    await cache_invalidation_bus.stop()
+    await stop_worker_id_lease()
     logger.info("正在关闭 Redis 连接...")
     if hasattr(app.state, 'redis_service') and app.state.redis_service:
         await app.state.redis_service.close()
@@ -1,4 +1,5 @@
 # app/api/middleware/exception_handlers.py
+import math
 from fastapi import Request, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
@@ -18,9 +19,15 @@ async def business_exception_handler(request: Request, exc: BusinessException):
     #     # log warning/error
     print(f"业务异常捕获: {exc.message}, Code: {exc.code}") # 简单打印，实际应用中应使用 logger
     response = ApiResponse.fail(message=exc.message, code=exc.code)
+    headers = None
+    retry_after = getattr(exc, "retry_after_seconds", None)
+    if retry_after is not None:
+        # 限流 (429) 与依赖不可用 (503) 时告知客户端建议的重试等待时间
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
     return JSONResponse(
         status_code=exc.code, # HTTP 状态码与业务码保持一致
-        content=response.model_dump(exclude_none=True) # 序列化 Pydantic 模型
+        content=response.model_dump(exclude_none=True), # 序列化 Pydantic 模型
+        headers=headers
     )
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,58 @@
+# app/core/ai/chat/circuit.py
+import logging
+from typing import AsyncGenerator, List
+
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.dtos import ChatAIUploadFileDto, InputMessage
+from app.core.exceptions import BusinessException
+from app.core.resilience import CircuitBreaker, get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreakerChatAIService(IChatAIService):
+    """
+    在调度层之外加上提供者级熔断：提供者连续故障 (超时、连接失败、5xx) 后，冷却期内的请求直接以 503 失败，
+    不再排队等待完整超时。流式请求在熔断或首个片段之前失败时，与其他流式错误一致以文本形式返回。
+    """
+
+    def __init__(self, inner: IChatAIService, breaker: CircuitBreaker):
+        self.inner = inner
+        self.breaker = breaker
+
+    def __getattr__(self, name: str):
+        # 其余属性 (如 chat_model、dimension) 透传给被包装的服务
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        return await self.breaker.call(self.inner.get_embedding_async, text)
+
+    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        return await self.breaker.call(self.inner.get_embeddings_async, texts)
+
+    async def upload_file_async(self, file_path: str) -> ChatAIUploadFileDto:
+        return await self.inner.upload_file_async(file_path)
+
+    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+        return await self.breaker.call(self.inner.chat_completion_async, messages)
+
+    async def streaming_chat_completion_async(
+        self, messages: List[InputMessage]
+    ) -> AsyncGenerator[str, None]:
+        started = False
+        try:
+            async for piece in self.breaker.stream(lambda: self.inner.streaming_chat_completion_async(messages)):
+                started = True
+                yield piece
+        except BusinessException as e:
+            if started:
+                raise
+            logger.warning(f"AI 流式请求失败 (熔断器 '{self.breaker.name}'): {e.message}")
+            yield f"[AI Error: {e.message}]"
+
+
+def with_circuit_breaker(service: IChatAIService, name: str) -> CircuitBreakerChatAIService:
+    """为服务加上名为 ai.{name} 的熔断器 (在 with_scheduler 之后包装，同名实例共享熔断状态)"""
+    return CircuitBreakerChatAIService(service, get_circuit_breaker(f"ai.{name}"))
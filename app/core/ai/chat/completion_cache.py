@@ -0,0 +1,189 @@
+# app/core/ai/chat/completion_cache.py
+import hashlib
+import json
+import logging
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+
+from app.core.config.settings import settings
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.instrumentation import ai_call_site
+from app.core.ai.chat.deferred import deferred_ai_lane
+from app.core.ai.dtos import InputMessage
+from app.core.redis.service import RedisService
+
+logger = logging.getLogger(__name__)
+
+# 键格式版本：调整键内容时递增，使旧条目自然过期
+_KEY_VERSION = 1
+
+
+class CompletionCache:
+    """
+    AI 补全结果的精确匹配缓存 (按调用点显式启用)。
+
+    - 键为 提供者 + 模型 + 参数 + 转换后消息 的规范化 JSON 的 SHA-256，任何输入差异都不会命中。
+    - 值保存在 Redis 中并带 TTL；索引有序集合记录各条目的过期时间，
+      超过 max_entries 时淘汰最早过期的条目，保证占用有上限。
+    - 同一输入的并发请求只调用一次 AI (复用 RedisService.get_or_set_async 的 single-flight 与跨节点锁)。
+    - 错误输出 (如流式返回的 "[AI Error: ...]") 不写入缓存。
+    - 服务未提供 get_completion_cache_identity (无法确定模型与参数) 时直接调用，不缓存。
+    """
+
+    KEY_PREFIX = "AI:COMPLETION:"
+    INDEX_KEY = "AI:COMPLETION:INDEX"
+
+    def __init__(self, redis_service: Optional[RedisService] = None):
+        # RedisService 连接池为类级共享，未传入时使用默认实例
+        self.redis_service = redis_service or RedisService()
+
+    @staticmethod
+    def _is_cacheable(content: Optional[str]) -> bool:
+        if not content or content.startswith("[AI Error") or content.startswith("[Unknown AI Error"):
+            return False
+        if content == "[模型未返回有效内容]":
+            return False
+        return len(content) <= settings.AI_COMPLETION_CACHE_MAX_VALUE_CHARS
+
+    @staticmethod
+    def _enabled(scope: str) -> bool:
+        return settings.AI_COMPLETION_CACHE_ENABLED and scope not in settings.AI_COMPLETION_CACHE_DISABLED_SCOPES
+
+    def build_key(self, ai_service: IChatAIService, messages: List[InputMessage], scope: str) -> Optional[str]:
+        """计算缓存键，服务不支持时返回 None"""
+        get_identity = getattr(ai_service, "get_completion_cache_identity", None)
+        if get_identity is None:
+            return None
+        payload = {"v": _KEY_VERSION, **get_identity(messages)}
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return f"{self.KEY_PREFIX}{scope}:{digest}"
+
+    async def _track(self, key: str, ttl_seconds: int):
+        """登记条目并按上限淘汰最早过期的条目"""
+        try:
+            client = self.redis_service._get_client()
+            now = time.time()
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zadd(self.INDEX_KEY, {key: now + ttl_seconds})
+                pipe.zremrangebyscore(self.INDEX_KEY, "-inf", now)
+                pipe.zcard(self.INDEX_KEY)
+                _, _, count = await pipe.execute()
+            overflow = int(count) - settings.AI_COMPLETION_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = await client.zpopmin(self.INDEX_KEY, overflow)
+                evicted_keys = [member for member, _ in evicted]
+                if evicted_keys:
+                    await client.delete(*evicted_keys)
+        except Exception as e:
+            logger.warning(f"更新 AI 补全缓存索引失败: {e}")
+
+    async def chat_completion_async(
+        self,
+        ai_service: IChatAIService,
+        messages: List[InputMessage],
+        scope: str,
+        ttl_seconds: Optional[int] = None,
+        deferred: bool = False
+    ) -> str:
+        """
+        带精确匹配缓存的 chat_completion_async。
+
+        Args:
+            ai_service: AI 聊天服务。
+            messages: 输入消息。
+            scope: 调用点标识 (如 "dataanalysis.column_names")，用于区分与按调用点禁用。
+            ttl_seconds: 缓存有效期，默认 AI_COMPLETION_CACHE_TTL_SECONDS。
+            deferred: 缓存未命中时是否经延迟通道执行 (用于不需要实时结果的调用点)。
+        """
+        # 缓存未命中时的 AI 调用以 scope 作为调用点记录
+        with ai_call_site(scope):
+            return await self._chat_completion_async(ai_service, messages, scope, ttl_seconds, deferred)
+
+    async def _complete_async(self, ai_service: IChatAIService, messages: List[InputMessage], scope: str, deferred: bool) -> str:
+        if deferred:
+            return await deferred_ai_lane.submit(ai_service, messages, scope)
+        return await ai_service.chat_completion_async(messages)
+
+    async def _chat_completion_async(
+        self,
+        ai_service: IChatAIService,
+        messages: List[InputMessage],
+        scope: str,
+        ttl_seconds: Optional[int],
+        deferred: bool
+    ) -> str:
+        key = self.build_key(ai_service, messages, scope) if self._enabled(scope) else None
+        if key is None:
+            return await self._complete_async(ai_service, messages, scope, deferred)
+        ttl_seconds = ttl_seconds or settings.AI_COMPLETION_CACHE_TTL_SECONDS
+
+        # 当前调用实际得到的输出 (不可缓存的输出以 None 返回给缓存层，由此处取回)
+        produced: Dict[str, str] = {}
+
+        async def loader() -> Optional[str]:
+            content = await self._complete_async(ai_service, messages, scope, deferred)
+            produced["content"] = content
+            return content if self._is_cacheable(content) else None
+
+        started = time.monotonic()
+        cached = await self.redis_service.get_or_set_async(
+            key,
+            loader,
+            expiry_seconds=ttl_seconds,
+            lock_timeout_seconds=settings.AI_COMPLETION_CACHE_LOCK_SECONDS,
+            early_refresh_beta=0
+        )
+        if "content" in produced:
+            if cached is not None:
+                await self._track(key, ttl_seconds)
+            return produced["content"]
+        if cached is not None:
+            logger.debug(f"AI 补全缓存命中: scope={scope}, 耗时 {(time.monotonic() - started) * 1000:.1f}ms")
+            return cached
+        # 并发的同一请求结果不可缓存，自行调用
+        return await self._complete_async(ai_service, messages, scope, deferred)
+
+    async def streaming_chat_completion_async(
+        self,
+        ai_service: IChatAIService,
+        messages: List[InputMessage],
+        scope: str,
+        ttl_seconds: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        带精确匹配缓存的流式补全：命中时一次性输出缓存内容；
+        未命中时透传流式输出，完整结束后写入缓存 (中途断开不写入)。
+        """
+        key = self.build_key(ai_service, messages, scope) if self._enabled(scope) else None
+        if key is not None:
+            hit, cached = await self.redis_service.get_cached_async(key)
+            if hit and cached:
+                logger.debug(f"AI 补全缓存命中 (流式): scope={scope}")
+                yield cached
+                return
+
+        pieces: List[str] = []
+        async for piece in ai_service.streaming_chat_completion_async(messages):
+            pieces.append(piece)
+            yield piece
+
+        if key is None:
+            return
+        content = "".join(pieces)
+        if any(piece.startswith("[AI Error") or piece.startswith("[Unknown AI Error") for piece in pieces):
+            return
+        if self._is_cacheable(content):
+            ttl_seconds = ttl_seconds or settings.AI_COMPLETION_CACHE_TTL_SECONDS
+            if await self.redis_service.set_cached_async(key, content, ttl_seconds):
+                await self._track(key, ttl_seconds)
+
+    async def invalidate_async(self, ai_service: IChatAIService, messages: List[InputMessage], scope: str):
+        """删除指定输入的缓存 (调用点发现缓存内容无法解析时调用，避免反复命中错误结果)"""
+        key = self.build_key(ai_service, messages, scope)
+        if key is not None:
+            await self.redis_service.key_delete_async(key)
+
+
+# 全局实例
+completion_cache = CompletionCache()
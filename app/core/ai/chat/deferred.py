@@ -0,0 +1,349 @@
+# app/core/ai/chat/deferred.py
+"""
+非交互 AI 工作的延迟通道。
+
+图谱生成、面试回答评估、列名转换、播客脚本等不需要实时结果的补全提交到通道后得到一个凭据，
+await 凭据即得到回复。通道按服务分组打包请求：
+- 打包：同一服务的请求累积到 AI_DEFERRED_BATCH_MAX_SIZE 或最早的请求等待 AI_DEFERRED_BATCH_WINDOW_SECONDS 后成批执行。
+- 低峰时段：配置 AI_DEFERRED_OFF_PEAK_HOURS 后，其余时段只执行已到最长延迟的请求，其余保留到低峰。
+- 执行器：批足够大、服务支持提供者批处理接口 (batch_chat_completion_async) 且请求的最长延迟允许时，
+  整批提交给提供者；否则由本地执行器以后台优先级经过调度层执行 (并发受 AI_DEFERRED_LOCAL_CONCURRENCY 限制)。
+  本地执行器不依赖提供者的批处理能力，也用作模拟服务与测试环境下的执行器。
+
+    ticket = deferred_ai_lane.submit(self.ai_service, messages, scope="knowledge.graph")
+    text = await ticket
+
+请求只保存在进程内，进程退出时未完成的凭据以异常结束 (由任务重试重新提交)。
+"""
+import asyncio
+import contextvars
+import datetime
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from app.core.config.settings import settings
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.instrumentation import AIUsage, ai_call_site, get_ai_user, record_ai_call
+from app.core.ai.chat.scheduler import AIRequestPriority, ai_request_priority, estimate_messages_tokens
+from app.core.ai.dtos import InputMessage
+from app.core.exceptions import BusinessException
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 等待时间分桶 (秒)，覆盖打包窗口到低峰等待
+_WAIT_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600)
+_BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+ai_deferred_requests_total = metrics_registry.counter(
+    "ai_deferred_requests_total", "延迟通道完成的请求数 (executor: local/provider；outcome: success/error/cancelled)",
+    ("scope", "executor", "outcome"))
+ai_deferred_wait_seconds = metrics_registry.histogram(
+    "ai_deferred_wait_seconds", "延迟请求从提交到开始执行的等待时间", ("scope",), buckets=_WAIT_BUCKETS)
+ai_deferred_batch_size = metrics_registry.histogram(
+    "ai_deferred_batch_size", "延迟通道每批执行的请求数", ("executor",), buckets=_BATCH_SIZE_BUCKETS)
+
+
+@dataclass
+class DeferredRequest:
+    """通道中的一个请求"""
+    ticket_id: int
+    messages: List[InputMessage]
+    scope: str
+    future: asyncio.Future
+    # 提交时的上下文 (用户、优先级等)，本地执行时在该上下文中调用
+    context: contextvars.Context
+    user_id: Optional[int]
+    submitted_at: float
+    deadline: float
+
+
+class DeferredTicket:
+    """延迟请求的凭据：await 得到回复；取消等待会撤回尚未开始执行的请求"""
+
+    def __init__(self, ticket_id: int, scope: str, future: asyncio.Future):
+        self.ticket_id = ticket_id
+        self.scope = scope
+        self._future = future
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        return self._future.cancel()
+
+    def __await__(self):
+        return self._future.__await__()
+
+
+class DeferredExecutor:
+    """执行一批延迟请求，返回与请求顺序一致的回复或异常"""
+
+    name = "base"
+
+    async def execute_async(self, ai_service: IChatAIService, requests: List[DeferredRequest]) -> List[Union[str, BaseException]]:
+        raise NotImplementedError
+
+
+class LocalDeferredExecutor(DeferredExecutor):
+    """本地执行：逐个以后台优先级调用 chat_completion_async (经过调度层，不挤占交互请求)"""
+
+    name = "local"
+
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _run(self, ai_service: IChatAIService, request: DeferredRequest) -> str:
+        async with self._semaphore:
+            with ai_request_priority(AIRequestPriority.BACKGROUND), ai_call_site(request.scope):
+                return await ai_service.chat_completion_async(request.messages)
+
+    async def execute_async(self, ai_service: IChatAIService, requests: List[DeferredRequest]) -> List[Union[str, BaseException]]:
+        # 在提交时的上下文中创建任务，保留用户等调用信息
+        tasks = [request.context.run(asyncio.create_task, self._run(ai_service, request)) for request in requests]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class ProviderBatchExecutor(DeferredExecutor):
+    """整批提交给提供者的批处理接口；提交失败的批与失败的单个请求交由本地执行器执行"""
+
+    name = "provider"
+
+    def __init__(self, poll_seconds: float, fallback: DeferredExecutor):
+        self.poll_seconds = poll_seconds
+        self.fallback = fallback
+
+    @staticmethod
+    def supports(ai_service: IChatAIService) -> bool:
+        return callable(getattr(ai_service, "batch_chat_completion_async", None))
+
+    async def execute_async(self, ai_service: IChatAIService, requests: List[DeferredRequest]) -> List[Union[str, BaseException]]:
+        provider = str(getattr(ai_service, "provider", None) or "unknown")
+        model = str(getattr(ai_service, "chat_model", None) or provider)
+        usages = [AIUsage() for _ in requests]
+        started = time.monotonic()
+        try:
+            replies = await ai_service.batch_chat_completion_async(
+                [request.messages for request in requests], self.poll_seconds, usages)
+        except Exception as e:
+            logger.warning(f"提供者批处理失败，{len(requests)} 个请求改为本地执行: {e}")
+            return await self.fallback.execute_async(ai_service, requests)
+        elapsed = time.monotonic() - started
+
+        results: List[Union[str, BaseException]] = []
+        failed: List[int] = []
+        for index, (request, reply, usage) in enumerate(zip(requests, replies, usages)):
+            record_ai_call(
+                provider, model, "batch", request.scope, "success" if reply is not None else "error", elapsed,
+                usage.prompt_tokens if usage.prompt_tokens is not None else estimate_messages_tokens(request.messages),
+                usage.completion_tokens or 0,
+                request.user_id
+            )
+            results.append(reply if reply is not None else BusinessException("AI 批处理未返回结果"))
+            if reply is None:
+                failed.append(index)
+        if failed:
+            logger.info(f"提供者批处理中 {len(failed)} 个请求失败，改为本地执行")
+            retried = await self.fallback.execute_async(ai_service, [requests[i] for i in failed])
+            for index, result in zip(failed, retried):
+                results[index] = result
+        return results
+
+
+class DeferredAILane:
+    """延迟通道 (进程内单例 deferred_ai_lane)"""
+
+    def __init__(self, local_executor: Optional[DeferredExecutor] = None, provider_executor: Optional[ProviderBatchExecutor] = None):
+        self.local_executor = local_executor or LocalDeferredExecutor(settings.AI_DEFERRED_LOCAL_CONCURRENCY)
+        self.provider_executor = provider_executor or ProviderBatchExecutor(settings.AI_DEFERRED_PROVIDER_POLL_SECONDS, self.local_executor)
+        # 按服务实例分组的待执行请求
+        self._groups: Dict[int, Tuple[IChatAIService, List[DeferredRequest]]] = {}
+        self._ticket_ids = itertools.count(1)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(pending) for _, pending in self._groups.values())
+
+    @property
+    def running_batches(self) -> int:
+        return len(self._running)
+
+    def submit(
+        self,
+        ai_service: IChatAIService,
+        messages: List[InputMessage],
+        scope: str,
+        max_delay_seconds: Optional[float] = None
+    ) -> DeferredTicket:
+        """
+        提交一个补全请求。
+
+        Args:
+            ai_service: AI 聊天服务 (同一实例的请求打包在一起)。
+            messages: 输入消息。
+            scope: 调用点标识 (如 "knowledge.graph")，用于指标与按调用点配置最长延迟。
+            max_delay_seconds: 最长延迟，默认按 AI_DEFERRED_MAX_DELAY_BY_SCOPE / AI_DEFERRED_MAX_DELAY_SECONDS。
+        """
+        ticket_id = next(self._ticket_ids)
+        if not settings.AI_DEFERRED_LANE_ENABLED:
+            return DeferredTicket(ticket_id, scope, asyncio.ensure_future(self._complete_now(ai_service, messages, scope)))
+
+        if max_delay_seconds is None:
+            max_delay_seconds = settings.AI_DEFERRED_MAX_DELAY_BY_SCOPE.get(scope, settings.AI_DEFERRED_MAX_DELAY_SECONDS)
+        now = time.monotonic()
+        request = DeferredRequest(
+            ticket_id=ticket_id,
+            messages=messages,
+            scope=scope,
+            future=asyncio.get_running_loop().create_future(),
+            context=contextvars.copy_context(),
+            user_id=get_ai_user(),
+            submitted_at=now,
+            deadline=now + max_delay_seconds
+        )
+        self._groups.setdefault(id(ai_service), (ai_service, []))[1].append(request)
+
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        return DeferredTicket(ticket_id, scope, request.future)
+
+    async def _complete_now(self, ai_service: IChatAIService, messages: List[InputMessage], scope: str) -> str:
+        with ai_call_site(scope):
+            return await ai_service.chat_completion_async(messages)
+
+    @staticmethod
+    def _is_off_peak() -> bool:
+        hours = settings.AI_DEFERRED_OFF_PEAK_HOURS
+        return not hours or datetime.datetime.now().hour in hours
+
+    async def _dispatch_loop(self):
+        while self._groups:
+            next_check = self._dispatch_ready()
+            if not self._groups:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.05, next_check - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch_ready(self) -> float:
+        """执行已就绪的批，返回下一次检查的时间"""
+        now = time.monotonic()
+        off_peak = self._is_off_peak()
+        max_size = max(1, settings.AI_DEFERRED_BATCH_MAX_SIZE)
+        window = settings.AI_DEFERRED_BATCH_WINDOW_SECONDS
+        # 非低峰时段至少每分钟检查一次，以便进入低峰时及时执行
+        next_check = now + (window if off_peak else 60.0)
+
+        for key, (ai_service, pending) in list(self._groups.items()):
+            # 撤回已取消的请求
+            pending[:] = [request for request in pending if not request.future.done()]
+            if off_peak:
+                while pending and (len(pending) >= max_size or pending[0].submitted_at + window <= now):
+                    batch, pending[:] = pending[:max_size], pending[max_size:]
+                    self._launch(ai_service, batch, now)
+                if pending:
+                    next_check = min(next_check, pending[0].submitted_at + window)
+            else:
+                due = [request for request in pending if request.deadline <= now]
+                if due:
+                    pending[:] = [request for request in pending if request.deadline > now]
+                    for start in range(0, len(due), max_size):
+                        self._launch(ai_service, due[start:start + max_size], now)
+                if pending:
+                    next_check = min(next_check, min(request.deadline for request in pending))
+            if not pending:
+                del self._groups[key]
+        return next_check
+
+    def _choose_executor(self, ai_service: IChatAIService, batch: List[DeferredRequest], now: float) -> DeferredExecutor:
+        if (
+            settings.AI_DEFERRED_EXECUTOR == "auto"
+            and len(batch) >= settings.AI_DEFERRED_PROVIDER_MIN_BATCH_SIZE
+            and all(request.deadline - now >= settings.AI_DEFERRED_PROVIDER_MIN_DELAY_SECONDS for request in batch)
+            and self.provider_executor.supports(ai_service)
+        ):
+            return self.provider_executor
+        return self.local_executor
+
+    def _launch(self, ai_service: IChatAIService, batch: List[DeferredRequest], now: float):
+        executor = self._choose_executor(ai_service, batch, now)
+        task = asyncio.create_task(self._execute(ai_service, executor, batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _execute(self, ai_service: IChatAIService, executor: DeferredExecutor, batch: List[DeferredRequest]):
+        started = time.monotonic()
+        for request in batch:
+            ai_deferred_wait_seconds.observe(started - request.submitted_at, scope=request.scope)
+        ai_deferred_batch_size.observe(len(batch), executor=executor.name)
+        try:
+            results = await executor.execute_async(ai_service, batch)
+            for request, result in zip(batch, results):
+                if request.future.done():
+                    outcome = "cancelled"
+                elif isinstance(result, BaseException):
+                    outcome = "cancelled" if isinstance(result, asyncio.CancelledError) else "error"
+                    request.future.set_exception(result)
+                else:
+                    outcome = "success"
+                    request.future.set_result(result)
+                ai_deferred_requests_total.inc(scope=request.scope, executor=executor.name, outcome=outcome)
+        except Exception as e:
+            logger.error(f"延迟通道执行批失败 ({executor.name}, {len(batch)} 个请求): {e}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+                    ai_deferred_requests_total.inc(scope=request.scope, executor=executor.name, outcome="error")
+        finally:
+            # 被取消 (如应用关闭) 时结束所有等待者
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(BusinessException("延迟 AI 请求未完成：服务正在关闭"))
+
+    async def stop(self):
+        """停止通道 (应用关闭时调用)：未执行与执行中的请求以异常结束"""
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        for _, pending in self._groups.values():
+            for request in pending:
+                if not request.future.done():
+                    request.future.set_exception(BusinessException("延迟 AI 请求未完成：服务正在关闭"))
+        self._groups.clear()
+
+
+deferred_ai_lane = DeferredAILane()
+
+
+def _collect_deferred_pending() -> Iterable:
+    yield "ai_deferred_pending", {}, deferred_ai_lane.pending_count
+
+
+def _collect_deferred_running_batches() -> Iterable:
+    yield "ai_deferred_running_batches", {}, deferred_ai_lane.running_batches
+
+
+metrics_registry.register_collector(
+    "ai_deferred_pending", "延迟通道中等待执行的请求数", "gauge", _collect_deferred_pending)
+metrics_registry.register_collector(
+    "ai_deferred_running_batches", "延迟通道中执行中的批数", "gauge", _collect_deferred_running_batches)
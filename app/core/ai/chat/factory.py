@@ -11,10 +11,20 @@ from app.core.config.settings import settings
 from app.core.ai.chat.base import IChatAIService
 # 导入具体的 OpenAI 服务实现
 from app.core.ai.chat.openai_service import OpenAIService
+# 导入提供者级请求调度 (优先级、并发与令牌预算、429 退避)
+from app.core.ai.chat.scheduler import with_scheduler
+# 调用观测 (耗时、首个片段时间与令牌用量)
+from app.core.ai.chat.instrumentation import with_instrumentation
+# 提供者级熔断 (连续故障后快速失败)
+from app.core.ai.chat.circuit import with_circuit_breaker
+# 多路由失败转移与对冲
+from app.core.ai.chat.failover import ChatRoute, FailoverChatAIService, RouteHealth
+# 压测用模拟服务
+from app.core.ai.chat.fake_service import FakeChatAIService, FakeChatOptions, RecordingChatAIService, ResponseRecordings
 
 # --- 导入 FastAPI Depends 和获取共享客户端的依赖 ---
 from fastapi import Depends
-from app.api.dependencies import get_http_client_from_state
+from app.api.dependencies import get_ai_http_client_from_state
 # --- 未来其他服务实现的导入 ---
 # from app.core.ai.chat.claude_service import ClaudeAIService
 # from app.core.ai.chat.gemini_service import GeminiAIService
@@ -32,6 +42,8 @@ class ChatAIProviderType(str, Enum):
     OPENAI = "OpenAI"
     CLAUDE = "Claude" # 占位符，尚未实现
     GEMINI = "Gemini" # 占位符，尚未实现
+    FAKE = "Fake" # 模拟服务 (压测用，回放录制或合成响应，不消耗令牌)
+    FAILOVER = "Failover" # 按 AI_FAILOVER_ROUTES 组合多个提供者/模型，失败转移与对冲
 
 # 使用 lru_cache 缓存服务实例，避免重复创建客户端
 # maxsize=None 表示不限制缓存大小
@@ -52,7 +64,7 @@ def get_chat_ai_service(
         shared_http_client: (可选) 预配置的共享 httpx 客户端。
 
     Returns:
-        实现了 IChatAIService 协议的服务实例。
+        实现了 IChatAIService 协议的服务实例 (已包装调用观测、提供者级调度与熔断，同一提供者的实例共享并发与令牌预算及熔断状态)。
 
     Raises:
         ValueError: 如果提供者类型不支持或相关配置无效。
@@ -83,11 +95,18 @@ def get_chat_ai_service(
         try:
             # 返回缓存的或新创建的 OpenAI 服务实例
             # OpenAIService 的 __init__ 会处理客户端创建和异常
-            return OpenAIService(http_client=shared_http_client)
+            service = with_scheduler(with_instrumentation(OpenAIService(http_client=shared_http_client), provider_type.value), provider_type.value)
+            return with_circuit_breaker(service, provider_type.value)
         except Exception as e:
              logger.error(f"创建 OpenAI 服务实例时出错: {e}")
              raise RuntimeError(f"创建 OpenAI 服务实例失败: {e}") from e
 
+    elif provider_type == ChatAIProviderType.FAILOVER:
+        return _create_failover_service(shared_http_client)
+
+    elif provider_type == ChatAIProviderType.FAKE:
+        return _create_fake_service(shared_http_client)
+
     # --- 未来其他提供者的实现 ---
     elif provider_type == ChatAIProviderType.CLAUDE:
         logger.error("Claude 服务尚未实现。")
@@ -109,11 +128,80 @@ def get_chat_ai_service(
         logger.error(f"内部错误：无法处理的 AI 提供者类型 '{provider_type.value}'. 支持的类型: {valid_providers}")
         raise ValueError(f"内部错误：无法处理的 AI 提供者类型 {provider_type.value}")
 
+def _create_route_service(route_spec: str, shared_http_client: Optional[httpx.AsyncClient]) -> IChatAIService:
+    """按 "提供者" 或 "提供者:模型" 创建路由对应的服务 (同一提供者共享调度预算)"""
+    provider_str, _, model = route_spec.partition(":")
+    provider_str, model = provider_str.strip(), model.strip()
+    if provider_str == ChatAIProviderType.FAILOVER.value:
+        raise ValueError("AI_FAILOVER_ROUTES 不能包含 Failover。")
+    if not model:
+        return get_chat_ai_service(provider_str, shared_http_client)
+    if provider_str != ChatAIProviderType.OPENAI.value:
+        raise ValueError(f"路由 '{route_spec}' 不支持指定模型，目前仅 OpenAI 支持。")
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OpenAI API Key 未配置，无法创建 OpenAI 服务。")
+    service = with_scheduler(with_instrumentation(OpenAIService(http_client=shared_http_client, chat_model=model), provider_str), provider_str)
+    # 熔断按路由 (提供者:模型) 区分，某个模型故障不影响同一提供者的其他路由
+    return with_circuit_breaker(service, f"{provider_str}:{model}")
+
+
+def _create_failover_service(shared_http_client: Optional[httpx.AsyncClient]) -> IChatAIService:
+    """按 AI_FAILOVER_ROUTES 创建失败转移与对冲的组合服务"""
+    routes = []
+    for route_spec in settings.AI_FAILOVER_ROUTES:
+        route_spec = route_spec.strip()
+        if not route_spec:
+            continue
+        health = RouteHealth(settings.AI_FAILOVER_FAILURE_THRESHOLD, settings.AI_FAILOVER_COOLDOWN_SECONDS)
+        routes.append(ChatRoute(route_spec, _create_route_service(route_spec, shared_http_client), health))
+    if not routes:
+        raise ValueError("AI_FAILOVER_ROUTES 未配置任何路由。")
+    logger.info(f"AI 失败转移路由: {[route.name for route in routes]}")
+    return FailoverChatAIService(
+        routes,
+        attempt_timeout_seconds=settings.AI_FAILOVER_ATTEMPT_TIMEOUT_SECONDS,
+        first_token_timeout_seconds=settings.AI_FAILOVER_FIRST_TOKEN_TIMEOUT_SECONDS,
+        hedge_enabled=settings.AI_HEDGE_ENABLED,
+        hedge_max_prompt_tokens=settings.AI_HEDGE_MAX_PROMPT_TOKENS,
+        hedge_min_delay_seconds=settings.AI_HEDGE_MIN_DELAY_SECONDS,
+        hedge_max_delay_seconds=settings.AI_HEDGE_MAX_DELAY_SECONDS
+    )
+
+
+def _create_fake_service(shared_http_client: Optional[httpx.AsyncClient]) -> IChatAIService:
+    """
+    按配置创建模拟服务：replay 回放/合成响应 (同样经过调度层，便于压测调度策略)；
+    record 包装真实提供者 (其自身已带调度) 并录制响应。
+    """
+    recordings = ResponseRecordings(settings.FAKE_AI_RECORDINGS_PATH)
+    if settings.FAKE_AI_MODE == "record":
+        if settings.FAKE_AI_RECORD_PROVIDER == ChatAIProviderType.FAKE.value:
+            raise ValueError("FAKE_AI_RECORD_PROVIDER 不能为 Fake。")
+        real_service = get_chat_ai_service(settings.FAKE_AI_RECORD_PROVIDER, shared_http_client)
+        logger.warning(f"模拟 AI 服务处于录制模式，响应将写入: {settings.FAKE_AI_RECORDINGS_PATH}")
+        return RecordingChatAIService(real_service, recordings)
+    options = FakeChatOptions(
+        latency_distribution=settings.FAKE_AI_LATENCY_DISTRIBUTION,
+        first_token_latency_ms=settings.FAKE_AI_FIRST_TOKEN_LATENCY_MS,
+        latency_spread=settings.FAKE_AI_LATENCY_SPREAD,
+        chunk_interval_ms=settings.FAKE_AI_STREAM_CHUNK_INTERVAL_MS,
+        chunk_chars=settings.FAKE_AI_STREAM_CHUNK_CHARS,
+        synthetic_response_chars=settings.FAKE_AI_SYNTHETIC_RESPONSE_CHARS,
+        embedding_dimension=settings.OPENAI_DIMENSION,
+        embedding_latency_ms=settings.FAKE_AI_EMBEDDING_LATENCY_MS,
+        rate_limit_probability=settings.FAKE_AI_RATE_LIMIT_PROBABILITY,
+        timeout_probability=settings.FAKE_AI_TIMEOUT_PROBABILITY,
+        timeout_seconds=settings.FAKE_AI_TIMEOUT_SECONDS,
+        seed=settings.FAKE_AI_SEED
+    )
+    fake_service = with_instrumentation(FakeChatAIService(options, recordings), ChatAIProviderType.FAKE.value)
+    return with_circuit_breaker(with_scheduler(fake_service, ChatAIProviderType.FAKE.value), ChatAIProviderType.FAKE.value)
+
 # --- 提供一个 FastAPI 依赖项，方便在 API 路由中注入 ---
 def chat_ai_service_dependency(
     provider: Optional[ChatAIProviderType] = None, # 可以通过查询参数等指定 provider
     # --- 注入共享 HTTP 客户端 ---
-    http_client: Optional[httpx.AsyncClient] = Depends(get_http_client_from_state) # <--- 从 state 获取
+    http_client: Optional[httpx.AsyncClient] = Depends(get_ai_http_client_from_state) # <--- 从 state 获取 AI 提供者连接池
 ) -> IChatAIService:
     """
     FastAPI 依赖项，用于注入 AI 聊天服务实例。
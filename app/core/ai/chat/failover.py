@@ -0,0 +1,292 @@
+# app/core/ai/chat/failover.py
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, List, Optional, Set, TypeVar
+
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.scheduler import estimate_messages_tokens
+from app.core.ai.dtos import ChatAIUploadFileDto, InputMessage
+from app.core.exceptions import BusinessException
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ai_failover_total = metrics_registry.counter(
+    "ai_failover_total", "请求从某个路由失败转移到下一个路由的次数", ("route", "operation"))
+ai_hedge_total = metrics_registry.counter(
+    "ai_hedge_total", "对冲请求次数 (outcome: primary=原请求先返回, hedge=对冲请求先返回)", ("route", "outcome"))
+
+
+class RouteHealth:
+    """
+    路由健康度：
+    - 最近成功请求的耗时窗口 (非流式为总耗时，流式为首片段耗时)，用于计算对冲等待时间 (p95)。
+    - 错误率 (指数加权)，超过阈值的路由排到健康路由之后。
+    - 连续失败达到阈值后在冷却期内跳过该路由，冷却结束后重新尝试 (成功即恢复)。
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float, window: int = 200, alpha: float = 0.2):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.alpha = alpha
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._window = window
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.open_until
+
+    def record_success(self, operation: str, latency_seconds: float):
+        self._latencies.setdefault(operation, deque(maxlen=self._window)).append(latency_seconds)
+        self.error_rate *= (1 - self.alpha)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self):
+        self.error_rate = self.error_rate * (1 - self.alpha) + self.alpha
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown_seconds
+
+    def latency_quantile(self, operation: str, q: float) -> Optional[float]:
+        samples = self._latencies.get(operation)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+class ChatRoute:
+    """一个可用的提供者/模型组合"""
+
+    def __init__(self, name: str, service: IChatAIService, health: RouteHealth):
+        self.name = name
+        self.service = service
+        self.health = health
+
+
+class FailoverChatAIService(IChatAIService):
+    """
+    组合多个提供者/模型的 IChatAIService：
+
+    - 路由顺序：按配置顺序，冷却中的路由与错误率超过 unhealthy_error_rate 的路由依次后移。
+    - 失败转移：请求出错或超过 attempt_timeout_seconds 时转到下一个路由；
+      流式请求在首个片段超过 first_token_timeout_seconds 未到达或首个片段即为错误时转移，
+      已输出内容后不再转移。
+    - 对冲请求：短小、幂等的调用 (嵌入、提示词不超过 hedge_max_prompt_tokens 的非流式补全)
+      在等待超过该路由近期 p95 耗时后向下一个路由 (只有一个路由时为同一路由) 再发一次，取先返回者。
+    - 客户端错误 (code=400，如输入过长) 直接抛出，不转移。
+    """
+
+    def __init__(
+        self,
+        routes: List[ChatRoute],
+        attempt_timeout_seconds: float = 120.0,
+        first_token_timeout_seconds: float = 20.0,
+        unhealthy_error_rate: float = 0.5,
+        hedge_enabled: bool = True,
+        hedge_max_prompt_tokens: int = 2000,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay_seconds: float = 0.5,
+        hedge_max_delay_seconds: float = 10.0
+    ):
+        if not routes:
+            raise ValueError("FailoverChatAIService 至少需要一个路由。")
+        self.routes = routes
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+        self.first_token_timeout_seconds = first_token_timeout_seconds
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.hedge_enabled = hedge_enabled
+        self.hedge_max_prompt_tokens = hedge_max_prompt_tokens
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_max_delay_seconds = hedge_max_delay_seconds
+
+    def __getattr__(self, name: str):
+        # 其余属性 (如 chat_model、dimension) 以首选路由为准
+        if name == "routes":
+            raise AttributeError(name)
+        return getattr(self.routes[0].service, name)
+
+    def get_completion_cache_identity(self, messages: List[InputMessage]) -> Dict[str, Any]:
+        """缓存键以首选路由为准 (各路由的输出视为等价)"""
+        get_identity = getattr(self.routes[0].service, "get_completion_cache_identity", None)
+        if get_identity is None:
+            return {"provider": "Failover", "routes": [route.name for route in self.routes], "messages": None}
+        return get_identity(messages)
+
+    def _ordered_routes(self) -> List[ChatRoute]:
+        now = time.monotonic()
+        indexed = list(enumerate(self.routes))
+        indexed.sort(key=lambda item: (
+            not item[1].health.available(now),
+            item[1].health.error_rate >= self.unhealthy_error_rate,
+            item[0]
+        ))
+        return [route for _, route in indexed]
+
+    def _hedge_delay(self, route: ChatRoute, operation: str) -> float:
+        p95 = route.health.latency_quantile(operation, self.hedge_quantile)
+        if p95 is None:
+            return self.hedge_max_delay_seconds
+        return min(self.hedge_max_delay_seconds, max(self.hedge_min_delay_seconds, p95))
+
+    @staticmethod
+    def _is_client_error(e: Exception) -> bool:
+        return isinstance(e, BusinessException) and e.code == 400
+
+    async def _timed_call(self, route: ChatRoute, operation: str, call: Callable[[IChatAIService], Awaitable[T]]) -> T:
+        """在单个路由上执行一次调用并记录健康度 (被取消时不计为失败)"""
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(route.service), self.attempt_timeout_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not self._is_client_error(e):
+                route.health.record_failure()
+            raise
+        route.health.record_success(operation, time.monotonic() - started)
+        return result
+
+    async def _attempt(
+        self,
+        operation: str,
+        route: ChatRoute,
+        call: Callable[[IChatAIService], Awaitable[T]],
+        hedge_route: Optional[ChatRoute],
+        hedged_routes: List[ChatRoute]
+    ) -> T:
+        """
+        执行一次 (可能带对冲的) 尝试，返回最先成功的结果；全部失败时抛出最后一个错误。
+        实际发出了对冲请求的路由追加到 hedged_routes。
+        """
+        if hedge_route is None:
+            return await self._timed_call(route, operation, call)
+
+        primary = asyncio.create_task(self._timed_call(route, operation, call))
+        tasks: Set[asyncio.Task] = {primary}
+        hedge: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay(route, operation))
+            if not done:
+                logger.info(f"AI 请求 {operation} 在路由 {route.name} 超过对冲等待时间，向 {hedge_route.name} 发送对冲请求")
+                hedge = asyncio.create_task(self._timed_call(hedge_route, operation, call))
+                tasks.add(hedge)
+                hedged_routes.append(hedge_route)
+            last_error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if hedge is not None:
+                            ai_hedge_total.inc(route=route.name, outcome="hedge" if task is hedge else "primary")
+                        return task.result()
+                    last_error = error
+                    if self._is_client_error(error):
+                        raise error
+            raise last_error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _execute(
+        self,
+        operation: str,
+        call: Callable[[IChatAIService], Awaitable[T]],
+        hedge: bool
+    ) -> T:
+        routes = self._ordered_routes()
+        last_error: Optional[Exception] = None
+        index = 0
+        while index < len(routes):
+            route = routes[index]
+            hedge_route: Optional[ChatRoute] = None
+            if hedge and self.hedge_enabled:
+                hedge_route = routes[index + 1] if index + 1 < len(routes) else route
+            hedged_routes: List[ChatRoute] = []
+            try:
+                return await self._attempt(operation, route, call, hedge_route, hedged_routes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._is_client_error(e):
+                    raise
+                last_error = e
+                ai_failover_total.inc(route=route.name, operation=operation)
+                logger.warning(f"AI 请求 {operation} 在路由 {route.name} 失败: {e!r}，尝试下一个路由")
+            # 对冲请求已使用下一个路由时跳过它
+            index += 2 if any(r is not route for r in hedged_routes) else 1
+        if isinstance(last_error, asyncio.TimeoutError):
+            raise BusinessException("AI 服务响应超时，请稍后重试", code=504) from last_error
+        raise last_error
+
+    # --- IChatAIService ---
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        return await self._execute("embedding", lambda service: service.get_embedding_async(text), hedge=True)
+
+    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        return await self._execute("embeddings", lambda service: service.get_embeddings_async(texts), hedge=True)
+
+    async def upload_file_async(self, file_path: str) -> ChatAIUploadFileDto:
+        return await self.routes[0].service.upload_file_async(file_path)
+
+    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+        hedge = estimate_messages_tokens(messages) <= self.hedge_max_prompt_tokens
+        return await self._execute("chat", lambda service: service.chat_completion_async(messages), hedge=hedge)
+
+    async def streaming_chat_completion_async(
+        self, messages: List[InputMessage]
+    ) -> AsyncGenerator[str, None]:
+        last_error_text: Optional[str] = None
+        for route in self._ordered_routes():
+            stream = route.service.streaming_chat_completion_async(messages)
+            started = time.monotonic()
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), self.first_token_timeout_seconds)
+            except StopAsyncIteration:
+                route.health.record_success("stream", time.monotonic() - started)
+                return
+            except asyncio.CancelledError:
+                await stream.aclose()
+                raise
+            except Exception as e:
+                await stream.aclose()
+                if self._is_client_error(e):
+                    raise
+                route.health.record_failure()
+                ai_failover_total.inc(route=route.name, operation="stream")
+                last_error_text = "[AI Error: 首个片段超时]" if isinstance(e, asyncio.TimeoutError) else f"[AI Error: {e}]"
+                logger.warning(f"AI 流式请求在路由 {route.name} 未返回首个片段: {e!r}，尝试下一个路由")
+                continue
+
+            if first.startswith("[AI Error") or first.startswith("[Unknown AI Error"):
+                # 提供者以文本形式返回的错误，尚未向调用方输出，可以转移
+                await stream.aclose()
+                route.health.record_failure()
+                ai_failover_total.inc(route=route.name, operation="stream")
+                last_error_text = first
+                logger.warning(f"AI 流式请求在路由 {route.name} 返回错误: {first[:200]}，尝试下一个路由")
+                continue
+
+            route.health.record_success("stream", time.monotonic() - started)
+            try:
+                yield first
+                async for piece in stream:
+                    yield piece
+            finally:
+                await stream.aclose()
+            return
+
+        yield last_error_text or "[AI Error: 没有可用的 AI 服务]"
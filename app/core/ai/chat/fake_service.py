@@ -0,0 +1,298 @@
+# app/core/ai/chat/fake_service.py
+"""
+压测用的模拟聊天服务：回放录制的响应或生成合成响应，不消耗真实令牌。
+
+- replay 模式：按消息摘要回放录制文件中的响应，未录制的输入生成确定性的合成文本。
+- record 模式：包装真实提供者，把响应与耗时追加写入录制文件 (JSON Lines)。
+- 延迟分布、流式分块节奏、429/超时注入均可配置；固定随机种子时结果可复现。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.dtos import ChatAIUploadFileDto, InputMessage, InputTextContent, InputImageContent
+from app.core.exceptions import AIRateLimitException, BusinessException
+
+logger = logging.getLogger(__name__)
+
+_SYNTHETIC_WORDS = (
+    "数据", "分析", "模型", "用户", "系统", "结果", "需要", "可以", "通过", "进行",
+    "the", "value", "result", "service", "request", "data", "model", "with", "for", "and",
+)
+
+
+def message_digest(messages: List[InputMessage]) -> str:
+    """消息内容的摘要 (录制与回放的匹配键)"""
+    parts = []
+    for message in messages:
+        content = []
+        for part in message.content:
+            if isinstance(part, InputTextContent):
+                content.append(part.text)
+            elif isinstance(part, InputImageContent):
+                content.append(part.source.url or hashlib.sha256((part.source.data or "").encode("utf-8")).hexdigest())
+        parts.append([message.role.openai_role, content])
+    canonical = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class FakeChatOptions:
+    """模拟服务参数 (毫秒)"""
+    latency_distribution: str = "lognormal"  # fixed / uniform / lognormal / recorded
+    first_token_latency_ms: float = 500.0     # 首个片段 (或非流式完整响应) 的中位延迟
+    latency_spread: float = 0.5               # lognormal 的 sigma；uniform 时为 ±比例
+    chunk_interval_ms: float = 30.0           # 流式片段之间的间隔
+    chunk_chars: int = 8                      # 每个流式片段的字符数
+    synthetic_response_chars: int = 400       # 合成响应长度
+    embedding_dimension: int = 1536
+    embedding_latency_ms: float = 50.0
+    rate_limit_probability: float = 0.0       # 注入 429 的概率
+    timeout_probability: float = 0.0          # 注入超时的概率
+    timeout_seconds: float = 30.0             # 注入超时前等待的时间
+    seed: Optional[int] = None
+
+
+class ResponseRecordings:
+    """
+    录制文件 (JSON Lines)，每行一条：
+    {"key": 消息摘要, "response": 完整响应, "latency_ms": 总耗时, "first_token_ms": 首片段耗时}
+    同一输入录制多次时按顺序轮流回放。
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._write_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path: str):
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"忽略无法解析的录制行: {line[:80]}")
+                    continue
+                if "key" in record and "response" in record:
+                    self._records.setdefault(record["key"], []).append(record)
+                    count += 1
+        logger.info(f"已加载 {count} 条 AI 响应录制: {path}")
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._records.values())
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        records = self._records.get(key)
+        if not records:
+            return None
+        index = self._cursor.get(key, 0)
+        self._cursor[key] = index + 1
+        return records[index % len(records)]
+
+    def append(self, record: Dict[str, Any]):
+        self._records.setdefault(record["key"], []).append(record)
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self._write_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class FakeChatAIService(IChatAIService):
+    """回放录制响应或生成合成响应的模拟聊天服务"""
+
+    def __init__(self, options: FakeChatOptions, recordings: Optional[ResponseRecordings] = None):
+        self.options = options
+        self.recordings = recordings or ResponseRecordings(None)
+        self.chat_model = "fake"
+        self.dimension = options.embedding_dimension
+        self._random = random.Random(options.seed)
+        logger.warning(
+            f"使用模拟 AI 服务 (录制 {len(self.recordings)} 条，延迟分布 {options.latency_distribution}，"
+            f"429 概率 {options.rate_limit_probability}，超时概率 {options.timeout_probability})"
+        )
+
+    def get_completion_cache_identity(self, messages: List[InputMessage]) -> Dict[str, Any]:
+        return {"provider": "Fake", "model": self.chat_model, "messages": message_digest(messages)}
+
+    # --- 延迟与错误注入 ---
+
+    def _sample_latency_ms(self, median_ms: float, recorded_ms: Optional[float] = None) -> float:
+        options = self.options
+        distribution = options.latency_distribution
+        if distribution == "recorded" and recorded_ms is not None:
+            return recorded_ms
+        if distribution == "fixed" or median_ms <= 0:
+            return median_ms
+        if distribution == "uniform":
+            spread = median_ms * options.latency_spread
+            return max(0.0, self._random.uniform(median_ms - spread, median_ms + spread))
+        # lognormal：中位数为 median_ms，长尾由 sigma 控制
+        return median_ms * math.exp(self._random.gauss(0.0, options.latency_spread))
+
+    async def _sleep_ms(self, ms: float):
+        if ms > 0:
+            await asyncio.sleep(ms / 1000.0)
+
+    async def _maybe_inject_error(self):
+        """按配置概率注入 429 或超时 (与真实提供者抛出的异常类型一致)"""
+        roll = self._random.random()
+        if roll < self.options.rate_limit_probability:
+            raise AIRateLimitException("AI 服务请求过于频繁: rate_limit_exceeded - 模拟 429", retry_after_seconds=1.0)
+        if roll < self.options.rate_limit_probability + self.options.timeout_probability:
+            await asyncio.sleep(self.options.timeout_seconds)
+            raise asyncio.TimeoutError("模拟请求超时")
+
+    # --- 响应内容 ---
+
+    def _synthesize(self, key: str) -> str:
+        """按消息摘要生成确定性的合成文本 (相同输入得到相同输出)"""
+        rng = random.Random(key)
+        words: List[str] = []
+        length = 0
+        while length < self.options.synthetic_response_chars:
+            word = rng.choice(_SYNTHETIC_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)
+
+    def _resolve_response(self, messages: List[InputMessage]) -> Dict[str, Any]:
+        key = message_digest(messages)
+        record = self.recordings.lookup(key)
+        if record is not None:
+            return record
+        return {"key": key, "response": self._synthesize(key)}
+
+    def _split_chunks(self, text: str) -> List[str]:
+        size = max(1, self.options.chunk_chars)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    # --- IChatAIService ---
+
+    def _embed(self, text: str) -> List[float]:
+        """按文本摘要生成确定性的单位向量 (维度与配置一致)"""
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).hexdigest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.dimension)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        await self._maybe_inject_error()
+        await self._sleep_ms(self._sample_latency_ms(self.options.embedding_latency_ms))
+        return self._embed(text)
+
+    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        await self._maybe_inject_error()
+        await self._sleep_ms(self._sample_latency_ms(self.options.embedding_latency_ms))
+        return [self._embed(text) for text in texts]
+
+    async def upload_file_async(self, file_path: str) -> ChatAIUploadFileDto:
+        raise NotImplementedError("模拟 AI 服务不支持上传文件。")
+
+    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+        if not messages:
+            return ""
+        try:
+            await self._maybe_inject_error()
+        except asyncio.TimeoutError as e:
+            raise BusinessException(f"AI 聊天服务发生未知错误: {str(e)}") from e
+        record = self._resolve_response(messages)
+        response = record["response"]
+        # 非流式：首片段延迟 + 按分块节奏生成全部内容的时间
+        generation_ms = len(self._split_chunks(response)) * self.options.chunk_interval_ms
+        await self._sleep_ms(self._sample_latency_ms(
+            self.options.first_token_latency_ms + generation_ms, record.get("latency_ms")))
+        return response
+
+    async def streaming_chat_completion_async(
+        self, messages: List[InputMessage]
+    ) -> AsyncGenerator[str, None]:
+        if not messages:
+            yield ""
+            return
+        try:
+            await self._maybe_inject_error()
+        except asyncio.TimeoutError as e:
+            yield f"[Unknown AI Error: {str(e)}]"
+            return
+        record = self._resolve_response(messages)
+        await self._sleep_ms(self._sample_latency_ms(self.options.first_token_latency_ms, record.get("first_token_ms")))
+        for index, chunk in enumerate(self._split_chunks(record["response"])):
+            if index > 0:
+                await self._sleep_ms(self.options.chunk_interval_ms)
+            yield chunk
+
+
+class RecordingChatAIService(IChatAIService):
+    """包装真实提供者，把补全响应与耗时写入录制文件 (嵌入与文件上传直接透传)"""
+
+    def __init__(self, inner: IChatAIService, recordings: ResponseRecordings):
+        self.inner = inner
+        self.recordings = recordings
+
+    def __getattr__(self, name: str):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        return await self.inner.get_embedding_async(text)
+
+    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.get_embeddings_async(texts)
+
+    async def upload_file_async(self, file_path: str) -> ChatAIUploadFileDto:
+        return await self.inner.upload_file_async(file_path)
+
+    def _record(self, messages: List[InputMessage], response: str, latency_ms: float, first_token_ms: float):
+        if not response or response.startswith("[AI Error") or response.startswith("[Unknown AI Error"):
+            return
+        self.recordings.append({
+            "key": message_digest(messages),
+            "response": response,
+            "latency_ms": round(latency_ms, 1),
+            "first_token_ms": round(first_token_ms, 1),
+        })
+
+    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+        started = time.monotonic()
+        response = await self.inner.chat_completion_async(messages)
+        latency_ms = (time.monotonic() - started) * 1000
+        self._record(messages, response, latency_ms, latency_ms)
+        return response
+
+    async def streaming_chat_completion_async(
+        self, messages: List[InputMessage]
+    ) -> AsyncGenerator[str, None]:
+        started = time.monotonic()
+        first_token_ms: Optional[float] = None
+        pieces: List[str] = []
+        async for piece in self.inner.streaming_chat_completion_async(messages):
+            if first_token_ms is None:
+                first_token_ms = (time.monotonic() - started) * 1000
+            pieces.append(piece)
+            yield piece
+        latency_ms = (time.monotonic() - started) * 1000
+        self._record(messages, "".join(pieces), latency_ms, first_token_ms or latency_ms)
@@ -0,0 +1,350 @@
+# app/core/ai/chat/instrumentation.py
+import asyncio
+import datetime
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config.settings import settings
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.scheduler import estimate_messages_tokens, estimate_text_tokens
+from app.core.ai.dtos import ChatAIUploadFileDto, InputMessage
+from app.core.exceptions import AIRateLimitException
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 首个片段时间分桶 (秒)
+_TTFT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 60)
+
+ai_call_duration_seconds = metrics_registry.histogram(
+    "ai_call_duration_seconds", "AI 调用耗时 (不含调度排队；outcome: success/error/rate_limited/cancelled)",
+    ("provider", "model", "operation", "call_site", "outcome"))
+ai_call_ttft_seconds = metrics_registry.histogram(
+    "ai_call_ttft_seconds", "流式补全从发出请求到收到首个片段的时间", ("provider", "model", "call_site"), buckets=_TTFT_BUCKETS)
+ai_call_tokens_total = metrics_registry.counter(
+    "ai_call_tokens_total", "AI 调用消耗的令牌数 (kind: prompt/completion；提供者未返回用量时为估算值)",
+    ("provider", "model", "call_site", "kind"))
+
+
+# --- 调用上下文 ---
+# 调用点：由 SSE 流 (流名称)、后台任务 (任务端点) 与显式的 ai_call_site 设置，未设置时按调用栈推断
+_call_site: ContextVar[Optional[str]] = ContextVar("ai_call_site", default=None)
+# 发起调用的用户：由认证依赖在请求开始时设置，后台任务与系统调用为 None
+_call_user_id: ContextVar[Optional[int]] = ContextVar("ai_call_user_id", default=None)
+
+
+@contextmanager
+def ai_call_site(name: str) -> Iterator[None]:
+    """在当前上下文 (及其中创建的子任务) 内以指定调用点记录 AI 调用"""
+    token = _call_site.set(name)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+def bind_ai_call_site(name: str):
+    """为当前请求的剩余部分设置调用点 (用于返回流式响应的端点，响应在同一请求上下文中生成)"""
+    _call_site.set(name)
+
+
+def bind_ai_user(user_id: Optional[int]):
+    """为当前请求设置发起 AI 调用的用户 (认证依赖中调用)"""
+    _call_user_id.set(user_id)
+
+
+def get_ai_user() -> Optional[int]:
+    return _call_user_id.get()
+
+
+def get_ai_call_site() -> str:
+    """当前调用点：显式设置的值，或调用栈中第一个业务模块的 "模块.函数"，都没有时为 unknown"""
+    site = _call_site.get()
+    if site:
+        return site
+    frame = sys._getframe(1)
+    depth = 0
+    while frame is not None and depth < 50:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.modules."):
+            parts = module.split(".")
+            return f"{parts[3] if len(parts) > 3 else parts[-1]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+        depth += 1
+    return "unknown"
+
+
+@dataclass
+class AIUsage:
+    """提供者返回的实际令牌用量 (支持上报用量的服务在调用结束时填写)"""
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+class AIUsageAggregator:
+    """
+    按 日期 / 用户 / 调用点 汇总 AI 用量。
+
+    进程内累积增量，每 AI_USAGE_FLUSH_SECONDS 用一个管道写入 Redis：
+    - AI:USAGE:{日期}:U:{用户ID} 哈希，字段为 "{调用点}|calls/prompt_tokens/completion_tokens/latency_ms/errors"
+    - AI:USAGE:{日期}:RANK 有序集合，按用户累计令牌数排序
+    写入失败时增量保留到下一次写入。没有用户的调用 (后台任务、系统调用) 只记录在指标中。
+    """
+
+    KEY_PREFIX = "AI:USAGE:"
+    FIELDS = ("calls", "prompt_tokens", "completion_tokens", "latency_ms", "errors")
+
+    def __init__(self):
+        self._pending: Dict[Tuple[str, int, str], List[float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: int, call_site: str, prompt_tokens: int, completion_tokens: int, latency_seconds: float, error: bool):
+        if not settings.AI_USAGE_AGGREGATION_ENABLED:
+            return
+        day = datetime.datetime.now().strftime("%Y%m%d")
+        values = self._pending.setdefault((day, user_id, call_site), [0, 0, 0, 0.0, 0])
+        values[0] += 1
+        values[1] += prompt_tokens
+        values[2] += completion_tokens
+        values[3] += latency_seconds * 1000
+        values[4] += 1 if error else 0
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(settings.AI_USAGE_FLUSH_SECONDS)
+            await self.flush_async()
+
+    async def flush_async(self):
+        """把累积的增量写入 Redis"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        from app.core.redis.service import RedisService
+        expiry_seconds = settings.AI_USAGE_RETENTION_DAYS * 86400
+        try:
+            async with RedisService().pipeline() as batch:
+                for (day, user_id, call_site), values in pending.items():
+                    user_key = f"{self.KEY_PREFIX}{day}:U:{user_id}"
+                    rank_key = f"{self.KEY_PREFIX}{day}:RANK"
+                    for field, value in zip(self.FIELDS, values):
+                        if value:
+                            batch.pipe.hincrbyfloat(user_key, f"{call_site}|{field}", value)
+                    batch.pipe.zincrby(rank_key, values[1] + values[2], str(user_id))
+                    batch.pipe.expire(user_key, expiry_seconds)
+                    batch.pipe.expire(rank_key, expiry_seconds)
+        except Exception as e:
+            logger.warning(f"写入 AI 用量汇总失败，将在下次重试: {e}")
+            for key, values in pending.items():
+                current = self._pending.setdefault(key, [0, 0, 0, 0.0, 0])
+                for i, value in enumerate(values):
+                    current[i] += value
+
+    async def stop(self):
+        """停止定时写入并写入剩余增量 (应用关闭时调用)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush_async()
+
+    async def get_daily_usage_async(self, day: Optional[str] = None, top: int = 20) -> List[Dict[str, Any]]:
+        """读取某日令牌用量最高的用户及其各调用点明细"""
+        from app.core.redis.service import RedisService
+        day = day or datetime.datetime.now().strftime("%Y%m%d")
+        redis_service = RedisService()
+        client = redis_service._get_client()
+        ranked = await client.zrevrange(f"{self.KEY_PREFIX}{day}:RANK", 0, max(0, top - 1), withscores=True)
+        if not ranked:
+            return []
+        async with redis_service.pipeline() as batch:
+            for user_id, _ in ranked:
+                batch.pipe.hgetall(f"{self.KEY_PREFIX}{day}:U:{_decode(user_id)}")
+        result = []
+        for (user_id, total_tokens), raw in zip(ranked, batch.results):
+            call_sites: Dict[str, Dict[str, float]] = {}
+            for field, value in (raw or {}).items():
+                call_site, _, name = _decode(field).rpartition("|")
+                call_sites.setdefault(call_site, {})[name] = float(_decode(value))
+            for item in call_sites.values():
+                calls = item.get("calls", 0)
+                item["avg_latency_ms"] = item.pop("latency_ms", 0.0) / calls if calls else 0.0
+            result.append({"user_id": int(_decode(user_id)), "total_tokens": int(total_tokens), "call_sites": call_sites})
+        return result
+
+
+def _decode(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+ai_usage_aggregator = AIUsageAggregator()
+
+
+def record_ai_call(
+    provider: str,
+    model: str,
+    operation: str,
+    call_site: str,
+    outcome: str,
+    latency_seconds: float,
+    prompt_tokens: int,
+    completion_tokens: int,
+    user_id: Optional[int]
+):
+    """记录一次 AI 调用 (不经过 InstrumentedChatAIService 的调用，如提供者批处理，也由此记录)"""
+    ai_call_duration_seconds.observe(
+        latency_seconds, provider=provider, model=model, operation=operation, call_site=call_site, outcome=outcome)
+    if prompt_tokens:
+        ai_call_tokens_total.inc(prompt_tokens, provider=provider, model=model, call_site=call_site, kind="prompt")
+    if completion_tokens:
+        ai_call_tokens_total.inc(completion_tokens, provider=provider, model=model, call_site=call_site, kind="completion")
+    if user_id is not None:
+        ai_usage_aggregator.record(user_id, call_site, prompt_tokens, completion_tokens, latency_seconds, outcome != "success")
+
+
+def _outcome_of(e: BaseException) -> str:
+    if isinstance(e, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(e, AIRateLimitException):
+        return "rate_limited"
+    return "error"
+
+
+class InstrumentedChatAIService(IChatAIService):
+    """
+    在提供者服务外层记录每次调用的提供者、模型、调用点、耗时、首个片段时间 (流式)、令牌用量与结果。
+    位于调度层之内，耗时不含排队时间 (见 ai_scheduler_wait_seconds)；429 重试的每次尝试分别记录。
+    被包装的服务声明 reports_usage = True 时，调用方法接受 usage 参数并填写提供者返回的实际用量，
+    否则按估算值记录。
+    """
+
+    def __init__(self, inner: IChatAIService, provider: str):
+        self.inner = inner
+        self.provider = provider
+        self._reports_usage = bool(getattr(inner, "reports_usage", False))
+
+    def __getattr__(self, name: str):
+        # 其余属性 (如 chat_model、dimension) 透传给被包装的服务
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _model(self, operation: str) -> str:
+        attribute = "embedding_model" if operation.startswith("embedding") else "chat_model"
+        return str(getattr(self.inner, attribute, None) or self.provider)
+
+    def _usage_kwargs(self, usage: AIUsage) -> Dict[str, Any]:
+        return {"usage": usage} if self._reports_usage else {}
+
+    async def _observe(
+        self,
+        operation: str,
+        call: Callable[[AIUsage], Awaitable[T]],
+        prompt_estimate: int,
+        count_output: Optional[Callable[[T], int]] = None
+    ) -> T:
+        call_site = get_ai_call_site()
+        usage = AIUsage()
+        outcome = "success"
+        result: Optional[T] = None
+        started = time.monotonic()
+        try:
+            result = await call(usage)
+            return result
+        except BaseException as e:
+            outcome = _outcome_of(e)
+            raise
+        finally:
+            completion_estimate = count_output(result) if count_output and result is not None else 0
+            record_ai_call(
+                self.provider, self._model(operation), operation, call_site, outcome, time.monotonic() - started,
+                usage.prompt_tokens if usage.prompt_tokens is not None else prompt_estimate,
+                usage.completion_tokens if usage.completion_tokens is not None else completion_estimate,
+                get_ai_user()
+            )
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        return await self._observe(
+            "embedding",
+            lambda usage: self.inner.get_embedding_async(text, **self._usage_kwargs(usage)),
+            estimate_text_tokens(text)
+        )
+
+    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        return await self._observe(
+            "embeddings",
+            lambda usage: self.inner.get_embeddings_async(texts, **self._usage_kwargs(usage)),
+            sum(estimate_text_tokens(text) for text in texts)
+        )
+
+    async def upload_file_async(self, file_path: str) -> ChatAIUploadFileDto:
+        return await self.inner.upload_file_async(file_path)
+
+    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+        return await self._observe(
+            "chat",
+            lambda usage: self.inner.chat_completion_async(messages, **self._usage_kwargs(usage)),
+            estimate_messages_tokens(messages),
+            estimate_text_tokens
+        )
+
+    async def streaming_chat_completion_async(
+        self, messages: List[InputMessage]
+    ) -> AsyncGenerator[str, None]:
+        call_site = get_ai_call_site()
+        user_id = get_ai_user()
+        model = self._model("stream")
+        usage = AIUsage()
+        outcome = "success"
+        output_tokens = 0
+        first_piece = True
+        started = time.monotonic()
+        try:
+            async for piece in self.inner.streaming_chat_completion_async(messages, **self._usage_kwargs(usage)):
+                if first_piece and piece:
+                    first_piece = False
+                    ai_call_ttft_seconds.observe(time.monotonic() - started, provider=self.provider, model=model, call_site=call_site)
+                if piece.startswith("[AI Error") or piece.startswith("[Unknown AI Error"):
+                    outcome = "error"
+                output_tokens += estimate_text_tokens(piece)
+                yield piece
+        except GeneratorExit:
+            # 调用方提前结束读取 (如客户端断开)
+            outcome = "cancelled"
+            raise
+        except BaseException as e:
+            outcome = _outcome_of(e)
+            raise
+        finally:
+            record_ai_call(
+                self.provider, model, "stream", call_site, outcome, time.monotonic() - started,
+                usage.prompt_tokens if usage.prompt_tokens is not None else estimate_messages_tokens(messages),
+                usage.completion_tokens if usage.completion_tokens is not None else output_tokens,
+                user_id
+            )
+
+
+def with_instrumentation(service: IChatAIService, provider: str) -> InstrumentedChatAIService:
+    """为提供者服务加上调用观测 (在 with_scheduler 之前包装)"""
+    return InstrumentedChatAIService(service, provider)
+
+
+def summarize_ai_metrics() -> Dict[str, Any]:
+    """汇总本进程的 AI 调用指标 (用于管理接口)"""
+    tokens: Dict[str, Dict[str, float]] = {}
+    for (provider, model, call_site, kind), value in ai_call_tokens_total.values().items():
+        tokens.setdefault(call_site, {}).setdefault(kind, 0)
+        tokens[call_site][kind] += value
+    return {
+        "latency": ai_call_duration_seconds.summarize(),
+        "ttft": ai_call_ttft_seconds.summarize(),
+        "tokens_by_call_site": tokens,
+    }
@@ -1,32 +1,83 @@
 # app/core/ai/chat/openai_service.py - 修复角色转换
+import asyncio
+import json
 import logging
 import httpx
 from typing import List, Dict, Any, AsyncGenerator, Optional
 
-from openai import AsyncOpenAI, OpenAIError
+from openai import AsyncOpenAI, OpenAIError, RateLimitError, APIConnectionError, APITimeoutError, APIStatusError
 from openai.types.chat import ChatCompletionChunk
 from openai.types.chat.chat_completion import ChatCompletion
 
 from app.core.config.settings import settings
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.instrumentation import AIUsage
+from app.core.http import HTTP_POOL_OPENAI, http_client_registry
 from app.core.ai.dtos import (
     ChatAIUploadFileDto, InputMessage, ChatRoleType, 
     InputContentType, InputTextContent, InputImageContent, InputImageSourceType
 )
-from app.core.exceptions import BusinessException, NotFoundException
+from app.core.exceptions import BusinessException, NotFoundException, AIRateLimitException
 
 logger = logging.getLogger(__name__)
 
+
+def _to_rate_limit_exception(e: RateLimitError) -> Optional[AIRateLimitException]:
+    """
+    将 OpenAI 429 转换为 AIRateLimitException (由调度层退避重试)。
+    额度耗尽 (insufficient_quota) 重试无意义，返回 None 按普通错误处理。
+    """
+    if getattr(e, "code", None) == "insufficient_quota":
+        return None
+    retry_after: Optional[float] = None
+    response = getattr(e, "response", None)
+    if response is not None:
+        headers = response.headers
+        try:
+            if headers.get("retry-after-ms"):
+                retry_after = float(headers["retry-after-ms"]) / 1000.0
+            elif headers.get("retry-after"):
+                retry_after = float(headers["retry-after"])
+        except (TypeError, ValueError):
+            retry_after = None
+    return AIRateLimitException(f"AI 服务请求过于频繁: {e.type} - {e.message}", retry_after_seconds=retry_after)
+
+
+def _error_code(e: OpenAIError) -> int:
+    """
+    OpenAI 错误对应的业务码：超时 504、连接失败 503、提供者 5xx 为 502，其余 (请求本身的问题) 为 400。
+    失败转移与熔断器据此区分提供者故障与客户端错误。
+    """
+    if isinstance(e, APITimeoutError):
+        return 504
+    if isinstance(e, APIConnectionError):
+        return 503
+    if isinstance(e, APIStatusError) and e.status_code >= 500:
+        return 502
+    return 400
+
+
+def _fill_usage(usage: Optional[AIUsage], response_usage: Any):
+    """把响应中的实际令牌用量写入观测层传入的 usage"""
+    if usage is None or response_usage is None:
+        return
+    usage.prompt_tokens = getattr(response_usage, "prompt_tokens", None)
+    usage.completion_tokens = getattr(response_usage, "completion_tokens", None) or 0
+
+
 class OpenAIService(IChatAIService):
     """使用 OpenAI API 的聊天服务实现"""
-    
-    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
-        """初始化 OpenAI 异步客户端"""
+
+    # 调用方法接受 usage 参数并填写实际令牌用量 (见 InstrumentedChatAIService)
+    reports_usage = True
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None, chat_model: Optional[str] = None):
+        """初始化 OpenAI 异步客户端 (chat_model 为空时使用 OPENAI_CHAT_MODEL，http_client 为空时使用 AI 提供者连接池)"""
         if not settings.OPENAI_API_KEY:
             raise ValueError("OpenAI API Key 未在配置中设置。")
 
         try:
-            effective_http_client = http_client if http_client else httpx.AsyncClient(timeout=180.0)
+            effective_http_client = http_client if http_client else http_client_registry.get(HTTP_POOL_OPENAI)
 
             self.client = AsyncOpenAI(
                 api_key=settings.OPENAI_API_KEY,
@@ -34,9 +85,10 @@ class OpenAIService(IChatAIService):
                 http_client=effective_http_client
             )
             self.embedding_model = settings.OPENAI_EMBEDDING_MODEL
-            self.chat_model = settings.OPENAI_CHAT_MODEL
+            self.chat_model = chat_model or settings.OPENAI_CHAT_MODEL
             self.max_tokens = settings.OPENAI_MAX_TOKENS
             self.dimension = settings.OPENAI_DIMENSION
+            self.temperature = 0.7
             logger.info(f"OpenAI 服务已初始化。聊天模型: {self.chat_model}, 嵌入模型: {self.embedding_model}")
         except Exception as e:
             logger.error(f"初始化 OpenAI 客户端失败: {e}")
@@ -61,13 +113,13 @@ class OpenAIService(IChatAIService):
                     if part.source.type == InputImageSourceType.URL:
                         image_part["image_url"] = {
                             "url": part.source.url,
-                            "detail": "low"
+                            "detail": part.detail or "low"
                         }
                     elif part.source.type == InputImageSourceType.BASE64:
                         base64_url = f"data:{part.source.media_type};base64,{part.source.data}"
                         image_part["image_url"] = {
                             "url": base64_url,
-                            "detail": "low"
+                            "detail": part.detail or "low"
                         }
                     else:
                          logger.warning(f"不支持的图片源类型: {part.source.type}")
@@ -81,7 +133,17 @@ class OpenAIService(IChatAIService):
         """将 InputMessage 列表转换为 OpenAI API 格式"""
         return [self._convert_input_to_openai_message(msg) for msg in messages]
 
-    async def get_embedding_async(self, text: str) -> List[float]:
+    def get_completion_cache_identity(self, messages: List[InputMessage]) -> Dict[str, Any]:
+        """补全缓存的键内容：模型、生成参数与转换后的消息 (任何一项变化都会生成不同的键)"""
+        return {
+            "provider": "OpenAI",
+            "model": self.chat_model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "messages": self._convert_messages_to_openai_format(messages),
+        }
+
+    async def get_embedding_async(self, text: str, usage: Optional[AIUsage] = None) -> List[float]:
         """获取单个文本的嵌入向量"""
         try:
             response = await self.client.embeddings.create(
@@ -89,20 +151,27 @@ class OpenAIService(IChatAIService):
                 input=text,
                 dimensions=self.dimension
             )
+            _fill_usage(usage, getattr(response, "usage", None))
             if response.data and len(response.data) > 0:
                 embedding = response.data[0].embedding
                 return list(embedding) if embedding else []
             else:
                  logger.error("OpenAI embedding API 返回了空数据。")
                  raise BusinessException("获取文本嵌入失败 (API 返回空)")
-        except OpenAIError as e:
+        except RateLimitError as e:
+            rate_limit_error = _to_rate_limit_exception(e)
+            if rate_limit_error is not None:
+                raise rate_limit_error from e
             logger.error(f"OpenAI API 嵌入请求失败: {e}")
             raise BusinessException(f"获取文本嵌入失败: {e.type} - {e.message}") from e
+        except OpenAIError as e:
+            logger.error(f"OpenAI API 嵌入请求失败: {e}")
+            raise BusinessException(f"获取文本嵌入失败: {e.type} - {e.message}", code=_error_code(e)) from e
         except Exception as e:
             logger.error(f"获取文本嵌入时发生未知错误: {e}")
             raise BusinessException(f"获取文本嵌入时发生未知错误: {str(e)}") from e
 
-    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+    async def get_embeddings_async(self, texts: List[str], usage: Optional[AIUsage] = None) -> List[List[float]]:
         """批量获取多个文本的嵌入向量"""
         if not texts:
             return []
@@ -112,11 +181,18 @@ class OpenAIService(IChatAIService):
                 input=texts,
                 dimensions=self.dimension
             )
+            _fill_usage(usage, getattr(response, "usage", None))
             embeddings = [item.embedding for item in response.data if item.embedding]
             return [list(emb) for emb in embeddings]
-        except OpenAIError as e:
+        except RateLimitError as e:
+            rate_limit_error = _to_rate_limit_exception(e)
+            if rate_limit_error is not None:
+                raise rate_limit_error from e
             logger.error(f"OpenAI API 批量嵌入请求失败: {e}")
             raise BusinessException(f"批量获取文本嵌入失败: {e.type} - {e.message}") from e
+        except OpenAIError as e:
+            logger.error(f"OpenAI API 批量嵌入请求失败: {e}")
+            raise BusinessException(f"批量获取文本嵌入失败: {e.type} - {e.message}", code=_error_code(e)) from e
         except Exception as e:
             logger.error(f"批量获取文本嵌入时发生未知错误: {e}")
             raise BusinessException(f"批量获取文本嵌入时发生未知错误: {str(e)}") from e
@@ -126,7 +202,7 @@ class OpenAIService(IChatAIService):
         logger.warning("OpenAI Chat Completion API 不支持通过此方法上传文件供直接访问。")
         raise NotImplementedError("OpenAI 服务未实现 UploadFileAsync 功能。请使用 Assistant API 或其他方式处理文件。")
 
-    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+    async def chat_completion_async(self, messages: List[InputMessage], usage: Optional[AIUsage] = None) -> str:
         """执行一次完整的聊天补全请求"""
         if not messages:
             return ""
@@ -137,8 +213,9 @@ class OpenAIService(IChatAIService):
                 model=self.chat_model,
                 messages=openai_messages,
                 max_tokens=self.max_tokens,
-                temperature=0.7,
+                temperature=self.temperature,
             )
+            _fill_usage(usage, completion.usage)
             if completion.choices and completion.choices[0].message:
                 content = completion.choices[0].message.content
                 return content if content else ""
@@ -146,41 +223,151 @@ class OpenAIService(IChatAIService):
                 logger.warning("OpenAI chat completion API 返回结果中无有效回复。")
                 return "[模型未返回有效内容]"
 
+        except RateLimitError as e:
+            rate_limit_error = _to_rate_limit_exception(e)
+            if rate_limit_error is not None:
+                raise rate_limit_error from e
+            logger.error(f"OpenAI API 聊天补全请求失败: {e}")
+            raise BusinessException(f"AI 聊天服务出错: {e.type} - {e.message}") from e
         except OpenAIError as e:
             logger.error(f"OpenAI API 聊天补全请求失败: {e}")
             if "context_length_exceeded" in str(e):
                  raise BusinessException("输入内容过长，请减少输入或缩短对话历史。", code=400) from e
-            raise BusinessException(f"AI 聊天服务出错: {e.type} - {e.message}") from e
+            raise BusinessException(f"AI 聊天服务出错: {e.type} - {e.message}", code=_error_code(e)) from e
         except Exception as e:
             logger.error(f"聊天补全时发生未知错误: {e}")
             raise BusinessException(f"AI 聊天服务发生未知错误: {str(e)}") from e
 
     async def streaming_chat_completion_async(
-        self, messages: List[InputMessage]
+        self, messages: List[InputMessage], usage: Optional[AIUsage] = None
     ) -> AsyncGenerator[str, None]:
-        """执行流式聊天补全请求"""
+        """执行流式聊天补全请求 (传入 usage 且开启 AI_STREAM_INCLUDE_USAGE 时请求最后一个数据块附带实际用量)"""
         if not messages:
             yield ""
             return
 
         openai_messages = self._convert_messages_to_openai_format(messages)
 
+        extra_options: Dict[str, Any] = {}
+        if usage is not None and settings.AI_STREAM_INCLUDE_USAGE:
+            extra_options["stream_options"] = {"include_usage": True}
+
+        started = False
         try:
             stream = await self.client.chat.completions.create(
                 model=self.chat_model,
                 messages=openai_messages,
                 max_tokens=self.max_tokens,
-                temperature=0.7,
+                temperature=self.temperature,
                 stream=True,
+                **extra_options
             )
             async for chunk in stream:
+                 # 用量在最后一个数据块中返回 (choices 为空)
+                 _fill_usage(usage, getattr(chunk, "usage", None))
                  if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
                      content_piece = chunk.choices[0].delta.content
+                     started = True
                      yield content_piece
 
+        except RateLimitError as e:
+            # 429 只会在建立流之前返回，交由调度层退避重试
+            rate_limit_error = _to_rate_limit_exception(e)
+            if rate_limit_error is not None:
+                raise rate_limit_error from e
+            logger.error(f"OpenAI API 流式聊天补全请求失败: {e}")
+            yield f"[AI Error: {e.type} - {e.message}]"
         except OpenAIError as e:
             logger.error(f"OpenAI API 流式聊天补全请求失败: {e}")
+            code = _error_code(e)
+            if code >= 500 and not started:
+                # 提供者不可用 (超时、连接失败、5xx)：在输出之前抛出，由熔断器计入失败后再以文本形式返回
+                raise BusinessException(f"AI 聊天服务出错: {e.type} - {e.message}", code=code) from e
             yield f"[AI Error: {e.type} - {e.message}]"
         except Exception as e:
             logger.error(f"流式聊天补全时发生未知错误: {e}")
-            yield f"[Unknown AI Error: {str(e)}]"
\ No newline at end of file
+            yield f"[Unknown AI Error: {str(e)}]"
+
+    async def batch_chat_completion_async(
+        self,
+        batch_messages: List[List[InputMessage]],
+        poll_interval_seconds: float = 60.0,
+        usages: Optional[List[AIUsage]] = None
+    ) -> List[Optional[str]]:
+        """
+        通过 Batch API 提交一批聊天补全并轮询直到结束 (提供者在 24 小时内完成，不占用实时接口的速率限制)。
+
+        Args:
+            batch_messages: 每个请求的输入消息。
+            poll_interval_seconds: 轮询批处理状态的间隔。
+            usages: (可选) 与请求一一对应，填写各请求的实际令牌用量。
+
+        Returns:
+            与输入顺序一致的回复，单个请求失败或批处理过期时对应位置为 None。
+        """
+        if not batch_messages:
+            return []
+        lines = [
+            json.dumps({
+                "custom_id": str(index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.chat_model,
+                    "messages": self._convert_messages_to_openai_format(messages),
+                    "max_tokens": self.max_tokens,
+                    "temperature": self.temperature,
+                },
+            }, ensure_ascii=False)
+            for index, messages in enumerate(batch_messages)
+        ]
+        try:
+            input_file = await self.client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
+            )
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            logger.info(f"OpenAI 批处理已提交: {batch.id}, 请求数: {len(batch_messages)}")
+            while batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+                await asyncio.sleep(poll_interval_seconds)
+                batch = await self.client.batches.retrieve(batch.id)
+        except RateLimitError as e:
+            rate_limit_error = _to_rate_limit_exception(e)
+            if rate_limit_error is not None:
+                raise rate_limit_error from e
+            logger.error(f"OpenAI 批处理请求失败: {e}")
+            raise BusinessException(f"AI 批处理出错: {e.type} - {e.message}") from e
+        except OpenAIError as e:
+            logger.error(f"OpenAI 批处理请求失败: {e}")
+            raise BusinessException(f"AI 批处理出错: {e}", code=_error_code(e)) from e
+
+        results: List[Optional[str]] = [None] * len(batch_messages)
+        if not batch.output_file_id:
+            logger.warning(f"OpenAI 批处理 {batch.id} 未产生输出，状态: {batch.status}")
+            return results
+        try:
+            content = await self.client.files.content(batch.output_file_id)
+        except OpenAIError as e:
+            logger.error(f"读取 OpenAI 批处理输出失败: {batch.id}, 错误: {e}")
+            raise BusinessException(f"读取 AI 批处理结果失败: {e}", code=_error_code(e)) from e
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            index = int(item.get("custom_id", -1))
+            response = item.get("response") or {}
+            if not 0 <= index < len(results) or response.get("status_code") != 200:
+                continue
+            body = response.get("body") or {}
+            choices = body.get("choices") or []
+            if choices:
+                results[index] = (choices[0].get("message") or {}).get("content") or ""
+            if usages is not None and body.get("usage"):
+                usages[index].prompt_tokens = body["usage"].get("prompt_tokens")
+                usages[index].completion_tokens = body["usage"].get("completion_tokens") or 0
+        logger.info(f"OpenAI 批处理 {batch.id} 已结束，状态: {batch.status}, 成功 {sum(r is not None for r in results)}/{len(results)}")
+        return results
@@ -0,0 +1,395 @@
+# app/core/ai/chat/scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config.settings import settings
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.dtos import ChatAIUploadFileDto, InputMessage, InputTextContent, InputImageContent
+from app.core.exceptions import AIRateLimitException, BusinessException
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AIRequestPriority(IntEnum):
+    """AI 请求优先级 (数值越小越优先)"""
+    INTERACTIVE = 0  # 用户正在等待的请求 (聊天、SSE 生成)
+    BACKGROUND = 1   # 后台任务 (图谱生成、播客脚本、面试评估等)
+
+
+# 当前请求的优先级：默认视为交互请求，后台任务执行期间由 job_endpoint 设置为 BACKGROUND
+_request_priority: ContextVar[AIRequestPriority] = ContextVar("ai_request_priority", default=AIRequestPriority.INTERACTIVE)
+
+
+def get_ai_request_priority() -> AIRequestPriority:
+    return _request_priority.get()
+
+
+@contextmanager
+def ai_request_priority(priority: AIRequestPriority) -> Iterator[None]:
+    """在当前上下文 (及其中创建的子任务) 内以指定优先级调用 AI 服务"""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+# --- 令牌估算 ---
+# CJK 字符约 1 字符 1 令牌，其他文本约 4 字符 1 令牌
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_MESSAGE_OVERHEAD_TOKENS = 4
+_IMAGE_TOKENS = 85  # detail=low 的图片固定消耗
+_HIGH_DETAIL_IMAGE_TOKENS = 765  # detail=high 且缩放到 768 短边后的典型消耗 (4 个分块)
+
+
+def estimate_text_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def estimate_messages_tokens(messages: List[InputMessage]) -> int:
+    total = 0
+    for message in messages:
+        total += _MESSAGE_OVERHEAD_TOKENS
+        for part in message.content:
+            if isinstance(part, InputTextContent):
+                total += estimate_text_tokens(part.text)
+            elif isinstance(part, InputImageContent):
+                total += _IMAGE_TOKENS if (part.detail or "low") == "low" else _HIGH_DETAIL_IMAGE_TOKENS
+    return total
+
+
+# --- 指标 ---
+ai_scheduler_queued = metrics_registry.gauge(
+    "ai_scheduler_queued", "在调度队列中等待的 AI 请求数", ("provider", "priority"))
+ai_scheduler_in_flight = metrics_registry.gauge(
+    "ai_scheduler_in_flight", "正在执行的 AI 请求数", ("provider", "priority"))
+ai_scheduler_concurrency_limit = metrics_registry.gauge(
+    "ai_scheduler_concurrency_limit", "当前自适应并发上限", ("provider",))
+ai_scheduler_wait_seconds = metrics_registry.histogram(
+    "ai_scheduler_wait_seconds", "AI 请求在调度队列中的等待时间", ("provider", "priority"))
+ai_rate_limited_total = metrics_registry.counter(
+    "ai_rate_limited_total", "AI 提供者返回 429 的次数", ("provider",))
+
+
+class ProviderAdmission:
+    """
+    单个 AI 提供者的准入控制 (进程内)：
+
+    - 并发名额：交互请求可使用全部名额，后台任务最多使用 max_concurrency - interactive_reserved 个。
+    - 严格优先级：队列按 (优先级, 到达顺序) 排序，只要有交互请求在等待，后台请求就不会被放行。
+    - 令牌预算：按估算令牌数从每分钟预算中扣减 (令牌桶)，完成后按实际输出长度结算。
+    - 自适应退避：收到 429 后暂停放行直到退避结束，并将并发上限减半；之后每个成功请求逐步恢复 (AIMD)。
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_concurrency: int,
+        interactive_reserved: int = 0,
+        tokens_per_minute: int = 0,
+        backoff_base_seconds: float = 1.0,
+        backoff_max_seconds: float = 60.0
+    ):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.interactive_reserved = max(0, min(interactive_reserved, self.max_concurrency - 1))
+        self.tokens_per_minute = max(0, tokens_per_minute)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self._limit = float(self.max_concurrency)
+        self._in_flight: Dict[AIRequestPriority, int] = {p: 0 for p in AIRequestPriority}
+        # (优先级, 序号, future, 预估令牌数)
+        self._queue: List[Tuple[int, int, asyncio.Future, int]] = []
+        self._seq = itertools.count()
+        self._tokens = float(self.tokens_per_minute)
+        self._tokens_updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._consecutive_rate_limits = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._publish_metrics()
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self._limit)
+
+    def _background_limit(self) -> int:
+        return max(1, self.concurrency_limit - self.interactive_reserved)
+
+    def _refill_tokens(self, now: float):
+        if self.tokens_per_minute <= 0:
+            return
+        elapsed = now - self._tokens_updated_at
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60.0)
+        self._tokens_updated_at = now
+
+    def _schedule_wakeup(self, delay: float):
+        loop = asyncio.get_running_loop()
+        self._wakeup = loop.call_later(max(0.001, delay), self._dispatch)
+
+    def _dispatch(self):
+        """按优先级放行队首请求，直到名额、令牌或退避条件不满足"""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        now = time.monotonic()
+        self._refill_tokens(now)
+        while self._queue:
+            priority_value, _, future, tokens = self._queue[0]
+            if future.done():
+                # 已超时或被取消的等待者
+                heapq.heappop(self._queue)
+                continue
+            if now < self._blocked_until:
+                self._schedule_wakeup(self._blocked_until - now)
+                break
+            priority = AIRequestPriority(priority_value)
+            if sum(self._in_flight.values()) >= self.concurrency_limit:
+                break
+            if priority == AIRequestPriority.BACKGROUND and self._in_flight[priority] >= self._background_limit():
+                break
+            if self.tokens_per_minute > 0 and tokens > 0:
+                # 超过整分钟预算的单个请求在令牌桶满时放行，避免永远无法执行
+                required = min(tokens, self.tokens_per_minute)
+                if self._tokens < required:
+                    self._schedule_wakeup((required - self._tokens) * 60.0 / self.tokens_per_minute)
+                    break
+                self._tokens -= tokens
+            heapq.heappop(self._queue)
+            self._in_flight[priority] += 1
+            future.set_result(None)
+        self._publish_metrics()
+
+    def _publish_metrics(self):
+        queued = {p: 0 for p in AIRequestPriority}
+        for priority_value, _, future, _ in self._queue:
+            if not future.done():
+                queued[AIRequestPriority(priority_value)] += 1
+        for priority in AIRequestPriority:
+            label = priority.name.lower()
+            ai_scheduler_queued.set(queued[priority], provider=self.provider, priority=label)
+            ai_scheduler_in_flight.set(self._in_flight[priority], provider=self.provider, priority=label)
+        ai_scheduler_concurrency_limit.set(self.concurrency_limit, provider=self.provider)
+
+    async def acquire(self, priority: AIRequestPriority, tokens: int, timeout: Optional[float] = None):
+        """
+        排队等待执行名额。
+
+        Raises:
+            BusinessException: 等待超时 (服务繁忙)。
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), future, tokens))
+        started_at = time.monotonic()
+        self._dispatch()
+        try:
+            if future.done():
+                await future
+            elif timeout:
+                await asyncio.wait_for(future, timeout)
+            else:
+                await future
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 已分配名额但调用方放弃等待，归还名额与令牌
+                self.release(priority, tokens, used_tokens=0)
+            else:
+                future.cancel()
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                logger.warning(f"AI 请求排队超时: provider={self.provider}, priority={priority.name}, 等待 {timeout}s")
+                raise BusinessException("AI 服务繁忙，请稍后重试", code=503) from e
+            raise
+        ai_scheduler_wait_seconds.observe(
+            time.monotonic() - started_at, provider=self.provider, priority=priority.name.lower())
+
+    def release(self, priority: AIRequestPriority, reserved_tokens: int, used_tokens: Optional[int] = None):
+        """
+        归还执行名额。
+        used_tokens 为实际消耗的估算值 (None 表示未知，按预留值计)。
+        """
+        self._in_flight[priority] = max(0, self._in_flight[priority] - 1)
+        if self.tokens_per_minute > 0 and used_tokens is not None:
+            self._refill_tokens(time.monotonic())
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + reserved_tokens - used_tokens)
+        self._dispatch()
+
+    def on_success(self):
+        self._consecutive_rate_limits = 0
+        if self._limit < self.max_concurrency:
+            # 加法增长：约每完成 limit 个请求恢复 1 个并发名额
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+
+    def on_rate_limited(self, retry_after_seconds: Optional[float] = None) -> float:
+        """记录一次 429，返回退避时长（秒）"""
+        self._consecutive_rate_limits += 1
+        if retry_after_seconds and retry_after_seconds > 0:
+            backoff = min(retry_after_seconds, self.backoff_max_seconds)
+        else:
+            backoff = min(self.backoff_max_seconds,
+                          self.backoff_base_seconds * (2 ** (self._consecutive_rate_limits - 1)))
+        # 抖动，避免各进程在同一时刻同时恢复
+        backoff *= random.uniform(1.0, 1.25)
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + backoff)
+        self._limit = max(1.0, self._limit / 2)
+        if self.tokens_per_minute > 0:
+            self._refill_tokens(now)
+            self._tokens = min(self._tokens, 0.0)
+        ai_rate_limited_total.inc(provider=self.provider)
+        logger.warning(
+            f"AI 提供者 {self.provider} 返回 429，暂停 {backoff:.1f}s，并发上限降为 {self.concurrency_limit} "
+            f"(连续 {self._consecutive_rate_limits} 次)"
+        )
+        return backoff
+
+
+_provider_admissions: Dict[str, ProviderAdmission] = {}
+
+
+def get_provider_admission(provider: str) -> ProviderAdmission:
+    """获取 (或按配置创建) 提供者的准入控制器，同一提供者的所有服务实例共享"""
+    admission = _provider_admissions.get(provider)
+    if admission is None:
+        overrides = settings.AI_SCHEDULER_PROVIDER_LIMITS.get(provider, {})
+        admission = ProviderAdmission(
+            provider,
+            max_concurrency=overrides.get("max_concurrency", settings.AI_SCHEDULER_MAX_CONCURRENCY),
+            interactive_reserved=overrides.get("interactive_reserved", settings.AI_SCHEDULER_INTERACTIVE_RESERVED),
+            tokens_per_minute=overrides.get("tokens_per_minute", settings.AI_SCHEDULER_TOKENS_PER_MINUTE),
+            backoff_base_seconds=settings.AI_SCHEDULER_BACKOFF_BASE_SECONDS,
+            backoff_max_seconds=settings.AI_SCHEDULER_BACKOFF_MAX_SECONDS
+        )
+        _provider_admissions[provider] = admission
+    return admission
+
+
+class ScheduledChatAIService(IChatAIService):
+    """
+    在 IChatAIService 外层加入调度：按优先级排队、限制并发与令牌速率，
+    收到 429 时退避后自动重试 (流式请求仅在输出首个片段之前重试)。
+    """
+
+    def __init__(
+        self,
+        inner: IChatAIService,
+        admission: ProviderAdmission,
+        max_rate_limit_retries: int = 3,
+        queue_timeout_seconds: Optional[float] = None,
+        completion_token_reserve: int = 1024
+    ):
+        self.inner = inner
+        self.admission = admission
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.completion_token_reserve = completion_token_reserve
+
+    def __getattr__(self, name: str):
+        # 其余属性 (如 chat_model、dimension) 透传给被包装的服务
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    async def _run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        prompt_tokens: int,
+        reserved_tokens: int,
+        count_output: Optional[Callable[[T], int]] = None
+    ) -> T:
+        priority = get_ai_request_priority()
+        attempt = 0
+        while True:
+            await self.admission.acquire(priority, reserved_tokens, self.queue_timeout_seconds)
+            used_tokens: Optional[int] = None
+            try:
+                result = await call()
+                self.admission.on_success()
+                used_tokens = prompt_tokens + (count_output(result) if count_output else 0)
+                return result
+            except AIRateLimitException as e:
+                self.admission.on_rate_limited(e.retry_after_seconds)
+                attempt += 1
+                if attempt > self.max_rate_limit_retries:
+                    raise
+                logger.info(f"AI 请求被限流，退避后重试 ({attempt}/{self.max_rate_limit_retries})")
+            finally:
+                self.admission.release(priority, reserved_tokens, used_tokens)
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        tokens = estimate_text_tokens(text)
+        return await self._run(lambda: self.inner.get_embedding_async(text), tokens, tokens)
+
+    async def get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_text_tokens(text) for text in texts)
+        return await self._run(lambda: self.inner.get_embeddings_async(texts), tokens, tokens)
+
+    async def upload_file_async(self, file_path: str) -> ChatAIUploadFileDto:
+        return await self.inner.upload_file_async(file_path)
+
+    async def chat_completion_async(self, messages: List[InputMessage]) -> str:
+        prompt_tokens = estimate_messages_tokens(messages)
+        return await self._run(
+            lambda: self.inner.chat_completion_async(messages),
+            prompt_tokens,
+            prompt_tokens + self.completion_token_reserve,
+            estimate_text_tokens
+        )
+
+    async def streaming_chat_completion_async(
+        self, messages: List[InputMessage]
+    ) -> AsyncGenerator[str, None]:
+        priority = get_ai_request_priority()
+        prompt_tokens = estimate_messages_tokens(messages)
+        reserved_tokens = prompt_tokens + self.completion_token_reserve
+        attempt = 0
+        while True:
+            await self.admission.acquire(priority, reserved_tokens, self.queue_timeout_seconds)
+            used_tokens: Optional[int] = None
+            output_tokens = 0
+            started = False
+            try:
+                async for piece in self.inner.streaming_chat_completion_async(messages):
+                    started = True
+                    output_tokens += estimate_text_tokens(piece)
+                    yield piece
+                self.admission.on_success()
+                used_tokens = prompt_tokens + output_tokens
+                return
+            except AIRateLimitException as e:
+                self.admission.on_rate_limited(e.retry_after_seconds)
+                attempt += 1
+                if started or attempt > self.max_rate_limit_retries:
+                    # 与其他流式错误一致，以文本形式返回给调用方
+                    yield f"[AI Error: {e.message}]"
+                    return
+                logger.info(f"AI 流式请求被限流，退避后重试 ({attempt}/{self.max_rate_limit_retries})")
+            finally:
+                self.admission.release(priority, reserved_tokens, used_tokens)
+
+
+def with_scheduler(service: IChatAIService, provider: str) -> ScheduledChatAIService:
+    """使用全局配置为服务加上提供者级调度"""
+    return ScheduledChatAIService(
+        service,
+        get_provider_admission(provider),
+        max_rate_limit_retries=settings.AI_SCHEDULER_MAX_RATE_LIMIT_RETRIES,
+        queue_timeout_seconds=settings.AI_SCHEDULER_QUEUE_TIMEOUT_SECONDS,
+        completion_token_reserve=settings.AI_SCHEDULER_COMPLETION_TOKEN_RESERVE
+    )
@@ -0,0 +1,240 @@
+# app/core/ai/context_window.py
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, List, Optional, Protocol, Sequence
+
+from app.core.config.settings import settings
+from app.core.ai.chat.scheduler import estimate_text_tokens
+from app.core.ai.dtos import ChatRoleType, InputMessage
+
+logger = logging.getLogger(__name__)
+
+# 可选的分词库 (确保已安装: pip install tiktoken)，未安装时按字符估算
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+    logger.warning("tiktoken 未安装，上下文令牌数将按字符估算。请运行: pip install tiktoken")
+
+# 聊天格式中每条消息的固定开销，以及回复起始的固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+_TRUNCATION_MARK = "……"
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: str) -> Any:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: Optional[str], model: str) -> int:
+    """计算文本的令牌数 (不含消息开销)"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_text_tokens(text)
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+
+def to_chat_role(role: Any) -> ChatRoleType:
+    """历史行的角色转换为 ChatRoleType (兼容字符串 "user"/"assistant" 与整型存储的角色)"""
+    if isinstance(role, int):
+        return ChatRoleType(role)
+    return ChatRoleType.from_openai_role(role or "user")
+
+
+class HistoryMessage(Protocol):
+    """可参与打包的历史消息 (如 ChatHistory 行)：token_count 为缓存的令牌数，为空时计算并回写"""
+    role: Any
+    content: Optional[str]
+    token_count: Optional[int]
+
+
+@dataclass
+class PackedContext:
+    """打包结果"""
+    messages: List[InputMessage]
+    prompt_tokens: int
+    budget: int
+    history_used: int = 0
+    history_dropped: int = 0
+    context_truncated: bool = False
+    message_truncated: bool = False
+    selected_history: List[Any] = field(default_factory=list)
+
+
+class ContextWindowManager:
+    """
+    按模型的令牌预算打包系统提示词、检索上下文、历史消息与当前消息。
+
+    预算 = min(模型上下文窗口 - 预留输出令牌, max_prompt_tokens)。打包顺序与截断规则是确定的：
+    1. 系统提示词总是完整保留。
+    2. 当前消息完整保留，只有单独超过剩余预算时才截断其末尾。
+    3. 检索上下文在为最近 min_recent_messages 条历史预留空间后放入，超出部分截断末尾。
+    4. 历史消息从最新向最早逐条整体放入，遇到放不下的一条即停止 (保证所选历史连续)，
+       最多 max_history_messages 条。
+    历史消息的令牌数缓存在行的 token_count 上，只在为空时计算 (未安装 tiktoken 时只估算，不缓存)。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_prompt_tokens: Optional[int] = None,
+        reserved_output_tokens: Optional[int] = None,
+        min_recent_messages: int = 6
+    ):
+        self.model = model
+        context_window = settings.AI_MODEL_CONTEXT_WINDOWS.get(model, settings.AI_DEFAULT_CONTEXT_WINDOW)
+        reserved = settings.OPENAI_MAX_TOKENS if reserved_output_tokens is None else reserved_output_tokens
+        budget = context_window - reserved
+        if max_prompt_tokens:
+            budget = min(budget, max_prompt_tokens)
+        self.budget = max(1, budget)
+        self.min_recent_messages = min_recent_messages
+
+    def count(self, text: Optional[str]) -> int:
+        return count_tokens(text, self.model)
+
+    def count_message(self, text: Optional[str]) -> int:
+        return self.count(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def cacheable_count(self, text: Optional[str]) -> Optional[int]:
+        """
+        可写入 token_count 缓存的令牌数。
+        未安装 tiktoken 时返回 None：按字符估算的值不持久化，避免安装后仍沿用不准确的缓存。
+        """
+        if tiktoken is None:
+            return None
+        return self.count(text)
+
+    def history_tokens(self, item: HistoryMessage) -> int:
+        """历史消息的令牌数 (含消息开销)，未缓存时计算并写回 token_count (仅精确计数)"""
+        token_count = getattr(item, "token_count", None)
+        if token_count is None:
+            token_count = self.count(item.content)
+            if tiktoken is not None:
+                try:
+                    item.token_count = token_count
+                except AttributeError:
+                    pass
+        return token_count + MESSAGE_OVERHEAD_TOKENS
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断文本末尾使其不超过 max_tokens (含截断标记)"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        mark_tokens = self.count(_TRUNCATION_MARK)
+        keep = max(0, max_tokens - mark_tokens)
+        if tiktoken is not None:
+            encoding = _get_encoding(self.model)
+            truncated = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+        else:
+            # 按估算二分查找可保留的最长前缀
+            low, high = 0, len(text)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if estimate_text_tokens(text[:mid]) <= keep:
+                    low = mid
+                else:
+                    high = mid - 1
+            truncated = text[:low]
+        return truncated + _TRUNCATION_MARK if truncated else ""
+
+    @staticmethod
+    def _to_input_message(item: HistoryMessage) -> InputMessage:
+        return InputMessage.from_text(to_chat_role(item.role), item.content or "")
+
+    def pack(
+        self,
+        system_prompts: Sequence[str],
+        current_message: str,
+        history: Sequence[HistoryMessage] = (),
+        context: Optional[str] = None,
+        max_history_messages: Optional[int] = None,
+        context_template: Optional[str] = None
+    ) -> PackedContext:
+        """
+        打包提示词。
+
+        Args:
+            system_prompts: 系统提示词 (完整保留，空字符串忽略)。
+            current_message: 当前用户消息。
+            history: 历史消息，按时间正序，不含当前消息。
+            context: 检索到的上下文 (作为系统消息放在系统提示词之后)。
+            max_history_messages: 最多保留的历史消息条数。
+            context_template: 包含 {Context} 占位符的模板，只截断其中的上下文部分。
+        """
+        def render_context(value: str) -> str:
+            return context_template.replace("{Context}", value) if context_template else value
+
+        system_prompts = [prompt for prompt in system_prompts if prompt]
+        used = REPLY_PRIMING_TOKENS + sum(self.count_message(prompt) for prompt in system_prompts)
+        if used > self.budget:
+            logger.warning(f"系统提示词 ({used} tokens) 已超过上下文预算 {self.budget}")
+
+        # 当前消息
+        message_truncated = False
+        message_tokens = self.count_message(current_message)
+        if used + message_tokens > self.budget:
+            current_message = self.truncate(current_message, self.budget - used - MESSAGE_OVERHEAD_TOKENS)
+            message_tokens = self.count_message(current_message)
+            message_truncated = True
+        used += message_tokens
+
+        # 为最近的历史预留空间后放入检索上下文
+        history = list(history)
+        recent_tokens = sum(self.history_tokens(item) for item in history[-self.min_recent_messages:]) if self.min_recent_messages else 0
+        context_truncated = False
+        context_tokens = 0
+        context_message: Optional[str] = None
+        if context:
+            available = self.budget - used - min(recent_tokens, (self.budget - used) // 2)
+            context_message = render_context(context)
+            context_tokens = self.count_message(context_message)
+            if context_tokens > available:
+                frame_tokens = self.count_message(render_context(""))
+                context_message = render_context(self.truncate(context, available - frame_tokens))
+                context_tokens = self.count_message(context_message)
+                context_truncated = True
+            used += context_tokens
+
+        # 历史：从最新向最早连续放入
+        selected: List[HistoryMessage] = []
+        for item in reversed(history):
+            if max_history_messages is not None and len(selected) >= max_history_messages:
+                break
+            item_tokens = self.history_tokens(item)
+            if used + item_tokens > self.budget:
+                break
+            selected.append(item)
+            used += item_tokens
+        selected.reverse()
+
+        messages = [InputMessage.from_text(ChatRoleType.SYSTEM, prompt) for prompt in system_prompts]
+        if context_message:
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, context_message))
+        messages.extend(self._to_input_message(item) for item in selected)
+        messages.append(InputMessage.from_text(ChatRoleType.USER, current_message))
+
+        return PackedContext(
+            messages=messages,
+            prompt_tokens=used,
+            budget=self.budget,
+            history_used=len(selected),
+            history_dropped=len(history) - len(selected),
+            context_truncated=context_truncated,
+            message_truncated=message_truncated,
+            selected_history=selected
+        )
+
+
+def get_context_window_manager(ai_service: Any, max_prompt_tokens: Optional[int] = None) -> ContextWindowManager:
+    """按 AI 服务当前使用的模型创建上下文管理器"""
+    model = getattr(ai_service, "chat_model", None) or settings.OPENAI_CHAT_MODEL
+    return ContextWindowManager(model, max_prompt_tokens=max_prompt_tokens or settings.AI_CONTEXT_MAX_PROMPT_TOKENS)
@@ -186,6 +186,7 @@ class InputImageContent(InputContentBase):
     """图片类型的输入内容"""
     type: InputContentType = Field(InputContentType.IMAGE, description="内容类型")
     source: InputImageSource = Field(..., description="图片来源信息")
+    detail: Optional[str] = Field(None, description="图片细节级别 (low/high/auto)，为空时按 low 处理")
 
 AnyInputContent = Union[InputTextContent, InputImageContent]
 
@@ -0,0 +1,205 @@
+# app/core/ai/image_preprocess.py
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.core.config.settings import settings
+from app.core.ai.dtos import ChatRoleType, InputImageContent, InputImageSource, InputImageSourceType, InputMessage, InputTextContent
+from app.core.cache import TwoTierCache
+from app.core.http import HTTP_POOL_DOWNLOADS, http_client_registry
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 图片处理库 (requirements.txt 已包含 Pillow)，环境中缺失时按原图发送
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+    logger.warning("Pillow 未安装，视觉调用将按原图发送。请运行: pip install Pillow")
+
+DETAIL_LOW = "low"
+DETAIL_HIGH = "high"
+DETAIL_AUTO = "auto"
+
+# 模型可直接接受的原图格式 (缩放后更大时保留原图)
+_PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+
+ai_image_preprocess_total = metrics_registry.counter(
+    "ai_image_preprocess_total", "视觉调用的图片预处理次数 (outcome: processed/original/passthrough/failed)", ("use_case", "outcome"))
+ai_image_bytes_total = metrics_registry.counter(
+    "ai_image_bytes_total", "预处理前后的图片字节数 (stage: source/sent)", ("use_case", "stage"))
+
+# 缩放结果按内容哈希 (或 URL) 缓存；值不可变，无需失效
+_derivatives = TwoTierCache(
+    namespace="ai_image",
+    redis_key_prefix="AI:IMAGE:",
+    local_max_size=64,
+    local_ttl_seconds=600,
+    redis_ttl_seconds=settings.AI_IMAGE_CACHE_TTL_SECONDS
+)
+
+def detail_for(use_case: str) -> str:
+    """调用场景对应的图片细节级别"""
+    mapping = settings.AI_IMAGE_DETAIL_BY_USE_CASE
+    detail = mapping.get(use_case) or mapping.get("default") or DETAIL_LOW
+    return detail if detail in (DETAIL_LOW, DETAIL_HIGH, DETAIL_AUTO) else DETAIL_LOW
+
+
+def target_size(width: int, height: int, detail: str) -> Tuple[int, int]:
+    """
+    模型实际处理的尺寸 (不放大)：
+    - low: 缩放到 AI_IMAGE_LOW_MAX_SIDE 见方以内。
+    - high/auto: 先缩放到 AI_IMAGE_HIGH_MAX_SIDE 见方以内，再把最短边缩放到 AI_IMAGE_HIGH_SHORT_SIDE 以内。
+    """
+    if width <= 0 or height <= 0:
+        return width, height
+    if detail == DETAIL_LOW:
+        scale = min(1.0, settings.AI_IMAGE_LOW_MAX_SIDE / max(width, height))
+    else:
+        scale = min(1.0, settings.AI_IMAGE_HIGH_MAX_SIDE / max(width, height))
+        scale = min(scale, settings.AI_IMAGE_HIGH_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _process(raw: bytes, detail: str) -> Dict[str, Any]:
+    """缩放并重新编码为 JPEG (CPU 密集，在线程中执行)；缩放后不小于原图时保留可直接发送的原图"""
+    with Image.open(io.BytesIO(raw)) as source:
+        source_format = source.format
+        if getattr(source, "is_animated", False):
+            source.seek(0)
+        image = ImageOps.exif_transpose(source)
+        size = target_size(image.width, image.height, detail)
+        resized = size != (image.width, image.height)
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # 透明背景按白色合成
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        if resized:
+            image = image.resize(size, Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=settings.AI_IMAGE_JPEG_QUALITY, optimize=True)
+        data = output.getvalue()
+
+    if not resized and len(data) >= len(raw) and source_format in _PASSTHROUGH_FORMATS:
+        return {"MediaType": _PASSTHROUGH_FORMATS[source_format], "Data": base64.b64encode(raw).decode("ascii"),
+                "Width": size[0], "Height": size[1], "Processed": False}
+    return {"MediaType": "image/jpeg", "Data": base64.b64encode(data).decode("ascii"),
+            "Width": size[0], "Height": size[1], "Processed": True}
+
+
+async def _download_async(url: str) -> Optional[bytes]:
+    """下载图片，超过 AI_IMAGE_MAX_SOURCE_BYTES 或失败时返回 None"""
+    try:
+        async with http_client_registry.get(HTTP_POOL_DOWNLOADS).stream("GET", url, timeout=30.0) as response:
+            response.raise_for_status()
+            chunks: List[bytes] = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > settings.AI_IMAGE_MAX_SOURCE_BYTES:
+                    logger.info(f"图片超过 {settings.AI_IMAGE_MAX_SOURCE_BYTES} 字节，按原图发送: {url}")
+                    return None
+                chunks.append(chunk)
+            return b"".join(chunks)
+    except Exception as e:
+        logger.warning(f"下载图片失败，按原图发送: {url}, 错误: {e}")
+        return None
+
+
+def _read_file(path: str) -> Optional[bytes]:
+    """读取本地图片，超过 AI_IMAGE_MAX_SOURCE_BYTES 时返回 None"""
+    if os.path.getsize(path) > settings.AI_IMAGE_MAX_SOURCE_BYTES:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _passthrough(image: Union[str, bytes], detail: str, media_type: str) -> InputImageContent:
+    if isinstance(image, bytes):
+        source = InputImageSource(type=InputImageSourceType.BASE64, mediaType=media_type, data=base64.b64encode(image).decode("ascii"))
+    else:
+        source = InputImageSource(type=InputImageSourceType.URL, mediaType=media_type, url=image)
+    return InputImageContent(source=source, detail=detail)
+
+
+async def prepare_image_async(
+    image: Union[str, bytes],
+    use_case: str,
+    media_type: str = "image/jpeg"
+) -> InputImageContent:
+    """
+    把图片转换为视觉调用的输入内容：按调用场景的细节级别缩放到模型实际处理的尺寸，
+    重新编码为 JPEG 后以 Base64 发送 (减少上传字节、提供者下载耗时与图片令牌)。
+    缩放结果按内容哈希 (URL 按地址) 缓存。未安装 Pillow、下载或解码失败时按原图发送。
+
+    Args:
+        image: 图片 URL、data URL、本地文件路径或原始字节。
+        use_case: 调用场景 (见 AI_IMAGE_DETAIL_BY_USE_CASE)。
+        media_type: 按原图发送时的 MIME 类型。
+    """
+    detail = detail_for(use_case)
+    if isinstance(image, str) and image.startswith("data:"):
+        header, _, encoded = image.partition(",")
+        media_type = header[5:].split(";")[0] or media_type
+        image = base64.b64decode(encoded)
+    elif isinstance(image, str) and os.path.isfile(image):
+        image = await asyncio.to_thread(_read_file, image) or image
+    is_url = isinstance(image, str) and image.startswith(("http://", "https://"))
+    if not settings.AI_IMAGE_PREPROCESS_ENABLED or Image is None or not (is_url or isinstance(image, bytes)):
+        ai_image_preprocess_total.inc(use_case=use_case, outcome="passthrough")
+        return _passthrough(image, detail, media_type)
+
+    profile = f"{detail}:{settings.AI_IMAGE_LOW_MAX_SIDE}:{settings.AI_IMAGE_HIGH_MAX_SIDE}:{settings.AI_IMAGE_HIGH_SHORT_SIDE}:{settings.AI_IMAGE_JPEG_QUALITY}"
+    if is_url:
+        cache_key = f"url:{hashlib.sha256(image.encode('utf-8')).hexdigest()}:{profile}"
+    else:
+        cache_key = f"{hashlib.sha256(image).hexdigest()}:{profile}"
+
+    async def load() -> Optional[Dict[str, Any]]:
+        raw = await _download_async(image) if is_url else image
+        if not raw or len(raw) > settings.AI_IMAGE_MAX_SOURCE_BYTES:
+            return None
+        derivative = await asyncio.to_thread(_process, raw, detail)
+        derivative["SourceBytes"] = len(raw)
+        return derivative
+
+    try:
+        derivative = await _derivatives.get_or_load(cache_key, load)
+    except Exception as e:
+        logger.warning(f"图片预处理失败，按原图发送 ({use_case}): {e}")
+        derivative = None
+    if not derivative:
+        ai_image_preprocess_total.inc(use_case=use_case, outcome="failed")
+        return _passthrough(image, detail, media_type)
+
+    ai_image_preprocess_total.inc(use_case=use_case, outcome="processed" if derivative.get("Processed") else "original")
+    ai_image_bytes_total.inc(derivative.get("SourceBytes", 0), use_case=use_case, stage="source")
+    ai_image_bytes_total.inc(len(derivative["Data"]) * 3 // 4, use_case=use_case, stage="sent")
+    return InputImageContent(
+        source=InputImageSource(type=InputImageSourceType.BASE64, mediaType=derivative["MediaType"], data=derivative["Data"]),
+        detail=detail
+    )
+
+
+async def image_message_async(
+    role: ChatRoleType,
+    text: Optional[str],
+    images: Sequence[Union[str, bytes]],
+    use_case: str,
+    media_type: str = "image/jpeg"
+) -> InputMessage:
+    """从文本和图片创建 InputMessage (图片并发预处理，保持原顺序)"""
+    content: List[Union[InputTextContent, InputImageContent]] = []
+    if text:
+        content.append(InputTextContent(text=text))
+    content.extend(await asyncio.gather(*(prepare_image_async(image, use_case, media_type) for image in images)))
+    return InputMessage(role=role, content=content)
@@ -0,0 +1,260 @@
+# app/core/ai/json_stream.py
+"""
+流式结构化输出的增量 JSON 解析。
+
+LLM 按数据块流式输出 JSON (常包裹在 ```json 代码块中) 时，IncrementalJsonParser 逐块扫描，
+指定路径上的值一闭合就解析并返回 (如页面结构中的每个页面、设计中的每张表)，
+调用方无需等待整个回复结束即可开始后续处理或推送给前端。
+
+    parser = IncrementalJsonParser(["pages.*"], start_markers=("```json",))
+    async for chunk in ai_service.streaming_chat_completion_async(messages):
+        for item in parser.feed(chunk):
+            ...  # item.path == ("pages", 0), item.value 为该页面的字典
+    structure = parser.result  # 根值闭合后为完整的 JSON 对象
+
+路径以 "." 分隔，"*" 匹配任意键或数组下标，空字符串表示根值。
+扫描只跟踪结构 (括号、字符串与转义)，对尾随逗号等常见的不规范输出保持宽容；
+闭合的值无法解析时跳过该值，调用方可在回复结束后按原方式回退解析。
+"""
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+PathKey = Union[str, int]
+
+_WHITESPACE = " \t\r\n"
+_UNSET = object()
+
+
+@dataclass
+class JsonStreamItem:
+    """一个已闭合的值"""
+    path: Tuple[PathKey, ...]
+    value: Any
+
+
+class _Frame:
+    """正在扫描的对象或数组"""
+    __slots__ = ("is_object", "start", "emit", "key", "state")
+
+    def __init__(self, is_object: bool, start: int, emit: bool):
+        self.is_object = is_object
+        self.start = start
+        self.emit = emit
+        # 对象为当前键，数组为当前下标
+        self.key: PathKey = "" if is_object else 0
+        # 对象: key -> colon -> value -> comma；数组: value -> comma
+        self.state = "key" if is_object else "value"
+
+
+class IncrementalJsonParser:
+    """
+    增量 JSON 解析器 (非线程安全，每个流使用一个实例)。
+
+    Args:
+        paths: 需要在闭合时返回的路径，如 ["pages.*"]、["tables.*", "relations.*"]。
+        start_markers: JSON 开始前的标记 (如 "```json"、"<json>")，遇到标记后从下一个 { 或 [ 开始解析；
+            回复本身以 { 或 [ 开头时直接解析。为空时从第一个 { 或 [ 开始解析。
+    """
+
+    def __init__(self, paths: Sequence[str] = (), start_markers: Sequence[str] = ()):
+        self._patterns = [tuple(p.split(".")) if p else () for p in paths]
+        self._markers = tuple(start_markers)
+        self._marker_tail = max((len(m) for m in self._markers), default=1) - 1
+        self._prefix = ""
+        self._seen_text = False
+        self._armed = not self._markers
+
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._done = False
+        self._raw: Optional[str] = None
+        self._result: Any = _UNSET
+
+        self._stack: List[_Frame] = []
+        # 正在扫描的字符串/字面量: (开始位置, 是否为键, 是否返回)
+        self._string: Optional[Tuple[int, bool, bool]] = None
+        self._escape = False
+        self._literal: Optional[Tuple[int, bool]] = None
+
+    @property
+    def done(self) -> bool:
+        """根值是否已闭合"""
+        return self._done
+
+    @property
+    def raw(self) -> Optional[str]:
+        """根值闭合后的 JSON 原文"""
+        return self._raw
+
+    @property
+    def result(self) -> Any:
+        """根值闭合后解析得到的对象 (未闭合或无法解析时为 None)"""
+        if self._raw is None:
+            return None
+        if self._result is _UNSET:
+            try:
+                self._result = json.loads(self._raw)
+            except ValueError as e:
+                logger.warning(f"流式 JSON 根值解析失败: {e}")
+                self._result = None
+        return self._result
+
+    def feed(self, chunk: str) -> List[JsonStreamItem]:
+        """输入一个数据块，返回本块中闭合的指定路径上的值 (按闭合顺序)"""
+        if self._done or not chunk:
+            return []
+        if not self._started:
+            chunk = self._find_start(chunk)
+            if chunk is None:
+                return []
+        self._buf += chunk
+        items: List[JsonStreamItem] = []
+        self._scan(items)
+        return items
+
+    def _find_start(self, chunk: str) -> Optional[str]:
+        """在 JSON 开始之前查找开始标记与第一个 { 或 [，返回从根值开始的文本"""
+        text = self._prefix + chunk
+        offset = 0
+        if not self._seen_text:
+            stripped = text.lstrip(_WHITESPACE)
+            if stripped:
+                self._seen_text = True
+                if stripped[0] in "{[":
+                    self._armed = True
+        if not self._armed:
+            hits = [(text.find(m), m) for m in self._markers]
+            hits = [(i, m) for i, m in hits if i >= 0]
+            if not hits:
+                self._prefix = text[-self._marker_tail:] if self._marker_tail else ""
+                return None
+            index, marker = min(hits)
+            offset = index + len(marker)
+            self._armed = True
+        starts = [i for i in (text.find("{", offset), text.find("[", offset)) if i >= 0]
+        if not starts:
+            self._prefix = ""
+            return None
+        self._started = True
+        self._prefix = ""
+        return text[min(starts):]
+
+    def _path(self) -> Tuple[PathKey, ...]:
+        return tuple(frame.key for frame in self._stack)
+
+    def _matches(self, path: Tuple[PathKey, ...]) -> bool:
+        for pattern in self._patterns:
+            if len(pattern) == len(path) and all(p == "*" or p == str(k) for p, k in zip(pattern, path)):
+                return True
+        return False
+
+    def _scan(self, items: List[JsonStreamItem]):
+        buf = self._buf
+        pos = self._pos
+        length = len(buf)
+        while pos < length and not self._done:
+            ch = buf[pos]
+
+            if self._string is not None:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    start, is_key, emit = self._string
+                    self._string = None
+                    frame = self._stack[-1] if self._stack else None
+                    if is_key:
+                        try:
+                            frame.key = json.loads(buf[start:pos + 1])
+                        except ValueError:
+                            frame.key = buf[start + 1:pos]
+                        frame.state = "colon"
+                    else:
+                        self._close_value(start, pos + 1, emit, items)
+                pos += 1
+                continue
+
+            if self._literal is not None:
+                if ch not in _WHITESPACE and ch not in ",]}":
+                    pos += 1
+                    continue
+                start, emit = self._literal
+                self._literal = None
+                self._close_value(start, pos, emit, items)
+                # 当前字符由外层结构继续处理
+
+            if ch in _WHITESPACE:
+                pos += 1
+                continue
+
+            frame = self._stack[-1] if self._stack else None
+            if frame is not None and frame.state == "comma":
+                if ch == ",":
+                    if frame.is_object:
+                        frame.state = "key"
+                    else:
+                        frame.key += 1
+                        frame.state = "value"
+                elif ch in "]}":
+                    self._close_container(pos, items)
+                pos += 1
+                continue
+
+            if frame is not None and frame.is_object and frame.state == "key":
+                if ch == '"':
+                    self._string = (pos, True, False)
+                elif ch == "}":
+                    self._close_container(pos, items)
+                pos += 1
+                continue
+
+            if frame is not None and frame.state == "colon":
+                if ch == ":":
+                    frame.state = "value"
+                pos += 1
+                continue
+
+            # 值的开始 (根值、对象的值或数组元素)
+            if frame is not None and not frame.is_object and ch == "]":
+                # 空数组或尾随逗号
+                self._close_container(pos, items)
+                pos += 1
+                continue
+            emit = self._matches(self._path())
+            if ch in "{[":
+                self._stack.append(_Frame(ch == "{", pos, emit))
+            elif ch == '"':
+                self._string = (pos, False, emit)
+            elif ch in ",}":
+                # 缺失的值，按不规范输出跳过
+                if frame is not None and ch == "}":
+                    self._close_container(pos, items)
+            else:
+                self._literal = (pos, emit)
+            pos += 1
+
+        self._pos = pos
+
+    def _close_container(self, pos: int, items: List[JsonStreamItem]):
+        frame = self._stack.pop()
+        self._close_value(frame.start, pos + 1, frame.emit, items)
+
+    def _close_value(self, start: int, end: int, emit: bool, items: List[JsonStreamItem]):
+        """一个值闭合：按需解析返回，并推进外层结构的状态"""
+        path = self._path()
+        if emit:
+            try:
+                items.append(JsonStreamItem(path=path, value=json.loads(self._buf[start:end])))
+            except ValueError as e:
+                logger.debug(f"流式 JSON 值解析失败，已跳过: path={path}, 错误: {e}")
+        if self._stack:
+            self._stack[-1].state = "comma"
+        else:
+            self._raw = self._buf[start:end]
+            self._done = True
@@ -5,7 +5,8 @@ import logging
 from typing import Optional
 
 from app.core.config.settings import settings
-from app.core.ai.speech.speech_service import AISpeechService, DummySpeechService
+from app.core.ai.speech.speech_service import AISpeechService, DummySpeechService, CircuitBreakerSpeechService
+from app.core.resilience import get_circuit_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -14,13 +15,13 @@ def get_speech_service() -> Optional[AISpeechService]:
     获取配置的语音服务实例
     
     Returns:
-        配置的语音服务实例，如果未配置则返回测试用的DummySpeechService
+        配置的语音服务实例 (已包装熔断)，如果未配置则返回测试用的DummySpeechService
     """
     speech_service_type = settings.SPEECH_SERVICE_TYPE
     
     if speech_service_type == "Dummy" or not speech_service_type:
         logger.info("使用 DummySpeechService 作为语音服务")
-        return DummySpeechService()
+        return CircuitBreakerSpeechService(DummySpeechService(), get_circuit_breaker("speech"))
     
     # 这里可以添加其他语音服务的实现
     # elif speech_service_type == "Azure":
@@ -32,4 +33,4 @@ def get_speech_service() -> Optional[AISpeechService]:
     #     return GoogleSpeechService(...)
     
     logger.warning(f"未知的语音服务类型: {speech_service_type}，使用默认的DummySpeechService")
-    return DummySpeechService()
\ No newline at end of file
+    return CircuitBreakerSpeechService(DummySpeechService(), get_circuit_breaker("speech"))
\ No newline at end of file
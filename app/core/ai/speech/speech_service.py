@@ -3,10 +3,12 @@ AI 语音服务实现
 """
 import os
 import logging
-import subprocess
 import datetime
 from typing import Tuple, Optional, Protocol, runtime_checkable
 
+from app.core.resilience import CircuitBreaker
+from app.core.utils.process import run_process_async
+
 logger = logging.getLogger(__name__)
 
 @runtime_checkable
@@ -74,16 +76,9 @@ class DummySpeechService:
                 output_path
             ]
             
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout, stderr = process.communicate()
+            returncode, stdout, stderr = await run_process_async(cmd)
             
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.error(f"模拟合成语音失败: {stderr}")
                 return False, datetime.timedelta()
             
@@ -94,3 +89,41 @@ class DummySpeechService:
             logger.error(f"模拟合成语音异常: {str(e)}")
             return False, datetime.timedelta()
 
+
+
+class _SpeechSynthesisFailed(Exception):
+    """语音服务返回失败结果 (用于让熔断器计入失败)"""
+
+
+class CircuitBreakerSpeechService:
+    """
+    为语音服务加上熔断：合成连续失败 (抛出异常或返回失败结果) 后，冷却期内直接抛出 CircuitOpenException (503)，
+    不再逐个等待语音服务超时。
+    """
+
+    def __init__(self, inner: AISpeechService, breaker: CircuitBreaker):
+        self.inner = inner
+        self.breaker = breaker
+
+    def __getattr__(self, name: str):
+        # 其余属性透传给被包装的服务
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    async def _synthesize(self, text: str, output_path: str, voice_name: str) -> Tuple[bool, datetime.timedelta]:
+        success, duration = await self.inner.synthesize_speech_async(text, output_path, voice_name)
+        if not success:
+            raise _SpeechSynthesisFailed()
+        return success, duration
+
+    async def synthesize_speech_async(
+        self,
+        text: str,
+        output_path: str,
+        voice_name: str = "zh-CN-XiaoxiaoNeural"
+    ) -> Tuple[bool, datetime.timedelta]:
+        try:
+            return await self.breaker.call(self._synthesize, text, output_path, voice_name)
+        except _SpeechSynthesisFailed:
+            return False, datetime.timedelta()
@@ -0,0 +1,7 @@
+from .models import ConversationSummary
+from .service import ConversationSummarizer
+
+__all__ = [
+    "ConversationSummary",
+    "ConversationSummarizer",
+]
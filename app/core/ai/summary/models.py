@@ -0,0 +1,27 @@
+# app/core/ai/summary/models.py
+from sqlalchemy import BigInteger, String, DateTime, func, Text, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+import datetime
+from typing import Optional
+
+from app.core.database.session import Base
+from app.core.utils.snowflake import generate_id
+
+
+class ConversationSummary(Base):
+    """对话滚动摘要表模型 (各模块的会话共用，按 Scope + SessionId 唯一)"""
+    __tablename__ = "pb_conversation_summary"
+    __table_args__ = (
+        Index('uq_convsummary_scope_session', 'Scope', 'SessionId', unique=True),
+        {'comment': '对话滚动摘要表'}
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, default=generate_id, name="Id", comment="主键ID，雪花算法")
+    scope: Mapped[str] = mapped_column(String(50), nullable=False, name="Scope", comment="会话所属模块 (如 pkb、customerservice、datadesign)")
+    session_id: Mapped[int] = mapped_column(BigInteger, nullable=False, name="SessionId", comment="会话ID (datadesign 为任务ID)")
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True, name="Summary", comment="已折叠对话的摘要")
+    summarized_through_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, name="SummarizedThroughId", comment="已并入摘要的最后一条消息ID")
+    summarized_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, name="SummarizedCount", comment="已并入摘要的消息条数")
+    token_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, name="TokenCount", comment="摘要的令牌数")
+    create_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), name="CreateDate", comment="创建时间")
+    last_modify_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now(), name="LastModifyDate", comment="更新时间")
@@ -0,0 +1,226 @@
+# app/core/ai/summary/service.py
+import asyncio
+import logging
+import uuid
+from typing import Any, List, Optional, Sequence, Set
+
+from sqlalchemy import delete, select
+
+from app.core.config.settings import settings
+from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.scheduler import AIRequestPriority, ai_request_priority
+from app.core.ai.chat.instrumentation import ai_call_site
+from app.core.ai.context_window import get_context_window_manager, to_chat_role
+from app.core.ai.dtos import ChatRoleType, InputMessage
+from app.core.ai.summary.models import ConversationSummary
+from app.core.database.session import AsyncSessionFactory
+from app.core.redis.service import RedisService
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_SYSTEM_PROMPT = (
+    "你负责维护一段对话的滚动摘要。请把“新的对话内容”并入“已有摘要”，输出一份更新后的完整摘要。\n"
+    "要求：\n"
+    "1. 保留用户的目标、需求与偏好、已确认的事实与结论、涉及的实体ID/名称/数值，以及尚未解决的问题。\n"
+    "2. 删除寒暄和重复内容，不要编造对话中没有的信息。\n"
+    "3. 使用与对话相同的语言，以简洁的要点形式输出，不超过 {MaxTokens} 个令牌，只输出摘要本身。"
+)
+
+# 后台折叠任务的引用，防止被垃圾回收
+_background_folds: Set[asyncio.Task] = set()
+
+
+class ConversationSummarizer:
+    """
+    对话滚动摘要。
+
+    会话中尚未折叠的历史超过 AI_SUMMARY_TRIGGER_TOKENS (或占满调用方的历史窗口) 后，
+    在后台以低优先级调用 AI，把除最近 AI_SUMMARY_KEEP_RECENT_MESSAGES 条之外的消息并入已存储的摘要。
+    构建提示词时使用 "摘要 + 摘要之后的消息"，单次请求的提示词大小与会话长度无关。
+
+    消息按 ID (雪花算法，随时间递增) 划分：ID 不大于 summarized_through_id 的消息已并入摘要。
+    摘要表归本模块所有，读写使用独立的数据库会话，不参与调用方的事务。
+    """
+
+    LOCK_KEY_PREFIX = "AI:SUMMARY:LOCK:"
+
+    def __init__(
+        self,
+        scope: str,
+        history_model: Any,
+        session_column: Any,
+        criteria: Sequence[Any] = (),
+        role_labels: Optional[dict] = None
+    ):
+        """
+        Args:
+            scope: 会话所属模块，与 session_id 一起唯一确定一份摘要。
+            history_model: 历史消息实体类 (需有 id、role、content 列)。
+            session_column: 历史消息实体上的会话列 (如 ChatHistory.session_id)。
+            criteria: 参与摘要的消息的额外过滤条件 (如只折叠用户消息)。
+            role_labels: 摘要输入中各角色的显示名称。
+        """
+        self.scope = scope
+        self.history_model = history_model
+        self.session_column = session_column
+        self.criteria = list(criteria)
+        self.role_labels = role_labels or {ChatRoleType.USER: "用户", ChatRoleType.ASSISTANT: "助手"}
+        self._folding: Set[int] = set()
+
+    async def get_async(self, session_id: int) -> Optional[ConversationSummary]:
+        """获取会话的摘要 (未启用或读取失败时返回 None，调用方按无摘要处理)"""
+        if not settings.AI_SUMMARY_ENABLED:
+            return None
+        try:
+            async with AsyncSessionFactory() as db:
+                return await self._get_async(db, session_id)
+        except Exception as e:
+            logger.warning(f"读取对话摘要失败: scope={self.scope}, session_id={session_id}, 错误: {e}")
+            return None
+
+    async def _get_async(self, db, session_id: int) -> Optional[ConversationSummary]:
+        result = await db.execute(
+            select(ConversationSummary)
+            .where(ConversationSummary.scope == self.scope)
+            .where(ConversationSummary.session_id == session_id)
+        )
+        return result.scalars().first()
+
+    async def delete_async(self, session_id: int):
+        """删除会话的摘要 (会话删除时调用)"""
+        try:
+            async with AsyncSessionFactory() as db:
+                await db.execute(
+                    delete(ConversationSummary)
+                    .where(ConversationSummary.scope == self.scope)
+                    .where(ConversationSummary.session_id == session_id)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"删除对话摘要失败: scope={self.scope}, session_id={session_id}, 错误: {e}")
+
+    @staticmethod
+    def unsummarized(summary: Optional[ConversationSummary], history: Sequence[Any]) -> List[Any]:
+        """过滤出尚未并入摘要的历史消息 (保持原顺序)"""
+        if summary is None:
+            return list(history)
+        return [item for item in history if item.id > summary.summarized_through_id]
+
+    @staticmethod
+    def summary_prompt(summary: Optional[ConversationSummary]) -> str:
+        """摘要对应的系统提示词，无摘要时返回空字符串"""
+        if summary is None or not summary.summary:
+            return ""
+        return f"以下是本次对话中较早内容的摘要，回答时可作为上下文参考：\n{summary.summary}"
+
+    def maybe_schedule_fold(
+        self,
+        ai_service: IChatAIService,
+        session_id: int,
+        unsummarized: Sequence[Any],
+        window_limit: Optional[int] = None
+    ) -> bool:
+        """
+        尚未折叠的消息超过阈值时在后台折叠 (不阻塞调用方)，返回是否已安排。
+
+        Args:
+            ai_service: AI 聊天服务。
+            session_id: 会话ID。
+            unsummarized: 调用方持有的尚未并入摘要的消息 (含本轮新增的消息)。
+            window_limit: 调用方每次读取的历史条数，未折叠消息占满窗口时也触发折叠，避免更早的消息滑出窗口。
+        """
+        if not settings.AI_SUMMARY_ENABLED or session_id in self._folding:
+            return False
+        keep = max(1, settings.AI_SUMMARY_KEEP_RECENT_MESSAGES)
+        if len(unsummarized) <= keep:
+            return False
+        manager = get_context_window_manager(ai_service)
+        pending_tokens = sum(manager.history_tokens(item) for item in unsummarized)
+        window_full = window_limit is not None and len(unsummarized) >= window_limit
+        if pending_tokens < settings.AI_SUMMARY_TRIGGER_TOKENS and not window_full:
+            return False
+
+        self._folding.add(session_id)
+        task = asyncio.create_task(self.fold_async(ai_service, session_id))
+        _background_folds.add(task)
+        task.add_done_callback(_background_folds.discard)
+        task.add_done_callback(lambda _: self._folding.discard(session_id))
+        return True
+
+    async def fold_async(self, ai_service: IChatAIService, session_id: int):
+        """把摘要之后、最近 AI_SUMMARY_KEEP_RECENT_MESSAGES 条之前的消息并入摘要 (跨节点加锁，同一会话同时只有一个折叠)"""
+        redis_service = RedisService()
+        lock_key = f"{self.LOCK_KEY_PREFIX}{self.scope}:{session_id}"
+        token = uuid.uuid4().hex
+        locked = await redis_service._try_acquire_lock(lock_key, token, settings.AI_SUMMARY_LOCK_SECONDS)
+        if locked is False:
+            return
+        try:
+            with ai_request_priority(AIRequestPriority.BACKGROUND), ai_call_site(f"summary.{self.scope}"):
+                await self._fold_async(ai_service, session_id)
+        except Exception as e:
+            logger.error(f"折叠对话摘要失败: scope={self.scope}, session_id={session_id}, 错误: {e}")
+        finally:
+            if locked:
+                await redis_service._release_lock(lock_key, token)
+
+    async def _fold_async(self, ai_service: IChatAIService, session_id: int):
+        manager = get_context_window_manager(ai_service)
+        keep = max(1, settings.AI_SUMMARY_KEEP_RECENT_MESSAGES)
+        async with AsyncSessionFactory() as db:
+            summary = await self._get_async(db, session_id)
+            through_id = summary.summarized_through_id if summary else 0
+            model = self.history_model
+            result = await db.execute(
+                select(model)
+                .where(self.session_column == session_id)
+                .where(model.id > through_id)
+                .where(*self.criteria)
+                .order_by(model.id)
+                .limit(settings.AI_SUMMARY_FOLD_MAX_MESSAGES + keep)
+            )
+            rows = list(result.scalars().all())
+            candidates = rows[:-keep]
+            if not candidates:
+                return
+
+            # 按预算选取本次折叠的消息 (从最早开始连续选取)，单条过长的消息截断后参与摘要
+            previous = summary.summary if summary else ""
+            budget = manager.budget - manager.count_message(previous) - settings.AI_SUMMARY_MAX_TOKENS - 200
+            per_message_limit = max(200, budget // 4)
+            lines: List[str] = []
+            folded: List[Any] = []
+            used = 0
+            for item in candidates:
+                label = self.role_labels.get(to_chat_role(item.role), "助手")
+                line = f"{label}: {manager.truncate(item.content or '', per_message_limit)}"
+                line_tokens = manager.count(line) + 1
+                if folded and used + line_tokens > budget:
+                    break
+                lines.append(line)
+                folded.append(item)
+                used += line_tokens
+
+            system_prompt = _SUMMARY_SYSTEM_PROMPT.replace("{MaxTokens}", str(settings.AI_SUMMARY_MAX_TOKENS))
+            messages = [InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt)]
+            if previous:
+                messages.append(InputMessage.from_text(ChatRoleType.USER, f"已有摘要：\n{previous}"))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, "新的对话内容：\n" + "\n".join(lines)))
+            text = (await ai_service.chat_completion_async(messages) or "").strip()
+            if not text or text.startswith("[AI Error") or text == "[模型未返回有效内容]":
+                logger.warning(f"对话摘要生成失败: scope={self.scope}, session_id={session_id}, 输出: {text[:200]}")
+                return
+            text = manager.truncate(text, settings.AI_SUMMARY_MAX_TOKENS)
+
+            if summary is None:
+                summary = ConversationSummary(scope=self.scope, session_id=session_id, summarized_count=0)
+                db.add(summary)
+            summary.summary = text
+            summary.summarized_through_id = folded[-1].id
+            summary.summarized_count = (summary.summarized_count or 0) + len(folded)
+            summary.token_count = manager.count(text)
+            await db.commit()
+            logger.info(
+                f"对话摘要已更新: scope={self.scope}, session_id={session_id}, 本次折叠 {len(folded)} 条, "
+                f"累计 {summary.summarized_count} 条, 摘要 {summary.token_count} tokens"
+            )
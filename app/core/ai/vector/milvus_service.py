@@ -13,6 +13,7 @@ from pymilvus import (
 from app.core.config.settings import settings
 from app.core.ai.vector.base import IMilvusService, VectorFieldDefine
 from app.core.exceptions import BusinessException
+from app.core.resilience import circuit_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -358,6 +359,7 @@ class MilvusService(IMilvusService):
                 formatted_data[i].append(row_dict.get(field_name)) # 使用 .get() 处理可能缺失的键？ Milvus 要求数据完整
         return formatted_data
 
+    @circuit_breaker("milvus") # Milvus 不可用时快速失败，不再等待 30 秒超时
     async def insert_vectors_async(
         self,
         collection_name: str,
@@ -396,6 +398,7 @@ class MilvusService(IMilvusService):
             raise BusinessException(f"向量数据插入时发生未知错误: {e}", code=500) from e
 
 
+    @circuit_breaker("milvus")
     async def delete_vectors_async(
         self,
         collection_name: str,
@@ -429,6 +432,7 @@ class MilvusService(IMilvusService):
             logger.error(f"删除集合 '{collection_name}' 数据时发生未知错误: {e}")
             raise BusinessException(f"向量数据删除时发生未知错误: {e}", code=500) from e
 
+    @circuit_breaker("milvus")
     async def search_async(
         self,
         collection_name: str,
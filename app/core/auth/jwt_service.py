@@ -1,14 +1,27 @@
 # app/core/auth/jwt_service.py
 import time
+import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field
 
-from app.core.config.settings import Settings
+from app.core.config.settings import Settings, settings as app_settings
 from app.core.redis.service import RedisService # 假设 RedisService 可用
+from app.core.cache import cache_invalidation_bus
+from app.core.auth.token_cache import VerifiedTokenCache, TOKEN_CACHE_NAMESPACE
+from app.core.exceptions import UnauthorizedException
 from app.core.utils.snowflake import generate_id
 
+logger = logging.getLogger(__name__)
+
+# 进程内已验证令牌缓存，登录/撤销时经 pub/sub 通知所有节点失效
+verified_token_cache = VerifiedTokenCache(
+    max_size=app_settings.AUTH_TOKEN_CACHE_MAX_SIZE,
+    max_ttl_seconds=app_settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+)
+cache_invalidation_bus.register(verified_token_cache)
+
 class TokenPayload(BaseModel):
     """JWT 令牌载荷模型"""
     sub: str = Field(..., description="令牌主题 (用户 ID)")
@@ -72,27 +85,18 @@ class JwtService:
             print(f"警告: 存储用户 {user_id} 的令牌到 Redis 失败。")
             # raise CacheError("无法存储令牌到 Redis")
 
+        # 新令牌替换旧令牌 (单点登录)，通知各节点清除该用户已缓存的旧令牌
+        await self._invalidate_cached_tokens(user_id)
+
         return encoded_jwt, expire_at
 
     def validate_token(self, token: str) -> Optional[TokenPayload]:
         """
-        验证JWT令牌并增强错误处理
+        验证 JWT 令牌的签名与过期时间。
+
+        Returns:
+            验证通过时返回载荷，否则返回 None。
         """
-        # 先不验证签名解码，用于调试
-        try:
-            # 正确方式：即使不验证签名也需要提供key参数
-            unverified_payload = jwt.decode(
-                token,
-                self.SECRET_KEY,  # 需要提供key
-                options={"verify_signature": False}  # 不验证签名
-            )
-            print(f"令牌未验证载荷: {unverified_payload}")
-            print(f"使用的SECRET_KEY: {self.SECRET_KEY}... 算法: {self.ALGORITHM}")
-        except Exception as e:
-            print(f"令牌格式错误，无法解码: {e}")
-            return None
-            
-        # 验证令牌
         try:
             payload_dict = jwt.decode(
                 token,
@@ -100,24 +104,54 @@ class JwtService:
                 algorithms=[self.ALGORITHM],
                 options={"verify_aud": False}
             )
-            print(f"验证成功，载荷: {payload_dict}")
-            token_data = TokenPayload(**payload_dict)
-            return token_data
+            return TokenPayload(**payload_dict)
         except jwt.ExpiredSignatureError:
-            print("令牌已过期")
+            logger.debug("令牌已过期")
             return None
         except jwt.JWTClaimsError as e:
-            print(f"令牌声明错误: {e}")
+            logger.debug(f"令牌声明错误: {e}")
             return None
         except JWTError as e:
-            print(f"令牌验证失败: {e}")
-            # 添加更多诊断信息
-            print(f"使用的SECRET_KEY长度: {len(self.SECRET_KEY)}, 算法: {self.ALGORITHM}")
+            logger.debug(f"令牌验证失败: {e}")
             return None
         except Exception as e:
-            print(f"令牌解码或验证时发生未知错误: {e}")
+            logger.warning(f"令牌解码或验证时发生未知错误: {e}")
             return None
 
+    async def authenticate_async(self, token: str) -> int:
+        """
+        验证令牌 (签名、过期时间、Redis 中的当前令牌) 并返回用户 ID。
+        验证通过的令牌缓存在进程内，命中时不解码也不访问 Redis。
+
+        Raises:
+            UnauthorizedException: 令牌无效、已撤销或已在别处登录。
+        """
+        cached_user_id = verified_token_cache.get(token)
+        if cached_user_id is not None:
+            return cached_user_id
+
+        payload = self.validate_token(token)
+        if payload is None or payload.sub is None:
+            raise UnauthorizedException(message="无法验证凭据或令牌无效")
+        try:
+            user_id = int(payload.sub)
+        except ValueError:
+            raise UnauthorizedException(message="无法验证凭据或令牌无效")
+
+        generation = verified_token_cache.generation(user_id)
+        stored_token = await self.redis_service.get_async(f"user:token:{user_id}")
+        if stored_token is None or stored_token != token:
+            logger.warning(f"用户 {user_id} 的令牌验证失败 (Redis 不存在或不匹配)。")
+            raise UnauthorizedException(message="登录已失效或已在别处登录")
+
+        verified_token_cache.put(token, user_id, payload.exp, generation)
+        return user_id
+
+    async def _invalidate_cached_tokens(self, user_id: int):
+        """清除本进程中该用户的已验证令牌，并通知其他节点"""
+        verified_token_cache.evict_user(user_id)
+        await cache_invalidation_bus.publish(TOKEN_CACHE_NAMESPACE, [str(user_id)])
+
     async def revoke_token(self, user_id: int) -> bool:
         """
         通过从 Redis 中删除令牌来撤销用户的当前令牌。
@@ -129,4 +163,6 @@ class JwtService:
             如果成功删除返回 True，否则返回 False。
         """
         redis_key = f"user:token:{user_id}"
-        return await self.redis_service.key_delete_async(redis_key)
\ No newline at end of file
+        deleted = await self.redis_service.key_delete_async(redis_key)
+        await self._invalidate_cached_tokens(user_id)
+        return deleted
\ No newline at end of file
@@ -0,0 +1,94 @@
+# app/core/auth/token_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+TOKEN_CACHE_NAMESPACE = "auth_token"
+
+
+def hash_token(token: str) -> str:
+    """令牌摘要 (缓存中不保存令牌原文)"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    进程内已验证令牌缓存：令牌摘要 -> 用户 ID。
+
+    - 条目有效期不超过令牌的 exp，也不超过 max_ttl_seconds。
+    - 登录与撤销时按用户 ID 失效 (本进程直接清除，其他节点经 cache_invalidation_bus 的 pub/sub 通知)。
+    - 每个用户维护失效代次：验证期间收到失效通知时不写入缓存，避免把刚撤销的令牌重新缓存。
+    """
+    namespace = TOKEN_CACHE_NAMESPACE
+
+    def __init__(self, max_size: int = 10000, max_ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.max_ttl_seconds = max_ttl_seconds
+        # 令牌摘要 -> (过期时间戳, 用户 ID)
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._generations: Dict[int, int] = {}
+        self._epoch = 0
+
+    def get(self, token: str) -> Optional[int]:
+        """命中时返回用户 ID"""
+        digest = hash_token(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        expires_at, user_id = entry
+        if expires_at <= time.time():
+            self._remove(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return user_id
+
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def put(self, token: str, user_id: int, exp: Optional[int], generation: Tuple[int, int]):
+        """写入已验证的令牌；generation 为验证开始前取得的代次"""
+        if self.generation(user_id) != generation:
+            return
+        now = time.time()
+        expires_at = now + self.max_ttl_seconds
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        if expires_at <= now:
+            return
+        digest = hash_token(token)
+        self._entries[digest] = (expires_at, user_id)
+        self._entries.move_to_end(digest)
+        self._by_user.setdefault(user_id, set()).add(digest)
+        while len(self._entries) > self.max_size:
+            oldest, _ = next(iter(self._entries.items()))
+            self._remove(oldest)
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._by_user.get(entry[1])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[entry[1]]
+
+    def evict_user(self, user_id: int):
+        for digest in list(self._by_user.pop(user_id, ())):
+            self._entries.pop(digest, None)
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def evict_local(self, key: Optional[str] = None):
+        """失效总线回调：key 为用户 ID 字符串，None 表示全部清空"""
+        if key is None:
+            self._entries.clear()
+            self._by_user.clear()
+            self._generations.clear()
+            self._epoch += 1
+            return
+        try:
+            self.evict_user(int(key))
+        except (TypeError, ValueError):
+            return
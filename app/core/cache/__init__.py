@@ -0,0 +1,8 @@
+from .two_tier import LocalLRUCache, TwoTierCache, CacheInvalidationBus, cache_invalidation_bus
+
+__all__ = [
+    "LocalLRUCache",
+    "TwoTierCache",
+    "CacheInvalidationBus",
+    "cache_invalidation_bus",
+]
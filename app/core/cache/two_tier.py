@@ -0,0 +1,256 @@
+# app/core/cache/two_tier.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config.settings import settings
+from app.core.redis.service import RedisService
+
+logger = logging.getLogger(__name__)
+
+# 当前进程标识，用于识别自己发布的失效消息
+_INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LocalLRUCache:
+    """
+    进程内 LRU 缓存，条目带过期时间。
+    仅在事件循环线程中使用，无需加锁。
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)"""
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    两级缓存：进程内 LRU (L1) + Redis (L2)。
+
+    - 读取顺序为 L1 -> L2 -> loader，回源结果同时写入两级缓存。
+      L2 回源经 RedisService.get_or_set_async (single-flight、提前刷新、空值缓存)。
+    - invalidate 删除 Redis 中的键并通过 pub/sub 广播，各节点收到后清除本地副本。
+    - 本地 TTL 是失效消息丢失时的兜底 (例如订阅连接断开期间)。
+
+    值在 Redis 中以 JSON 存储，调用方负责 DTO 与字典之间的转换 (见 serializer/deserializer)。
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        redis_key_prefix: Optional[str] = None,
+        local_max_size: int = 1024,
+        local_ttl_seconds: float = 300,
+        redis_ttl_seconds: int = 3600,
+        negative_ttl_seconds: Optional[int] = None,
+        serializer: Optional[Callable[[Any], Any]] = None,
+        deserializer: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.namespace = namespace
+        self.redis_key_prefix = redis_key_prefix if redis_key_prefix is not None else f"cache:{namespace}:"
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._local = LocalLRUCache(max_size=local_max_size, ttl_seconds=local_ttl_seconds)
+        self._serializer = serializer or (lambda v: v)
+        self._deserializer = deserializer or (lambda v: v)
+        # 每个键的失效代次：回源期间收到失效消息时，不把旧值写回本地缓存
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0 # 整体清空时递增
+        self._redis = RedisService()
+        cache_invalidation_bus.register(self)
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.redis_key_prefix}{key}"
+
+    def _generation(self, key: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(key, 0)
+
+    async def get(self, key: str) -> Optional[Any]:
+        """依次查询本地缓存与 Redis，均未命中时返回 None"""
+        hit, value = self._local.get(key)
+        if hit:
+            return value
+        generation = self._generation(key)
+        try:
+            _, value = await self._redis.get_cached_async(self._redis_key(key), self._deserializer)
+        except Exception as e:
+            logger.warning(f"两级缓存反序列化失败 ({self.namespace}:{key}): {e}")
+            return None
+        if value is not None and self._generation(key) == generation:
+            self._local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any):
+        """写入本地缓存与 Redis"""
+        self._local.set(key, value)
+        await self._redis.set_cached_async(self._redis_key(key), value, self.redis_ttl_seconds, serializer=self._serializer)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        读取缓存，本地未命中时经 Redis single-flight 回源并回填。
+        loader 返回 None 时按 negative_ttl_seconds 在 Redis 中缓存空结果 (本地不缓存)。
+        """
+        hit, value = self._local.get(key)
+        if hit:
+            return value
+        generation = self._generation(key)
+        value = await self._redis.get_or_set_async(
+            self._redis_key(key),
+            loader,
+            expiry_seconds=self.redis_ttl_seconds,
+            negative_expiry_seconds=self.negative_ttl_seconds,
+            serializer=self._serializer,
+            deserializer=self._deserializer,
+        )
+        # 回源期间收到失效消息时不回填本地缓存，直接返回本次读取结果
+        if value is not None and self._generation(key) == generation:
+            self._local.set(key, value)
+        return value
+
+    async def invalidate(self, *keys: str):
+        """删除键并广播失效消息，集群内所有节点清除本地副本"""
+        for key in keys:
+            self.evict_local(key)
+        await self._redis.keys_delete_async(self._redis_key(key) for key in keys)
+        await cache_invalidation_bus.publish(self.namespace, list(keys))
+
+    def evict_local(self, key: Optional[str] = None):
+        """清除本地副本 (key 为 None 时清空整个命名空间)"""
+        if key is None:
+            self._local.clear()
+            self._generations.clear()
+            self._epoch += 1
+            return
+        self._local.delete(key)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+
+# 订阅连接每次等待消息的最长时间 (秒)，超时后继续等待
+_POLL_TIMEOUT_SECONDS = 10.0
+
+
+class CacheInvalidationBus:
+    """
+    通过 Redis pub/sub 在节点间广播缓存失效消息。
+    每个进程一个订阅连接，按命名空间分发到已注册的缓存
+    (TwoTierCache，或任何提供 namespace 与 evict_local(key) 的本地缓存)。
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._caches: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, cache: Any):
+        self._caches[cache.namespace] = cache
+
+    async def publish(self, namespace: str, keys: list):
+        message = json.dumps({"ns": namespace, "keys": keys, "origin": _INSTANCE_ID})
+        try:
+            await RedisService()._get_client().publish(self.channel, message)
+        except Exception as e:
+            logger.warning(f"发布缓存失效消息失败 ({namespace}): {e}")
+
+    def _evict_all(self):
+        for cache in self._caches.values():
+            cache.evict_local()
+
+    def _handle(self, data: str):
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            logger.warning(f"无法解析缓存失效消息: {data!r}")
+            return
+        if payload.get("origin") == _INSTANCE_ID:
+            return # 本进程发布的消息，invalidate 时已清除本地副本
+        cache = self._caches.get(payload.get("ns"))
+        if cache is None:
+            return
+        keys = payload.get("keys") or []
+        if not keys:
+            cache.evict_local()
+        for key in keys:
+            cache.evict_local(key)
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = RedisService()._get_client().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.channel)
+                # 重新订阅后，断开期间的失效消息可能已丢失，清空本地缓存
+                self._evict_all()
+                backoff = 1.0
+                logger.info(f"已订阅缓存失效频道: {self.channel}")
+                while True:
+                    # 显式指定读取超时：listen() 会沿用连接池的 socket_timeout，频道空闲时每次读取都超时并触发重连与清空；
+                    # 这里超时只表示暂无消息，只有真正断开 (抛出异常) 才重连并清空本地缓存
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=_POLL_TIMEOUT_SECONDS)
+                    if message and message.get("type") == "message":
+                        self._handle(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"缓存失效订阅中断: {e}，{backoff:.0f} 秒后重连")
+                self._evict_all()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        """启动订阅任务 (在 Redis 初始化之后调用)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 全局失效总线
+cache_invalidation_bus = CacheInvalidationBus(settings.CACHE_INVALIDATION_CHANNEL)
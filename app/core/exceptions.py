@@ -35,4 +35,16 @@ class ForbiddenException(BusinessException):
     def __init__(self, message: str = "您没有权限执行此操作"):
         super().__init__(message, code=403)
 
+class AIRateLimitException(BusinessException):
+    """AI 服务提供商限流 (HTTP 429)，retry_after_seconds 为提供商建议的等待时间"""
+    def __init__(self, message: str = "AI 服务请求过于频繁，请稍后重试", retry_after_seconds: float = None):
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(message, code=429)
+
+class ServiceUnavailableException(BusinessException):
+    """依赖服务暂时不可用 (HTTP 503，如熔断器打开)，retry_after_seconds 为建议的等待时间"""
+    def __init__(self, message: str = "依赖服务暂时不可用，请稍后重试", retry_after_seconds: float = None):
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(message, code=503)
+
 # 可以根据需要添加更多特定业务异常
\ No newline at end of file
@@ -0,0 +1,21 @@
+from .clients import (
+    HTTP_POOL_DEFAULT,
+    HTTP_POOL_DOWNLOADS,
+    HTTP_POOL_INTERNAL,
+    HTTP_POOL_OPENAI,
+    HttpClientRegistry,
+    HttpPoolConfig,
+    check_http2,
+    http_client_registry,
+)
+
+__all__ = [
+    "HTTP_POOL_DEFAULT",
+    "HTTP_POOL_DOWNLOADS",
+    "HTTP_POOL_INTERNAL",
+    "HTTP_POOL_OPENAI",
+    "HttpClientRegistry",
+    "HttpPoolConfig",
+    "check_http2",
+    "http_client_registry",
+]
@@ -0,0 +1,227 @@
+# app/core/http/clients.py
+"""
+按上游命名的共享出站 HTTP 客户端。
+
+每个连接池 (default/openai/downloads/internal) 对应一个长期存在的 httpx.AsyncClient，
+保持连接复用 (keep-alive)，在支持时使用 HTTP/2，避免在热路径上反复建立 TCP/TLS 连接。
+代理按 PROXY_* 配置挂载到需要代理的连接池 (PROXY_FORCE_DOMAINS 为空时代理全部请求)。
+
+    client = http_client_registry.get(HTTP_POOL_OPENAI)
+
+客户端在首次使用时创建，应用关闭时由 http_client_registry.aclose() 统一关闭；调用方不要自行关闭。
+"""
+import logging
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from app.core.config.settings import settings
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 依赖 h2 (由 httpx[http2] 安装)；缺失时回退 HTTP/1.1，启动时由 check_http2() 告警
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+HTTP_POOL_DEFAULT = "default"     # 通用出站请求
+HTTP_POOL_OPENAI = "openai"       # AI 提供者 (OpenAI 接口)
+HTTP_POOL_DOWNLOADS = "downloads" # 文档、网页与图片下载
+HTTP_POOL_INTERNAL = "internal"   # 调度器调用本服务的任务接口
+
+http_client_requests_total = metrics_registry.counter(
+    "http_client_requests_total", "出站 HTTP 请求数 (按连接池与状态码类别)", ("pool", "status"))
+
+
+@dataclass
+class HttpPoolConfig:
+    """连接池配置 (可由 HTTP_CLIENT_POOLS 按名称覆盖)"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    http2: bool = False
+    proxy: bool = True
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+_DEFAULT_POOLS: Dict[str, HttpPoolConfig] = {
+    HTTP_POOL_DEFAULT: HttpPoolConfig(timeout=120.0, connect_timeout=30.0),
+    HTTP_POOL_OPENAI: HttpPoolConfig(
+        max_connections=200, max_keepalive_connections=50, keepalive_expiry=90.0,
+        timeout=180.0, connect_timeout=30.0, http2=True),
+    HTTP_POOL_DOWNLOADS: HttpPoolConfig(
+        max_connections=50, max_keepalive_connections=10, timeout=60.0, http2=True,
+        headers={"User-Agent": "AIToolkit/1.0 (Python HttpX Client)"}),
+    HTTP_POOL_INTERNAL: HttpPoolConfig(
+        max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0,
+        timeout=settings.SCHEDULER_API_TIMEOUT, proxy=False),
+}
+
+
+def pool_config(name: str) -> HttpPoolConfig:
+    """连接池的生效配置：默认值叠加 HTTP_CLIENT_POOLS 中的覆盖项"""
+    base = _DEFAULT_POOLS.get(name, _DEFAULT_POOLS[HTTP_POOL_DEFAULT])
+    overrides = settings.HTTP_CLIENT_POOLS.get(name) or {}
+    known = {f.name for f in fields(HttpPoolConfig)}
+    unknown = set(overrides) - known
+    if unknown:
+        logger.warning(f"HTTP_CLIENT_POOLS['{name}'] 包含未知字段，已忽略: {sorted(unknown)}")
+    return replace(base, **{k: v for k, v in overrides.items() if k in known})
+
+
+def proxy_url() -> Optional[str]:
+    """按 PROXY_* 配置得到代理地址 (含认证信息)，未启用代理时返回 None"""
+    if not (settings.PROXY_ENABLED and settings.PROXY_URL):
+        return None
+    if settings.PROXY_USERNAME and settings.PROXY_PASSWORD:
+        try:
+            parts = httpx.URL(settings.PROXY_URL)
+            return str(parts.copy_with(username=settings.PROXY_USERNAME, password=settings.PROXY_PASSWORD))
+        except Exception as e:
+            logger.error(f"解析代理 URL 或添加认证失败: {e}")
+    return settings.PROXY_URL
+
+
+def check_http2() -> List[str]:
+    """启动检查：配置了 http2 但 h2 无法导入的连接池逐个告警，返回这些连接池名称"""
+    if _HTTP2_AVAILABLE or not settings.HTTP_CLIENT_HTTP2_ENABLED:
+        return []
+    names = list(dict.fromkeys([*_DEFAULT_POOLS, *settings.HTTP_CLIENT_POOLS]))
+    degraded = [name for name in names if pool_config(name).http2]
+    for name in degraded:
+        logger.warning(
+            f"HTTP 连接池 '{name}' 配置了 http2，但无法导入 h2，将回退 HTTP/1.1。请安装依赖: pip install 'httpx[http2]'")
+    return degraded
+
+
+class HttpClientRegistry:
+    """共享出站 HTTP 客户端注册表 (进程内单例 http_client_registry，同时存入 app.state.http_clients)"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        # 每个客户端的传输层 (直连与各代理挂载)，用于导出连接池使用情况
+        self._transports: Dict[str, List[httpx.AsyncHTTPTransport]] = {}
+
+    def get(self, name: str = HTTP_POOL_DEFAULT) -> httpx.AsyncClient:
+        """获取指定连接池的客户端 (首次使用时创建)"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        config = pool_config(name)
+        http2 = config.http2 and settings.HTTP_CLIENT_HTTP2_ENABLED and _HTTP2_AVAILABLE
+        limits = httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry
+        )
+
+        def transport(proxy: Optional[str] = None) -> httpx.AsyncHTTPTransport:
+            return httpx.AsyncHTTPTransport(
+                http2=http2, limits=limits, proxy=httpx.Proxy(url=proxy) if proxy else None)
+
+        direct = transport()
+        transports = [direct]
+        mounts: Dict[str, httpx.AsyncHTTPTransport] = {}
+        proxy = proxy_url() if config.proxy else None
+        if proxy:
+            domains = [domain.strip() for domain in settings.PROXY_FORCE_DOMAINS if domain.strip()]
+            if domains:
+                # 仅为指定域名挂载代理 (同时匹配 http 和 https)，其余域名直连
+                for domain in domains:
+                    proxied = transport(proxy)
+                    transports.append(proxied)
+                    mounts[f"http://{domain}"] = proxied
+                    mounts[f"https://{domain}"] = proxied
+            else:
+                proxied = transport(proxy)
+                transports.append(proxied)
+                mounts["all://"] = proxied
+
+        async def count_response(response: httpx.Response):
+            http_client_requests_total.inc(pool=name, status=f"{response.status_code // 100}xx")
+
+        self._transports[name] = transports
+        logger.info(
+            f"创建 HTTP 连接池 '{name}': 最大连接 {config.max_connections}, 保持连接 {config.max_keepalive_connections}, "
+            f"HTTP/2 {'启用' if http2 else '关闭'}, 代理 {'启用' if proxy else '关闭'}"
+        )
+        return httpx.AsyncClient(
+            transport=direct,
+            mounts=mounts,
+            timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+            headers=config.headers or None,
+            follow_redirects=True,
+            event_hooks={"response": [count_response]}
+        )
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各连接池的连接数 (活跃/空闲/HTTP2) 与排队请求数"""
+        result = []
+        for name, transports in self._transports.items():
+            active = idle = http2 = queued = 0
+            for transport in transports:
+                # httpx/httpcore 未公开连接池统计，读取失败时跳过
+                pool = getattr(transport, "_pool", None)
+                try:
+                    for connection in getattr(pool, "connections", ()):
+                        if connection.is_idle():
+                            idle += 1
+                        else:
+                            active += 1
+                        if "HTTP/2" in connection.info():
+                            http2 += 1
+                    queued += sum(1 for request in getattr(pool, "_requests", ()) if request.is_queued())
+                except Exception:
+                    continue
+            result.append({"pool": name, "active": active, "idle": idle, "http2": http2, "queued": queued})
+        return result
+
+    async def aclose(self):
+        """关闭全部客户端 (应用关闭时调用)"""
+        clients, self._clients = self._clients, {}
+        self._transports = {}
+        for name, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭 HTTP 连接池 '{name}' 失败: {e}")
+
+
+http_client_registry = HttpClientRegistry()
+
+
+def _collect_http_pool_connections() -> Iterable:
+    for item in http_client_registry.snapshot():
+        yield "http_client_pool_connections", {"pool": item["pool"], "state": "active"}, item["active"]
+        yield "http_client_pool_connections", {"pool": item["pool"], "state": "idle"}, item["idle"]
+
+
+def _collect_http_pool_http2_connections() -> Iterable:
+    for item in http_client_registry.snapshot():
+        yield "http_client_pool_http2_connections", {"pool": item["pool"]}, item["http2"]
+
+
+def _collect_http_pool_queued_requests() -> Iterable:
+    for item in http_client_registry.snapshot():
+        yield "http_client_pool_queued_requests", {"pool": item["pool"]}, item["queued"]
+
+
+metrics_registry.register_collector(
+    "http_client_pool_connections", "出站 HTTP 连接池的连接数 (state: active/idle)", "gauge",
+    _collect_http_pool_connections)
+metrics_registry.register_collector(
+    "http_client_pool_http2_connections", "出站 HTTP 连接池中的 HTTP/2 连接数", "gauge",
+    _collect_http_pool_http2_connections)
+metrics_registry.register_collector(
+    "http_client_pool_queued_requests", "出站 HTTP 连接池中等待连接的请求数", "gauge",
+    _collect_http_pool_queued_requests)
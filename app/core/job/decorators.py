@@ -79,17 +79,28 @@ def job_endpoint(default_can_retry: bool = True):
                 # (如果原始函数也需要 job_service，则不移除)
                 other_dependencies = {k: v for k, v in kwargs.items() if k != 'job_service'}
 
-                await api_endpoint_func(
-                    **specific_params,
-                    # --- 传递过滤后的依赖 ---
-                    **other_dependencies
-                )
+                # 执行期间在后台自动续约，进程崩溃后租约过期，任务将被回收
+                # 任务内的 AI 调用以后台优先级排队，不占用交互请求的名额，并以任务端点作为调用点记录
+                from app.core.job.lease import JobLeaseKeeper
+                from app.core.ai.chat.scheduler import ai_request_priority, AIRequestPriority
+                from app.core.ai.chat.instrumentation import ai_call_site
+                with ai_request_priority(AIRequestPriority.BACKGROUND), ai_call_site(f"job.{api_endpoint_func.__name__}"):
+                    async with JobLeaseKeeper(job_id):
+                        await api_endpoint_func(
+                            **specific_params,
+                            # --- 传递过滤后的依赖 ---
+                            **other_dependencies
+                        )
                 # ---------------------------
 
                 # 3. 成功，标记完成
                 success_message = f"任务 {job_id} 成功完成"
-                await job_service.complete_job(job_id, success_message)
+                released_job_ids = await job_service.complete_job(job_id, success_message)
                 logger.info(f"同步任务成功完成: JobId={job_id}")
+                if released_job_ids:
+                    # 下游任务已就绪，立即调度而不等待下一个调度周期
+                    from app.core.scheduler import schedule_ready_jobs_dispatch
+                    schedule_ready_jobs_dispatch(released_job_ids)
                 return ApiResponse.success(message=success_message)
 
             except Exception as e:
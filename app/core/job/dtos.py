@@ -0,0 +1,22 @@
+# app/core/job/dtos.py
+import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobSpec(BaseModel):
+    """
+    声明式任务定义，用于 JobPersistenceService.enqueue_job_graph 一次性提交任务 DAG。
+    depends_on 引用同一批次中其他任务的 key，或已存在任务的整数 ID。
+    """
+    key: str = Field(..., description="批次内唯一的任务引用名")
+    task_type: str = Field(..., description="任务类型唯一标识")
+    params_id: Optional[int] = Field(None, description="关联的参数 ID")
+    params_data: Optional[Dict[str, Any]] = Field(None, description="其他参数")
+    user_id: Optional[int] = Field(None, description="提交任务的用户 ID")
+    priority: Optional[int] = Field(None, description="优先级通道，默认取任务配置")
+    max_retries: Optional[int] = Field(None, description="最大重试次数，默认取任务配置")
+    scheduled_at: Optional[datetime.datetime] = Field(None, description="计划执行时间")
+    idempotency_key: Optional[str] = Field(None, description="幂等键，相同键的重复提交合并为同一任务")
+    depends_on: List[Any] = Field(default_factory=list, description="上游任务 (批次内 key 或已有任务 ID)")
@@ -0,0 +1,164 @@
+# app/core/job/fair.py
+import datetime
+import logging
+import threading
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.job.models import JobPersist
+
+logger = logging.getLogger(__name__)
+
+
+class FairJobSelector:
+    """
+    公平任务选择器 (两级赤字轮转 Deficit Round-Robin)。
+
+    - 第一级：优先级通道。每轮每个通道获得与其优先级相等的配额，
+      高优先级通道获得更多调度名额，低优先级通道也不会被饿死。
+    - 第二级：通道内按用户轮转，每个用户每轮最多一个名额，
+      单个用户的大量积压任务不会挤占其他用户。
+
+    选择器在调度器进程内常驻，赤字、通道轮转位置与用户轮转位置跨调度周期保留：
+    通道只在轮到它且赤字用尽时才补充配额，因 limit 用尽而中断的轮次在下一周期继续，
+    之后轮到下一个通道。因此即使 limit 小于高优先级通道的配额，每个非空通道也会在有限的周期内获得名额。
+    """
+
+    def __init__(self):
+        self._lane_deficit: Dict[int, float] = defaultdict(float)
+        # 最后一次被服务的通道 (其赤字未用尽时下一周期从它继续，否则从下一个通道开始)
+        self._last_lane: Optional[int] = None
+        # 每个通道内最后一次被服务的用户，下一轮从其后继开始
+        self._last_served_user: Dict[int, Optional[int]] = {}
+
+    @staticmethod
+    def lane_weight(priority: int) -> int:
+        """通道权重 (即每轮配额)，优先级至少为 1"""
+        return max(1, int(priority or 1))
+
+    def _user_rotation(self, lane: int, users: List[Optional[int]]) -> List[Optional[int]]:
+        """按用户 ID 排序，从上次服务用户的后继开始轮转"""
+        ordered = sorted(users, key=lambda u: (u is None, u or 0))
+        last = self._last_served_user.get(lane)
+        if last in ordered:
+            idx = ordered.index(last) + 1
+            ordered = ordered[idx:] + ordered[:idx]
+        return ordered
+
+    def _lane_rotation(self, lanes: List[int]) -> List[int]:
+        """通道按优先级从高到低轮转，从上次未完成的通道或其后继开始"""
+        last = self._last_lane
+        if last is None:
+            return lanes
+        if last in lanes and self._lane_deficit.get(last, 0) >= 1:
+            idx = lanes.index(last)
+        else:
+            idx = next((i for i, lane in enumerate(lanes) if lane < last), 0)
+        return lanes[idx:] + lanes[:idx]
+
+    def select(self, candidates: List[JobPersist], limit: int) -> List[JobPersist]:
+        """
+        从候选任务中公平地选出最多 limit 个任务。
+
+        Args:
+            candidates: 候选任务 (通常来自 JobPersistenceService.find_fair_candidates)。
+            limit: 本次最多调度的任务数。
+
+        Returns:
+            按调度顺序排列的任务列表。
+        """
+        if limit <= 0 or not candidates:
+            return []
+
+        # lane -> user -> deque[job] (按创建时间排序)
+        flows: Dict[int, "OrderedDict[Optional[int], Deque[JobPersist]]"] = {}
+        for job in sorted(candidates, key=lambda j: j.create_date or datetime.datetime.min):
+            lane_flows = flows.setdefault(job.priority, OrderedDict())
+            lane_flows.setdefault(job.user_id, deque()).append(job)
+
+        # 空通道不保留赤字 (标准 DRR 语义)
+        for lane in list(self._lane_deficit.keys()):
+            if lane not in flows:
+                self._lane_deficit.pop(lane, None)
+
+        selected: List[JobPersist] = []
+        lanes = self._lane_rotation(sorted(flows.keys(), reverse=True))
+        idx = 0
+        while len(selected) < limit and lanes:
+            lane = lanes[idx % len(lanes)]
+            lane_flows = flows[lane]
+            # 赤字用尽才开始新的轮次；上一周期因 limit 中断的轮次沿用剩余赤字
+            if self._lane_deficit[lane] < 1:
+                self._lane_deficit[lane] += self.lane_weight(lane)
+            self._last_lane = lane
+            # 通道内按用户轮转，每个用户每次最多取一个
+            while self._lane_deficit[lane] >= 1 and lane_flows and len(selected) < limit:
+                for user in self._user_rotation(lane, list(lane_flows.keys())):
+                    if self._lane_deficit[lane] < 1 or len(selected) >= limit:
+                        break
+                    queue = lane_flows[user]
+                    selected.append(queue.popleft())
+                    self._lane_deficit[lane] -= 1
+                    self._last_served_user[lane] = user
+                    if not queue:
+                        del lane_flows[user]
+            if not lane_flows:
+                # 通道已清空：不保留赤字，下一个通道顺位到当前位置
+                lanes.remove(lane)
+                self._lane_deficit.pop(lane, None)
+            elif self._lane_deficit[lane] < 1:
+                idx += 1
+        return selected
+
+
+class LaneMetrics:
+    """
+    优先级通道指标 (进程内)：队列深度、最早等待时间与调度等待时间。
+    由调度器在每次调度周期更新，线程安全，开销可忽略。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._depth: Dict[int, Dict[str, Any]] = {}
+        self._dispatched: Dict[int, int] = defaultdict(int)
+        self._wait_sum: Dict[int, float] = defaultdict(float)
+        self._wait_max: Dict[int, float] = defaultdict(float)
+
+    def update_depth(self, lane_stats: List[Dict[str, Any]]):
+        """使用 JobPersistenceService.get_pending_lane_stats 的结果刷新队列深度"""
+        with self._lock:
+            self._depth = {item["priority"]: dict(item) for item in lane_stats}
+
+    def record_dispatch(self, job: JobPersist, now: Optional[datetime.datetime] = None):
+        """记录一次任务调度及其排队等待时间 (从可调度时刻到被选中)"""
+        now = now or datetime.datetime.now()
+        ready_at = job.scheduled_at or job.create_date
+        wait = max(0.0, (now - ready_at).total_seconds()) if ready_at else 0.0
+        with self._lock:
+            self._dispatched[job.priority] += 1
+            self._wait_sum[job.priority] += wait
+            self._wait_max[job.priority] = max(self._wait_max[job.priority], wait)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """返回每个通道的当前指标"""
+        with self._lock:
+            lanes = set(self._depth.keys()) | set(self._dispatched.keys())
+            result = []
+            for lane in sorted(lanes, reverse=True):
+                depth = self._depth.get(lane, {})
+                dispatched = self._dispatched.get(lane, 0)
+                result.append({
+                    "priority": lane,
+                    "depth": depth.get("depth", 0),
+                    "users": depth.get("users", 0),
+                    "oldest_wait_seconds": depth.get("oldest_wait_seconds", 0.0),
+                    "dispatched_total": dispatched,
+                    "avg_wait_seconds": (self._wait_sum.get(lane, 0.0) / dispatched) if dispatched else 0.0,
+                    "max_wait_seconds": self._wait_max.get(lane, 0.0),
+                })
+            return result
+
+
+# 调度器进程内共享实例
+fair_job_selector = FairJobSelector()
+lane_metrics = LaneMetrics()
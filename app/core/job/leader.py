@@ -0,0 +1,200 @@
+# app/core/job/leader.py
+"""
+多进程/多节点部署下的调度器协调 (基于 Redis 租约)。
+
+每个运行 APScheduler 的进程都会启动协调器：
+- 维护作业 (迁移历史、清理历史、回收租约过期任务) 只在持有主节点租约的进程上执行 (leader_only)；
+  主节点每 1/3 租约时长续期一次，崩溃后租约过期 (默认 10 秒)，其余进程在下一次检查时接管；正常关闭时立即释放。
+- 任务调度由全部存活成员分担：成员定期在 Redis 有序集合中登记心跳，按成员列表得到 (序号, 成员数)，
+  每个成员只扫描按用户哈希分到自己的任务 (见 JobPersistenceService.find_fair_candidates)。
+  成员变化的短暂窗口内两个成员可能看到不同的划分，重复调度由任务锁保证只执行一次，遗漏的任务在下一周期调度。
+
+Redis 不可用时 (启动时未连接)，进程按单节点运行：执行全部作业并扫描全部任务。
+"""
+import asyncio
+import functools
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config.settings import settings
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 仅当租约仍属于自己时续期
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仅当租约仍属于自己时释放
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+scheduler_leader = metrics_registry.gauge(
+    "scheduler_leader", "本进程是否为调度器主节点 (1=是, 0=否)")
+scheduler_dispatch_members = metrics_registry.gauge(
+    "scheduler_dispatch_members", "本进程看到的任务调度成员数")
+scheduler_leader_transitions_total = metrics_registry.counter(
+    "scheduler_leader_transitions_total", "本进程获得/失去调度器主节点的次数", ("event",))
+
+
+class SchedulerCoordinator:
+    """
+    调度器主节点选举与调度成员登记。
+    - redis_client 为 redis.asyncio 客户端 (None 表示单节点运行)
+    - lease_seconds 主节点租约与成员心跳的有效期，后台任务每 1/3 租约时长续期一次
+    """
+
+    LEADER_KEY = "SCHEDULER:LEADER"
+    MEMBERS_KEY = "SCHEDULER:MEMBERS"
+
+    def __init__(self, lease_seconds: int = 10):
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.redis_client = None
+        self.is_leader = True
+        self.member_index = 0
+        self.member_count = 1
+        self._leader_until = 0.0  # 本地估计的主节点租约到期时间 (Redis 出错时据此让出主节点)
+        self._members_until = 0.0 # 成员列表的有效期 (Redis 出错时据此退回单节点划分)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis_client is not None
+
+    def dispatch_partition(self) -> Optional[Tuple[int, int]]:
+        """本进程负责的调度分区 (序号, 成员数)；单节点时返回 None 表示扫描全部任务"""
+        if not self.enabled or self.member_count <= 1:
+            return None
+        if time.monotonic() > self._members_until:
+            # 成员列表已过期 (Redis 出错)：退回扫描全部任务，由任务锁防止重复执行
+            return None
+        return self.member_index, self.member_count
+
+    def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        scheduler_leader.set(1 if is_leader else 0)
+        scheduler_leader_transitions_total.inc(event="acquired" if is_leader else "lost")
+        if is_leader:
+            logger.info(f"已成为调度器主节点 (owner={self.owner})，开始执行维护作业")
+        else:
+            logger.warning(f"不再是调度器主节点 (owner={self.owner})，停止执行维护作业")
+
+    async def _elect_once(self):
+        lease_ms = self.lease_seconds * 1000
+        # 先续期 (租约可能仍属于自己，例如上次续期的响应丢失)，否则尝试获取
+        held = bool(int(await self.redis_client.eval(_RENEW_SCRIPT, 1, self.LEADER_KEY, self.owner, lease_ms)))
+        if not held:
+            held = bool(await self.redis_client.set(self.LEADER_KEY, self.owner, nx=True, px=lease_ms))
+        if held:
+            self._leader_until = time.monotonic() + self.lease_seconds
+        self._set_leader(held)
+
+    async def _heartbeat_once(self):
+        now_ms = int(time.time() * 1000)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.MEMBERS_KEY, {self.owner: now_ms + self.lease_seconds * 1000})
+            pipe.zremrangebyscore(self.MEMBERS_KEY, "-inf", now_ms)
+            pipe.zrange(self.MEMBERS_KEY, 0, -1)
+            pipe.expire(self.MEMBERS_KEY, self.lease_seconds * 3)
+            _, _, members, _ = await pipe.execute()
+        members = sorted(member.decode() if isinstance(member, bytes) else str(member) for member in members)
+        if self.owner not in members:
+            members = sorted(members + [self.owner])
+        index, count = members.index(self.owner), len(members)
+        if (index, count) != (self.member_index, self.member_count):
+            logger.info(f"任务调度成员变化: 本进程为第 {index + 1}/{count} 个成员")
+        self.member_index, self.member_count = index, count
+        self._members_until = time.monotonic() + self.lease_seconds
+        scheduler_dispatch_members.set(count)
+
+    async def _tick(self):
+        try:
+            await self._elect_once()
+        except Exception as e:
+            logger.error(f"调度器主节点选举失败: {e}")
+            if self.is_leader and time.monotonic() > self._leader_until:
+                # 无法续期且租约已过期，其他进程可能已接管
+                self._set_leader(False)
+        try:
+            await self._heartbeat_once()
+        except Exception as e:
+            logger.error(f"登记调度成员心跳失败: {e}")
+
+    async def _run_loop(self):
+        interval = max(1.0, self.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            await self._tick()
+
+    async def start(self, redis_client):
+        """参与主节点选举并登记为调度成员 (redis_client 为 None 时按单节点运行)"""
+        if not settings.SCHEDULER_LEADER_ELECTION_ENABLED or redis_client is None:
+            logger.info("未启用调度器主节点选举，本进程执行全部调度与维护作业")
+            scheduler_leader.set(1)
+            return
+        self.redis_client = redis_client
+        # 启动时先作为普通成员，竞选成功后才执行维护作业
+        self.is_leader = False
+        scheduler_leader.set(0)
+        await self._tick()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """停止续期并释放主节点租约与成员登记 (其他进程可立即接管)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if not self.enabled:
+            return
+        try:
+            if self.is_leader:
+                await self.redis_client.eval(_RELEASE_SCRIPT, 1, self.LEADER_KEY, self.owner)
+            await self.redis_client.zrem(self.MEMBERS_KEY, self.owner)
+        except Exception as e:
+            logger.warning(f"释放调度器主节点租约失败: {e}")
+        self._set_leader(False)
+        self.redis_client = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        partition = self.dispatch_partition()
+        return {
+            "owner": self.owner,
+            "election_enabled": self.enabled,
+            "is_leader": self.is_leader,
+            "dispatch_partition": list(partition) if partition else None,
+            "members": self.member_count,
+        }
+
+
+scheduler_coordinator = SchedulerCoordinator(lease_seconds=settings.SCHEDULER_LEADER_LEASE_SECONDS)
+
+
+def leader_only(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """维护作业只在调度器主节点上执行，其余进程直接跳过"""
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any):
+        if not scheduler_coordinator.is_leader:
+            logger.debug(f"非调度器主节点，跳过作业: {func.__name__}")
+            return None
+        return await func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,90 @@
+# app/core/job/lease.py
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.config.settings import settings
+from app.core.database.session import AsyncSessionFactory
+from app.core.job.services import JobPersistenceService
+
+logger = logging.getLogger(__name__)
+
+# 当前协程上下文中正在执行的任务租约 (由 job_endpoint 装饰器设置)
+_current_job_lease: ContextVar[Optional['JobLeaseKeeper']] = ContextVar("current_job_lease", default=None)
+
+
+class JobLeaseKeeper:
+    """
+    任务租约保持器。
+    在任务执行期间于后台定期续约；进程崩溃时续约自然停止，租约过期后任务由回收作业重新排队。
+
+    续约使用独立的数据库会话，避免提交任务处理函数自身会话中尚未提交的变更。
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        interval_seconds: Optional[int] = None,
+        lease_seconds: Optional[int] = None
+    ):
+        self.job_id = job_id
+        self.interval_seconds = interval_seconds or settings.JOB_HEARTBEAT_INTERVAL_SECONDS
+        self.lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+        self.lease_lost = False
+        self._task: Optional[asyncio.Task] = None
+        self._token = None
+
+    async def heartbeat(self) -> bool:
+        """立即续约一次。返回 False 表示租约已丢失。"""
+        try:
+            async with AsyncSessionFactory() as session:
+                job_service = JobPersistenceService(session)
+                renewed = await job_service.heartbeat_job(self.job_id, self.lease_seconds)
+        except Exception as e:
+            logger.error(f"任务续约出错: JobId={self.job_id} - {e}")
+            return False
+        if not renewed:
+            self.lease_lost = True
+        return renewed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            if not await self.heartbeat() and self.lease_lost:
+                logger.warning(f"任务租约已丢失，停止自动续约: JobId={self.job_id}")
+                return
+
+    async def __aenter__(self) -> 'JobLeaseKeeper':
+        self._token = _current_job_lease.set(self)
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._token is not None:
+            _current_job_lease.reset(self._token)
+            self._token = None
+
+
+def get_current_job_lease() -> Optional[JobLeaseKeeper]:
+    """获取当前上下文中正在执行任务的租约保持器 (不在任务中时返回 None)"""
+    return _current_job_lease.get()
+
+
+async def heartbeat_current_job() -> bool:
+    """
+    为当前上下文中的任务立即续约。
+    供长时间运行且可能阻塞事件循环的处理逻辑 (如视频渲染、批量 TTS) 在阶段之间显式调用。
+    不在任务上下文中调用时直接返回 True。
+    """
+    lease = _current_job_lease.get()
+    if lease is None:
+        return True
+    return await lease.heartbeat()
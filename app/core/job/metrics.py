@@ -0,0 +1,102 @@
+# app/core/job/metrics.py
+import datetime
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 排队等待分桶 (秒)：任务可能因重试延迟排队数分钟
+_WAIT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120, 300, 600, 1800, 3600)
+_ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 10)
+
+jobs_enqueued_total = metrics_registry.counter(
+    "job_enqueued_total", "已提交的任务数 (created=新建, deduplicated=重复提交被合并)", ("task_type", "result"))
+jobs_claimed_total = metrics_registry.counter(
+    "job_claimed_total", "成功获取锁开始执行的任务数", ("task_type",))
+job_claim_wait_seconds = metrics_registry.histogram(
+    "job_claim_wait_seconds", "任务从可调度 (创建/计划时间) 到被获取锁的等待时间", ("task_type",), buckets=_WAIT_BUCKETS)
+job_run_duration_seconds = metrics_registry.histogram(
+    "job_run_duration_seconds", "任务从获取锁到结束的执行时间", ("task_type", "outcome"))
+jobs_finished_total = metrics_registry.counter(
+    "job_finished_total", "任务结束次数 (completed/retried/failed/lease_expired/cascade_failed)", ("task_type", "outcome"))
+job_attempts = metrics_registry.histogram(
+    "job_attempts", "任务最终结束时的执行次数 (1 表示未重试)", ("task_type", "outcome"), buckets=_ATTEMPT_BUCKETS)
+
+
+def _seconds_since(start: Optional[datetime.datetime], now: datetime.datetime) -> Optional[float]:
+    if start is None:
+        return None
+    return max(0.0, (now - start).total_seconds())
+
+
+def record_enqueued(task_type: str, created: bool):
+    jobs_enqueued_total.inc(task_type=task_type, result="created" if created else "deduplicated")
+
+
+def record_claimed(task_type: str, ready_at: Optional[datetime.datetime], now: datetime.datetime):
+    jobs_claimed_total.inc(task_type=task_type)
+    wait = _seconds_since(ready_at, now)
+    if wait is not None:
+        job_claim_wait_seconds.observe(wait, task_type=task_type)
+
+
+def record_finished(
+    task_type: str,
+    outcome: str,
+    started_at: Optional[datetime.datetime],
+    retry_count: int,
+    now: datetime.datetime
+):
+    """记录任务一次执行的结束 (含重试)"""
+    jobs_finished_total.inc(task_type=task_type, outcome=outcome)
+    duration = _seconds_since(started_at, now)
+    if duration is not None:
+        job_run_duration_seconds.observe(duration, task_type=task_type, outcome=outcome)
+    if outcome not in ("retried", "lease_expired"):
+        job_attempts.observe(retry_count + 1, task_type=task_type, outcome=outcome)
+
+
+# 优先级通道指标 (调度器最近一次快照)：(指标名, LaneMetrics.snapshot 字段, 说明)
+_LANE_GAUGES = (
+    ("job_lane_queue_depth", "depth", "优先级通道中待调度的任务数"),
+    ("job_lane_queue_users", "users", "优先级通道中有待调度任务的用户数"),
+    ("job_lane_oldest_wait_seconds", "oldest_wait_seconds", "优先级通道中最早的待调度任务已等待的时间"),
+    ("job_lane_dispatch_wait_avg_seconds", "avg_wait_seconds", "优先级通道任务从可调度到被选中的平均等待时间"),
+)
+
+
+def _lane_collector(name: str, field: str) -> Callable[[], Iterable]:
+    def collect() -> Iterable:
+        # 延迟导入，避免与调度器模块之间的循环依赖
+        from app.core.job.fair import lane_metrics
+        for lane in lane_metrics.snapshot():
+            yield name, {"priority": str(lane["priority"])}, lane[field]
+    return collect
+
+
+for _name, _field, _description in _LANE_GAUGES:
+    metrics_registry.register_collector(_name, _description, "gauge", _lane_collector(_name, _field))
+
+
+def summarize_job_metrics() -> Dict[str, Any]:
+    """汇总本进程的任务指标 (用于管理接口)"""
+    finished: Dict[str, Dict[str, float]] = {}
+    for (task_type, outcome), value in jobs_finished_total.values().items():
+        finished.setdefault(task_type, {})[outcome] = value
+    enqueued: Dict[str, Dict[str, float]] = {}
+    for (task_type, result), value in jobs_enqueued_total.values().items():
+        enqueued.setdefault(task_type, {})[result] = value
+    retry_rates = {}
+    for task_type, outcomes in finished.items():
+        attempts = sum(outcomes.values())
+        retry_rates[task_type] = (outcomes.get("retried", 0) + outcomes.get("lease_expired", 0)) / attempts if attempts else 0.0
+    return {
+        "enqueued": enqueued,
+        "finished": finished,
+        "retry_rate": retry_rates,
+        "claim_wait": job_claim_wait_seconds.summarize(),
+        "run_duration": job_run_duration_seconds.summarize(),
+        "attempts": job_attempts.summarize(),
+    }
@@ -37,6 +37,7 @@ class JobConfig(Base):
     api_path: Mapped[str] = mapped_column(String(500), nullable=False, name="ApiPath", comment="任务执行的 API 路径模板")
     http_method: Mapped[str] = mapped_column(String(10), nullable=False, default="POST", name="HttpMethod", comment="调用 API 的 HTTP 方法")
     default_max_retries: Mapped[int] = mapped_column(Integer, nullable=False, default=3, name="DefaultMaxRetries", comment="默认最大重试次数")
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=5, server_default="5", name="Priority", comment="任务优先级通道 (1-10，越大越优先，同时作为公平调度权重)")
     description: Mapped[Optional[str]] = mapped_column(String(500), nullable=True, name="Description", comment="任务描述")
     # 时间戳字段使用指定的大驼峰名称
     create_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), name="CreateDate", comment="创建时间")
@@ -49,6 +50,9 @@ class JobPersist(Base):
     __table_args__ = (
         Index('idx_jobpersist_status_scheduled', 'Status', 'ScheduledAt'),
         Index('idx_jobpersist_type_params', 'TaskType', 'ParamsId'),
+        Index('idx_jobpersist_status_lease', 'Status', 'LeaseExpiresAt'),
+        Index('idx_jobpersist_status_lane_user', 'Status', 'Priority', 'UserId', 'CreateDate'),
+        Index('uq_jobpersist_idempotency', 'IdempotencyKey', unique=True),
         {'comment': '任务持久化表'}
     )
 
@@ -56,6 +60,10 @@ class JobPersist(Base):
     task_type: Mapped[str] = mapped_column(String(100), nullable=False, index=True, name="TaskType", comment="任务类型唯一标识")
     params_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True, name="ParamsId", comment="关联的参数 ID")
     params_data: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True, name="ParamsData", comment="其他参数 (JSON 格式)")
+    user_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, name="UserId", comment="提交任务的用户 ID (公平调度分组依据，系统任务为空)")
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=5, server_default="5", name="Priority", comment="任务优先级通道 (创建时取自任务配置)")
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(200), nullable=True, name="IdempotencyKey", comment="幂等键，相同键的重复提交合并为同一任务")
+    pending_parents: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0", name="PendingParents", comment="尚未完成的上游依赖任务数，为 0 时才可被调度")
     status: Mapped[JobStatus] = mapped_column(Integer, nullable=False, default=JobStatus.PENDING.value, index=True, name="Status", comment="任务状态 (存储整数)")
     retry_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, name="RetryCount", comment="当前重试次数")
     max_retries: Mapped[int] = mapped_column(Integer, nullable=False, default=3, name="MaxRetries", comment="最大允许重试次数")
@@ -63,6 +71,9 @@ class JobPersist(Base):
     scheduled_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True, index=True, name="ScheduledAt", comment="计划执行时间")
     started_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True, name="StartedAt", comment="实际开始执行时间")
     completed_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True, name="CompletedAt", comment="任务完成或失败时间")
+    # 租约字段：PROCESSING 状态的任务必须持续心跳续约，过期后由回收作业重新排队
+    lease_expires_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True, name="LeaseExpiresAt", comment="任务租约过期时间")
+    locked_by: Mapped[Optional[str]] = mapped_column(String(200), nullable=True, name="LockedBy", comment="持有任务租约的工作进程标识")
     # 时间戳字段
     create_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), name="CreateDate", comment="创建时间")
     last_modify_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now(), name="LastModifyDate", comment="更新时间")
@@ -82,6 +93,9 @@ class JobPersistHistory(Base):
     task_type: Mapped[str] = mapped_column(String(100), nullable=False, index=True, name="TaskType", comment="任务类型唯一标识")
     params_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True, name="ParamsId", comment="关联的参数 ID")
     params_data: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True, name="ParamsData", comment="其他参数 (JSON 格式)")
+    user_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, name="UserId", comment="提交任务的用户 ID (公平调度分组依据，系统任务为空)")
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=5, server_default="5", name="Priority", comment="任务优先级通道 (创建时取自任务配置)")
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(200), nullable=True, name="IdempotencyKey", comment="幂等键")
     status: Mapped[JobStatus] = mapped_column(Integer, nullable=False, default=JobStatus.PENDING.value, index=True, name="Status", comment="任务状态 (存储整数)")
     retry_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, name="RetryCount", comment="当前重试次数")
     max_retries: Mapped[int] = mapped_column(Integer, nullable=False, default=3, name="MaxRetries", comment="最大允许重试次数")
@@ -109,4 +123,20 @@ class JobPersistLog(Base):
     job_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True, name="JobId", comment="关联的任务持久化 ID")
     timestamp: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, default=func.now(), name="Timestamp", comment="日志时间戳")
     level: Mapped[JobLogLevel] = mapped_column(Integer, nullable=False, default=JobLogLevel.INFO.value, name="Level", comment="日志级别 (存储整数)")
-    message: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True, name="Message", comment="日志消息")
\ No newline at end of file
+    message: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True, name="Message", comment="日志消息")
+
+
+# --- JobDependency Model ---
+class JobDependency(Base):
+    """任务依赖关系表模型 (子任务在所有上游任务完成后才可被调度)"""
+    __tablename__ = "pb_job_dependency"
+    __table_args__ = (
+        Index('uq_jobdep_job_parent', 'JobId', 'DependsOnJobId', unique=True),
+        Index('idx_jobdep_parent', 'DependsOnJobId'),
+        {'comment': '任务依赖关系表'}
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, default=generate_id, name="Id", comment="主键ID，雪花算法")
+    job_id: Mapped[int] = mapped_column(BigInteger, nullable=False, name="JobId", comment="子任务 ID")
+    depends_on_job_id: Mapped[int] = mapped_column(BigInteger, nullable=False, name="DependsOnJobId", comment="上游 (父) 任务 ID")
+    create_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), name="CreateDate", comment="创建时间")
@@ -1,16 +1,25 @@
 # app/core/job/services.py
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy import select, update, delete, insert, func # 导入 func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 import datetime
 import json
+import os
+import socket
 
-from app.core.job.models import JobPersist, JobPersistLog, JobConfig, JobStatus, JobLogLevel, JobPersistHistory
+from app.core.config.settings import settings
+from app.core.job.models import JobPersist, JobPersistLog, JobConfig, JobStatus, JobLogLevel, JobPersistHistory, JobDependency
+from app.core.job.dtos import JobSpec
+from app.core.job import metrics as job_metrics
 from app.core.utils.snowflake import generate_id
 
 logger = logging.getLogger(__name__)
 
+# 当前进程的工作者标识，写入 LockedBy 字段，用于心跳续约时校验租约归属
+WORKER_IDENTITY = f"{socket.gethostname()}:{os.getpid()}"
+
 class JobPersistenceService:
     """
     封装对任务持久化相关表的操作。
@@ -24,48 +33,235 @@ class JobPersistenceService:
         params_id: Optional[int] = None,
         params_data: Optional[Dict[str, Any]] = None,
         scheduled_at: Optional[datetime.datetime] = None,
-        max_retries: Optional[int] = None
+        max_retries: Optional[int] = None,
+        user_id: Optional[int] = None,
+        priority: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+        depends_on: Optional[List[int]] = None,
+        commit: bool = True
     ) -> int:
         """
         创建一个新的持久化任务记录。
+
+        user_id 用于按用户公平调度 (同一用户的大量任务不会挤占其他用户)；
+        priority 未指定时取任务配置中的优先级通道。
+
+        重复提交会被合并：指定 idempotency_key 时返回同键的已有任务；
+        未指定时，若存在尚未开始、参数完全相同的同类任务，则直接返回该任务 ID。
+
+        Args:
+            depends_on: 上游任务 ID 列表，所有上游任务完成后本任务才可被调度。
+            commit: 是否立即提交。为 False 时由调用方在自身事务中统一提交。
         """
-        logger.debug(f"请求创建任务: Type={task_type}, ParamsId={params_id}, ParamsData={params_data}")
+        spec = JobSpec(
+            key=task_type, task_type=task_type, params_id=params_id, params_data=params_data,
+            user_id=user_id, priority=priority, max_retries=max_retries, scheduled_at=scheduled_at,
+            idempotency_key=idempotency_key, depends_on=list(depends_on or [])
+        )
+        job_ids = await self.enqueue_job_graph([spec], commit=commit)
+        return job_ids[spec.key]
+
+    async def enqueue_job_graph(self, specs: List[JobSpec], commit: bool = True) -> Dict[str, int]:
+        """
+        在一个事务中提交一组带依赖关系的任务 (DAG)。
+        子任务在所有上游任务完成时由 complete_job 释放，上游最终失败时级联失败。
 
-        job_config = await self._get_job_config(task_type)
+        Args:
+            specs: 任务定义列表，depends_on 可引用批次内的 key 或已有任务 ID。
+            commit: 是否立即提交。为 False 时由调用方在自身事务中统一提交。
+
+        Returns:
+            key -> 任务 ID 的映射 (被合并的重复提交返回已有任务 ID)。
+
+        Raises:
+            ValueError: 依赖引用不存在或存在循环依赖。
+        """
+        ordered_specs = self._topological_order(specs)
+        job_ids: Dict[str, int] = {}
+        job_states: Dict[int, int] = {} # 任务 ID -> 状态，用于计算子任务的未完成上游数
+        config_cache: Dict[str, Optional[JobConfig]] = {}
+        try:
+            for spec in ordered_specs:
+                logger.debug(f"请求创建任务: Type={spec.task_type}, ParamsId={spec.params_id}, ParamsData={spec.params_data}, UserId={spec.user_id}")
+                parent_ids = await self._resolve_parent_ids(spec, job_ids, job_states)
+                job_id, created = await self._insert_job(spec, parent_ids, job_states, config_cache)
+                job_ids[spec.key] = job_id
+                job_metrics.record_enqueued(spec.task_type, created)
+                if created:
+                    logger.info(f"任务已创建: JobId={job_id}, Type={spec.task_type}, ParamsId={spec.params_id}, Parents={parent_ids}")
+                else:
+                    logger.info(f"重复提交已合并到已有任务: JobId={job_id}, Type={spec.task_type}, ParamsId={spec.params_id}")
+            if commit:
+                await self.db.commit()
+            return job_ids
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"创建任务失败: Types={[spec.task_type for spec in specs]} - {e}")
+            raise
+
+    @staticmethod
+    def _topological_order(specs: List[JobSpec]) -> List[JobSpec]:
+        """按依赖关系对批次内任务排序，保证上游任务先插入"""
+        by_key = {spec.key: spec for spec in specs}
+        if len(by_key) != len(specs):
+            raise ValueError("任务批次中存在重复的 key")
+        ordered: List[JobSpec] = []
+        visiting, visited = set(), set()
+
+        def visit(spec: JobSpec):
+            if spec.key in visited:
+                return
+            if spec.key in visiting:
+                raise ValueError(f"任务依赖存在循环: {spec.key}")
+            visiting.add(spec.key)
+            for dep in spec.depends_on:
+                if isinstance(dep, str):
+                    if dep not in by_key:
+                        raise ValueError(f"任务 '{spec.key}' 依赖的 '{dep}' 不在批次中")
+                    visit(by_key[dep])
+            visiting.discard(spec.key)
+            visited.add(spec.key)
+            ordered.append(spec)
+
+        for spec in specs:
+            visit(spec)
+        return ordered
+
+    async def _resolve_parent_ids(self, spec: JobSpec, job_ids: Dict[str, int], job_states: Dict[int, int]) -> List[int]:
+        """将 depends_on 解析为任务 ID，并记录已有上游任务的状态"""
+        parent_ids: List[int] = []
+        external_ids = []
+        for dep in spec.depends_on:
+            if isinstance(dep, str):
+                parent_ids.append(job_ids[dep])
+            else:
+                parent_ids.append(int(dep))
+                if int(dep) not in job_states:
+                    external_ids.append(int(dep))
+        if external_ids:
+            result = await self.db.execute(
+                select(JobPersist.id, JobPersist.status).where(JobPersist.id.in_(external_ids))
+            )
+            for job_id, job_status in result.all():
+                job_states[job_id] = job_status
+            missing = [job_id for job_id in external_ids if job_id not in job_states]
+            if missing:
+                # 已迁移到历史表的上游任务视为已完成
+                history_result = await self.db.execute(
+                    select(JobPersistHistory.id, JobPersistHistory.status).where(JobPersistHistory.id.in_(missing))
+                )
+                for job_id, job_status in history_result.all():
+                    job_states[job_id] = job_status
+                missing = [job_id for job_id in external_ids if job_id not in job_states]
+                if missing:
+                    raise ValueError(f"任务 '{spec.key}' 依赖的任务不存在: {missing}")
+        return list(dict.fromkeys(parent_ids))
+
+    async def _insert_job(
+        self,
+        spec: JobSpec,
+        parent_ids: List[int],
+        job_states: Dict[int, int],
+        config_cache: Dict[str, Optional[JobConfig]]
+    ) -> tuple:
+        """插入单个任务 (含重复合并与依赖关系)，返回 (任务 ID, 是否新建)"""
+        params_data_str = json.dumps(spec.params_data) if spec.params_data else None
+
+        duplicate = await self._find_duplicate_job(spec, params_data_str, has_parents=bool(parent_ids))
+        if duplicate is not None:
+            job_states[duplicate.id] = duplicate.status
+            return int(duplicate.id), False
+
+        if spec.task_type not in config_cache:
+            config_cache[spec.task_type] = await self._get_job_config(spec.task_type)
+        job_config = config_cache[spec.task_type]
         if job_config is None:
-             logger.warning(f"任务类型 '{task_type}' 未在 pb_job_config 中找到，将使用默认重试次数 3。")
-             final_max_retries = max_retries if max_retries is not None else 3
+             logger.warning(f"任务类型 '{spec.task_type}' 未在 pb_job_config 中找到，将使用默认重试次数 3。")
+             final_max_retries = spec.max_retries if spec.max_retries is not None else 3
+             final_priority = spec.priority if spec.priority is not None else settings.JOB_DEFAULT_PRIORITY
         else:
-             final_max_retries = max_retries if max_retries is not None else job_config.default_max_retries
+             final_max_retries = spec.max_retries if spec.max_retries is not None else job_config.default_max_retries
+             final_priority = spec.priority if spec.priority is not None else job_config.priority
+
+        failed_parents = [pid for pid in parent_ids if job_states.get(pid) == int(JobStatus.FAILED)]
+        pending_parents = [pid for pid in parent_ids if job_states.get(pid) != int(JobStatus.COMPLETED)]
 
         now = datetime.datetime.now()
         job = JobPersist(
-            task_type=task_type,
-            params_id=params_id,
-            params_data=json.dumps(params_data) if params_data else None,
-            status=int(JobStatus.PENDING), # 使用枚举成员的整数值
+            id=generate_id(),
+            task_type=spec.task_type,
+            params_id=spec.params_id,
+            params_data=params_data_str,
+            user_id=spec.user_id,
+            priority=final_priority,
+            idempotency_key=spec.idempotency_key,
+            pending_parents=len(pending_parents),
+            status=int(JobStatus.FAILED) if failed_parents else int(JobStatus.PENDING), # 使用枚举成员的整数值
+            last_error=f"上游任务已失败: {failed_parents}" if failed_parents else None,
+            completed_at=now if failed_parents else None,
             retry_count=0,
             max_retries=final_max_retries,
-            scheduled_at=scheduled_at,
+            scheduled_at=spec.scheduled_at,
             create_date = now,
             last_modify_date = now,
         )
 
-        try:
+        if spec.idempotency_key:
+            # 使用保存点插入：并发提交同一幂等键时，唯一索引冲突只回滚本次插入
+            try:
+                async with self.db.begin_nested():
+                    self.db.add(job)
+                    await self.db.flush()
+            except IntegrityError:
+                existing = await self._find_job_by_idempotency_key(spec.idempotency_key)
+                if existing is None:
+                    raise
+                job_states[existing.id] = existing.status
+                return int(existing.id), False
+        else:
             self.db.add(job)
             await self.db.flush()
-            await self.db.commit()
-            logger.info(f"任务已创建: JobId={job.id}, Type={task_type}, ParamsId={params_id}")
-            # 确保返回的是整数 ID
-            return int(job.id) if job.id is not None else 0 # 添加 ID 非空检查
-        except Exception as e:
-            await self.db.rollback()
-            logger.error(f"创建任务失败: Type={task_type} - {e}")
-            raise
+
+        for parent_id in parent_ids:
+            self.db.add(JobDependency(job_id=job.id, depends_on_job_id=parent_id, create_date=now))
+        if parent_ids:
+            await self.db.flush()
+        job_states[job.id] = job.status
+        return int(job.id), True
+
+    async def _find_job_by_idempotency_key(self, idempotency_key: str) -> Optional[JobPersist]:
+        stmt = select(JobPersist).where(JobPersist.idempotency_key == idempotency_key)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def _find_duplicate_job(self, spec: JobSpec, params_data_str: Optional[str], has_parents: bool) -> Optional[JobPersist]:
+        """查找可合并的重复任务"""
+        if spec.idempotency_key:
+            return await self._find_job_by_idempotency_key(spec.idempotency_key)
+        if spec.params_id is None or has_parents:
+            # 无参数 ID 或带依赖的任务无法安全判定重复，需显式提供幂等键
+            return None
+        # 仅合并尚未开始、无上游依赖、参数完全相同的任务；已开始的任务可能读取的是旧数据
+        stmt = (
+            select(JobPersist)
+            .where(JobPersist.task_type == spec.task_type)
+            .where(JobPersist.params_id == spec.params_id)
+            .where(JobPersist.status == int(JobStatus.PENDING))
+            .where(JobPersist.pending_parents == 0)
+            .where(
+                (JobPersist.params_data == params_data_str) if params_data_str is not None
+                else (JobPersist.params_data == None)
+            )
+            .order_by(JobPersist.create_date.asc())
+            .limit(1)
+        )
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
 
     async def acquire_job_lock(self, job_id: int) -> bool:
         """
-        尝试获取任务锁 (将状态从 PENDING 更新为 PROCESSING)。
+        尝试获取任务锁 (将状态从 PENDING 更新为 PROCESSING)，并授予一个租约。
+        持有者需要在租约过期前调用 heartbeat_job 续约，否则任务会被回收作业重新排队。
         """
         logger.debug(f"尝试获取任务锁: JobId={job_id}")
         now = datetime.datetime.now()
@@ -74,9 +270,12 @@ class JobPersistenceService:
             update(JobPersist)
             .where(JobPersist.id == job_id)
             .where(JobPersist.status ==int(JobStatus.PENDING)) # 使用枚举成员比较
+            .where(JobPersist.pending_parents == 0) # 上游依赖未全部完成的任务不可执行
             .values(
                 status=JobStatus.PROCESSING.value, # 使用枚举成员赋值
                 started_at=now,
+                lease_expires_at=now + datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                locked_by=WORKER_IDENTITY,
                 last_modify_date=now # 手动更新时间戳 (或者依赖 onupdate)
             )
         )
@@ -85,8 +284,11 @@ class JobPersistenceService:
             if result.rowcount == 1:
                 # 注意：日志记录的 job_id 仍然是整数 ID
                 await self._log_job_event(job_id, JobLogLevel.INFO, "任务开始执行 (已获取锁)")
+                job_info = await self._get_job_brief(job_id)
                 await self.db.commit()
                 logger.info(f"成功获取任务锁: JobId={job_id}")
+                if job_info:
+                    job_metrics.record_claimed(job_info["task_type"], job_info["scheduled_at"] or job_info["create_date"], now)
                 return True
             else:
                 await self.db.rollback()
@@ -97,16 +299,58 @@ class JobPersistenceService:
             logger.error(f"获取任务锁时数据库出错: JobId={job_id} - {e}")
             return False
 
-    async def complete_job(self, job_id: int, message: str = "任务成功完成"):
+    async def heartbeat_job(self, job_id: int, lease_seconds: Optional[int] = None) -> bool:
         """
-        标记任务为成功完成。
+        为处理中的任务续约 (延长租约过期时间)。
+        长时间运行的任务处理函数应定期调用此方法；job_endpoint 装饰器会自动在后台续约。
+
+        Args:
+            job_id: 任务 ID。
+            lease_seconds: 续约时长（秒），默认使用 JOB_LEASE_SECONDS。
+
+        Returns:
+            续约是否成功。返回 False 表示租约已丢失 (任务已被回收或状态已变更)。
+        """
+        now = datetime.datetime.now()
+        lease = lease_seconds if lease_seconds is not None else settings.JOB_LEASE_SECONDS
+        stmt = (
+            update(JobPersist)
+            .where(JobPersist.id == job_id)
+            .where(JobPersist.status == int(JobStatus.PROCESSING))
+            .where(JobPersist.locked_by == WORKER_IDENTITY)
+            .values(
+                lease_expires_at=now + datetime.timedelta(seconds=lease),
+                last_modify_date=now
+            )
+        )
+        try:
+            result = await self.db.execute(stmt)
+            await self.db.commit()
+            if result.rowcount == 1:
+                logger.debug(f"任务租约已续约: JobId={job_id}, Lease={lease}s")
+                return True
+            logger.warning(f"任务续约失败 (租约已丢失或状态不符): JobId={job_id}")
+            return False
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"任务续约时数据库出错: JobId={job_id} - {e}")
+            return False
+
+    async def complete_job(self, job_id: int, message: str = "任务成功完成") -> List[int]:
+        """
+        标记任务为成功完成，并在同一事务中释放其下游子任务。
+
+        Returns:
+            因本任务完成而变为可调度的子任务 ID 列表。
         """
         logger.debug(f"标记任务完成: JobId={job_id}")
-        await self._update_job_status(job_id, JobStatus.COMPLETED, message, JobLogLevel.INFO)
+        return await self._update_job_status(job_id, JobStatus.COMPLETED, message, JobLogLevel.INFO)
 
-    async def fail_job(self, job_id: int, error_message: str, can_retry: bool = True):
+    async def fail_job(self, job_id: int, error_message: str, can_retry: bool = True, owned: bool = True):
         """
         标记任务为失败，并根据重试次数决定最终状态或增加重试计数。
+        owned 为 True (任务端点) 时只更新本进程持有租约的处理中任务；
+        为 False (调度器处理 API 调用失败) 时只更新尚未被获取锁的待处理任务。
         """
         logger.debug(f"标记任务失败: JobId={job_id}, CanRetry={can_retry}")
         # 使用 get 获取对象，需要主键
@@ -138,7 +382,8 @@ class JobPersistenceService:
             log_level=log_level,
             log_message_override=log_message,
             retry_count_override=new_retry_count,
-            scheduled_at_override=new_scheduled_at if should_retry else job.completed_at # 如果失败，完成时间是现在；如果重试，由下次执行设置
+            scheduled_at_override=new_scheduled_at if should_retry else job.completed_at, # 如果失败，完成时间是现在；如果重试，由下次执行设置
+            owned=owned
         )
 
     async def _update_job_status(
@@ -149,13 +394,20 @@ class JobPersistenceService:
         log_level: JobLogLevel,
         log_message_override: Optional[str] = None,
         retry_count_override: Optional[int] = None,
-        scheduled_at_override: Optional[datetime.datetime] = None
-    ):
-        """内部方法：更新任务状态并记录日志"""
+        scheduled_at_override: Optional[datetime.datetime] = None,
+        owned: bool = True
+    ) -> List[int]:
+        """
+        内部方法：更新任务状态并记录日志，返回因此变为可调度的子任务 ID。
+        owned 为 True 时要求任务仍由本进程持有 (处理中且 locked_by 为本进程)：
+        租约被回收并由其他进程重新获取后，旧的执行者不能再改写任务状态、释放子任务或清除新持有者的租约。
+        """
         now = datetime.datetime.now()
         
         values_to_update: Dict[str, Any] = {
             "status": int(status), # 使用枚举成员的整数值
+            "lease_expires_at": None, # 任何终态或重新排队都释放租约
+            "locked_by": None,
             "last_modify_date": now # 更新时间戳
         }
         if status == JobStatus.COMPLETED or status == JobStatus.FAILED:
@@ -174,15 +426,114 @@ class JobPersistenceService:
 
 
         stmt = update(JobPersist).where(JobPersist.id == job_id).values(**values_to_update)
+        if owned:
+            # 只有持有租约的处理中任务才能结束 (同时防止重复完成导致子任务的上游计数被多次扣减)
+            stmt = (
+                stmt.where(JobPersist.status == int(JobStatus.PROCESSING))
+                .where(JobPersist.locked_by == WORKER_IDENTITY)
+            )
+        else:
+            stmt = stmt.where(JobPersist.status == int(JobStatus.PENDING))
+        released_ids: List[int] = []
         try:
-            await self.db.execute(stmt)
+            job_info = await self._get_job_brief(job_id)
+            result = await self.db.execute(stmt)
+            if result.rowcount == 0:
+                # 租约已丢失 (任务已被回收或由其他进程执行) 或状态已变更，丢弃本次结果
+                await self._log_job_event(
+                    job_id, JobLogLevel.WARNING,
+                    f"任务状态已变更或租约已丢失，忽略本次结果 ({status.name}): {log_message_override or message or ''}"
+                )
+                await self.db.commit()
+                logger.warning(f"任务状态未更新 (租约已丢失或状态不符): JobId={job_id}, NewStatus={status.name}")
+                return []
             log_msg = log_message_override if log_message_override else (message or f"状态更新为 {status.name}")
             await self._log_job_event(job_id, log_level, log_msg)
+            if result.rowcount == 1:
+                if status == JobStatus.COMPLETED:
+                    released_ids = await self._release_children(job_id)
+                elif status == JobStatus.FAILED:
+                    await self._cascade_fail_children(job_id, now)
             await self.db.commit()
             logger.info(f"任务状态更新成功: JobId={job_id}, NewStatus={status.name}")
+            if job_info and result.rowcount == 1:
+                outcome = {JobStatus.COMPLETED: "completed", JobStatus.PENDING: "retried"}.get(status, "failed")
+                job_metrics.record_finished(job_info["task_type"], outcome, job_info["started_at"], job_info["retry_count"], now)
+            if released_ids:
+                logger.info(f"上游任务完成，子任务已就绪: JobId={job_id}, Children={released_ids}")
         except Exception as e:
             await self.db.rollback()
             logger.error(f"更新任务状态或记录日志失败: JobId={job_id} - {e}")
+            released_ids = []
+        return released_ids
+
+    async def _get_job_brief(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """读取任务的类型与时间信息 (用于指标记录，不加载整行)"""
+        stmt = select(
+            JobPersist.task_type, JobPersist.create_date, JobPersist.scheduled_at,
+            JobPersist.started_at, JobPersist.retry_count
+        ).where(JobPersist.id == job_id)
+        row = (await self.db.execute(stmt)).first()
+        if row is None:
+            return None
+        return {
+            "task_type": row[0], "create_date": row[1], "scheduled_at": row[2],
+            "started_at": row[3], "retry_count": row[4] or 0,
+        }
+
+    async def _release_children(self, job_id: int) -> List[int]:
+        """上游任务完成：扣减子任务的未完成上游数，返回变为可调度的子任务 ID"""
+        child_ids_stmt = select(JobDependency.job_id).where(JobDependency.depends_on_job_id == job_id)
+        child_ids = list((await self.db.execute(child_ids_stmt)).scalars().all())
+        if not child_ids:
+            return []
+        await self.db.execute(
+            update(JobPersist)
+            .where(JobPersist.id.in_(child_ids))
+            .where(JobPersist.status == int(JobStatus.PENDING))
+            .where(JobPersist.pending_parents > 0)
+            .values(pending_parents=JobPersist.pending_parents - 1)
+        )
+        ready_stmt = (
+            select(JobPersist.id)
+            .where(JobPersist.id.in_(child_ids))
+            .where(JobPersist.status == int(JobStatus.PENDING))
+            .where(JobPersist.pending_parents == 0)
+        )
+        return list((await self.db.execute(ready_stmt)).scalars().all())
+
+    async def _cascade_fail_children(self, job_id: int, now: datetime.datetime) -> int:
+        """上游任务最终失败：将所有尚未执行的下游任务 (递归) 标记为失败"""
+        failed_count = 0
+        frontier = [job_id]
+        while frontier:
+            child_ids_stmt = select(JobDependency.job_id).where(JobDependency.depends_on_job_id.in_(frontier))
+            child_ids = list(set((await self.db.execute(child_ids_stmt)).scalars().all()))
+            if not child_ids:
+                break
+            pending_stmt = (
+                select(JobPersist.id, JobPersist.task_type)
+                .where(JobPersist.id.in_(child_ids))
+                .where(JobPersist.status == int(JobStatus.PENDING))
+            )
+            pending_rows = (await self.db.execute(pending_stmt)).all()
+            if not pending_rows:
+                break
+            pending_ids = [row[0] for row in pending_rows]
+            error_message = f"上游任务 {job_id} 已失败，下游任务取消执行"
+            await self.db.execute(
+                update(JobPersist)
+                .where(JobPersist.id.in_(pending_ids))
+                .values(status=int(JobStatus.FAILED), last_error=error_message, completed_at=now, last_modify_date=now)
+            )
+            for child_id, child_task_type in pending_rows:
+                await self._log_job_event(child_id, JobLogLevel.ERROR, error_message)
+                job_metrics.record_finished(child_task_type, "cascade_failed", None, 0, now)
+            failed_count += len(pending_ids)
+            frontier = pending_ids
+        if failed_count:
+            logger.warning(f"上游任务失败，已级联失败 {failed_count} 个下游任务: JobId={job_id}")
+        return failed_count
 
     async def _log_job_event(self, job_id: int, level: JobLogLevel, message: str):
         """记录任务日志到 pb_job_persist_log 表"""
@@ -202,6 +553,7 @@ class JobPersistenceService:
         stmt = (
             select(JobPersist)
             .where(JobPersist.status ==int(JobStatus.PENDING))
+            .where(JobPersist.pending_parents == 0)
             .where( (JobPersist.scheduled_at == None) | (JobPersist.scheduled_at <= now) )
             .order_by(JobPersist.create_date.asc()) # 使用 create_date
             .limit(limit)
@@ -209,6 +561,191 @@ class JobPersistenceService:
         result = await self.db.execute(stmt)
         return list(result.scalars().all())
 
+    async def find_fair_candidates(
+        self,
+        per_flow_limit: int,
+        max_candidates: int,
+        partition: Optional[Tuple[int, int]] = None
+    ) -> List[JobPersist]:
+        """
+        查找公平调度的候选任务 (供调度器使用)。
+        按 (优先级通道, 用户) 分组，每组只取最早的 per_flow_limit 个，
+        保证单个用户的大量积压任务不会占满候选窗口。最终选择由 FairJobSelector 完成。
+        partition 为 (序号, 成员数) 时只返回按用户哈希 (CRC32) 分到该序号的任务 (多个调度成员分担调度)。
+        """
+        now = datetime.datetime.now()
+        flow_rank = func.row_number().over(
+            partition_by=(JobPersist.priority, JobPersist.user_id),
+            order_by=JobPersist.create_date.asc()
+        ).label("flow_rank")
+        pending = (
+            select(JobPersist.id.label("job_id"), flow_rank)
+            .where(JobPersist.status == int(JobStatus.PENDING))
+            .where(JobPersist.pending_parents == 0)
+            .where( (JobPersist.scheduled_at == None) | (JobPersist.scheduled_at <= now) )
+        )
+        if partition is not None:
+            index, count = partition
+            pending = pending.where(func.crc32(func.coalesce(JobPersist.user_id, 0)) % count == index)
+        ranked = pending.subquery()
+        stmt = (
+            select(JobPersist)
+            .join(ranked, JobPersist.id == ranked.c.job_id)
+            .where(ranked.c.flow_rank <= per_flow_limit)
+            .order_by(ranked.c.flow_rank.asc(), JobPersist.create_date.asc())
+            .limit(max_candidates)
+        )
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_pending_lane_stats(self) -> List[Dict[str, Any]]:
+        """
+        按优先级通道统计待处理任务的队列深度与最早等待时间 (供调度器指标使用)。
+        """
+        now = datetime.datetime.now()
+        stmt = (
+            select(
+                JobPersist.priority,
+                func.count(JobPersist.id),
+                func.count(func.distinct(JobPersist.user_id)),
+                func.min(func.coalesce(JobPersist.scheduled_at, JobPersist.create_date)),
+            )
+            .where(JobPersist.status == int(JobStatus.PENDING))
+            .where(JobPersist.pending_parents == 0)
+            .where( (JobPersist.scheduled_at == None) | (JobPersist.scheduled_at <= now) )
+            .group_by(JobPersist.priority)
+        )
+        result = await self.db.execute(stmt)
+        stats = []
+        for priority, depth, user_count, oldest in result.all():
+            stats.append({
+                "priority": priority,
+                "depth": depth,
+                "users": user_count,
+                "oldest_wait_seconds": max(0.0, (now - oldest).total_seconds()) if oldest else 0.0,
+            })
+        return stats
+
+    async def recover_expired_jobs(self, batch_size: int = 100) -> int:
+        """
+        回收租约过期的处理中任务 (供调度器使用)。
+        执行进程崩溃或失联后，任务不会再续约；此方法将其重新排队 (未超过重试次数) 或标记为最终失败。
+
+        Args:
+            batch_size: 每次处理的最大任务数。
+
+        Returns:
+            被回收的任务数量。
+        """
+        now = datetime.datetime.now()
+        # 兼容升级前没有租约字段的旧任务：按开始时间判断
+        legacy_cutoff = now - datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        stmt = (
+            select(JobPersist)
+            .where(JobPersist.status == int(JobStatus.PROCESSING))
+            .where(
+                (JobPersist.lease_expires_at < now) |
+                ((JobPersist.lease_expires_at == None) & (JobPersist.started_at < legacy_cutoff))
+            )
+            .order_by(JobPersist.lease_expires_at.asc())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True) # 多个回收者并发时互不阻塞
+        )
+        recovered_count = 0
+        try:
+            result = await self.db.execute(stmt)
+            expired_jobs = list(result.scalars().all())
+            if not expired_jobs:
+                await self.db.rollback()
+                return 0
+
+            for job in expired_jobs:
+                lost_owner = job.locked_by or "unknown"
+                if job.retry_count < job.max_retries:
+                    new_retry_count = job.retry_count + 1
+                    values: Dict[str, Any] = {
+                        "status": int(JobStatus.PENDING),
+                        "retry_count": new_retry_count,
+                        "scheduled_at": now, # 立即可被再次调度
+                        "started_at": None,
+                        "completed_at": None,
+                    }
+                    log_level = JobLogLevel.WARNING
+                    log_message = f"任务租约已过期 (持有者: {lost_owner})，重新排队 ({new_retry_count}/{job.max_retries})。"
+                else:
+                    values = {
+                        "status": int(JobStatus.FAILED),
+                        "completed_at": now,
+                    }
+                    log_level = JobLogLevel.ERROR
+                    log_message = f"任务租约已过期 (持有者: {lost_owner})，且已达到最大重试次数，标记为最终失败。"
+
+                values.update({
+                    "lease_expires_at": None,
+                    "locked_by": None,
+                    "last_error": "任务执行进程失联，租约已过期",
+                    "last_modify_date": now,
+                })
+                # 仅当状态与租约未在此期间变化时才更新，避免覆盖刚完成心跳的任务
+                update_stmt = (
+                    update(JobPersist)
+                    .where(JobPersist.id == job.id)
+                    .where(JobPersist.status == int(JobStatus.PROCESSING))
+                    .where(
+                        (JobPersist.lease_expires_at == job.lease_expires_at)
+                        if job.lease_expires_at is not None else (JobPersist.lease_expires_at == None)
+                    )
+                    .values(**values)
+                )
+                update_result = await self.db.execute(update_stmt)
+                if update_result.rowcount == 1:
+                    await self._log_job_event(job.id, log_level, log_message)
+                    job_metrics.record_finished(
+                        job.task_type,
+                        "lease_expired" if values["status"] == int(JobStatus.PENDING) else "failed",
+                        job.started_at, job.retry_count, now
+                    )
+                    if values["status"] == int(JobStatus.FAILED):
+                        await self._cascade_fail_children(job.id, now)
+                    recovered_count += 1
+                    logger.warning(f"回收租约过期任务: JobId={job.id}, Type={job.task_type} - {log_message}")
+
+            await self.db.commit()
+            return recovered_count
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"回收租约过期任务时出错: {e}")
+            raise
+
+    async def get_queue_summary(self) -> List[Dict[str, Any]]:
+        """
+        按任务类型与状态统计主表中的任务 (集群维度，供管理接口使用)。
+        包含数量、平均重试次数与待处理任务的最早等待时间。
+        """
+        now = datetime.datetime.now()
+        stmt = (
+            select(
+                JobPersist.task_type,
+                JobPersist.status,
+                func.count(JobPersist.id),
+                func.avg(JobPersist.retry_count),
+                func.min(func.coalesce(JobPersist.scheduled_at, JobPersist.create_date)),
+                func.sum(JobPersist.pending_parents > 0),
+            )
+            .group_by(JobPersist.task_type, JobPersist.status)
+        )
+        result = await self.db.execute(stmt)
+        summary: Dict[str, Dict[str, Any]] = {}
+        for task_type, job_status, count, avg_retry, oldest, blocked in result.all():
+            item = summary.setdefault(task_type, {"task_type": task_type, "statuses": {}})
+            status_name = JobStatus(job_status).name if job_status in JobStatus._value2member_map_ else str(job_status)
+            entry: Dict[str, Any] = {"count": count, "avg_retry_count": float(avg_retry or 0)}
+            if job_status == int(JobStatus.PENDING):
+                entry["blocked_by_dependencies"] = int(blocked or 0)
+                entry["oldest_wait_seconds"] = max(0.0, (now - oldest).total_seconds()) if oldest else 0.0
+            item["statuses"][status_name] = entry
+        return list(summary.values())
+
     async def get_job_config(self, task_type: str) -> Optional[JobConfig]:
         """获取任务配置 (供调度器使用)"""
         return await self._get_job_config(task_type)
@@ -271,6 +808,9 @@ class JobPersistenceService:
                     "task_type": job.task_type,
                     "params_id": job.params_id,
                     "params_data": job.params_data,
+                    "user_id": job.user_id,
+                    "priority": job.priority,
+                    "idempotency_key": job.idempotency_key,
                     "status": job.status,
                     "retry_count": job.retry_count,
                     "max_retries": job.max_retries,
@@ -292,6 +832,9 @@ class JobPersistenceService:
                 logger.info(f"成功将 {len(history_data)} 条记录插入到历史表。")
 
             # 5. 从原表删除已迁移的记录
+            # 已结束的子任务不再需要依赖关系记录
+            await self.db.execute(delete(JobDependency).where(JobDependency.job_id.in_(job_ids_to_migrate)))
+
             delete_stmt = delete(JobPersist).where(JobPersist.id.in_(job_ids_to_migrate))
             delete_result = await self.db.execute(delete_stmt)
             migrated_count = delete_result.rowcount
@@ -0,0 +1,10 @@
+from .registry import Counter, Gauge, Histogram, MetricsRegistry, metrics_registry, DEFAULT_LATENCY_BUCKETS
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "metrics_registry",
+    "DEFAULT_LATENCY_BUCKETS",
+]
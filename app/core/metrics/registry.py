@@ -0,0 +1,262 @@
+# app/core/metrics/registry.py
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认耗时分桶 (秒)：覆盖毫秒级到十分钟级
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+LabelValues = Tuple[str, ...]
+# 采集器返回的样本：(指标名, 标签字典, 值)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra.items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：按标签值分组保存数据，所有操作在进程内加锁完成 (开销为一次字典查找)"""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names: Tuple[str, ...] = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in sorted(self.values().items())]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in sorted(self.values().items())]
+
+
+class Histogram(_Metric):
+    """固定分桶直方图 (记录一次观测为一次二分查找与计数)"""
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数..., +Inf 计数], 总和, 总数
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+                self._counts[key] = counts
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def snapshot(self) -> Dict[LabelValues, Dict[str, object]]:
+        """返回每组标签的计数、总和与分桶计数 (非累计)"""
+        with self._lock:
+            return {
+                key: {"count": sum(counts), "sum": self._sums[key], "buckets": list(counts)}
+                for key, counts in self._counts.items()
+            }
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """按分桶线性插值估算分位数 (无数据时返回 None)"""
+        key = self._key(labels)
+        with self._lock:
+            counts = list(self._counts.get(key, []))
+        return self._estimate_quantile(counts, q)
+
+    def _estimate_quantile(self, counts: List[int], q: float) -> Optional[float]:
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            previous = cumulative
+            cumulative += count
+            if cumulative >= rank and count > 0:
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                lower = self.buckets[index - 1] if 0 < index <= len(self.buckets) else 0.0
+                if index >= len(self.buckets):
+                    return upper
+                return lower + (upper - lower) * ((rank - previous) / count)
+        return self.buckets[-1]
+
+    def summarize(self, quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> List[Dict[str, object]]:
+        """按标签汇总：次数、平均值与估算分位数 (用于管理接口)"""
+        result = []
+        for key, data in sorted(self.snapshot().items()):
+            count = data["count"]
+            item: Dict[str, object] = dict(zip(self.label_names, key))
+            item["count"] = count
+            item["avg"] = (data["sum"] / count) if count else 0.0
+            for q in quantiles:
+                item[f"p{int(q * 100)}"] = self._estimate_quantile(data["buckets"], q)
+            result.append(item)
+        return result
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, data in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, data["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': _format_value(bound)})} {cumulative}")
+            cumulative += data["buckets"][-1]
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(data['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表。
+    指标以 Prometheus 文本格式导出；采集器 (collector) 用于在导出时动态生成指标 (如队列深度快照)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def _get_or_create(self, cls, name: str, description: str, label_names: Sequence[str], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, description, label_names, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 '{name}' 已以不同类型注册")
+            return metric
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, description, label_names)
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, description, label_names)
+
+    def histogram(
+        self, name: str, description: str, label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, label_names, buckets=buckets)
+
+    def register_collector(self, name: str, description: str, metric_type: str, collect: Callable[[], Iterable[Sample]]):
+        """
+        注册导出时调用的采集函数，返回 (指标名, 标签, 值) 样本。
+        name 即导出的指标族 (HELP/TYPE 以它为名)，样本的指标名须与之相同；多个指标需分别注册。
+        """
+        with self._lock:
+            self._collectors = [c for c in self._collectors if c[0] != name]
+            self._collectors.append((name, description, metric_type, collect))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文本格式导出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in sorted(metrics, key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.render())
+        for name, description, metric_type, collect in collectors:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            try:
+                for sample_name, labels, value in collect():
+                    label_names = list(labels.keys())
+                    lines.append(f"{sample_name}{_format_labels(label_names, [labels[n] for n in label_names])} {_format_value(value)}")
+            except Exception as e:
+                lines.append(f"# collector {name} failed: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+metrics_registry = MetricsRegistry()
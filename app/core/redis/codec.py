@@ -0,0 +1,111 @@
+# app/core/redis/codec.py
+import json
+import logging
+from typing import Any, Optional, Union
+
+from app.core.utils.json_utils import safe_serialize, safe_deserialize
+
+logger = logging.getLogger(__name__)
+
+# 可选的高性能序列化库 (确保已安装: pip install orjson msgpack)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class RedisCodec:
+    """
+    Redis 值编解码器。
+    text_safe 为 True 表示编码结果是 UTF-8 文本，连接池可以使用 decode_responses=True。
+    """
+    name = "base"
+    text_safe = True
+
+    def encode(self, value: Any) -> Union[str, bytes]:
+        raise NotImplementedError
+
+    def decode(self, raw: Union[str, bytes, None]) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(RedisCodec):
+    """标准库 JSON (默认，兼容已有数据)"""
+    name = "json"
+
+    def encode(self, value: Any) -> str:
+        return safe_serialize(value)
+
+    def decode(self, raw: Union[str, bytes, None]) -> Any:
+        if raw is None:
+            return None
+        return safe_deserialize(raw)
+
+
+class OrjsonCodec(RedisCodec):
+    """orjson：与 JSON 数据互相兼容，编解码速度更快"""
+    name = "orjson"
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, raw: Union[str, bytes, None]) -> Any:
+        if raw is None:
+            return None
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"orjson 反序列化失败: {e}")
+            return None
+
+
+class MsgpackCodec(RedisCodec):
+    """msgpack 二进制编码：体积更小，需要连接池返回 bytes"""
+    name = "msgpack"
+    text_safe = False
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True, default=self._default)
+
+    def decode(self, raw: Union[str, bytes, None]) -> Any:
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        try:
+            return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+        except Exception:
+            # 切换编码前写入的 JSON 数据
+            try:
+                return json.loads(raw)
+            except (TypeError, ValueError):
+                logger.warning("msgpack/JSON 反序列化均失败，忽略该值")
+                return None
+
+    @staticmethod
+    def _default(obj: Any) -> Any:
+        # 与 safe_serialize 保持一致：datetime 以 ISO 字符串保存
+        if hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def get_codec(name: Optional[str]) -> RedisCodec:
+    """根据名称获取编解码器，依赖库未安装时回退为 JSON"""
+    name = (name or "json").strip().lower()
+    if name == "orjson":
+        if orjson is not None:
+            return OrjsonCodec()
+        logger.warning("orjson 未安装，Redis 编码回退为 json。请运行: pip install orjson")
+    elif name == "msgpack":
+        if msgpack is not None:
+            return MsgpackCodec()
+        logger.warning("msgpack 未安装，Redis 编码回退为 json。请运行: pip install msgpack")
+    elif name != "json":
+        logger.warning(f"未知的 Redis 编码 '{name}'，使用 json。")
+    return JsonCodec()
@@ -0,0 +1,119 @@
+# app/core/redis/rate_limit.py
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# GCRA (通用信元速率算法)：每个 key 只保存一个“理论到达时间” (TAT，毫秒)。
+# emission_interval = period / limit，burst 个请求可以连续通过。
+# 使用 Redis TIME 作为时钟，避免各节点时钟偏差。
+# 返回 {是否允许 (1/0), 需等待的毫秒数}
+GCRA_LUA_SCRIPT = """
+local key = KEYS[1]
+local emission_interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', key))
+if tat == nil or tat < now then
+    tat = now
+end
+
+local allow_at = tat - tolerance
+if now < allow_at then
+    return {0, allow_at - now}
+end
+
+local new_tat = tat + emission_interval
+redis.call('SET', key, new_tat, 'PX', math.max(1, math.ceil(new_tat - now)))
+return {1, 0}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    """限流结果：retry_after_seconds 为被拒绝时建议的重试等待时间"""
+    allowed: bool
+    retry_after_seconds: float = 0.0
+
+
+def gcra_parameters(limit: int, period_seconds: float, burst: Optional[int] = None) -> Tuple[float, float]:
+    """
+    计算 GCRA 参数 (毫秒)。
+
+    Returns:
+        (emission_interval_ms, tolerance_ms)
+    """
+    limit = max(1, limit)
+    burst = max(1, burst if burst is not None else limit)
+    emission_interval = period_seconds * 1000.0 / limit
+    tolerance = emission_interval * (burst - 1)
+    return emission_interval, tolerance
+
+
+class LocalRateLimitGuard:
+    """
+    进程内的近似预检查，用于在访问 Redis 之前拒绝必然会被拒绝的请求：
+
+    - 记录本进程中已被 Redis 放行的请求 (本地 GCRA)。本进程放行的请求已经超限时，
+      全局必然也超限，可直接拒绝。
+    - Redis 拒绝后记录“封禁到期时间”。TAT 在拒绝时不变，到期前的请求在本地直接拒绝。
+
+    该检查只会多拒绝已确定超限的请求，不会放行 Redis 会拒绝的请求。
+    Redis 不可用时也作为本地兜底限流。
+    每个 key 只保存两个浮点数，按 LRU 淘汰，内存有上限。
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        # key -> (本地 TAT 毫秒, 封禁到期毫秒)
+        self._state: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    @staticmethod
+    def _now_ms() -> float:
+        return time.monotonic() * 1000.0
+
+    def _get(self, key: str) -> Tuple[float, float]:
+        state = self._state.get(key)
+        if state is None:
+            return 0.0, 0.0
+        self._state.move_to_end(key)
+        return state
+
+    def _put(self, key: str, tat: float, blocked_until: float):
+        self._state[key] = (tat, blocked_until)
+        self._state.move_to_end(key)
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
+
+    def precheck(self, key: str, emission_interval: float, tolerance: float) -> Optional[RateLimitResult]:
+        """确定会被拒绝时返回拒绝结果，否则返回 None (需要询问 Redis)"""
+        now = self._now_ms()
+        tat, blocked_until = self._get(key)
+        if now < blocked_until:
+            return RateLimitResult(False, math.ceil(blocked_until - now) / 1000.0)
+        allow_at = tat - tolerance
+        if now < allow_at:
+            return RateLimitResult(False, math.ceil(allow_at - now) / 1000.0)
+        return None
+
+    def record(self, key: str, result: RateLimitResult, emission_interval: float):
+        """记录 Redis 的判定结果"""
+        now = self._now_ms()
+        tat, blocked_until = self._get(key)
+        if result.allowed:
+            self._put(key, max(tat, now) + emission_interval, blocked_until)
+        else:
+            self._put(key, tat, now + result.retry_after_seconds * 1000.0)
+
+    def check_local(self, key: str, emission_interval: float, tolerance: float) -> RateLimitResult:
+        """仅在本地执行 GCRA (Redis 不可用时使用)"""
+        rejected = self.precheck(key, emission_interval, tolerance)
+        if rejected is not None:
+            return rejected
+        result = RateLimitResult(True)
+        self.record(key, result, emission_interval)
+        return result
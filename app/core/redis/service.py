@@ -1,20 +1,128 @@
 # app/core/redis/service.py
 import json
-from typing import Optional, TypeVar, Any
+import asyncio
+import logging
+import math
+import random
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, TypeVar, Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Set, Tuple
 from redis import asyncio as aioredis # 使用 redis-py 的异步客户端
 import time
 
 from app.core.config.settings import settings
-from app.core.utils.json_utils import safe_serialize, safe_deserialize # 需要实现 json_utils
+from app.core.redis.codec import RedisCodec, get_codec
+from app.core.redis.rate_limit import GCRA_LUA_SCRIPT, LocalRateLimitGuard, RateLimitResult, gcra_parameters
+
+logger = logging.getLogger(__name__)
 
 # 定义泛型类型变量
 T = TypeVar('T')
 
+# 缓存封装标记：get_or_set_async 写入的值带有加载耗时与过期时间，用于提前刷新
+_CACHE_ENVELOPE_MARK = "__cache__"
+
+# 释放分布式锁：仅当锁仍属于自己时删除
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisBatch:
+    """
+    在一次往返中执行多条命令 (pipeline / MULTI-EXEC)。
+    值按 RedisService 的编解码器编码，执行后 results 中的值已解码，顺序与命令顺序一致。
+
+    用法:
+        async with redis_service.pipeline() as batch:
+            batch.get("a")
+            batch.set("b", {"x": 1}, expiry_seconds=60)
+            batch.incr("c", expiry_seconds=3600)
+        a_value, b_ok, c_value = batch.results
+    """
+
+    def __init__(self, pipe: Any, codec: RedisCodec):
+        self.pipe = pipe # 原始 redis pipeline，可直接调用其他命令 (结果不解码)
+        self._codec = codec
+        self._decoders: List[Optional[Callable[[Any], Any]]] = []
+        self.results: List[Any] = []
+
+    def _queue(self, decoder: Optional[Callable[[Any], Any]] = None) -> "RedisBatch":
+        self._decoders.append(decoder)
+        return self
+
+    def get(self, key: str) -> "RedisBatch":
+        self.pipe.get(key)
+        return self._queue(lambda raw: self._codec.decode(raw) if raw else None)
+
+    def set(self, key: str, value: Any, expiry_seconds: Optional[int] = None) -> "RedisBatch":
+        ex = expiry_seconds if expiry_seconds is not None and expiry_seconds > 0 else None
+        self.pipe.set(key, self._codec.encode(value), ex=ex)
+        return self._queue(bool)
+
+    def incr(self, key: str, amount: int = 1, expiry_seconds: Optional[int] = None) -> "RedisBatch":
+        """计数器增量；设置 expiry_seconds 时追加 EXPIRE (其结果不计入 results)"""
+        self.pipe.incrby(key, amount)
+        self._queue(int)
+        if expiry_seconds is not None and expiry_seconds > 0:
+            self.pipe.expire(key, expiry_seconds)
+            self._queue(_SKIP_RESULT)
+        return self
+
+    def get_counter(self, key: str) -> "RedisBatch":
+        self.pipe.get(key)
+        return self._queue(lambda raw: int(raw) if raw is not None else 0)
+
+    def exists(self, key: str) -> "RedisBatch":
+        self.pipe.exists(key)
+        return self._queue(lambda count: count > 0)
+
+    def delete(self, *keys: str) -> "RedisBatch":
+        self.pipe.delete(*keys)
+        return self._queue(int)
+
+    def expire(self, key: str, seconds: int) -> "RedisBatch":
+        self.pipe.expire(key, seconds)
+        return self._queue(bool)
+
+    async def execute(self) -> List[Any]:
+        raw_results = await self.pipe.execute()
+        # 直接调用 self.pipe 的命令没有解码器，按原样返回
+        decoders = self._decoders + [None] * (len(raw_results) - len(self._decoders))
+        self.results = [
+            decoder(raw) if decoder is not None else raw
+            for decoder, raw in zip(decoders, raw_results)
+            if decoder is not _SKIP_RESULT
+        ]
+        return self.results
+
+
+def _SKIP_RESULT(raw: Any) -> Any:
+    """标记不需要返回给调用方的内部命令结果"""
+    return raw
+
+
+def _to_str(value: Any) -> str:
+    """msgpack 编码时连接不解码响应，Stream 的记录ID与字段为 bytes"""
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
 class RedisService:
     """
     提供 Redis 操作的异步服务类。
     """
     _pool: aioredis.Redis = None
+    # 值编解码器 (REDIS_CODEC: json / orjson / msgpack)
+    _codec: RedisCodec = get_codec(settings.REDIS_CODEC)
+    # 限流：GCRA 脚本与进程内预检查 (所有实例共享)
+    _gcra_script: Any = None
+    _local_rate_limit: LocalRateLimitGuard = LocalRateLimitGuard()
+    # 进程内正在回源的缓存键 -> Future (single-flight)
+    _inflight: Dict[str, asyncio.Future] = {}
+    # 进程内正在提前刷新的缓存键
+    _refreshing: Set[str] = set()
 
     @classmethod
     async def initialize(cls):
@@ -22,17 +130,21 @@ class RedisService:
         if cls._pool is None:
             try:
                 print("正在初始化 Redis 连接池...")
-                print(f"Redis 连接字符串: {settings.REDIS_URL}")
-                print("Redis 连接池初始化中...")
-                print(settings.REDIS_URL)
-                cls._pool = aioredis.from_url(
-                    "redis://localhost:6379/0",
-                    password=123456,
+                # 连接数达到上限时等待空闲连接 (最多 REDIS_POOL_TIMEOUT_SECONDS)，而不是直接报错
+                connection_pool = aioredis.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                    health_check_interval=30,
                     encoding="utf-8",
-                    decode_responses=True # 自动将 bytes 解码为 str
+                    # 文本编码时自动将 bytes 解码为 str；msgpack 需要保留 bytes
+                    decode_responses=cls._codec.text_safe
                 )
+                cls._pool = aioredis.Redis.from_pool(connection_pool)
                 await cls._pool.ping() # 测试连接
-                print("Redis 连接池初始化成功。")
+                print(f"Redis 连接池初始化成功 (最大连接数: {settings.REDIS_MAX_CONNECTIONS}, 编码: {cls._codec.name})。")
             except Exception as e:
                 print(f"Redis 连接失败: {e}")
                 # 根据需要决定是否抛出异常或允许应用在无 Redis 的情况下启动（降级模式）
@@ -65,10 +177,9 @@ class RedisService:
         """
         try:
             client = self._get_client()
-            value_str = await client.get(key)
-            if value_str:
-                # 假设 safe_deserialize 可以处理 JSON 反序列化
-                return safe_deserialize(value_str) # 使用安全的 JSON 反序列化
+            raw = await client.get(key)
+            if raw:
+                return self._codec.decode(raw)
             return None
         except Exception as e:
             print(f"从 Redis 获取 key '{key}' 时出错: {e}") # 使用 logger 记录错误
@@ -88,12 +199,11 @@ class RedisService:
         """
         try:
             client = self._get_client()
-            # 假设 safe_serialize 可以将任意对象转为 JSON 字符串
-            value_str = safe_serialize(value) # 使用安全的 JSON 序列化
+            raw = self._codec.encode(value)
             if expiry_seconds is not None and expiry_seconds > 0:
-                return await client.setex(key, expiry_seconds, value_str)
+                return await client.setex(key, expiry_seconds, raw)
             else:
-                return await client.set(key, value_str)
+                return await client.set(key, raw)
         except Exception as e:
             print(f"向 Redis 设置 key '{key}' 时出错: {e}") # 使用 logger 记录错误
             return False
@@ -111,17 +221,143 @@ class RedisService:
         Returns:
             增量操作后的值，如果操作失败则返回 None。
         """
+        try:
+            # INCRBY 与 EXPIRE 在同一事务中执行 (一次往返)
+            async with self.transaction() as batch:
+                batch.incr(key, value, expiry_seconds=expiry_seconds)
+            return batch.results[0]
+        except Exception as e:
+            print(f"对 Redis key '{key}' 执行增量操作时出错: {e}") # 使用 logger 记录错误
+            return None
+
+    async def get_counter_async(self, key: str) -> int:
+        """
+        读取 INCR 维护的计数器 (原始整数，不经过编解码器)。
+
+        Returns:
+            计数值，key 不存在或读取失败时返回 0。
+        """
+        try:
+            client = self._get_client()
+            raw = await client.get(key)
+            return int(raw) if raw is not None else 0
+        except Exception as e:
+            logger.warning(f"读取 Redis 计数器 '{key}' 时出错: {e}")
+            return 0
+
+    async def mget_async(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        一次往返读取多个 key。
+
+        Returns:
+            与 keys 顺序一致的值列表，不存在或读取失败的位置为 None。
+        """
+        if not keys:
+            return []
         try:
             client = self._get_client()
-            # 使用 INCRBY 原子地增加值
-            new_value = await client.incrby(key, value)
+            raw_values = await client.mget(keys)
+            return [self._codec.decode(raw) if raw else None for raw in raw_values]
+        except Exception as e:
+            logger.warning(f"从 Redis 批量获取 {len(keys)} 个 key 时出错: {e}")
+            return [None] * len(keys)
+
+    async def mset_async(self, mapping: Dict[str, Any], expiry_seconds: Optional[int] = None) -> bool:
+        """
+        一次往返写入多个 key。设置 expiry_seconds 时使用 pipeline 逐个 SET EX。
+
+        Returns:
+            操作是否成功。
+        """
+        if not mapping:
+            return True
+        try:
             if expiry_seconds is not None and expiry_seconds > 0:
-                # 只有在成功增量后才设置过期时间
-                await client.expire(key, expiry_seconds)
-            return new_value
+                async with self.pipeline() as batch:
+                    for key, value in mapping.items():
+                        batch.set(key, value, expiry_seconds=expiry_seconds)
+                return all(batch.results)
+            client = self._get_client()
+            return bool(await client.mset({key: self._codec.encode(value) for key, value in mapping.items()}))
         except Exception as e:
-            print(f"对 Redis key '{key}' 执行增量操作时出错: {e}") # 使用 logger 记录错误
+            logger.warning(f"向 Redis 批量写入 {len(mapping)} 个 key 时出错: {e}")
+            return False
+
+    async def keys_delete_async(self, keys: Iterable[str]) -> int:
+        """
+        一次往返删除多个 key。
+
+        Returns:
+            实际删除的 key 数量。
+        """
+        keys = list(keys)
+        if not keys:
+            return 0
+        try:
+            client = self._get_client()
+            return await client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"从 Redis 批量删除 {len(keys)} 个 key 时出错: {e}")
+            return 0
+
+    async def stream_append_async(
+        self,
+        key: str,
+        fields: Dict[str, str],
+        max_len: Optional[int] = None,
+        expiry_seconds: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        向 Redis Stream 追加一条记录 (XADD，超过 max_len 时近似裁剪最早的记录)，并刷新过期时间。
+        字段值按原样写入，不经过编解码器。
+
+        Returns:
+            记录ID，失败时返回 None。
+        """
+        try:
+            async with self.pipeline() as batch:
+                batch.pipe.xadd(key, fields, maxlen=max_len, approximate=True)
+                if expiry_seconds is not None and expiry_seconds > 0:
+                    batch.pipe.expire(key, expiry_seconds)
+            return _to_str(batch.results[0])
+        except Exception as e:
+            logger.warning(f"向 Redis Stream '{key}' 追加记录时出错: {e}")
+            return None
+
+    async def stream_read_async(self, key: str, after_id: str = "0", count: int = 100) -> Optional[List[Tuple[str, Dict[str, str]]]]:
+        """
+        读取 Redis Stream 中 after_id 之后的记录 (XREAD，不阻塞)。
+
+        Returns:
+            (记录ID, 字段) 列表，流不存在时为空列表，失败时返回 None。
+        """
+        try:
+            client = self._get_client()
+            response = await client.xread({key: after_id}, count=count)
+        except Exception as e:
+            logger.warning(f"读取 Redis Stream '{key}' 时出错: {e}")
             return None
+        entries: List[Tuple[str, Dict[str, str]]] = []
+        for _, stream_entries in response or []:
+            for entry_id, fields in stream_entries:
+                entries.append((_to_str(entry_id), {_to_str(k): _to_str(v) for k, v in fields.items()}))
+        return entries
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[RedisBatch]:
+        """
+        批量命令上下文：退出时一次性发送并执行，结果见 batch.results。
+        上下文内抛出异常时不执行任何命令。Redis 不可用时抛出 ConnectionError。
+        """
+        client = self._get_client()
+        async with client.pipeline(transaction=transaction) as pipe:
+            batch = RedisBatch(pipe, self._codec)
+            yield batch
+            await batch.execute()
+
+    def transaction(self) -> "AsyncIterator[RedisBatch]":
+        """MULTI/EXEC 事务上下文：命令原子执行"""
+        return self.pipeline(transaction=True)
 
     async def key_exists_async(self, key: str) -> bool:
         """
@@ -159,63 +395,263 @@ class RedisService:
             print(f"删除 Redis key '{key}' 时出错: {e}") # 使用 logger 记录错误
             return False
 
-    async def rate_limit_async(self, key_prefix: str, limit: int, period_seconds: int) -> bool:
+    async def rate_limit_async(
+        self,
+        key_prefix: str,
+        limit: int,
+        period_seconds: int,
+        burst: Optional[int] = None
+    ) -> bool:
+        """
+        速率限制 (GCRA)，见 rate_limit_check_async。
+
+        Returns:
+            如果请求被允许返回 True，如果超出限制返回 False。
         """
-        使用 Redis Sorted Set 实现简单的滑动窗口速率限制 (异步)。
+        result = await self.rate_limit_check_async(key_prefix, limit, period_seconds, burst)
+        return result.allowed
+
+    async def rate_limit_check_async(
+        self,
+        key_prefix: str,
+        limit: int,
+        period_seconds: int,
+        burst: Optional[int] = None
+    ) -> RateLimitResult:
+        """
+        使用 GCRA 算法实现的速率限制 (异步)。
+        每个 key 只保存一个理论到达时间，内存占用与请求量无关。
+        请求先经过进程内预检查，确定超限的请求不访问 Redis。
 
         Args:
             key_prefix: 用于生成 Redis key 的前缀 (例如 "ratelimit:user:123:path")。
-            limit: 时间窗口内的最大允许请求数。
+            limit: 时间窗口内的最大允许请求数 (长期平均速率为 limit / period_seconds)。
             period_seconds: 时间窗口的长度（秒）。
+            burst: 允许连续突发的请求数，默认等于 limit。
 
         Returns:
-            如果请求被允许返回 True，如果超出限制返回 False。
+            RateLimitResult，包含是否允许以及被拒绝时建议的重试等待时间。
+        """
+        redis_key = f"{key_prefix}:{period_seconds}" # Key 包含时间窗口，方便管理
+        emission_interval, tolerance = gcra_parameters(limit, period_seconds, burst)
+
+        rejected = self._local_rate_limit.precheck(redis_key, emission_interval, tolerance)
+        if rejected is not None:
+            return rejected
+
+        try:
+            client = self._get_client()
+            if RedisService._gcra_script is None or RedisService._gcra_script.registered_client is not client:
+                # register_script 使用 EVALSHA，脚本只在首次调用时传输
+                RedisService._gcra_script = client.register_script(GCRA_LUA_SCRIPT)
+            allowed, retry_after_ms = await RedisService._gcra_script(
+                keys=[redis_key], args=[emission_interval, tolerance]
+            )
+            result = RateLimitResult(bool(int(allowed)), int(retry_after_ms) / 1000.0)
+        except Exception as e:
+            logger.warning(f"执行速率限制检查 key '{key_prefix}' 时出错: {e}，使用本地限流")
+            # Redis 出错时不拒绝全部请求，退化为进程内限流
+            return self._local_rate_limit.check_local(redis_key, emission_interval, tolerance)
+
+        self._local_rate_limit.record(redis_key, result, emission_interval)
+        return result
+
+    # --- 缓存旁路 (cache-aside) ---
+
+    def _unwrap_cache_envelope(self, raw: Any) -> Optional[Tuple[Any, float, float, bool]]:
+        """解析缓存封装，返回 (值, 加载耗时, 过期时间戳, 是否为空值缓存)；格式不符时返回 None"""
+        if not isinstance(raw, dict) or raw.get(_CACHE_ENVELOPE_MARK) != 1:
+            return None
+        return raw.get("v"), float(raw.get("d") or 0.0), float(raw.get("e") or 0.0), bool(raw.get("n"))
+
+    async def get_cached_async(self, key: str, deserializer: Optional[Callable[[Any], Any]] = None) -> Tuple[bool, Any]:
+        """
+        读取由 get_or_set_async / set_cached_async 写入的缓存值。
+
+        Returns:
+            (是否命中, 值)。命中空值缓存时返回 (True, None)。
         """
+        envelope = self._unwrap_cache_envelope(await self.get_async(key))
+        if envelope is None:
+            return False, None
+        value, _, _, negative = envelope
+        if negative:
+            return True, None
+        return True, deserializer(value) if deserializer else value
+
+    async def set_cached_async(
+        self,
+        key: str,
+        value: Any,
+        expiry_seconds: int,
+        load_seconds: float = 0.0,
+        serializer: Optional[Callable[[Any], Any]] = None
+    ) -> bool:
+        """
+        以缓存封装格式写入值 (value 为 None 时写入空值缓存)。
+        """
+        negative = value is None
+        envelope = {
+            _CACHE_ENVELOPE_MARK: 1,
+            "v": None if negative else (serializer(value) if serializer else value),
+            "d": round(load_seconds, 4),
+            "e": time.time() + expiry_seconds,
+        }
+        if negative:
+            envelope["n"] = 1
+        return await self.set_async(key, envelope, expiry_seconds=expiry_seconds)
+
+    async def get_or_set_async(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[T]]],
+        expiry_seconds: int,
+        negative_expiry_seconds: Optional[int] = None,
+        serializer: Optional[Callable[[Any], Any]] = None,
+        deserializer: Optional[Callable[[Any], Any]] = None,
+        lock_timeout_seconds: float = 10.0,
+        early_refresh_beta: float = 1.0
+    ) -> Optional[T]:
+        """
+        缓存旁路读取，防止缓存击穿：
+
+        - 进程内 single-flight：同一键同时只有一个协程回源，其余等待同一个 Future。
+        - 跨节点短锁：回源前以 SET NX PX 获取锁，未获取到的节点轮询等待缓存写入。
+        - 提前概率刷新 (XFetch)：临近过期时按加载耗时以一定概率提前回源，
+          刷新期间其他请求继续返回旧值。
+        - 空值缓存：loader 返回 None 时按 negative_expiry_seconds 缓存空结果 (为 None 则不缓存)。
+
+        Redis 不可用时退化为仅进程内 single-flight 的直接回源。
+
+        Args:
+            key: Redis 键。
+            loader: 回源函数，返回 None 表示数据不存在。
+            expiry_seconds: 缓存有效期（秒）。
+            negative_expiry_seconds: 空结果缓存有效期（秒）。
+            serializer/deserializer: 值与可 JSON 序列化对象之间的转换 (如 DTO <-> dict)。
+            lock_timeout_seconds: 跨节点回源锁的有效期，也是等待其他节点回源的最长时间。
+            early_refresh_beta: 提前刷新系数，越大越早刷新，0 表示关闭。
+        """
+        envelope = self._unwrap_cache_envelope(await self.get_async(key))
+        if envelope is not None:
+            value, load_seconds, expires_at, negative = envelope
+            cached = None if negative else (deserializer(value) if deserializer else value)
+            if key in self._refreshing or not self._should_refresh_early(load_seconds, expires_at, early_refresh_beta):
+                return cached
+            # 提前刷新：抢到刷新权的请求同步回源，其余请求继续返回旧值
+            self._refreshing.add(key)
+            try:
+                loaded, fresh = await self._load_and_store(
+                    key, loader, expiry_seconds, negative_expiry_seconds, serializer, deserializer,
+                    lock_timeout_seconds, wait_for_peer=False
+                )
+            except Exception as e:
+                logger.warning(f"提前刷新缓存 '{key}' 失败，返回旧值: {e}")
+                return cached
+            finally:
+                self._refreshing.discard(key)
+            return fresh if loaded else cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                # shield: 某个等待者被取消不影响回源本身
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 回源请求被取消 (如客户端断开)，重新发起
+                return await self.get_or_set_async(
+                    key, loader, expiry_seconds, negative_expiry_seconds, serializer, deserializer,
+                    lock_timeout_seconds, early_refresh_beta
+                )
+
+        future = asyncio.get_running_loop().create_future()
+        # 没有等待者时也取出异常，避免 "exception was never retrieved" 警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            _, value = await self._load_and_store(
+                key, loader, expiry_seconds, negative_expiry_seconds, serializer, deserializer,
+                lock_timeout_seconds, wait_for_peer=True
+            )
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    @staticmethod
+    def _should_refresh_early(load_seconds: float, expires_at: float, beta: float) -> bool:
+        if beta <= 0 or load_seconds <= 0:
+            return False
+        # XFetch: now - delta * beta * ln(rand) >= expiry
+        return time.time() - load_seconds * beta * math.log(random.random() or 1e-12) >= expires_at
+
+    async def _load_and_store(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[T]]],
+        expiry_seconds: int,
+        negative_expiry_seconds: Optional[int],
+        serializer: Optional[Callable[[Any], Any]],
+        deserializer: Optional[Callable[[Any], Any]],
+        lock_timeout_seconds: float,
+        wait_for_peer: bool
+    ) -> Tuple[bool, Optional[T]]:
+        """
+        获取跨节点锁后回源并写入缓存。
+        回源由当前协程执行 (loader 通常使用请求内的数据库会话，不能转移到后台任务)。
+
+        Returns:
+            (是否由本次调用得到结果, 值)。未抢到锁且 wait_for_peer=False 时返回 (False, None)。
+        """
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        locked = await self._try_acquire_lock(lock_key, token, lock_timeout_seconds)
+        if locked is False:
+            if not wait_for_peer:
+                return False, None # 其他节点正在刷新
+            # 其他节点正在回源：轮询等待其写入缓存，超时后自行回源
+            deadline = time.monotonic() + lock_timeout_seconds
+            delay = 0.02
+            while time.monotonic() < deadline:
+                await asyncio.sleep(delay)
+                hit, value = await self.get_cached_async(key, deserializer)
+                if hit:
+                    return True, value
+                delay = min(delay * 2, 0.5)
+        try:
+            started = time.monotonic()
+            value = await loader()
+            load_seconds = time.monotonic() - started
+            if value is not None:
+                await self.set_cached_async(key, value, expiry_seconds, load_seconds, serializer)
+            elif negative_expiry_seconds:
+                await self.set_cached_async(key, None, negative_expiry_seconds, load_seconds)
+            return True, value
+        finally:
+            if locked:
+                await self._release_lock(lock_key, token)
+
+    async def _try_acquire_lock(self, lock_key: str, token: str, timeout_seconds: float) -> Optional[bool]:
+        """获取分布式短锁；Redis 不可用时返回 None (调用方直接回源)"""
         try:
             client = self._get_client()
-            now_ns = time.time_ns() # 使用纳秒时间戳以获得更高精度
-            cutoff_ns = now_ns - (period_seconds * 1_000_000_000)
-            redis_key = f"{key_prefix}:{period_seconds}" # Key 包含时间窗口，方便管理
-
-            # 使用 Lua 脚本保证原子性
-            # 脚本逻辑:
-            # 1. 移除时间窗口之外的旧记录 (zremrangebyscore)
-            # 2. 获取当前窗口内的记录数 (zcard)
-            # 3. 如果记录数小于限制:
-            #    a. 添加当前时间戳记录 (zadd)
-            #    b. 设置/刷新 key 的过期时间 (expire)
-            #    c. 返回 1 (允许)
-            # 4. 否则返回 0 (拒绝)
-            lua_script = """
-            local key = KEYS[1]
-            local cutoff = ARGV[1]
-            local limit = tonumber(ARGV[2])
-            local now = ARGV[3]
-            local period = tonumber(ARGV[4])
-
-            -- 移除过期成员
-            redis.call('ZREMRANGEBYSCORE', key, '-inf', cutoff)
-
-            -- 获取当前数量
-            local current_count = redis.call('ZCARD', key)
-
-            if current_count < limit then
-                -- 添加当前请求记录，分数和成员都使用纳秒时间戳
-                redis.call('ZADD', key, now, now)
-                -- 设置过期时间，比时间窗口稍长一点，确保旧 key 能自动清理
-                redis.call('EXPIRE', key, period + 5)
-                return 1
-            else
-                return 0
-            end
-            """
-            # 参数: key, cutoff_score, limit, current_timestamp, period_seconds
-            args = [cutoff_ns, limit, now_ns, period_seconds]
-            result = await client.eval(lua_script, 1, redis_key, *args)
-
-            return result == 1
+            return bool(await client.set(lock_key, token, nx=True, px=max(1, int(timeout_seconds * 1000))))
+        except Exception as e:
+            logger.warning(f"获取 Redis 锁 '{lock_key}' 失败: {e}")
+            return None
 
+    async def _release_lock(self, lock_key: str, token: str):
+        try:
+            client = self._get_client()
+            await client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
         except Exception as e:
-            print(f"执行速率限制检查 key '{key_prefix}' 时出错: {e}") # 使用 logger 记录错误
-            # 在 Redis 出错时，选择放行还是拒绝？这里选择放行，避免 Redis 问题导致服务完全不可用
-            return True
\ No newline at end of file
+            logger.warning(f"释放 Redis 锁 '{lock_key}' 失败: {e}")
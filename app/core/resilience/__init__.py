@@ -0,0 +1,21 @@
+from .circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitOpenException,
+    CircuitState,
+    circuit_breaker,
+    circuit_breaker_snapshot,
+    get_circuit_breaker,
+    is_dependency_failure,
+)
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitBreakerConfig",
+    "CircuitOpenException",
+    "CircuitState",
+    "circuit_breaker",
+    "circuit_breaker_snapshot",
+    "get_circuit_breaker",
+    "is_dependency_failure",
+]
@@ -0,0 +1,254 @@
+# app/core/resilience/circuit_breaker.py
+"""
+外部依赖 (AI 提供者、Milvus、对象存储、语音服务) 的熔断器。
+
+依赖故障时 (如 Milvus 宕机、提供者超时)，若每个请求仍等待完整超时 (Milvus 30 秒，OpenAI 最长 180 秒)，
+工作协程与连接会被大量占用。熔断器在依赖连续失败 failure_threshold 次后打开，冷却期内直接抛出
+CircuitOpenException (503)；冷却结束后进入半开状态，只放行少量探测请求，探测成功则关闭，失败则重新打开。
+
+    breaker = get_circuit_breaker("milvus")
+    result = await breaker.call(client.search, ...)
+
+    @circuit_breaker("storage")
+    async def upload_async(...): ...
+
+只有依赖本身的故障计为失败：非 BusinessException 的异常 (超时、连接错误等)，以及业务码不在 4xx 的
+BusinessException；4xx (参数错误、未找到、限流等) 说明依赖可正常响应，按成功计。
+熔断状态按进程维护，不在实例之间共享。
+"""
+import asyncio
+import functools
+import logging
+import time
+from dataclasses import dataclass, fields, replace
+from enum import Enum
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.config.settings import settings
+from app.core.exceptions import BusinessException, ServiceUnavailableException
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitState(str, Enum):
+    """熔断器状态"""
+    CLOSED = "closed"       # 正常放行
+    OPEN = "open"           # 冷却中，直接拒绝
+    HALF_OPEN = "half_open" # 放行少量探测请求
+
+
+# 指标中状态的数值表示
+_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.OPEN: 1, CircuitState.HALF_OPEN: 2}
+
+circuit_breaker_state = metrics_registry.gauge(
+    "circuit_breaker_state", "熔断器状态 (0=关闭, 1=打开, 2=半开)", ("breaker",))
+circuit_breaker_calls_total = metrics_registry.counter(
+    "circuit_breaker_calls_total", "经过熔断器的调用数 (按结果: success/failure/rejected)", ("breaker", "outcome"))
+circuit_breaker_transitions_total = metrics_registry.counter(
+    "circuit_breaker_transitions_total", "熔断器状态切换次数 (按目标状态)", ("breaker", "state"))
+
+
+class CircuitOpenException(ServiceUnavailableException):
+    """熔断器打开 (或半开探测名额已满) 时拒绝调用"""
+    def __init__(self, breaker: str, retry_after_seconds: Optional[float] = None):
+        self.breaker = breaker
+        super().__init__(f"依赖服务 '{breaker}' 暂时不可用，请稍后重试", retry_after_seconds=retry_after_seconds)
+
+
+def is_dependency_failure(e: BaseException) -> bool:
+    """异常是否说明依赖本身故障 (取消、4xx 业务异常与熔断拒绝不计)"""
+    if isinstance(e, (asyncio.CancelledError, CircuitOpenException)) or not isinstance(e, Exception):
+        return False
+    if isinstance(e, BusinessException):
+        return not 400 <= e.code < 500
+    return True
+
+
+@dataclass
+class CircuitBreakerConfig:
+    """熔断器配置 (可由 CIRCUIT_BREAKER_OVERRIDES 按名称覆盖)"""
+    failure_threshold: int = 5
+    open_seconds: float = 30.0
+    half_open_max_calls: int = 1
+
+
+def breaker_config(name: str) -> CircuitBreakerConfig:
+    """熔断器的生效配置：全局默认值叠加 CIRCUIT_BREAKER_OVERRIDES 中的覆盖项"""
+    base = CircuitBreakerConfig(
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_max_calls=settings.CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS
+    )
+    overrides = settings.CIRCUIT_BREAKER_OVERRIDES.get(name) or {}
+    known = {f.name for f in fields(CircuitBreakerConfig)}
+    unknown = set(overrides) - known
+    if unknown:
+        logger.warning(f"CIRCUIT_BREAKER_OVERRIDES['{name}'] 包含未知字段，已忽略: {sorted(unknown)}")
+    return replace(base, **{k: v for k, v in overrides.items() if k in known})
+
+
+class CircuitBreaker:
+    """
+    连续失败计数的熔断器 (关闭 → 打开 → 半开 → 关闭/打开)。
+    只在事件循环线程中使用，状态修改不需要加锁。
+    """
+
+    def __init__(self, name: str, config: Optional[CircuitBreakerConfig] = None):
+        self.name = name
+        self.config = config or CircuitBreakerConfig()
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._half_open_calls = 0
+        circuit_breaker_state.set(_STATE_VALUES[self.state], breaker=name)
+
+    def _transition(self, state: CircuitState):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        if state == CircuitState.OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning(
+                f"熔断器 '{self.name}' 打开 (连续失败 {self.consecutive_failures} 次)，"
+                f"{self.config.open_seconds} 秒内直接拒绝请求"
+            )
+        else:
+            logger.info(f"熔断器 '{self.name}' 状态: {previous.value} -> {state.value}")
+        if state != CircuitState.HALF_OPEN:
+            self._half_open_calls = 0
+        circuit_breaker_state.set(_STATE_VALUES[state], breaker=self.name)
+        circuit_breaker_transitions_total.inc(breaker=self.name, state=state.value)
+
+    def retry_after_seconds(self) -> float:
+        """打开状态下距离进入半开还需等待的时间"""
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.config.open_seconds - time.monotonic())
+
+    def _acquire(self) -> bool:
+        """
+        调用前检查是否放行，拒绝时抛出 CircuitOpenException。
+        返回本次调用是否为半开状态下的探测请求。
+        """
+        if self.state == CircuitState.OPEN and self.retry_after_seconds() <= 0:
+            self._transition(CircuitState.HALF_OPEN)
+        if self.state == CircuitState.OPEN:
+            circuit_breaker_calls_total.inc(breaker=self.name, outcome="rejected")
+            raise CircuitOpenException(self.name, self.retry_after_seconds())
+        if self.state == CircuitState.HALF_OPEN:
+            if self._half_open_calls >= self.config.half_open_max_calls:
+                circuit_breaker_calls_total.inc(breaker=self.name, outcome="rejected")
+                raise CircuitOpenException(self.name, self.config.open_seconds)
+            self._half_open_calls += 1
+            return True
+        return False
+
+    def _release(self, probe: bool):
+        if probe and self.state == CircuitState.HALF_OPEN:
+            self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    def record_success(self, probe: bool = False):
+        circuit_breaker_calls_total.inc(breaker=self.name, outcome="success")
+        self._release(probe)
+        self.consecutive_failures = 0
+        if self.state == CircuitState.HALF_OPEN:
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self, probe: bool = False):
+        circuit_breaker_calls_total.inc(breaker=self.name, outcome="failure")
+        self._release(probe)
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN:
+            # 探测失败，重新打开并开始新的冷却期
+            self._transition(CircuitState.OPEN)
+        elif self.state == CircuitState.CLOSED and self.consecutive_failures >= self.config.failure_threshold:
+            self._transition(CircuitState.OPEN)
+
+    def _record_error(self, e: BaseException, probe: bool):
+        if is_dependency_failure(e):
+            self.record_failure(probe)
+        elif isinstance(e, Exception):
+            # 4xx 业务异常：依赖可正常响应
+            self.record_success(probe)
+        else:
+            # 被取消：不计结果，只归还探测名额
+            self._release(probe)
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """经过熔断器执行一次异步调用"""
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return await func(*args, **kwargs)
+        probe = self._acquire()
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            self._record_error(e, probe)
+            raise
+        self.record_success(probe)
+        return result
+
+    async def stream(self, iterator_factory: Callable[[], AsyncIterator[T]]) -> AsyncGenerator[T, None]:
+        """
+        经过熔断器读取流式结果：收到首个片段 (或正常结束) 即视为依赖可用；
+        首个片段之前的异常按 call 的规则计入，之后的异常只向上抛出。
+        """
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            async for item in iterator_factory():
+                yield item
+            return
+        probe = self._acquire()
+        settled = False
+        try:
+            async for item in iterator_factory():
+                if not settled:
+                    settled = True
+                    self.record_success(probe)
+                yield item
+        except BaseException as e:
+            if not settled:
+                settled = True
+                self._record_error(e, probe)
+            raise
+        finally:
+            if not settled:
+                self.record_success(probe)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "breaker": self.name,
+            "state": self.state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(self.retry_after_seconds(), 3),
+            "failure_threshold": self.config.failure_threshold,
+            "open_seconds": self.config.open_seconds,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取指定名称的熔断器 (进程内同名共享，首次使用时按配置创建)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name, breaker_config(name))
+        _breakers[name] = breaker
+    return breaker
+
+
+def circuit_breaker(name: str):
+    """为异步函数/方法加上指定名称的熔断器"""
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            return await get_circuit_breaker(name).call(func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def circuit_breaker_snapshot() -> List[Dict[str, Any]]:
+    """本进程全部熔断器的状态"""
+    return [breaker.snapshot() for breaker in _breakers.values()]
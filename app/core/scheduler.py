@@ -2,7 +2,8 @@
 import logging
 import asyncio
 import httpx # 用于异步调用 API
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Set
+from sqlalchemy import select
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.jobstores.base import JobLookupError
@@ -12,7 +13,10 @@ from datetime import datetime, timedelta, timezone
 from app.core.database.session import AsyncSessionFactory # 需要创建独立的 session
 from app.core.job.services import JobPersistenceService
 from app.core.job.models import JobPersist, JobConfig, JobStatus, JobLogLevel
+from app.core.job.fair import fair_job_selector, lane_metrics
+from app.core.job.leader import leader_only, scheduler_coordinator
 from app.core.config.settings import settings
+from app.core.http import HTTP_POOL_INTERNAL, http_client_registry
 import json # 用于解析 params_data
 
 logger = logging.getLogger(__name__)
@@ -22,6 +26,7 @@ scheduler = AsyncIOScheduler(timezone="Asia/Shanghai") # 使用配置的时区
 
 # --- 定时任务函数 ---
 
+@leader_only
 async def migrate_jobs_to_history_job():
     """定时任务：将完成/失败的任务迁移到历史表"""
     logger.info("APScheduler: 开始执行迁移任务到历史表...")
@@ -38,6 +43,7 @@ async def migrate_jobs_to_history_job():
     finally:
          if session: await session.close() # 确保关闭
 
+@leader_only
 async def cleanup_old_history_job():
     """(可选) 定时任务：清理过旧的历史任务记录"""
     logger.info("APScheduler: 开始执行清理旧历史任务...")
@@ -55,6 +61,22 @@ async def cleanup_old_history_job():
          if session: await session.close()
 
 
+@leader_only
+async def recover_expired_jobs_job():
+    """定时任务：回收租约过期的处理中任务 (执行进程崩溃或失联)"""
+    session = None
+    try:
+        async with AsyncSessionFactory() as session:
+            job_service = JobPersistenceService(session)
+            recovered_count = await job_service.recover_expired_jobs(batch_size=settings.JOB_REAPER_BATCH_SIZE)
+            if recovered_count:
+                logger.warning(f"APScheduler: 已回收 {recovered_count} 个租约过期的任务。")
+    except Exception as e:
+        logger.error(f"APScheduler: 回收租约过期任务时出错: {e}")
+    finally:
+         if session: await session.close()
+
+
 async def dispatch_pending_jobs_job():
     """定时任务：扫描待处理任务并调用 API，处理 API 调用层面的失败和重试"""
     logger.debug("APScheduler: 开始扫描并调度待处理任务...")
@@ -68,13 +90,27 @@ async def dispatch_pending_jobs_job():
         # 1. 获取待处理任务和配置 (保持不变)
         async with AsyncSessionFactory() as session:
             job_service = JobPersistenceService(session)
-            pending_jobs = await job_service.find_pending_jobs(limit=settings.SCHEDULER_FETCH_LIMIT)
+            # 按 (优先级通道, 用户) 取候选窗口，再由 DRR 选择器公平挑选；
+            # 多个调度成员时每个成员只扫描分到自己的用户
+            limit = settings.SCHEDULER_FETCH_LIMIT
+            candidates = await job_service.find_fair_candidates(
+                per_flow_limit=limit,
+                max_candidates=limit * settings.SCHEDULER_FAIR_CANDIDATE_FACTOR,
+                partition=scheduler_coordinator.dispatch_partition()
+            )
+            pending_jobs = fair_job_selector.select(candidates, limit)
+            if scheduler_coordinator.is_leader:
+                # 通道深度为全局统计，只由主节点查询
+                lane_metrics.update_depth(await job_service.get_pending_lane_stats())
             if not pending_jobs:
                  logger.debug("APScheduler: 没有待处理的任务。")
                  print("APScheduler: 没有待处理的任务。")
                  return
 
-            logger.info(f"APScheduler: 发现 {len(pending_jobs)} 个待处理任务，准备调度...")
+            logger.info(f"APScheduler: 发现 {len(pending_jobs)} 个待处理任务 (候选 {len(candidates)} 个)，准备调度...")
+            dispatch_time = datetime.now()
+            for job in pending_jobs:
+                lane_metrics.record_dispatch(job, dispatch_time)
             task_types = {job.task_type for job in pending_jobs}
             for task_type in task_types:
                  config = await job_service.get_job_config(task_type)
@@ -88,57 +124,117 @@ async def dispatch_pending_jobs_job():
         if session: await session.close()
 
     # 2. 异步调用 API
+    await _dispatch_jobs(pending_jobs, job_configs)
+
+
+async def dispatch_ready_jobs(job_ids: List[int]):
+    """
+    立即调度指定的就绪任务 (例如上游任务完成后刚被释放的子任务)，
+    无需等待下一个调度周期。与周期调度并发时由任务锁保证只执行一次。
+    """
+    if not job_ids:
+        return
+    session = None
+    ready_jobs: List[JobPersist] = []
+    job_configs: Dict[str, JobConfig] = {}
+    try:
+        async with AsyncSessionFactory() as session:
+            job_service = JobPersistenceService(session)
+            result = await session.execute(
+                select(JobPersist)
+                .where(JobPersist.id.in_(job_ids))
+                .where(JobPersist.status == int(JobStatus.PENDING))
+                .where(JobPersist.pending_parents == 0)
+            )
+            now = datetime.now()
+            ready_jobs = [job for job in result.scalars().all() if job.scheduled_at is None or job.scheduled_at <= now]
+            for task_type in {job.task_type for job in ready_jobs}:
+                 config = await job_service.get_job_config(task_type)
+                 if config: job_configs[task_type] = config
+            for job in ready_jobs:
+                lane_metrics.record_dispatch(job, now)
+    except Exception as e:
+         logger.error(f"立即调度就绪任务时查询出错: JobIds={job_ids} - {e}")
+         return
+    finally:
+        if session: await session.close()
+
+    logger.info(f"立即调度 {len(ready_jobs)} 个就绪的下游任务: {[job.id for job in ready_jobs]}")
+    await _dispatch_jobs(ready_jobs, job_configs)
+
+
+# 立即调度产生的后台任务引用，防止被垃圾回收
+_background_dispatches: Set[asyncio.Task] = set()
+
+def schedule_ready_jobs_dispatch(job_ids: List[int]):
+    """在后台调度就绪任务 (不阻塞调用方，例如任务端点在返回响应前调用)"""
+    if not job_ids:
+        return
+    task = asyncio.create_task(dispatch_ready_jobs(list(job_ids)))
+    _background_dispatches.add(task)
+    task.add_done_callback(_background_dispatches.discard)
+
+
+async def _dispatch_jobs(pending_jobs: List[JobPersist], job_configs: Dict[str, JobConfig]):
+    """并发调用任务 API，并处理 API 调用层面的失败和重试"""
     if pending_jobs:
-        async with httpx.AsyncClient(timeout=settings.SCHEDULER_API_TIMEOUT) as client:
-            tasks = []
-            valid_jobs = [] # 只包含有配置的任务
-            for job in pending_jobs:
-                config = job_configs.get(job.task_type)
-                if config:
-                    tasks.append(call_job_api(client, job, config))
-                    valid_jobs.append(job) # 记录对应的 job
-                else:
-                    logger.warning(f"APScheduler: 跳过任务 JobId={job.id}，类型 '{job.task_type}' 缺少配置。")
-                    # 将缺少配置的任务直接标记为失败，不再重试
-                    async with AsyncSessionFactory() as fail_session:
-                         fail_job_service = JobPersistenceService(fail_session)
-                         await fail_job_service.fail_job(job.id, "任务类型配置缺失", can_retry=False)
-
-            if tasks:
-                 logger.info(f"APScheduler: 准备并发调用 {len(tasks)} 个任务 API...")
-                 # --- 处理 gather 的结果 ---
-                 results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                 for i, result in enumerate(results):
-                      job = valid_jobs[i] # 获取对应的原始 job 对象
-
-                      if isinstance(result, httpx.Response) and result.status_code < 400:
-                           # API 调用成功 (HTTP 2xx 或 3xx)
-                           logger.info(f"APScheduler: 成功调用任务 API (JobId={job.id})，状态码: {result.status_code}")
-                           # 任务的最终成功/失败由 API 端内部的 complete_job/fail_job 处理
-                      else:
-                           # --- API 调用失败或返回错误状态码 ---
-                           error_message = "API 调用失败: "
-                           if isinstance(result, httpx.Response): # API 返回 >= 400
-                                error_message += f"HTTP {result.status_code}"
-                                try:
-                                     error_data = result.json()
-                                     error_message += f" - {error_data.get('message', result.text[:100])}"
-                                except Exception:
-                                     error_message += f" - {result.text[:100]}"
-                           elif isinstance(result, Exception): # 网络错误, 超时等
-                                error_message += str(result)
-                           else: # 未知错误
-                                error_message += f"未知返回类型 {type(result)}"
-
-                           logger.error(f"APScheduler: 调用任务 API (JobId={job.id}) 失败: {error_message}")
-
-                           # --- 在调度器端调用 fail_job 来处理重试 ---
-                           async with AsyncSessionFactory() as fail_session:
-                                fail_job_service = JobPersistenceService(fail_session)
-                                # 注意：这里的 can_retry 应该为 True，让 fail_job 根据次数判断
-                                await fail_job_service.fail_job(job.id, error_message, can_retry=True)
-                           # -------------------------------------------
+        # 复用内部连接池 (保持连接)，不再每个调度周期新建客户端
+        client = http_client_registry.get(HTTP_POOL_INTERNAL)
+        tasks = []
+        valid_jobs = [] # 只包含有配置的任务
+        for job in pending_jobs:
+            config = job_configs.get(job.task_type)
+            if config:
+                tasks.append(call_job_api(client, job, config))
+                valid_jobs.append(job) # 记录对应的 job
+            else:
+                logger.warning(f"APScheduler: 跳过任务 JobId={job.id}，类型 '{job.task_type}' 缺少配置。")
+                # 将缺少配置的任务直接标记为失败，不再重试
+                async with AsyncSessionFactory() as fail_session:
+                     fail_job_service = JobPersistenceService(fail_session)
+                     await fail_job_service.fail_job(job.id, "任务类型配置缺失", can_retry=False, owned=False)
+
+        if tasks:
+             logger.info(f"APScheduler: 准备并发调用 {len(tasks)} 个任务 API...")
+             # --- 处理 gather 的结果 ---
+             results = await asyncio.gather(*tasks, return_exceptions=True)
+
+             for i, result in enumerate(results):
+                  job = valid_jobs[i] # 获取对应的原始 job 对象
+
+                  if isinstance(result, httpx.Response) and result.status_code < 400:
+                       # API 调用成功 (HTTP 2xx 或 3xx)
+                       logger.info(f"APScheduler: 成功调用任务 API (JobId={job.id})，状态码: {result.status_code}")
+                       # 任务的最终成功/失败由 API 端内部的 complete_job/fail_job 处理
+                  else:
+                       # --- API 调用失败或返回错误状态码 ---
+                       error_message = "API 调用失败: "
+                       if isinstance(result, httpx.Response): # API 返回 >= 400
+                            error_message += f"HTTP {result.status_code}"
+                            try:
+                                 error_data = result.json()
+                                 error_message += f" - {error_data.get('message', result.text[:100])}"
+                            except Exception:
+                                 error_message += f" - {result.text[:100]}"
+                       elif isinstance(result, Exception): # 网络错误, 超时等
+                            error_message += str(result)
+                       else: # 未知错误
+                            error_message += f"未知返回类型 {type(result)}"
+
+                       logger.error(f"APScheduler: 调用任务 API (JobId={job.id}) 失败: {error_message}")
+
+                       if isinstance(result, httpx.TimeoutException):
+                            # 超时不代表任务失败：处理端可能仍在执行 (由租约保证存活)，
+                            # 若处理端已崩溃，租约过期后由回收作业重新排队；未获取锁的任务仍为 PENDING，下次调度即可
+                            logger.warning(f"APScheduler: 任务 API 调用超时 (JobId={job.id})，交由租约机制处理。")
+                            continue
+
+                       # --- 在调度器端调用 fail_job 来处理重试 ---
+                       async with AsyncSessionFactory() as fail_session:
+                            fail_job_service = JobPersistenceService(fail_session)
+                            # 注意：这里的 can_retry 应该为 True，让 fail_job 根据次数判断
+                            await fail_job_service.fail_job(job.id, error_message, can_retry=True, owned=False)
+                       # -------------------------------------------
 
 
 async def call_job_api(client: httpx.AsyncClient, job: JobPersist, config: JobConfig) -> Union[httpx.Response, Exception]:
@@ -206,6 +302,12 @@ def start_scheduler():
         #     trigger=IntervalTrigger(hours=settings.JOB_HISTORY_CLEANUP_INTERVAL_HOURS), # 从 settings 读取
         #     id="cleanup_history_job", replace_existing=True, max_instances=1
         # )
+        # 回收租约过期任务
+        scheduler.add_job(
+            recover_expired_jobs_job,
+            trigger=IntervalTrigger(seconds=settings.JOB_REAPER_INTERVAL_SECONDS),
+            id="recover_expired_jobs_job", replace_existing=True, max_instances=1
+        )
         # 任务调度
         scheduler.add_job(
             dispatch_pending_jobs_job,
@@ -214,7 +316,7 @@ def start_scheduler():
         )
 
         if not scheduler.running: scheduler.start()
-        logger.info("APScheduler 已启动，并添加了任务调度和维护作业。")
+        logger.info("APScheduler 已启动，并添加了任务调度和维护作业 (维护作业只在调度器主节点执行)。")
     except Exception as e:
         logger.error(f"启动 APScheduler 或添加作业时出错: {e}")
 
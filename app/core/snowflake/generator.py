@@ -31,3 +31,12 @@ class DefaultIdGenerator:
         if self.snowflake is None:
             raise ValueError("please set id generator at first.")
         return self.snowflake.next_id()
+
+    def next_ids(self, count: int) -> list:
+        """
+        批量获取新的UUID
+        """
+
+        if self.snowflake is None:
+            raise ValueError("please set id generator at first.")
+        return self.snowflake.next_ids(count)
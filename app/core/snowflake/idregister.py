@@ -1,129 +1,183 @@
 """
-worker id generator
+worker id 注册器 (基于 Redis 租约)
 """
-from threading import Thread
-import time
+import asyncio
 import logging
-import redis
+import os
+import random
+import socket
+import time
+import uuid
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 仅当租约仍属于自己时续期
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仅当租约仍属于自己时释放
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
 
 class Register:
     """
-    redis封装
-    - host 代表redis ip
-    - port 代表redis端口
-    - max_worker_id worker_id的最大值, 默认为100
-    - password redis的密码, 默认为空
+    通过 Redis 租约为每个进程分配全局唯一的 worker_id。
+    - redis_client 为 redis.asyncio 客户端
+    - max_worker_id worker_id 的最大值 (含)
+    - lease_seconds 租约时长, 后台任务每 1/3 租约时长续期一次；续期失败后每 retry_seconds 重试，
+      租约到期前仍未确认才停止发放 ID (短暂的 Redis 故障不影响写入)
+    - excluded_ids 不参与分配的 worker_id (例如静态配置给脚本使用的 ID)
+    - on_change worker_id 变化时的回调；参数为 -1 表示租约无法确认 (续期失败且即将到期，或已被他人占用)，
+      此时必须停止发放 ID，直到重新获得租约并以新的 worker_id 回调
     """
 
-    def __init__(self, host, port, max_worker_id=100, password=None):
-        self.redis_impl = redis.StrictRedis(host=host, port=port, db=0, password=password)
-        self.loop_count = 0
-        self.max_loop_count = 10
-        self.worker_id_expire_time = 15
+    KEY_PREFIX = "IdGen:WorkerId:Value:"
+    # 续期失败或尚未持有租约时的重试间隔 (秒)，也是重试时单次 Redis 命令的超时
+    RETRY_SECONDS = 1.0
+
+    def __init__(
+        self,
+        redis_client,
+        max_worker_id: int,
+        lease_seconds: int = 30,
+        excluded_ids: Iterable[int] = (),
+        on_change: Optional[Callable[[int], None]] = None
+    ):
+        self.redis_client = redis_client
         self.max_worker_id = max_worker_id
+        self.lease_seconds = lease_seconds
+        self.excluded_ids = set(excluded_ids)
+        self.on_change = on_change
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
         self.worker_id = -1
-        self.is_stop = False
+        # 本地估计的租约到期时间 (以发出 SET/续期命令的时刻计，偏保守)
+        self._lease_until = 0.0
+        # 是否已因租约无法确认而通知停止发放 ID
+        self._suspended = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _key(self, worker_id: int) -> str:
+        return f"{self.KEY_PREFIX}{worker_id}"
 
-    def get_lock(self, key):
+    async def acquire(self) -> int:
         """
-        获取分布式全局锁,并设置过期时间为30秒
+        获取一个空闲的 worker_id (从随机位置开始探测, 避免多个进程同时争抢同一个 ID)
+        失败返回 -1
         """
-
-        if self.redis_impl.setnx(key, 1):
-            self.redis_impl.expire(key, 30)
+        candidates = [i for i in range(self.max_worker_id + 1) if i not in self.excluded_ids]
+        if not candidates:
+            return -1
+        start = random.randrange(len(candidates))
+        for offset in range(len(candidates)):
+            worker_id = candidates[(start + offset) % len(candidates)]
+            sent_at = time.monotonic()
+            if await self.redis_client.set(self._key(worker_id), self.owner, nx=True, ex=self.lease_seconds):
+                self.worker_id = worker_id
+                self._lease_until = sent_at + self.lease_seconds
+                logger.info(f"已获取 Snowflake worker_id 租约: {worker_id} (owner={self.owner})")
+                return worker_id
+        logger.error(f"所有 Snowflake worker_id (0-{self.max_worker_id}) 均已被占用")
+        return -1
+
+    async def _renew_once(self) -> bool:
+        sent_at = time.monotonic()
+        renewed = await self.redis_client.eval(
+            _RENEW_SCRIPT, 1, self._key(self.worker_id), self.owner, self.lease_seconds
+        )
+        if int(renewed):
+            self._lease_until = sent_at + self.lease_seconds
             return True
-        if self.redis_impl.ttl(key) < 0:
-            self.redis_impl.expire(key, 30)
         return False
 
-    def stop(self):
-        """
-        退出注册器的线程
-        """
-
-        self.is_stop = True
-
-    def get_worker_id(self):
+    def _notify(self, worker_id: int):
+        if self.on_change:
+            self.on_change(worker_id)
+
+    def _suspend(self, reason: str):
+        """租约无法确认：通知停止发放 ID (只通知一次)"""
+        if not self._suspended:
+            self._suspended = True
+            logger.error(f"Snowflake worker_id {self.worker_id} {reason}，停止发放 ID 直到重新获得租约")
+            self._notify(-1)
+
+    def _resume(self):
+        if self._suspended:
+            self._suspended = False
+            logger.info(f"Snowflake worker_id {self.worker_id} 租约已确认，恢复发放 ID")
+            self._notify(self.worker_id)
+
+    async def _renew_or_acquire(self, timeout: float) -> bool:
+        """续期当前租约 (或在未持有租约时重新申请)，返回是否持有有效租约"""
+        if self.worker_id >= 0:
+            # 续期命令本身也有超时，否则来不及在到期前停止发放
+            if await asyncio.wait_for(self._renew_once(), timeout=timeout):
+                return True
+            # 租约已丢失 (例如进程长时间阻塞)，worker_id 可能已被其他进程占用：先停止发放，再重新申请
+            logger.warning(f"Snowflake worker_id {self.worker_id} 租约已丢失，重新申请")
+            self._suspend("租约已丢失")
+            self.worker_id = -1
+        return await asyncio.wait_for(self.acquire(), timeout=timeout) >= 0
+
+    async def _renew_loop(self):
+        interval = max(1.0, self.lease_seconds / 3)
+        retry = min(interval, self.RETRY_SECONDS)
+        healthy = self.worker_id >= 0
+        while True:
+            await asyncio.sleep(interval if healthy else retry)
+            try:
+                healthy = await self._renew_or_acquire(interval if healthy else retry)
+                if healthy:
+                    self._resume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                healthy = False
+                logger.error(f"续期 Snowflake worker_id 租约失败: {e!r}")
+            if not healthy and self.worker_id >= 0:
+                # 下一次重试 (间隔加超时) 之前租约可能到期：提前停止发放，避免与接手该 worker_id 的进程产生重复 ID
+                if time.monotonic() + 2 * retry >= self._lease_until:
+                    self._suspend("租约无法在到期前确认")
+
+    async def start(self) -> int:
         """
-        获取全局唯一worker_id, 会创建一个线程给worker id续期
-        失败返回-1
+        获取 worker_id 并启动后台续期任务
+        失败返回 -1：此时视为已停止发放 ID，后台任务持续重新申请，成功后以 on_change 通知
         """
-
-        self.loop_count = 0
-
-        def extern_life(my_id):
-            while 1:
-                time.sleep(self.worker_id_expire_time / 3)
-                # 是否关闭了
-                if self.is_stop:
-                    return
-                # 更新生命周期
-                if self.worker_id != my_id:
-                    break
-                try:
-                    self.redis_impl.expire(
-                        f"IdGen:WorkerId:Value:{my_id}",
-                        self.worker_id_expire_time)
-                except Exception as exe:
-                    logging.error(exe)
-                continue
-
-        self.worker_id = self.__get_next_worker_id()
-        if self.worker_id > -1:
-            Thread(target=extern_life, args=[self.worker_id]).start()
-        return self.worker_id
-
-    def __get_next_worker_id(self):
+        try:
+            worker_id = await self.acquire()
+        except Exception as e:
+            logger.error(f"申请 Snowflake worker_id 租约失败: {e!r}")
+            worker_id = -1
+        if worker_id < 0:
+            self._suspended = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._renew_loop())
+        return worker_id
+
+    async def stop(self):
         """
-        获取全局唯一worker id内部实现
+        停止续期并释放租约
         """
-
-        cur = self.redis_impl.incrby("IdGen:WorkerId:Index", 1)
-
-        def can_reset():
+        if self._task is not None:
+            self._task.cancel()
             try:
-                reset_value = self.redis_impl.incr("IdGen:WorkerId:Value:Edit")
-                return reset_value != 1
-            except Exception as ept:
-                logging.error(ept)
-                return False
-
-        def end_reset():
-            try:
-                self.redis_impl.set("IdGen:WorkerId:Value:Edit", 0)
-            except Exception as ept:
-                logging.error(ept)
-
-        def is_available(worker_id: int):
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.worker_id >= 0:
             try:
-                rst = self.redis_impl.get(f"IdGen:WorkerId:Value:{worker_id}")
-                return rst != "Y"
-            except Exception as ept:
-                logging.error(ept)
-                return False
-
-        if cur > self.max_worker_id:
-            if can_reset():
-                self.redis_impl.set("IdGen:WorkerId:Index", -1)
-                end_reset()
-                self.loop_count += 1
-
-                if self.loop_count > self.max_loop_count:
-                    self.loop_count = 0
-                    return -1
-
-                time.sleep(0.2 * self.loop_count)
-                return self.__get_next_worker_id()
-            time.sleep(0.2)
-            return self.__get_next_worker_id()
-        if is_available(cur):
-            self.redis_impl.setex(
-                f"IdGen:WorkerId:Value:{cur}",
-                self.worker_id_expire_time,
-                "Y"
-            )
-            self.loop_count = 0
-            return cur
-
-        return self.__get_next_worker_id()
+                await self.redis_client.eval(_RELEASE_SCRIPT, 1, self._key(self.worker_id), self.owner)
+            except Exception as e:
+                logger.warning(f"释放 Snowflake worker_id 租约失败: {e}")
+            self.worker_id = -1
@@ -145,3 +145,17 @@ class SnowFlakeM1(SnowFlake):
             else:
                 nextid = self.__next_normal_id()
             return nextid
+
+    def next_ids(self, count: int) -> list:
+        """
+        一次加锁连续生成 count 个ID (批量插入时使用)
+        """
+
+        with self.__id_lock:
+            ids = []
+            for _ in range(count):
+                if self.__is_over_cost:
+                    ids.append(self.__next_over_cost_id())
+                else:
+                    ids.append(self.__next_normal_id())
+            return ids
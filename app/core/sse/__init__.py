@@ -0,0 +1,23 @@
+from .stream import (
+    SSEEvent,
+    SSE_HEADERS,
+    format_sse,
+    sse_event_stream,
+    sse_events,
+    session_events,
+    sse_response,
+    text_events,
+)
+from .resumable import resume_sse_response
+
+__all__ = [
+    "SSEEvent",
+    "SSE_HEADERS",
+    "format_sse",
+    "sse_event_stream",
+    "sse_events",
+    "session_events",
+    "sse_response",
+    "text_events",
+    "resume_sse_response",
+]
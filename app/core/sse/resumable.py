@@ -0,0 +1,326 @@
+# app/core/sse/resumable.py
+"""
+可续接的 SSE 流。
+
+生成在后台任务中运行，事件逐个写入 Redis Stream (SSE:STREAM:{流ID}，保留 SSE_RESUME_TTL_SECONDS)，
+HTTP 响应只是该流的读取者。客户端断线后调用续接接口并带上 Last-Event-ID，
+即可补发断线期间的事件并继续接收后续事件，不会重新发起生成。
+生成会在请求结束后继续，事件源必须使用自己的数据库会话 (由 sse_response 以 session_events 创建)。
+
+- 事件ID为 "{流ID}:{Redis 记录ID}"，响应头 X-Stream-Id 为流ID。
+- 与生成在同一进程的读取者由进程内通知唤醒，其他节点上的读取者每 SSE_RESUME_POLL_MS 轮询一次 (不使用阻塞读取，避免占用连接池)。
+- 读取者定期刷新 SSE:STREAM:READER:{流ID}；超过 SSE_RESUME_ORPHAN_SECONDS 无人读取时取消生成。
+- 生成者定期刷新 SSE:STREAM:LIVE:{流ID}；生成者所在节点退出后，读取者收到 error 与 end 事件。
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+import uuid
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Optional, Set, Union
+
+from fastapi.responses import StreamingResponse
+
+from app.core.config.settings import settings
+from app.core.exceptions import ForbiddenException, NotFoundException
+from app.core.metrics import metrics_registry
+from app.core.redis.service import RedisService
+from app.core.sse.stream import HEARTBEAT, SSE_HEADERS, SSEEvent, format_sse, serialize_data, sse_event_stream, sse_events
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY_PREFIX = "SSE:STREAM:"
+META_KEY_PREFIX = "SSE:STREAM:META:"
+LIVE_KEY_PREFIX = "SSE:STREAM:LIVE:"
+READER_KEY_PREFIX = "SSE:STREAM:READER:"
+
+INTERRUPTED_MESSAGE = "生成已中断，请重新发送"
+
+_ENTRY_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+sse_resumes_total = metrics_registry.counter(
+    "sse_resumes_total", "续接请求次数 (outcome: resumed/expired/forbidden)", ("stream", "outcome"))
+sse_orphaned_streams_total = metrics_registry.counter(
+    "sse_orphaned_streams_total", "因长时间无人读取而取消生成的流数量", ("stream",))
+
+# 后台生成任务的引用，防止被垃圾回收
+_producers: Set[asyncio.Task] = set()
+
+
+class _LocalStream:
+    """本进程内生成中的流：每写入一个事件唤醒等待中的读取者"""
+
+    def __init__(self):
+        self.changed = asyncio.Event()
+        self.finished = False
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+_local_streams: Dict[str, _LocalStream] = {}
+
+
+def format_event_id(stream_id: str, entry_id: str) -> str:
+    return f"{stream_id}:{entry_id}"
+
+
+def parse_last_event_id(stream_id: str, last_event_id: Optional[str]) -> str:
+    """从 Last-Event-ID 中取出 Redis 记录ID，无效或属于其他流时从头补发"""
+    if not last_event_id:
+        return "0"
+    owner, _, entry_id = last_event_id.strip().rpartition(":")
+    if owner and owner != stream_id:
+        return "0"
+    return entry_id if _ENTRY_ID_PATTERN.match(entry_id) else "0"
+
+
+def _live_seconds() -> int:
+    return max(5, math.ceil(max(settings.SSE_HEARTBEAT_SECONDS, 1.0) * 3))
+
+
+def _check_interval() -> float:
+    """生成者与读取者刷新存活标记的间隔"""
+    interval = settings.SSE_HEARTBEAT_SECONDS if settings.SSE_HEARTBEAT_SECONDS > 0 else 5.0
+    return max(1.0, min(interval, settings.SSE_RESUME_ORPHAN_SECONDS / 3))
+
+
+async def start_resumable_stream(
+    stream_id: str,
+    source: AsyncIterator[Union[SSEEvent, str]],
+    name: str,
+    user_id: int,
+    start_data: Any = None,
+    format_error: Optional[Callable[[str], Any]] = None,
+    started: Optional[float] = None
+) -> bool:
+    """
+    在后台启动生成并把事件写入 Redis Stream。
+
+    Returns:
+        是否已启动；Redis 不可用时返回 False，调用方按普通流处理。
+    """
+    redis_service = RedisService()
+    interrupted = format_error(INTERRUPTED_MESSAGE) if format_error else INTERRUPTED_MESSAGE
+    try:
+        async with redis_service.pipeline() as batch:
+            batch.set(f"{META_KEY_PREFIX}{stream_id}", {
+                "UserId": user_id,
+                "Name": name,
+                "Interrupted": serialize_data("error", interrupted)
+            }, expiry_seconds=settings.SSE_RESUME_TTL_SECONDS)
+            batch.set(f"{LIVE_KEY_PREFIX}{stream_id}", 1, expiry_seconds=_live_seconds())
+            batch.set(f"{READER_KEY_PREFIX}{stream_id}", 1, expiry_seconds=math.ceil(settings.SSE_RESUME_ORPHAN_SECONDS))
+    except Exception as e:
+        logger.warning(f"无法创建可续接流 {name} ({stream_id})，按普通流处理: {e}")
+        return False
+
+    local = _LocalStream()
+    _local_streams[stream_id] = local
+    task = asyncio.create_task(_produce_async(stream_id, source, name, start_data, format_error, started, local))
+    _producers.add(task)
+    task.add_done_callback(_producers.discard)
+    return True
+
+
+async def _produce_async(
+    stream_id: str,
+    source: AsyncIterator[Union[SSEEvent, str]],
+    name: str,
+    start_data: Any,
+    format_error: Optional[Callable[[str], Any]],
+    started: Optional[float],
+    local: _LocalStream
+):
+    redis_service = RedisService()
+    key = f"{STREAM_KEY_PREFIX}{stream_id}"
+    check_interval = _check_interval()
+    # 空闲时 sse_events 按 check_interval 产出 None，借此刷新存活标记
+    events = sse_events(
+        source, name,
+        start_data=start_data,
+        stream_id=stream_id,
+        format_error=format_error,
+        started=started,
+        heartbeat_seconds=check_interval
+    )
+    last_check = time.monotonic()
+    try:
+        async for event in events:
+            if event is not None:
+                fields = {"event": event.event, "data": serialize_data(event.event, event.data)}
+                await redis_service.stream_append_async(
+                    key, fields,
+                    max_len=settings.SSE_RESUME_MAX_EVENTS,
+                    expiry_seconds=settings.SSE_RESUME_TTL_SECONDS
+                )
+                local.notify()
+            if time.monotonic() - last_check >= check_interval:
+                last_check = time.monotonic()
+                if not await _keep_alive_async(redis_service, stream_id):
+                    sse_orphaned_streams_total.inc(stream=name)
+                    logger.info(f"SSE 流 {name} ({stream_id}) 超过 {settings.SSE_RESUME_ORPHAN_SECONDS} 秒无人读取，取消生成")
+                    break
+    except Exception as e:
+        logger.error(f"可续接流 {name} ({stream_id}) 写入失败: {e}")
+    finally:
+        # 关闭事件源 (取消仍在进行的生成)
+        await events.aclose()
+        local.finished = True
+        local.notify()
+        _local_streams.pop(stream_id, None)
+        await redis_service.key_delete_async(f"{LIVE_KEY_PREFIX}{stream_id}")
+
+
+async def _keep_alive_async(redis_service: RedisService, stream_id: str) -> bool:
+    """刷新生成者存活标记，返回是否仍有读取者 (Redis 出错时视为有)"""
+    try:
+        async with redis_service.pipeline() as batch:
+            batch.set(f"{LIVE_KEY_PREFIX}{stream_id}", 1, expiry_seconds=_live_seconds())
+            batch.expire(f"{META_KEY_PREFIX}{stream_id}", settings.SSE_RESUME_TTL_SECONDS)
+            batch.exists(f"{READER_KEY_PREFIX}{stream_id}")
+        return batch.results[2]
+    except Exception as e:
+        logger.warning(f"刷新可续接流 {stream_id} 的存活标记失败: {e}")
+        return True
+
+
+async def _touch_reader_async(redis_service: RedisService, stream_id: str) -> bool:
+    """刷新读取者标记，返回生成者是否仍在运行 (Redis 出错时视为在运行)"""
+    try:
+        async with redis_service.pipeline() as batch:
+            batch.set(f"{READER_KEY_PREFIX}{stream_id}", 1, expiry_seconds=math.ceil(settings.SSE_RESUME_ORPHAN_SECONDS))
+            batch.exists(f"{LIVE_KEY_PREFIX}{stream_id}")
+        return batch.results[1]
+    except Exception as e:
+        logger.warning(f"刷新可续接流 {stream_id} 的读取者标记失败: {e}")
+        return True
+
+
+async def read_resumable_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = None,
+    interrupted_data: str = INTERRUPTED_MESSAGE
+) -> AsyncGenerator[str, None]:
+    """
+    读取可续接流：先补发 Last-Event-ID 之后的事件，再跟随生成实时输出，读到 end 事件后结束。
+    客户端断开只停止读取，生成继续进行，直到完成或超过 SSE_RESUME_ORPHAN_SECONDS 无人读取。
+    """
+    redis_service = RedisService()
+    key = f"{STREAM_KEY_PREFIX}{stream_id}"
+    after = parse_last_event_id(stream_id, last_event_id)
+    heartbeat = settings.SSE_HEARTBEAT_SECONDS
+    poll = settings.SSE_RESUME_POLL_MS / 1000.0
+    check_interval = _check_interval()
+    last_sent = time.monotonic()
+    last_check = 0.0
+    producer_alive = True
+
+    while True:
+        local = _local_streams.get(stream_id)
+        changed = local.changed if local is not None else None
+        now = time.monotonic()
+        if now - last_check >= check_interval:
+            last_check = now
+            producer_alive = await _touch_reader_async(redis_service, stream_id)
+
+        entries = await redis_service.stream_read_async(key, after, count=200)
+        if entries is None:
+            # Redis 暂时不可用：等待下一轮
+            entries = []
+        for entry_id, fields in entries:
+            after = entry_id
+            event = fields.get("event", "chunk")
+            yield format_sse(event, fields.get("data", ""), format_event_id(stream_id, entry_id))
+            last_sent = time.monotonic()
+            if event == "end":
+                return
+        if entries:
+            continue
+
+        if not producer_alive and local is None:
+            # 生成者已退出但没有写入 end 事件 (节点退出或因无人读取被取消)
+            yield format_sse("error", interrupted_data, format_event_id(stream_id, after))
+            yield format_sse("end", "", format_event_id(stream_id, after))
+            return
+
+        timeout = heartbeat - (time.monotonic() - last_sent) if heartbeat > 0 else check_interval
+        if timeout <= 0:
+            yield HEARTBEAT
+            last_sent = time.monotonic()
+            continue
+        wait = min(timeout, check_interval)
+        if changed is not None and not local.finished:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(min(wait, poll))
+
+
+async def _resumable_response_stream(
+    stream_id: str,
+    source: AsyncIterator[Union[SSEEvent, str]],
+    name: str,
+    user_id: int,
+    start_data: Any,
+    format_error: Optional[Callable[[str], Any]],
+    started: float
+) -> AsyncGenerator[str, None]:
+    if not await start_resumable_stream(stream_id, source, name, user_id, start_data, format_error, started):
+        async for chunk in sse_event_stream(
+            source, name,
+            start_data=start_data,
+            stream_id=stream_id,
+            format_error=format_error,
+            started=started
+        ):
+            yield chunk
+        return
+    interrupted = format_error(INTERRUPTED_MESSAGE) if format_error else INTERRUPTED_MESSAGE
+    async for chunk in read_resumable_stream(stream_id, interrupted_data=serialize_data("error", interrupted)):
+        yield chunk
+
+
+def resumable_sse_response(
+    source: AsyncIterator[Union[SSEEvent, str]],
+    name: str,
+    user_id: int,
+    start_data: Any = None,
+    format_error: Optional[Callable[[str], Any]] = None
+) -> StreamingResponse:
+    """创建可续接的 SSE 流式响应 (Redis 不可用时退化为普通流)"""
+    stream_id = uuid.uuid4().hex
+    return StreamingResponse(
+        _resumable_response_stream(stream_id, source, name, user_id, start_data, format_error, time.monotonic()),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": stream_id}
+    )
+
+
+async def resume_sse_response(stream_id: str, user_id: int, last_event_id: Optional[str] = None) -> StreamingResponse:
+    """
+    续接可续接流。
+
+    Raises:
+        NotFoundException: 流不存在或已过期。
+        ForbiddenException: 流不属于当前用户。
+    """
+    meta = await RedisService().get_async(f"{META_KEY_PREFIX}{stream_id}")
+    if not meta:
+        sse_resumes_total.inc(stream="unknown", outcome="expired")
+        raise NotFoundException("流", stream_id)
+    name = meta.get("Name", "unknown")
+    if meta.get("UserId") != user_id:
+        sse_resumes_total.inc(stream=name, outcome="forbidden")
+        raise ForbiddenException()
+    sse_resumes_total.inc(stream=name, outcome="resumed")
+    logger.info(f"续接 SSE 流 {name} ({stream_id})，Last-Event-ID: {last_event_id}")
+    return StreamingResponse(
+        read_resumable_stream(stream_id, last_event_id, meta.get("Interrupted") or INTERRUPTED_MESSAGE),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": stream_id}
+    )
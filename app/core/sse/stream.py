@@ -0,0 +1,329 @@
+# app/core/sse/stream.py
+"""
+统一的 SSE 流式响应层。
+
+- 事件源是异步生成器 (SSEEvent 或字符串)，由 sse_event_stream 编码为 SSE 文本：
+  先发送 start 事件，结束时发送 end 事件，出错时发送 error 事件后再发送 end。
+- 客户端断开时 (Starlette 取消或关闭响应生成器) 依次关闭事件源，取消向上游 LLM 的流式请求；
+  可续接流 (sse_response 指定 user_id 并以工厂函数提供事件源) 的生成在后台继续，见 app.core.sse.resumable。
+- 空闲超过 SSE_HEARTBEAT_SECONDS 时发送心跳注释 (": ping")，EventSource 会忽略注释行。
+- 相邻的同类数据块在 SSE_COALESCE_MS 窗口内合并为一个事件 (首个数据块立即发送)。
+- 记录每个流的首字节时间 (TTFB)、持续时间与结果。
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, replace
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Optional, Union
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config.settings import settings
+from app.core.exceptions import BusinessException
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 事件源工厂：接收独立的数据库会话并创建事件源 (用于生成与请求解耦的可续接流)
+SourceFactory = Callable[["AsyncSession"], AsyncIterator[Union["SSEEvent", str]]]
+
+sse_time_to_first_byte = metrics_registry.histogram(
+    "sse_time_to_first_byte_seconds", "从请求到发送第一个数据事件的耗时", ("stream",))
+sse_stream_duration = metrics_registry.histogram(
+    "sse_stream_duration_seconds", "SSE 流的持续时间 (outcome: completed/error/disconnected)", ("stream", "outcome"))
+sse_streams_active = metrics_registry.gauge(
+    "sse_streams_active", "当前打开的 SSE 流数量", ("stream",))
+
+SSE_HEADERS: Dict[str, str] = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+# 心跳注释 (EventSource 忽略以冒号开头的行)
+HEARTBEAT = ": ping\n\n"
+
+# 不计入首字节时间的控制事件
+_CONTROL_EVENTS = frozenset({"start", "end", "heartbeat"})
+
+
+@dataclass
+class SSEEvent:
+    """一个 SSE 事件 (data 不是字符串时序列化为 JSON)"""
+    event: str
+    data: Any = ""
+    id: Optional[str] = None
+
+    def encode(self) -> str:
+        return format_sse(self.event, self.data, self.id)
+
+
+def serialize_data(event: str, data: Any) -> str:
+    """事件数据转换为文本 (非字符串序列化为 JSON)"""
+    if isinstance(data, str):
+        return data
+    try:
+        return json.dumps(data, ensure_ascii=False)
+    except (TypeError, ValueError) as e:
+        logger.error(f"SSE 事件 {event} 的数据无法序列化: {e}")
+        return json.dumps({"error": "Serialization failed", "details": str(e)}, ensure_ascii=False)
+
+
+def format_sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """编码 SSE 事件：多行数据按规范拆成多个 data 行 (客户端按换行拼回)"""
+    data = serialize_data(event, data)
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def _merge(current: SSEEvent, incoming: SSEEvent) -> Optional[SSEEvent]:
+    """合并两个相邻的同类数据块，不能合并时返回 None"""
+    if current.event != incoming.event or current.id != incoming.id:
+        return None
+    if isinstance(current.data, str) and isinstance(incoming.data, str):
+        return replace(current, data=current.data + incoming.data)
+    if isinstance(current.data, dict) and isinstance(incoming.data, dict):
+        # 形如 {"role": ..., "content": ...} 的数据块：除 content 外其余字段相同时合并 content
+        a, b = current.data, incoming.data
+        if (
+            isinstance(a.get("content"), str) and isinstance(b.get("content"), str)
+            and a.keys() == b.keys()
+            and all(a[key] == b[key] for key in a if key != "content")
+        ):
+            return replace(current, data={**a, "content": a["content"] + b["content"]})
+    return None
+
+
+def _data_size(event: SSEEvent) -> int:
+    if isinstance(event.data, str):
+        return len(event.data)
+    if isinstance(event.data, dict) and isinstance(event.data.get("content"), str):
+        return len(event.data["content"])
+    return 0
+
+
+def _is_coalescible(event: SSEEvent) -> bool:
+    if event.event in _CONTROL_EVENTS:
+        return False
+    return isinstance(event.data, str) or (isinstance(event.data, dict) and isinstance(event.data.get("content"), str))
+
+
+async def sse_events(
+    source: AsyncIterator[Union[SSEEvent, str]],
+    name: str,
+    start_data: Any = None,
+    stream_id: Optional[str] = None,
+    format_error: Optional[Callable[[str], Any]] = None,
+    started: Optional[float] = None,
+    heartbeat_seconds: Optional[float] = None,
+    coalesce_ms: Optional[float] = None,
+    coalesce_max_chars: Optional[int] = None
+) -> AsyncGenerator[Optional[SSEEvent], None]:
+    """
+    为事件源加上 start/error/end 事件并合并数据块，空闲超过心跳间隔时产出 None。
+
+    Args:
+        source: 事件源 (字符串视为 chunk 事件)。
+        name: 流名称 (指标标签，如 "pkb.chat")。
+        start_data: start 事件的数据，为 None 时不发送 start 事件。
+        stream_id: 流ID (用于日志)。
+        format_error: 把错误信息转换为 error 事件数据，默认直接使用错误信息。
+        started: 请求开始时间 (time.monotonic)，用于计算首字节时间。
+    """
+    heartbeat = settings.SSE_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    coalesce = (settings.SSE_COALESCE_MS if coalesce_ms is None else coalesce_ms) / 1000.0
+    max_chars = settings.SSE_COALESCE_MAX_CHARS if coalesce_max_chars is None else coalesce_max_chars
+    started = time.monotonic() if started is None else started
+
+    iterator = source.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    buffered: Optional[SSEEvent] = None
+    buffered_at = 0.0
+    first_sent = False
+    last_sent = time.monotonic()
+    outcome = "disconnected"
+    sse_streams_active.inc(stream=name)
+
+    def emit(event: Optional[SSEEvent]) -> Optional[SSEEvent]:
+        nonlocal first_sent, last_sent
+        if event is not None and not first_sent and event.event not in _CONTROL_EVENTS:
+            first_sent = True
+            sse_time_to_first_byte.observe(time.monotonic() - started, stream=name)
+        last_sent = time.monotonic()
+        return event
+
+    try:
+        if start_data is not None:
+            yield emit(SSEEvent("start", start_data))
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            now = time.monotonic()
+            timeout = heartbeat - (now - last_sent) if heartbeat > 0 else None
+            if buffered is not None:
+                flush_in = coalesce - (now - buffered_at)
+                timeout = flush_in if timeout is None else min(timeout, flush_in)
+            done, _ = await asyncio.wait((pending,), timeout=None if timeout is None else max(0.0, timeout))
+            if not done:
+                # 等待期间：到期的合并缓冲先发送，否则发送心跳
+                if buffered is not None and time.monotonic() - buffered_at >= coalesce:
+                    yield emit(buffered)
+                    buffered = None
+                elif heartbeat > 0 and time.monotonic() - last_sent >= heartbeat:
+                    yield emit(None)
+                continue
+
+            task, pending = pending, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                break
+            if isinstance(event, str):
+                event = SSEEvent("chunk", event)
+
+            if buffered is not None:
+                merged = _merge(buffered, event)
+                if merged is not None and _data_size(merged) <= max_chars:
+                    buffered = merged
+                    continue
+                yield emit(buffered)
+                buffered = None
+            if first_sent and coalesce > 0 and _is_coalescible(event):
+                buffered = event
+                buffered_at = time.monotonic()
+                continue
+            yield emit(event)
+
+        if buffered is not None:
+            yield emit(buffered)
+            buffered = None
+        outcome = "completed"
+    except asyncio.CancelledError:
+        raise
+    except Exception as ex:
+        outcome = "error"
+        message = ex.message if isinstance(ex, BusinessException) else str(ex)
+        logger.error(f"SSE 流 {name} ({stream_id}) 出错: {message}")
+        if buffered is not None:
+            yield emit(buffered)
+        yield emit(SSEEvent("error", format_error(message) if format_error else message))
+    finally:
+        # 客户端断开或流结束：取消未完成的读取并关闭事件源 (逐级关闭到上游 LLM 流)
+        if pending is not None and not pending.done():
+            pending.cancel()
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception as e:
+                logger.debug(f"关闭 SSE 事件源 {name} 时出错: {e}")
+        sse_streams_active.dec(stream=name)
+        sse_stream_duration.observe(time.monotonic() - started, stream=name, outcome=outcome)
+        if outcome == "disconnected":
+            logger.info(f"SSE 流 {name} ({stream_id}) 在完成前被关闭")
+
+    yield emit(SSEEvent("end", ""))
+
+
+async def sse_event_stream(
+    source: AsyncIterator[Union[SSEEvent, str]],
+    name: str,
+    start_data: Any = None,
+    stream_id: Optional[str] = None,
+    format_error: Optional[Callable[[str], Any]] = None,
+    started: Optional[float] = None,
+    **options: Any
+) -> AsyncGenerator[str, None]:
+    """把事件源编码为 SSE 文本流 (参数见 sse_events)，事件ID默认为随机生成的流ID"""
+    stream_id = stream_id or uuid.uuid4().hex
+    events = sse_events(
+        source, name,
+        start_data=start_data,
+        stream_id=stream_id,
+        format_error=format_error,
+        started=started,
+        **options
+    )
+    try:
+        async for event in events:
+            if event is None:
+                yield HEARTBEAT
+            else:
+                yield (event if event.id else replace(event, id=stream_id)).encode()
+    finally:
+        await events.aclose()
+
+
+async def session_events(factory: SourceFactory) -> AsyncGenerator[Union[SSEEvent, str], None]:
+    """
+    在独立的数据库会话中运行事件源，会话随事件源结束而关闭。
+    请求作用域的会话 (Depends(get_db)) 在请求结束时关闭，不能用于与连接解耦的后台生成。
+    """
+    from app.core.database.session import AsyncSessionFactory
+    async with AsyncSessionFactory() as db:
+        source = factory(db)
+        try:
+            async for item in source:
+                yield item
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+def sse_response(
+    source: Union[AsyncIterator[Union[SSEEvent, str]], SourceFactory],
+    name: str,
+    start_data: Any = None,
+    stream_id: Optional[str] = None,
+    format_error: Optional[Callable[[str], Any]] = None,
+    user_id: Optional[int] = None
+) -> StreamingResponse:
+    """
+    创建 SSE 流式响应 (参数见 sse_events)。
+
+    source 可以是事件源，也可以是接收数据库会话并创建事件源的工厂函数 (见 session_events)：
+    工厂函数在独立的会话中运行，此时指定 user_id 且启用 SSE_RESUME_ENABLED 会创建可续接流
+    (见 app.core.sse.resumable)：生成与连接解耦，断线后可凭 Last-Event-ID 续接，此时忽略 stream_id。
+    直接传入的事件源可能依赖请求作用域的会话，始终随连接结束。
+    流中的 AI 调用以流名称作为调用点记录 (见 app.core.ai.chat.instrumentation)。
+    """
+    # 响应 (及续接流的生成任务) 在当前请求上下文中创建，继承该调用点
+    from app.core.ai.chat.instrumentation import bind_ai_call_site
+    bind_ai_call_site(name)
+    detached = callable(source)
+    if detached:
+        source = session_events(source)
+    if detached and user_id is not None and settings.SSE_RESUME_ENABLED:
+        from app.core.sse.resumable import resumable_sse_response
+        return resumable_sse_response(source, name, user_id, start_data=start_data, format_error=format_error)
+    return StreamingResponse(
+        sse_event_stream(
+            source, name,
+            start_data=start_data,
+            stream_id=stream_id,
+            format_error=format_error,
+            started=time.monotonic()
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+async def text_events(chunks: AsyncIterator[str], event: str = "chunk") -> AsyncGenerator[SSEEvent, None]:
+    """把文本流 (如 IChatAIService.streaming_chat_completion_async) 包装为事件源，关闭时同时关闭文本流"""
+    try:
+        async for chunk in chunks:
+            yield SSEEvent(event, chunk)
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
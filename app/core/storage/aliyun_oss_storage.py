@@ -7,6 +7,7 @@ from typing import Union
 from app.core.config.settings import settings
 from app.core.storage.base import IStorageService
 from app.core.exceptions import BusinessException
+from app.core.resilience import circuit_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,7 @@ class AliyunOssStorageService(IStorageService):
             logger.error(f"初始化阿里云 OSS 服务失败: {e}")
             raise RuntimeError(f"初始化阿里云 OSS 服务失败: {e}") from e
 
+    @circuit_breaker("storage.aliyun_oss") # 云存储不可用时快速失败
     async def upload_async(
         self,
         file_stream: Union[io.BytesIO, io.BufferedReader, bytes],
@@ -8,6 +8,7 @@ from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
 from app.core.config.settings import settings
 from app.core.storage.base import IStorageService
 from app.core.exceptions import BusinessException
+from app.core.resilience import circuit_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +66,7 @@ class AzureBlobStorageService(IStorageService):
         return self.blob_service_client.get_container_client(self.container_name)
 
 
+    @circuit_breaker("storage.azure_blob") # 云存储不可用时快速失败
     async def upload_async(
         self,
         file_stream: Union[io.BytesIO, io.BufferedReader, bytes],
@@ -0,0 +1,50 @@
+# app/core/utils/process.py
+"""
+异步执行外部命令 (ffmpeg/ffprobe 等)。
+
+subprocess.Popen(...).communicate() 在 async 函数中会阻塞事件循环，长时间的渲染期间
+任务租约的后台续约、其他请求都无法执行；这里使用 asyncio 子进程，等待期间事件循环照常运行。
+"""
+import asyncio
+import subprocess
+from typing import List, Tuple, Union
+
+
+async def run_process_async(cmd: Union[List[str], str], shell: bool = False) -> Tuple[int, str, str]:
+    """
+    执行命令并等待结束 (不阻塞事件循环)。
+
+    Args:
+        cmd: 命令参数列表；shell 为 True 时为完整的命令字符串。
+        shell: 是否通过 shell 执行。
+
+    Returns:
+        (返回码, 标准输出, 标准错误)
+    """
+    if shell:
+        process = await asyncio.create_subprocess_shell(
+            cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # 调用方被取消 (如请求断开、应用关闭) 时结束子进程，避免遗留孤儿进程
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return (
+        process.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace")
+    )
+
+
+async def check_output_async(cmd: List[str]) -> str:
+    """执行命令并返回标准输出，返回码非 0 时抛出 subprocess.CalledProcessError (与 subprocess.check_output 一致)"""
+    returncode, stdout, stderr = await run_process_async(cmd)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+    return stdout
@@ -2,7 +2,9 @@
 import time
 import threading
 import logging
+from typing import List, Optional
 from app.core.snowflake import options, generator
+from app.core.snowflake.idregister import Register
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -10,11 +12,60 @@ logger = logging.getLogger(__name__)
 # 从配置中获取 Worker ID 和 Datacenter ID
 from app.core.config.settings import settings
 
+# 前端以 JavaScript Number 处理 ID，超过 53 位会丢失精度
+_JS_SAFE_INTEGER_BITS = 53
+
+_generator_lock = threading.Lock()
+_worker_id_register: Optional[Register] = None
+
+
+def _build_generator(worker_id: int) -> generator.DefaultIdGenerator:
+    id_options = options.IdGeneratorOptions(
+        worker_id=worker_id,
+        worker_id_bit_length=settings.SNOWFLAKE_WORKER_ID_BIT_LENGTH,
+        seq_bit_length=settings.SNOWFLAKE_SEQ_BIT_LENGTH
+    )
+    if worker_id < 0 or worker_id >= (1 << id_options.worker_id_bit_length):
+        raise ValueError(f"worker_id {worker_id} 超出范围 [0, {(1 << id_options.worker_id_bit_length) - 1}]")
+    if id_options.worker_id_bit_length + id_options.seq_bit_length > 22:
+        raise ValueError("SNOWFLAKE_WORKER_ID_BIT_LENGTH + SNOWFLAKE_SEQ_BIT_LENGTH 不能超过 22")
+    id_generator = generator.DefaultIdGenerator()
+    id_generator.set_id_generator(id_options)
+
+    # 检查当前时间下 ID 的位数，提示前端精度风险
+    ticks = int(time.time() * 1000) - id_options.base_time
+    id_bits = ticks.bit_length() + id_options.worker_id_bit_length + id_options.seq_bit_length
+    if id_bits > _JS_SAFE_INTEGER_BITS:
+        logger.warning(f"Snowflake ID 已达到 {id_bits} 位，超过 JavaScript 安全整数范围 ({_JS_SAFE_INTEGER_BITS} 位)。")
+    return id_generator
+
+
+def configure_worker_id(worker_id: int):
+    """切换全局生成器使用的 worker_id (租约分配或变更时调用)"""
+    global _id_generator
+    new_generator = _build_generator(worker_id)
+    with _generator_lock:
+        _id_generator = new_generator
+    logger.info(f"Snowflake ID 生成器已使用 worker_id={worker_id}")
+
+
+def _on_worker_id_change(worker_id: int):
+    """
+    租约回调：worker_id 为 -1 表示租约无法确认，停止发放 ID。
+    不回退到静态 worker_id：它保留给脚本，且可能被多个进程同时回退使用。
+    """
+    global _id_generator
+    if worker_id >= 0:
+        configure_worker_id(worker_id)
+        return
+    with _generator_lock:
+        _id_generator = None
+    logger.error("Snowflake worker_id 租约无法确认，已停止发放 ID")
+
+
 try:
-    # 创建一个全局的 Snowflake ID 生成器实例
-    options = options.IdGeneratorOptions(worker_id=settings.SNOWFLAKE_WORKER_ID, worker_id_bit_length=2, seq_bit_length=6)
-    _id_generator = generator.DefaultIdGenerator()
-    _id_generator.set_id_generator(options)
+    # 创建一个全局的 Snowflake ID 生成器实例 (静态 worker_id，API 进程启动后会切换为租约分配的 worker_id)
+    _id_generator = _build_generator(settings.SNOWFLAKE_WORKER_ID)
 except ValueError as e:
     logger.error(f"初始化 Snowflake ID 生成器失败: {e}. 请检查 .env 文件中的 SNOWFLAKE_WORKER_ID 和 SNOWFLAKE_DATACENTER_ID 配置。")
     # 可以选择在这里抛出异常或设置 _id_generator 为 None，并在使用时检查
@@ -23,8 +74,59 @@ except Exception as e:
      logger.error(f"初始化 Snowflake ID 生成器时发生未知错误: {e}")
      _id_generator = None
 
+
+async def start_worker_id_lease(redis_client) -> int:
+    """
+    通过 Redis 租约获取全局唯一的 worker_id 并切换生成器 (多节点、多进程部署时避免 ID 冲突)。
+    静态配置的 SNOWFLAKE_WORKER_ID 保留给未参与租约的进程 (如脚本)，不会被分配，
+    只在未启用租约时使用：启用租约时多个进程回退到同一 worker_id 会产生重复 ID。
+    - Redis 不可用时启动失败；
+    - 暂时获取不到租约时停止发放 ID (返回 -1)，后台持续重新申请，获得后自动恢复。
+    """
+    global _worker_id_register
+    if not settings.SNOWFLAKE_WORKER_ID_LEASE_ENABLED:
+        logger.info(f"未启用 Snowflake worker_id 租约，使用静态 worker_id={settings.SNOWFLAKE_WORKER_ID}")
+        return settings.SNOWFLAKE_WORKER_ID
+    if redis_client is None:
+        raise RuntimeError(
+            "已启用 Snowflake worker_id 租约但 Redis 不可用，无法保证 worker_id 唯一。"
+            "请检查 Redis 连接，单进程部署可设置 SNOWFLAKE_WORKER_ID_LEASE_ENABLED=false 使用静态 worker_id。"
+        )
+    _worker_id_register = Register(
+        redis_client,
+        max_worker_id=(1 << settings.SNOWFLAKE_WORKER_ID_BIT_LENGTH) - 1,
+        lease_seconds=settings.SNOWFLAKE_WORKER_ID_LEASE_SECONDS,
+        excluded_ids=[settings.SNOWFLAKE_WORKER_ID],
+        on_change=_on_worker_id_change
+    )
+    worker_id = await _worker_id_register.start()
+    if worker_id < 0:
+        # 不回退到静态 worker_id：停止发放，后台重新申请成功后由 _on_worker_id_change 恢复
+        _on_worker_id_change(-1)
+        return -1
+    configure_worker_id(worker_id)
+    return worker_id
+
+
+async def stop_worker_id_lease():
+    """停止续期并释放 worker_id 租约"""
+    global _worker_id_register
+    if _worker_id_register is not None:
+        await _worker_id_register.stop()
+        _worker_id_register = None
+
+
 def generate_id() -> int:
     """全局函数，用于获取下一个 Snowflake ID"""
     if _id_generator is None:
-        raise RuntimeError("Snowflake ID 生成器未成功初始化。请检查配置和日志。")
-    return _id_generator.next_id()
\ No newline at end of file
+        raise RuntimeError("Snowflake ID 生成器不可用 (未成功初始化或 worker_id 租约无法确认)。请检查配置和日志。")
+    return _id_generator.next_id()
+
+
+def generate_ids(count: int) -> List[int]:
+    """一次性获取 count 个 Snowflake ID (批量插入时使用，只加锁一次)"""
+    if count <= 0:
+        return []
+    if _id_generator is None:
+        raise RuntimeError("Snowflake ID 生成器不可用 (未成功初始化或 worker_id 租约无法确认)。请检查配置和日志。")
+    return _id_generator.next_ids(count)
@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import datetime
 
 from app.modules.base.knowledge.models import DocumentVector # 相对导入
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 
 class DocumentVectorRepository:
     """文档向量 (关系数据库部分) 仓库"""
@@ -27,8 +27,9 @@ class DocumentVectorRepository:
         if not document_vectors:
             return True
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(len(document_vectors)))
         for vector in document_vectors:
-            vector.id = generate_id()
+            vector.id = next(new_ids)
             vector.create_date = now
             vector.last_modify_date = now
         self.db.add_all(document_vectors)
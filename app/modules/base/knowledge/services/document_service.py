@@ -37,6 +37,7 @@ from app.core.utils.json_utils import safe_deserialize, safe_serialize # 导入
 
 # --- 导入核心 Job Persistence 服务 ---
 from app.core.job.services import JobPersistenceService
+from app.core.job.dtos import JobSpec
 # ----------------------------------
 
 logger = logging.getLogger(__name__)
@@ -144,12 +145,8 @@ class DocumentService:
                 message="文档已上传，等待后台解析"
             ))
 
-            # --- 调用 JobPersistenceService 创建任务 ---
-            await self.job_persistence_service.create_job(
-                task_type="knowledge.process_document", # 定义任务类型标识符
-                params_id=document_id                   # 传递文档 ID 作为主要参数
-                # params_data 可以传递额外信息，例如 {'userId': user_id} (如果需要)
-            )
+            # --- 与文档记录在同一事务中提交解析及后续任务 DAG ---
+            await self._enqueue_document_jobs(document_id, user_id, need_vector, need_graph)
             self.logger.info(f"已创建文档处理任务请求: JobType=knowledge.process_document, ParamsId={document_id}")
             # ------------------------------------------
 
@@ -187,11 +184,8 @@ class DocumentService:
                 log_type=int(DocumentLogType.DOCUMENT_PARSING), message="网页导入请求已创建，等待后台处理"
             ))
 
-            # --- 调用 JobPersistenceService 创建任务 ---
-            await self.job_persistence_service.create_job(
-                task_type="knowledge.process_document",
-                params_id=document_id
-            )
+            # --- 与文档记录在同一事务中提交解析及后续任务 DAG ---
+            await self._enqueue_document_jobs(document_id, user_id, need_vector, need_graph)
             self.logger.info(f"已创建网页处理任务请求: JobType=knowledge.process_document, ParamsId={document_id}")
             # ------------------------------------------
 
@@ -204,6 +198,29 @@ class DocumentService:
             logger.error(f"创建网页导入记录或触发任务失败: {e}")
             raise BusinessException("导入网页失败") from e
 
+    async def _enqueue_document_jobs(self, document_id: int, user_id: int, need_vector: bool, need_graph: bool):
+        """
+        声明文档处理任务 DAG：解析完成后向量化与图谱化任务自动变为可调度。
+        不单独提交，由调用方与文档记录一起提交；幂等键防止同一文档重复创建任务。
+        """
+        specs = [JobSpec(
+            key="process", task_type="knowledge.process_document", params_id=document_id,
+            user_id=user_id, idempotency_key=f"knowledge.process_document:{document_id}"
+        )]
+        if need_vector:
+            specs.append(JobSpec(
+                key="vectorize", task_type="knowledge.vectorize_document", params_id=document_id,
+                user_id=user_id, idempotency_key=f"knowledge.vectorize_document:{document_id}",
+                depends_on=["process"]
+            ))
+        if need_graph:
+            specs.append(JobSpec(
+                key="graph", task_type="knowledge.graph_document", params_id=document_id,
+                user_id=user_id, idempotency_key=f"knowledge.graph_document:{document_id}",
+                depends_on=["process"]
+            ))
+        await self.job_persistence_service.enqueue_job_graph(specs, commit=False)
+
     # ... (get_document_async, get_documents_async, get_document_status_async,
     #      get_document_content_async, get_document_logs_async,
     #      get_user_documents_async, delete_document_async 方法与上一版本基本一致，
@@ -400,19 +417,7 @@ class DocumentService:
             ))
             await self.db.commit() # 提交最终结果
             self.logger.info(f"[任务执行] 文档 {document_id} 解析成功。")
-
-             # --- 解析成功后，触发后续任务 ---
-            if document.is_need_vector:
-                 await self.job_persistence_service.create_job(
-                    task_type="knowledge.vectorize_document", params_id=document_id
-                 )
-                 self.logger.info(f"已触发文档向量化任务: ID={document_id}")
-            if document.is_need_graph:
-                 await self.job_persistence_service.create_job(
-                    task_type="knowledge.graph_document", params_id=document_id
-                 )
-                 self.logger.info(f"已触发文档图谱化任务: ID={document_id}")
-            # --------------------------------
+            # 向量化/图谱化任务已在上传时声明为本任务的下游，任务完成时自动释放
 
         except Exception as e:
             logger.error(f"[任务执行] 解析文档 {document_id} 失败: {e}")
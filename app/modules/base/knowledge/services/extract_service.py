@@ -33,6 +33,7 @@ except ImportError:
 
 from app.core.config.settings import settings
 from app.core.exceptions import BusinessException, NotSupportedException
+from app.core.http import HTTP_POOL_DOWNLOADS, http_client_registry
 from app.core.storage.base import StorageProviderType # 从 core 导入
 
 logger = logging.getLogger(__name__)
@@ -70,13 +71,8 @@ class DocumentExtractService(IDocumentExtractService):
     """文档内容提取服务实现"""
 
     def __init__(self):
-        # 创建异步 HTTP 客户端 (推荐使用 httpx)
-        # 可以配置超时、代理等
-        self._http_client = httpx.AsyncClient(
-            headers={"User-Agent": "AIToolkit/1.0 (Python HttpX Client)"},
-            timeout=60.0, # 设置默认超时 60 秒
-            follow_redirects=True # 允许重定向
-        )
+        # 使用共享的下载连接池 (保持连接、允许重定向、默认 User-Agent 与 60 秒超时)，不随服务实例创建
+        self._http_client = http_client_registry.get(HTTP_POOL_DOWNLOADS)
         # logger.debug("DocumentExtractService 初始化完成。")
 
     async def _download_file(self, url: str) -> bytes:
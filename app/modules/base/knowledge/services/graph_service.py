@@ -5,6 +5,7 @@ import json # 导入 json
 
 from app.core.config.settings import settings
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.deferred import deferred_ai_lane
 from app.core.ai.dtos import InputMessage, ChatRoleType
 from app.modules.base.prompts.services import PromptTemplateService # 导入 Service
 from app.core.utils.json_utils import safe_deserialize, safe_serialize
@@ -57,8 +58,8 @@ class KnowledgeGraphService:
             ]
             self.logger.info(f"准备调用 AI 生成知识图谱，内容长度: {len(content)}")
 
-            # 调用 AI 服务
-            ai_result_text = await self.ai_service.chat_completion_async(messages)
+            # 调用 AI 服务 (图谱生成不需要实时结果，经延迟通道批量执行)
+            ai_result_text = await deferred_ai_lane.submit(self.ai_service, messages, scope="knowledge.graph")
             self.logger.debug(f"AI 返回的知识图谱原始结果: {ai_result_text[:500]}...") # 记录部分原始结果
 
             # 解析 AI 返回的 JSON 结果
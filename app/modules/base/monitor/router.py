@@ -0,0 +1,128 @@
+# app/modules/base/monitor/router.py
+import logging
+import secrets
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.config.settings import settings
+from app.core.dtos import ApiResponse
+from app.core.exceptions import ForbiddenException, UnauthorizedException
+from app.core.metrics import metrics_registry
+from app.core.job.metrics import summarize_job_metrics
+from app.core.job.fair import lane_metrics
+from app.core.job.leader import scheduler_coordinator
+from app.core.ai.chat.instrumentation import ai_usage_aggregator, summarize_ai_metrics
+from app.core.resilience import circuit_breaker_snapshot
+from app.api.dependencies import (
+    get_current_active_user_id,
+    get_job_persistence_service,
+    get_optional_user_id_from_token
+)
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from app.core.job.services import JobPersistenceService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/monitor",
+    tags=["Base - Monitor"]
+)
+
+
+def _verify_metrics_access(
+    x_metrics_key: Optional[str] = Header(None),
+    user_id: Optional[int] = Depends(get_optional_user_id_from_token)
+):
+    """指标抓取需提供与 METRICS_ACCESS_KEY 一致的 X-Metrics-Key，否则需管理员令牌"""
+    expected = settings.METRICS_ACCESS_KEY
+    if expected and x_metrics_key and secrets.compare_digest(x_metrics_key, expected):
+        return
+    if user_id is None:
+        raise UnauthorizedException(message="指标访问需要有效的访问密钥或管理员令牌")
+    if user_id not in settings.ADMIN_USER_IDS:
+        raise ForbiddenException()
+
+
+def _require_admin(user_id: int = Depends(get_current_active_user_id)) -> int:
+    """仅允许 ADMIN_USER_IDS 中的用户访问"""
+    if user_id not in settings.ADMIN_USER_IDS:
+        raise ForbiddenException()
+    return user_id
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Prometheus 指标",
+    description="以 Prometheus 文本格式导出本进程的指标 (任务队列等待/执行耗时、结果计数、通道深度，AI 调用耗时、首个片段时间与令牌用量)。",
+    dependencies=[Depends(_verify_metrics_access)]
+)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics_registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get(
+    "/jobs/summary",
+    response_model=ApiResponse[Dict[str, Any]],
+    summary="任务队列汇总",
+    description="汇总任务队列状态：集群维度的按类型/状态统计，以及本进程的等待/执行耗时分位数、重试率、各优先级通道快照与调度器主节点/调度分区状态。",
+    dependencies=[Depends(_require_admin)]
+)
+async def get_jobs_summary(
+    job_service: 'JobPersistenceService' = Depends(get_job_persistence_service)
+):
+    queue = await job_service.get_queue_summary()
+    lanes = await job_service.get_pending_lane_stats()
+    data = {
+        "queue": queue,
+        "lanes": lanes,
+        "dispatch": lane_metrics.snapshot(),
+        "scheduler": scheduler_coordinator.snapshot(),
+        "process": summarize_job_metrics(),
+    }
+    return ApiResponse.success(data=data)
+
+
+@router.get(
+    "/ai/summary",
+    response_model=ApiResponse[Dict[str, Any]],
+    summary="AI 调用汇总",
+    description="本进程按提供者/模型/调用点的 AI 调用耗时与首个片段时间分位数，以及各调用点的令牌用量。",
+    dependencies=[Depends(_require_admin)]
+)
+async def get_ai_summary():
+    return ApiResponse.success(data=summarize_ai_metrics())
+
+
+@router.get(
+    "/ai/usage",
+    response_model=ApiResponse[List[Dict[str, Any]]],
+    summary="AI 用量排行",
+    description="集群维度某日令牌用量最高的用户及其各调用点的调用次数、令牌数、平均耗时与错误数。",
+    dependencies=[Depends(_require_admin)]
+)
+async def get_ai_usage(
+    date: Optional[str] = Query(None, pattern=r"^\d{8}$", description="日期 (yyyyMMdd)，默认今天"),
+    top: int = Query(20, ge=1, le=200, description="返回的用户数")
+):
+    await ai_usage_aggregator.flush_async()
+    data = await ai_usage_aggregator.get_daily_usage_async(date, top)
+    return ApiResponse.success(data=data)
+
+
+@router.get(
+    "/circuit-breakers",
+    response_model=ApiResponse[List[Dict[str, Any]]],
+    summary="熔断器状态",
+    description="本进程各依赖 (AI 提供者、Milvus、对象存储、语音服务) 熔断器的状态、连续失败次数与剩余冷却时间。",
+    dependencies=[Depends(_require_admin)]
+)
+async def get_circuit_breakers():
+    return ApiResponse.success(data=circuit_breaker_snapshot())
@@ -13,17 +13,30 @@ from app.modules.base.prompts.dtos import (
     PromptTemplateResponseDto # 导入 DTO
 )
 from app.core.redis.service import RedisService
+from app.core.cache import TwoTierCache
 from app.core.exceptions import BusinessException, NotFoundException
 
 logger = logging.getLogger(__name__)
 
+# 模板缓存 (进程内 LRU + Redis)，更新时通过 pub/sub 通知所有节点失效
+_template_cache = TwoTierCache(
+    namespace="prompt_template",
+    redis_key_prefix="PROMPT_TEMPLATE:",
+    local_max_size=512,
+    local_ttl_seconds=600,
+    redis_ttl_seconds=3600,
+    negative_ttl_seconds=30, # 不存在的 Key 短暂缓存，避免反复查库
+    serializer=lambda dto: dto.model_dump(by_alias=True),
+    deserializer=lambda data: PromptTemplateResponseDto(**data),
+)
+
 class PromptTemplateService:
     """
     提示词模板服务，处理业务逻辑和缓存。
     对应 C# 的 IPromptTemplateService 实现。
     """
     REDIS_KEY_PREFIX = "PROMPT_TEMPLATE:"
-    REDIS_CACHE_DURATION_SECONDS = 60 # 缓存 1 分钟
+    cache: TwoTierCache = _template_cache
 
     def __init__(
         self,
@@ -74,6 +87,7 @@ class PromptTemplateService:
         try:
             new_id = await self.repository.add_async(entity)
             await self.db.commit()
+            await self.cache.invalidate(entity.template_key)
             logger.info(f"成功添加提示词模板，ID: {new_id}, Key: {entity.template_key}")
             return new_id
         except Exception as e:
@@ -106,14 +120,8 @@ class PromptTemplateService:
             if other_template and other_template.id != request_dto.id:
                 raise BusinessException(f"模板 Key '{request_dto.template_key}' 已被其他模板使用")
 
-        # 3. 清理缓存 (先于数据库更新)
-        redis_key_old = f"{self.REDIS_KEY_PREFIX}{existing_entity.template_key}"
-        redis_key_new = f"{self.REDIS_KEY_PREFIX}{request_dto.template_key}"
-        await self.redis_service.key_delete_async(redis_key_old)
-        if redis_key_old != redis_key_new: # 如果 key 也变了，新 key 的缓存也要删（以防万一）
-            await self.redis_service.key_delete_async(redis_key_new)
-        logger.debug(f"已删除提示词模板缓存: {redis_key_old}, {redis_key_new}")
-
+        # 3. 记录需要失效的缓存 Key (提交后统一失效，避免并发读取把旧值写回缓存)
+        stale_keys = {existing_entity.template_key, request_dto.template_key}
 
         # 4. 更新实体字段
         update_data = request_dto.model_dump(exclude={'id'}) # 获取需要更新的字段
@@ -133,6 +141,8 @@ class PromptTemplateService:
             # ---------------------------------
             await self.repository.update_async(existing_entity) # 仍然调用 repo 方法
             await self.db.commit()
+            await self.cache.invalidate(*stale_keys)
+            logger.debug(f"已失效提示词模板缓存: {stale_keys}")
             logger.info(f"成功更新提示词模板，ID: {request_dto.id}, Key: {request_dto.template_key}")
             return True
         except Exception as e:
@@ -153,33 +163,16 @@ class PromptTemplateService:
 
     async def get_by_key_async(self, template_key: str) -> PromptTemplateResponseDto:
         """
-        根据 Key 获取提示词模板，优先从缓存读取。
+        根据 Key 获取提示词模板，优先从两级缓存 (本地 LRU -> Redis) 读取。
         """
-        redis_key = f"{self.REDIS_KEY_PREFIX}{template_key}"
-        cached_dto_dict = await self.redis_service.get_async(redis_key)
-        if cached_dto_dict:
-            try:
-                cached_dto = PromptTemplateResponseDto(**cached_dto_dict)
-                logger.debug(f"提示词模板缓存命中: {template_key}")
-                return cached_dto
-            except Exception as e:
-                 logger.warning(f"反序列化模板缓存失败 (Key: {template_key}): {e}. 将从数据库重新获取。")
-
-        logger.debug(f"提示词模板缓存未命中: {template_key}. 从数据库查询...")
-        db_entity = await self.repository.get_by_key_async(template_key)
-        if not db_entity:
-            raise NotFoundException(resource_type="提示词模板", resource_id=template_key)
-
-        response_dto = self._map_entity_to_dto(db_entity)
-
-        # 存入缓存
-        await self.redis_service.set_async(
-            redis_key,
-            response_dto.model_dump(by_alias=True), # 存储转换后的 DTO 字典
-            expiry_seconds=self.REDIS_CACHE_DURATION_SECONDS
-        )
-        logger.debug(f"提示词模板已存入缓存: {template_key}, 有效期 {self.REDIS_CACHE_DURATION_SECONDS} 秒")
+        async def _load() -> Optional[PromptTemplateResponseDto]:
+            logger.debug(f"提示词模板缓存未命中: {template_key}. 从数据库查询...")
+            db_entity = await self.repository.get_by_key_async(template_key)
+            return self._map_entity_to_dto(db_entity) if db_entity else None
 
+        response_dto = await self.cache.get_or_load(template_key, _load)
+        if response_dto is None:
+            raise NotFoundException(resource_type="提示词模板", resource_id=template_key)
         return response_dto
 
     async def get_content_by_key_async(self, template_key: str) -> str:
@@ -0,0 +1,37 @@
+# app/modules/base/sse/router.py
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+
+from app.core.sse import resume_sse_response
+from app.api.dependencies import get_current_active_user_id
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/sse",
+    tags=["Base - SSE"]
+)
+
+
+@router.get(
+    "/resume/{stream_id}",
+    summary="续接流式响应",
+    description=(
+        "断线后续接流式响应 (流ID见原响应头 X-Stream-Id 或事件ID中冒号前的部分)：补发 Last-Event-ID 之后的事件，"
+        "再继续接收实时事件，不会重新发起生成。未提供 Last-Event-ID 时从头补发。"
+    )
+)
+async def resume_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id_query: Optional[str] = Query(None, alias="lastEventId", description="不便设置请求头时可通过查询参数传递"),
+    user_id: int = Depends(get_current_active_user_id)
+):
+    """
+    续接流式响应
+
+    *需要有效的登录令牌，只能续接自己发起的流*
+    """
+    return await resume_sse_response(stream_id, user_id, last_event_id or last_event_id_query)
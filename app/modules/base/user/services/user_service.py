@@ -56,16 +56,11 @@ class UserService:
         limit_key = f"Limit:{cache_key}"
 
         # 检查发送频率限制
-        limit_count_str = await self.redis_service.get_async(limit_key)
-        limit_count = int(limit_count_str) if limit_count_str else 0
+        limit_count = await self.redis_service.get_counter_async(limit_key)
 
         if limit_count > 5: # 一天不能超过 5 次
             raise BusinessException("验证码发送过于频繁，请稍后再试")
 
-        # 增加频率计数 (原子操作)
-        # 使用 INCR 并设置过期时间 (24 小时)
-        await self.redis_service.set_string_increment_async(limit_key, 1, expiry_seconds=24 * 60 * 60)
-
         # 生成随机四位验证码
         verifi_code = f"{random.randint(0, 9)}{random.randint(0, 9)}{random.randint(0, 9)}{random.randint(0, 9)}"
         logger.debug(f"为场景 {cache_key} 生成的验证码: {verifi_code}") # 模拟发送，打印到控制台
@@ -79,9 +74,15 @@ class UserService:
         #     return False
         # ------------------------------------------
 
-        # 将验证码存入 Redis，5 分钟有效
+        # 在同一事务中增加频率计数 (24 小时过期) 并将验证码存入 Redis (5 分钟有效)
         # C# 使用了 SetAsync<string>，这里也直接存字符串
-        await self.redis_service.set_async(cache_key, verifi_code, expiry_seconds=5 * 60)
+        try:
+            async with self.redis_service.transaction() as batch:
+                batch.incr(limit_key, 1, expiry_seconds=24 * 60 * 60)
+                batch.set(cache_key, verifi_code, expiry_seconds=5 * 60)
+        except Exception as e:
+            logger.error(f"保存验证码失败 ({cache_key}): {e}")
+            raise BusinessException("验证码发送失败，请稍后再试")
 
         return True
 
@@ -7,7 +7,9 @@ from typing import List, Optional, Dict, Any
 import httpx
 
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.completion_cache import completion_cache
 from app.core.ai.dtos import ChatRoleType, InputMessage
+from app.core.ai.image_preprocess import image_message_async
 from app.core.config.settings import Settings
 from app.modules.base.prompts.services import PromptTemplateService
 from app.modules.tools.customerservice.services.chat_tools_service import ChatToolsService
@@ -61,15 +63,17 @@ class ChatAIService:
         self,
         user_id: int,
         history: List[ChatHistoryDto],
-        message: str
+        message: str,
+        summary: Optional[str] = None
     ) -> IntentRecognitionResultDto:
         """
         根据会话上下文分析用户意图
         
         Args:
             user_id: 用户ID
-            history: 会话上下文
+            history: 会话上下文 (不含已并入摘要的消息)
             message: 用户消息
+            summary: 会话较早内容的摘要提示词
             
         Returns:
             意图识别结果
@@ -83,12 +87,14 @@ class ChatAIService:
             if not system_prompt:
                 system_prompt = "你是一个智能客服助手，请分析用户的意图并提取关键信息。"
             
-            messages.append(InputMessage(ChatRoleType.SYSTEM, system_prompt))
-            messages.append(InputMessage(ChatRoleType.SYSTEM, f"敏感词包括：{self.sensitive_words}"))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, f"敏感词包括：{self.sensitive_words}"))
+            if summary:
+                messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, summary))
             
             # 添加历史记录，帮助AI更好地理解上下文
             if history and len(history) > 0:
-                messages.append(InputMessage(ChatRoleType.USER, "###下面是对话历史信息"))
+                messages.append(InputMessage.from_text(ChatRoleType.USER, "###下面是对话历史信息"))
                 history_text = ""
                 for item in history:
                     if item.role == ChatRoleType.USER:
@@ -98,13 +104,15 @@ class ChatAIService:
                         if item.intent and item.call_datas:
                             history_msg += f" [此回复通过工具查询，涉及的实体ID: {item.call_datas}]"
                         history_text += f"{history_msg}\n"
-                messages.append(InputMessage(ChatRoleType.USER, history_text))
+                messages.append(InputMessage.from_text(ChatRoleType.USER, history_text))
             
             # 添加当前用户消息
-            messages.append(InputMessage(ChatRoleType.USER, f"###用户当前问题：{message}"))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, f"###用户当前问题：{message}"))
             
-            # 调用AI服务分析
-            response = await self.ai_service.chat_completion_async(messages)
+            # 调用AI服务分析 (常见问题在相同上下文下结果一致，启用补全缓存)
+            response = await completion_cache.chat_completion_async(
+                self.ai_service, messages, scope="customerservice.intent", ttl_seconds=3600
+            )
             
             # 解析结果
             try:
@@ -127,12 +135,13 @@ class ChatAIService:
                 id_datas=None
             )
     
-    async def analyze_image_async(self, image_url: str) -> ImageAnalysisResultDto:
+    async def analyze_image_async(self, image_url: str, image_bytes: Optional[bytes] = None) -> ImageAnalysisResultDto:
         """
         分析图片内容
         
         Args:
             image_url: 图片URL
+            image_bytes: 图片原始内容 (已持有时传入，预处理时无需再下载)
             
         Returns:
             图片分析结果
@@ -146,14 +155,15 @@ class ChatAIService:
             if not system_prompt:
                 system_prompt = "请分析图片内容，提供详细描述和标签。"
                 
-            messages.append(InputMessage(ChatRoleType.SYSTEM, system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
             
             # 发送图片给模型
-            messages.append(InputMessage.from_text_and_image_urls(
-    ChatRoleType.USER,
-    "请描述图片.",
-    [image_url]
-))
+            messages.append(await image_message_async(
+                ChatRoleType.USER,
+                "请描述图片.",
+                [image_bytes or image_url],
+                "customerservice.image_analysis"
+            ))
             
             # 调用AI服务分析图片内容
             response = await self.ai_service.chat_completion_async(messages)
@@ -177,16 +187,18 @@ class ChatAIService:
         query: str,
         history: List[ChatHistoryDto],
         intent: str,
-        context: Optional[str] = None
+        context: Optional[str] = None,
+        summary: Optional[str] = None
     ) -> str:
         """
         使用AI生成回复
         
         Args:
             query: 用户查询
-            history: 历史记录
+            history: 历史记录 (不含已并入摘要的消息)
             intent: 识别的意图
             context: 函数工具的调用结果
+            summary: 会话较早内容的摘要提示词
             
         Returns:
             AI回复
@@ -199,10 +211,10 @@ class ChatAIService:
             if not system_prompt:
                 system_prompt = "你是一个智能客服助手，请基于提供的知识回答用户的问题。"
                 
-            messages.append(InputMessage(ChatRoleType.SYSTEM, system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
             
             # 添加敏感词
-            messages.append(InputMessage(ChatRoleType.SYSTEM, f"敏感词包括：{self.sensitive_words}"))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, f"敏感词包括：{self.sensitive_words}"))
             
             # 添加知识库知识的限定
             knowledge_prompt = ""
@@ -215,18 +227,22 @@ class ChatAIService:
                 if not knowledge_prompt:
                     knowledge_prompt = "注意：我没有查询到相关的知识库信息，以下回答基于我的通用知识。"
                     
-            messages.append(InputMessage(ChatRoleType.SYSTEM, knowledge_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, knowledge_prompt))
+            
+            # 添加较早对话的摘要
+            if summary:
+                messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, summary))
             
             # 添加历史对话
             if history and len(history) > 0:
                 for item in history:
                     if item.role == ChatRoleType.USER:
-                        messages.append(InputMessage(ChatRoleType.USER, item.content))
+                        messages.append(InputMessage.from_text(ChatRoleType.USER, item.content or ""))
                     elif item.role == ChatRoleType.ASSISTANT:
-                        messages.append(InputMessage(ChatRoleType.ASSISTANT, item.content))
+                        messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, item.content or ""))
             
             # 添加用户查询
-            messages.append(InputMessage(ChatRoleType.USER, query))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, query))
             
             # 调用AI服务生成回复
             return await self.ai_service.chat_completion_async(messages)
@@ -12,6 +12,7 @@ from app.core.exceptions import BusinessException, NotFoundException
 from app.core.config.settings import Settings
 from app.core.dtos import PagedResultDto
 from app.core.ai.dtos import ChatRoleType
+from app.core.ai.summary import ConversationSummarizer
 
 from app.modules.tools.customerservice.entities.chat import ChatSession, ChatSessionStatus, ChatHistory, ChatConnection
 from app.modules.tools.customerservice.repositories.iface.chat_session_repository import IChatSessionRepository
@@ -25,6 +26,9 @@ from app.modules.tools.customerservice.services.dtos.chat_dto import (
     ChatMessageResultDto
 )
 
+# 会话较早的消息折叠为滚动摘要
+_summarizer = ConversationSummarizer("customerservice", ChatHistory, ChatHistory.session_id)
+
 class ChatService(IChatService):
     """智能客服服务实现"""
     
@@ -298,6 +302,9 @@ class ChatService(IChatService):
             history = await self.history_repository.get_recent_history_async(
                 request.session_id, self.max_context_messages * 2
             )
+            summary = await _summarizer.get_async(request.session_id)
+            history = _summarizer.unsummarized(summary, history)
+            summary_prompt = _summarizer.summary_prompt(summary)
             history_dtos = [
                 ChatHistoryDto(
                     id=h.id,
@@ -323,7 +330,8 @@ class ChatService(IChatService):
             intent_result = await self.chat_ai_service.analysis_intent_async(
                 user_id,
                 history_dtos,
-                request.content or ""
+                request.content or "",
+                summary_prompt
             )
             call_datas = "" if not intent_result.id_datas else ",".join(intent_result.id_datas)
             
@@ -336,7 +344,8 @@ class ChatService(IChatService):
                 user_message.content or "",
                 history_dtos,
                 intent_result.intent or "",
-                intent_result.context
+                intent_result.context,
+                summary_prompt
             )
             
             # 记录AI回复
@@ -348,6 +357,10 @@ class ChatService(IChatService):
                 call_datas=call_datas,
             )
             await self.history_repository.add_async(assistant_message)
+            _summarizer.maybe_schedule_fold(
+                self.chat_ai_service.ai_service, request.session_id, history + [user_message, assistant_message],
+                window_limit=self.max_context_messages * 2
+            )
             
             # 更新会话最后修改时间
             session.last_modify_date = datetime.now()
@@ -393,11 +406,15 @@ class ChatService(IChatService):
             file_key = f"customerservice/chat/{session_id}/{datetime.now().strftime('%Y%m%d%H%M%S')}{image.filename}"
             content_type = image.content_type or "application/octet-stream"
             
+            # 先读取图片内容供分析使用 (预处理时无需从存储再下载一次)
+            image_bytes = await image.read()
+            await image.seek(0)
+
             # 上传图片
             image_url = await self.storage_service.upload_async(image.file, file_key, content_type)
             
             # 分析图片内容
-            image_analysis = await self.chat_ai_service.analyze_image_async(image_url)
+            image_analysis = await self.chat_ai_service.analyze_image_async(image_url, image_bytes)
             
             # 记录用户图片消息
             user_message = ChatHistory(
@@ -412,6 +429,9 @@ class ChatService(IChatService):
             history = await self.history_repository.get_recent_history_async(
                 session_id, self.max_context_messages * 2
             )
+            summary = await _summarizer.get_async(session_id)
+            history = _summarizer.unsummarized(summary, history)
+            summary_prompt = _summarizer.summary_prompt(summary)
             history_dtos = [
                 ChatHistoryDto(
                     id=h.id,
@@ -429,7 +449,8 @@ class ChatService(IChatService):
             intent_result = await self.chat_ai_service.analysis_intent_async(
                 user_id,
                 history_dtos,
-                f"我发送了一张图片：{image_analysis.description}"
+                f"我发送了一张图片：{image_analysis.description}",
+                summary_prompt
             )
             call_datas = "" if not intent_result.id_datas else ",".join(intent_result.id_datas)
             
@@ -445,7 +466,8 @@ class ChatService(IChatService):
                 prompt,
                 history_dtos,
                 intent_result.intent or "",
-                intent_result.context
+                intent_result.context,
+                summary_prompt
             )
             
             # 记录AI回复
@@ -457,6 +479,10 @@ class ChatService(IChatService):
                 call_datas=call_datas,
             )
             await self.history_repository.add_async(assistant_message)
+            _summarizer.maybe_schedule_fold(
+                self.chat_ai_service.ai_service, session_id, history + [assistant_message],
+                window_limit=self.max_context_messages * 2
+            )
             
             # 更新会话最后修改时间
             session.last_modify_date = datetime.now()
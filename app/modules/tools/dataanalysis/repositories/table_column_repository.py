@@ -4,7 +4,7 @@ from sqlalchemy import select, delete
 from typing import List, Optional
 import datetime
 
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 from app.modules.tools.dataanalysis.models import TableColumn
 
 class TableColumnRepository:
@@ -59,8 +59,9 @@ class TableColumnRepository:
         
         # 设置雪花ID、创建和修改时间
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(len(table_columns)))
         for column in table_columns:
-            column.id = generate_id()
+            column.id = next(new_ids)
             column.create_date = now
             column.last_modify_date = now
         
@@ -1,20 +1,18 @@
 # app/modules/tools/dataanalysis/router.py
 import logging
-import uuid
-import json
-from typing import List, Optional, Dict, Any, Union, Tuple
+from typing import Callable, List, Optional, Dict, Any, Union, Tuple
 from fastapi import (
     APIRouter, Depends, UploadFile, File, Form, Body, Query, Path, 
     HTTPException, BackgroundTasks, Request, Response
 )
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi.responses import HTMLResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-import asyncio
 
 from app.core.utils import json_utils
 from app.core.dtos import ApiResponse, BaseIdRequestDto, BasePageRequestDto, PagedResultDto
 from app.core.exceptions import BusinessException
 from app.core.database.session import get_db
+from app.core.sse import sse_response
 from app.core.job.decorators import job_endpoint
 from app.core.storage.base import IStorageService
 from app.core.ai.chat.base import IChatAIService
@@ -22,7 +20,9 @@ from app.core.utils.snowflake import generate_id
 
 from app.api.dependencies import (
     get_chatai_service_from_state,
+    get_prompt_template_repository,
     get_prompt_template_service,
+    get_redis_service_from_state,
     get_storage_service_from_state,
     get_current_active_user_id,
     get_job_persistence_service
@@ -168,6 +168,21 @@ def _get_data_analysis_service(
 
     )
 
+def _get_data_analysis_service_factory(
+    ai_service: IChatAIService = Depends(get_chatai_service_from_state),
+    redis_service = Depends(get_redis_service_from_state)
+) -> Callable[[AsyncSession], "DataAnalysisService"]:
+    """返回在给定数据库会话中创建 DataAnalysisService 的工厂 (可续接流在独立会话中生成)"""
+    def create(db: AsyncSession) -> "DataAnalysisService":
+        prompt_template_service = get_prompt_template_service(db, get_prompt_template_repository(db), redis_service)
+        return _get_data_analysis_service(
+            db,
+            _get_ai_analysis_service(ai_service, prompt_template_service),
+            _get_visualiz_html_service(),
+            None
+        )
+    return create
+
 def _get_data_file_processor(
     db: AsyncSession = Depends(get_db),
     job_persistence_service: JobPersistenceService = Depends(get_job_persistence_service)
@@ -330,7 +345,7 @@ async def process_user_query_stream(
     response: Response,
     query_dto: UserQueryDto = Body(...),
     current_user_id: int = Depends(get_current_active_user_id),
-    data_analysis_service: "DataAnalysisService" = Depends(_get_data_analysis_service)
+    service_factory: Callable[[AsyncSession], "DataAnalysisService"] = Depends(_get_data_analysis_service_factory)
 ):
     """
     流式处理用户查询
@@ -341,48 +356,13 @@ async def process_user_query_stream(
     Returns:
         流式响应
     """
-    # 设置响应头
-    response.headers["Content-Type"] = "text/event-stream"
-    response.headers["Cache-Control"] = "no-cache"
-    response.headers["Connection"] = "keep-alive"
-    
-    # 创建事件ID
-    event_id = str(uuid.uuid4())
-    
-    # 创建响应流
-    async def event_generator():
-        try:
-            # 发送开始事件
-            yield f"id: {event_id}\nevent: start\ndata: {json.dumps({'message': '开始生成回复'})}\n\n"
-            
-            # 处理回调函数
-            async def on_chunk_received(chunk: str):
-                # 发送数据块
-                yield f"id: {event_id}\nevent: chunk\ndata: {chunk}\n\n"
-            
-            # 使用数据分析服务处理流式查询
-            final_reply = await data_analysis_service.process_user_query_stream_async(
-                current_user_id, 
-                query_dto,
-                on_chunk_received
-            )
-            
-            # 发送完成事件
-            yield f"id: {event_id}\nevent: done\ndata: {json.dumps(final_reply)}\n\n"
-        
-        except asyncio.CancelledError:
-            # 用户取消请求
-            yield f"id: {event_id}\nevent: canceled\ndata: 请求已取消\n\n"
-        
-        except Exception as ex:
-            # 发生错误
-            yield f"id: {event_id}\nevent: error\ndata: {str(ex)}\n\n"
-        
-        finally:
-            # 发送结束事件
-            yield f"id: {event_id}\nevent: end\ndata: \n\n"
-    
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    # 生成可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: service_factory(db).process_user_query_stream_async(current_user_id, query_dto),
+        "dataanalysis.query",
+        start_data={"message": "开始生成回复"},
+        user_id=current_user_id
+    )
 
 @router.post("/chat/sessions/conversation")
 async def process_user_query(
@@ -1,7 +1,7 @@
 # app/modules/dataanalysis/services/ai_analysis_service.py
 import json
 import logging
-from typing import List, Optional, Dict, Any
+from typing import AsyncGenerator, List, Dict
 import re
 from app.core.ai.chat.base import IChatAIService
 from app.core.utils import json_utils
@@ -176,19 +176,16 @@ class AIAnalysisService:
                 message=f"处理查询时出错: {str(ex)}"
             )
     
-    async def get_streaming_response_async(self, query: str, tables: List[DataTable],
-            on_chunk_received: callable, cancellation_token: Optional[Any] = None) -> str:
+    async def get_streaming_response_async(self, query: str, tables: List[DataTable]) -> AsyncGenerator[str, None]:
         """
         启动流式响应
         
         Args:
             query: 用户查询
             tables: 数据表列表
-            on_chunk_received: 接收到数据块时的回调函数
-            cancellation_token: 取消令牌
         
-        Returns:
-            完整的AI回复
+        Yields:
+            AI回复的数据块
         """
         try:
             # 第一步：预筛选可能相关的表
@@ -214,10 +211,9 @@ class AIAnalysisService:
             
             messages = [system_message1, system_message2]
             
-            # 调用流式API
-            return await self.ai_service.streaming_chat_completion_async(
-                messages, on_chunk_received, cancellation_token
-            )
+            # 调用流式API，逐块输出
+            async for chunk in self.ai_service.streaming_chat_completion_async(messages):
+                yield chunk
         except Exception as ex:
             print(f"获取流式响应失败: {str(ex)}")
             raise
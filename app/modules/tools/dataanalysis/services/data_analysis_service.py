@@ -3,9 +3,10 @@ import logging
 import json
 import datetime
 import os
-from typing import List, Dict, Any, Optional, Tuple, Callable, Union
+from typing import AsyncGenerator, List, Dict, Tuple, Union
 from app.core.exceptions import BusinessException,UnauthorizedException
 from app.core.dtos import ApiResponse, PagedResultDto
+from app.core.sse import SSEEvent
 from app.modules.tools.dataanalysis.models import (
     AnalysisSession,
     Conversation,
@@ -559,21 +560,17 @@ class DataAnalysisService:
     async def process_user_query_stream_async(
         self, 
         user_id: int, 
-        query_dto: UserQueryDto,
-        on_chunk_received: Callable[[str], None],
-        cancellation_token: Optional[Any] = None
-    ) -> str:
+        query_dto: UserQueryDto
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
         流式处理用户查询
         
         Args:
             user_id: 用户ID
             query_dto: 查询DTO
-            on_chunk_received: 接收到数据块时的回调函数
-            cancellation_token: 取消令牌
         
-        Returns:
-            完整的AI回复
+        Yields:
+            AI回复的数据块 (chunk 事件)，保存后为包含完整回复的 done 事件
         """
         # 获取会话
         session = await self.session_repository.get_by_id_async(query_dto.session_id)
@@ -599,12 +596,10 @@ class DataAnalysisService:
             raise BusinessException("当前用户没有可用的数据表，请先上传数据")
         
         # 调用OpenAI流式API
-        response_content = await self.ai_analysis_service.get_streaming_response_async(
-            query_dto.query or "", 
-            tables, 
-            on_chunk_received, 
-            cancellation_token
-        )
+        response_content = ""
+        async for chunk in self.ai_analysis_service.get_streaming_response_async(query_dto.query or "", tables):
+            response_content += chunk
+            yield SSEEvent("chunk", chunk)
         
         # 保存完整响应
         conversation.ai_response = response_content
@@ -614,7 +609,7 @@ class DataAnalysisService:
         session.last_modify_date = datetime.datetime.now()
         await self.session_repository.update_async(session)
         
-        return response_content
+        yield SSEEvent("done", json.dumps(response_content, ensure_ascii=False))
     
     async def get_session_history_async(
         self, 
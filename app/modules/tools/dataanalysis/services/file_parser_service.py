@@ -10,6 +10,8 @@ import logging
 
 
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.completion_cache import completion_cache
+from app.core.ai.dtos import ChatRoleType, InputMessage
 from app.modules.tools.dataanalysis.models import TableColumn
 
 class FileParserService:
@@ -205,10 +207,13 @@ class FileParserService:
             
             # 调用AI服务
             ai_messages = [
-                {"role": "system", "content": "你是一个专业的数据库命名专家。"},
-                {"role": "user", "content": prompt}
+                InputMessage.from_text(ChatRoleType.SYSTEM, "你是一个专业的数据库命名专家。"),
+                InputMessage.from_text(ChatRoleType.USER, prompt)
             ]
-            response = await self.ai_service.chat_completion_async(ai_messages)
+            # 相同的列名与类型得到相同的转换结果，启用补全缓存；未命中时经延迟通道批量执行
+            response = await completion_cache.chat_completion_async(
+                self.ai_service, ai_messages, scope="dataanalysis.column_names", deferred=True
+            )
             
             try:
                 # 提取JSON部分 (AI回复可能包含额外文本)
@@ -231,6 +236,7 @@ class FileParserService:
                                 break
             except Exception as ex:
                 print(f"解析AI响应失败: {str(ex)}")
+                await completion_cache.invalidate_async(self.ai_service, ai_messages, "dataanalysis.column_names")
                 # 如果解析失败，使用默认命名规则
                 for column in columns:
                     column.english_name = self._clean_column_name(column.original_name)
@@ -104,7 +104,8 @@ class FileUploadService:
             job_persistence_service = JobPersistenceService(db=self.upload_file_repository.db)
             await job_persistence_service.create_job(
                     task_type="dataanalysis.process_file",  # 使用已定义的任务类型标识符
-                    params_id=upload_file.id        # 传递文件 ID 作为主要参数
+                    params_id=upload_file.id,       # 传递文件 ID 作为主要参数
+                    user_id=user_id                 # 按用户公平调度
                 )
             # 返回上传结果（异步处理将由调度任务完成）
             return FileUploadResultDto(
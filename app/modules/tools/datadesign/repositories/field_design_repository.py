@@ -5,7 +5,7 @@ from sqlalchemy.future import select
 from sqlalchemy import delete, update
 
 from app.modules.tools.datadesign.entities import FieldDesign
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 
 class FieldDesignRepository:
     """字段设计仓储实现"""
@@ -89,11 +89,12 @@ class FieldDesignRepository:
             bool: 操作结果
         """
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for field_item in fields if not field_item.id)))
         for field_item in fields:
             # Assuming ID is pre-assigned if needed, or let DB assign if autoincrement
             # If ID is from snowflake, it should be assigned before calling this
             if not field_item.id: # Ensure ID is set if not auto-incrementing PK from DB
-                 field_item.id = generate_id()
+                 field_item.id = next(new_ids)
             field_item.create_date = now
             field_item.last_modify_date = now
         
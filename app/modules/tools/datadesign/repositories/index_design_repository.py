@@ -5,7 +5,7 @@ from sqlalchemy.future import select
 from sqlalchemy import delete, update
 
 from app.modules.tools.datadesign.entities import IndexDesign
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 
 class IndexDesignRepository:
     """索引设计仓储实现"""
@@ -89,9 +89,10 @@ class IndexDesignRepository:
             bool: 操作结果
         """
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for index_item in indexes if not index_item.id)))
         for index_item in indexes:
             if not index_item.id: # Ensure ID is set
-                 index_item.id = generate_id()
+                 index_item.id = next(new_ids)
             index_item.create_date = now
             index_item.last_modify_date = now
         
@@ -5,7 +5,7 @@ from sqlalchemy.future import select
 from sqlalchemy import delete, update
 
 from app.modules.tools.datadesign.entities import IndexField, IndexDesign # IndexDesign for DeleteByTaskIdAsync
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 
 class IndexFieldRepository:
     """索引字段仓储实现"""
@@ -75,9 +75,10 @@ class IndexFieldRepository:
             bool: 操作结果
         """
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for item in index_fields if not item.id)))
         for item in index_fields:
             if not item.id: # Ensure ID is set
-                 item.id = generate_id()
+                 item.id = next(new_ids)
             item.create_date = now
             item.last_modify_date = now
         
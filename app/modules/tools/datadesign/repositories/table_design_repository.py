@@ -5,7 +5,7 @@ from sqlalchemy.future import select
 from sqlalchemy import delete, update
 
 from app.modules.tools.datadesign.entities import TableDesign
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 
 class TableDesignRepository:
     """表设计仓储实现"""
@@ -75,9 +75,10 @@ class TableDesignRepository:
             bool: 操作结果
         """
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for table_item in tables if not table_item.id)))
         for table_item in tables:
             if not table_item.id: # Ensure ID is set
-                 table_item.id = generate_id()
+                 table_item.id = next(new_ids)
             table_item.create_date = now
             table_item.last_modify_date = now
         
@@ -5,7 +5,7 @@ from sqlalchemy.future import select
 from sqlalchemy import delete, update, or_
 
 from app.modules.tools.datadesign.entities import TableRelation
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 
 class TableRelationRepository:
     """表关系仓储实现"""
@@ -91,9 +91,10 @@ class TableRelationRepository:
             bool: 操作结果
         """
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for rel_item in relations if not rel_item.id)))
         for rel_item in relations:
             if not rel_item.id: # Ensure ID is set
-                 rel_item.id = generate_id()
+                 rel_item.id = next(new_ids)
             rel_item.create_date = now
             rel_item.last_modify_date = now
         
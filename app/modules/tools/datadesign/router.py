@@ -1,24 +1,23 @@
-import asyncio
-import json
 import logging
-import uuid # For generating unique event IDs
-from typing import Dict, List, AsyncGenerator, Optional, Callable, Any # Ensure Any is imported
+from typing import Callable, List
 
 from fastapi import (
     APIRouter, Depends, UploadFile, Form, Request, Response as FastAPIResponse, HTTPException, status
 )
-from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx # For AI service client
 
 # 核心依赖
 from app.core.database.session import get_db
 from app.core.config.settings import settings
+from app.core.sse import sse_response
 
 from app.api.dependencies import (
     get_current_active_user_id,
-    get_http_client_from_state,
+    get_ai_http_client_from_state,
+    get_prompt_template_repository,
     get_prompt_template_service,
+    get_redis_service_from_state,
   
     # RateLimiter can be added if needed
 )
@@ -46,6 +45,7 @@ from .dtos import (
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from app.core.ai.chat.base import IChatAIService
+    from app.core.redis.service import RedisService
 
     from .services.data_design_service import DataDesignService
     from .services.data_design_ai_service import DataDesignAIService
@@ -73,7 +73,7 @@ router = APIRouter(
 # --- 内部依赖项工厂：获取 DataDesignService 实例 ---
 def _get_data_design_service(
     db: AsyncSession = Depends(get_db),
-    http_client: httpx.AsyncClient = Depends(get_http_client_from_state),
+    http_client: httpx.AsyncClient = Depends(get_ai_http_client_from_state),
     prompt_template_service: 'PromptTemplateService' = Depends(get_prompt_template_service)
 ) -> 'DataDesignService':
     """内部依赖项：创建并返回 DataDesignService 及其所有内部依赖。"""
@@ -143,23 +143,15 @@ def _get_data_design_service(
     return data_design_service_instance
 
 
-# --- SSE Helper ---
-async def send_sse_event(event_id: str, event_type: str, data: Any) -> str:
-    """
-    Helper to format an SSE event.
-    Data will be JSON serialized if it's not already a string.
-    """
-    if not isinstance(data, str):
-        try:
-            # ensure_ascii=False is important for non-Latin characters
-            data_str = json.dumps(data, ensure_ascii=False)
-        except TypeError as e:
-            logger.error(f"SSE data serialization error for event type {event_type}: {e}. Data: {data}")
-            data_str = json.dumps({"error": "Serialization failed", "details": str(e)}, ensure_ascii=False)
-    else:
-        data_str = data
-    
-    return f"id: {event_id}\nevent: {event_type}\ndata: {data_str}\n\n"
+def _get_data_design_service_factory(
+    http_client: httpx.AsyncClient = Depends(get_ai_http_client_from_state),
+    redis_service: 'RedisService' = Depends(get_redis_service_from_state)
+) -> Callable[[AsyncSession], 'DataDesignService']:
+    """内部依赖项：返回在给定数据库会话中创建 DataDesignService 的工厂 (可续接流在独立会话中生成)"""
+    def create(db: AsyncSession) -> 'DataDesignService':
+        prompt_template_service = get_prompt_template_service(db, get_prompt_template_repository(db), redis_service)
+        return _get_data_design_service(db, http_client, prompt_template_service)
+    return create
 
 
 # --- API Endpoints ---
@@ -304,83 +296,11 @@ async def get_table_designs(
 # endregion
 
 # region 设计聊天 (SSE)
-# Helper for SSE streaming logic with asyncio.Queue
-async def sse_streamer(
-    event_id_prefix: str,
-    initial_message: Dict[str, Any],
-    service_call_coro: asyncio.Task, # The coroutine of the service method call
-    queue: asyncio.Queue,
-    logger_instance: logging.Logger # Pass logger explicitly
-):
-    event_id = f"{event_id_prefix}_{uuid.uuid4().hex}"
-    try:
-        yield await send_sse_event(event_id, "start", initial_message)
-        
-        while True:
-            # Wait for either an item in the queue or the service_task to complete
-            # Important: queue.get() is a coroutine and needs to be awaited.
-            # We wrap it in a task to use with asyncio.wait
-            get_item_task = asyncio.create_task(queue.get())
-            done, pending = await asyncio.wait(
-                {service_call_coro, get_item_task},
-                return_when=asyncio.FIRST_COMPLETED
-            )
-            
-            processed_service_task = False
-            chunk_yielded = False
-
-            for future in done:
-                if future == service_call_coro:
-                    processed_service_task = True
-                    # Service task completed, check for errors
-                    if service_call_coro.exception():
-                        # Log and re-raise to be caught by the outer try-except
-                        logger_instance.error(f"SSE service_call_coro (event {event_id}) exception: {service_call_coro.exception()}", exc_info=service_call_coro.exception())
-                        raise service_call_coro.exception()
-                elif future == get_item_task:
-                    # Item from queue
-                    item_from_queue = get_item_task.result() # Get result of queue.get()
-                    yield item_from_queue # This is already formatted SSE string
-                    chunk_yielded = True
-                    queue.task_done() # Signal that the item from queue is processed
-                else: # Should not happen
-                    logger_instance.error(f"SSE streamer (event {event_id}): Unexpected future completed.")
-            
-            if processed_service_task and queue.empty():
-                # Service task is done and queue is empty, so we are done
-                break
-            
-            # If only the queue.get() completed, loop again to wait for more chunks or service completion.
-            # If service_call_coro completed but queue might still have items, process them in next iterations.
-            
-    except asyncio.CancelledError:
-        logger_instance.info(f"SSE streamer (event {event_id}) cancelled.")
-        yield await send_sse_event(event_id, "canceled", "请求已取消")
-        if not service_call_coro.done():
-            service_call_coro.cancel() # Cancel the service task if streamer is cancelled
-            try:
-                await service_call_coro # Await to allow cleanup
-            except asyncio.CancelledError:
-                logger_instance.info(f"SSE service_call_coro (event {event_id}) successfully cancelled.")
-            except Exception as e_cancel_service:
-                 logger_instance.error(f"SSE service_call_coro (event {event_id}) error during cancellation: {e_cancel_service}")
-    except Exception as e_stream:
-        logger_instance.error(f"Error in SSE streamer (event {event_id}): {e_stream}")
-        yield await send_sse_event(event_id, "error", str(e_stream))
-    finally:
-        # Ensure service_call_coro is cleaned up if not done (e.g. client disconnects)
-        if not service_call_coro.done():
-            service_call_coro.cancel()
-            # Optionally await it with a timeout if there's cleanup logic in the service
-            # try: await asyncio.wait_for(service_call_coro, timeout=1.0)
-            # except (asyncio.CancelledError, asyncio.TimeoutError): pass
-        yield await send_sse_event(event_id, "end", "")
-
-
 @router.post("/chat/upload", summary="上传文档并进行流式聊天 (SSE)")
 async def chat_upload_document(
     current_user_id: int = Depends(get_current_active_user_id),
     service: 'DataDesignService' = Depends(_get_data_design_service),
+    service_factory: Callable[[AsyncSession], 'DataDesignService'] = Depends(_get_data_design_service_factory),
     task_id: int = Form(...),
     file: UploadFile = Form(...)
     # logger is available via self.logger in service, or can be injected here too
@@ -394,37 +314,12 @@ async def chat_upload_document(
         ai_message = f"已上传文档 '{file.filename}'。请基于以下内容进行分析和设计：\n\n{document_content}"
         chat_request_dto = DesignChatRequestDto(task_id=task_id, message=ai_message)
         
-        # Setup for SSE streaming
-        queue = asyncio.Queue()
-        async def sse_on_chunk_callback(chunk_data: str):
-            """Callback for the service to put formatted SSE data into the queue."""
-            # The chunk_data from service.streaming_chat_async is "role|content"
-            # We need to format it into full SSE event string here.
-            event_id = "upload_stream" # Could be made more unique if needed per chunk
-            parts = chunk_data.split('|', 1)
-            data_to_send_sse: Any = chunk_data # Default if no pipe
-            if len(parts) == 2:
-                role, content = parts
-                data_to_send_sse = {"role": role, "content": content}
-            
-            formatted_sse_event = await send_sse_event(event_id, "chunk", data_to_send_sse)
-            await queue.put(formatted_sse_event)
-
-        # Start the service's streaming chat logic in a background task
-        service_call_task = asyncio.create_task(
-            service.streaming_chat_async(current_user_id, chat_request_dto, sse_on_chunk_callback)
-        )
-        
-        # Return a StreamingResponse that reads from the queue
-        return StreamingResponse(
-            sse_streamer(
-                "chat_upload", 
-                {"message": "开始分析文档并生成回复"}, 
-                service_call_task, 
-                queue,
-                logger # Pass the logger instance
-            ), 
-            media_type="text/event-stream"
+        # 设计对话耗时较长，可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+        return sse_response(
+            lambda db: service_factory(db).streaming_chat_async(current_user_id, chat_request_dto),
+            "datadesign.chat_upload",
+            start_data={"message": "开始分析文档并生成回复"},
+            user_id=current_user_id
         )
 
     except BusinessException as e:
@@ -441,34 +336,15 @@ async def chat_upload_document(
 async def chat_send_text(
     request_data: DesignChatRequestDto,
     current_user_id: int = Depends(get_current_active_user_id),
-    service: 'DataDesignService' = Depends(_get_data_design_service)
+    service_factory: Callable[[AsyncSession], 'DataDesignService'] = Depends(_get_data_design_service_factory)
 ):
     # RateLimit check would be here if using a FastAPI rate limiter dependency
-    queue = asyncio.Queue()
-    async def sse_on_chunk_callback(chunk_data: str):
-        event_id = "text_stream" 
-        parts = chunk_data.split('|', 1)
-        data_to_send_sse: Any = chunk_data
-        if len(parts) == 2:
-            role, content = parts
-            data_to_send_sse = {"role": role, "content": content}
-        
-        formatted_sse_event = await send_sse_event(event_id, "chunk", data_to_send_sse)
-        await queue.put(formatted_sse_event)
-
-    service_call_task = asyncio.create_task(
-        service.streaming_chat_async(current_user_id, request_data, sse_on_chunk_callback)
-    )
-    
-    return StreamingResponse(
-        sse_streamer(
-            "chat_sendtext", 
-            {"message": "开始生成回复"}, 
-            service_call_task, 
-            queue,
-            logger
-        ), 
-        media_type="text/event-stream"
+    # 生成可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: service_factory(db).streaming_chat_async(current_user_id, request_data),
+        "datadesign.chat_sendtext",
+        start_data={"message": "开始生成回复"},
+        user_id=current_user_id
     )
 
 
@@ -611,33 +487,18 @@ async def delete_code_template(
 async def generate_code_template_detail_stream( # Renamed to avoid conflict if non-stream exists
     request_data: GenerateCodeTemplateRequestDto,
     current_user_id: int = Depends(get_current_active_user_id),
-    service: 'DataDesignService' = Depends(_get_data_design_service)
+    service_factory: Callable[[AsyncSession], 'DataDesignService'] = Depends(_get_data_design_service_factory)
 ):
-    queue = asyncio.Queue()
-    async def sse_on_chunk_callback(chunk_data: str): # chunk_data is raw AI output here
-        event_id = "template_gen_stream"
-        # For this one, the service `generate_templates_with_ai_async`'s callback directly provides AI model's chunk
-        formatted_sse_event = await send_sse_event(event_id, "chunk", chunk_data)
-        await queue.put(formatted_sse_event)
-
-    service_call_task = asyncio.create_task(
-        service.generate_templates_with_ai_async(
-            current_user_id, 
-            request_data.template_id, 
-            request_data.requirements, 
-            sse_on_chunk_callback
-        )
-    )
-    
-    return StreamingResponse(
-        sse_streamer(
-            "template_generatedtl", 
-            {"message": "开始生成模板内容"}, 
-            service_call_task, 
-            queue,
-            logger
-        ), 
-        media_type="text/event-stream"
+    # 服务直接输出 AI 模型的原始数据块；生成可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: service_factory(db).generate_templates_with_ai_async(
+            current_user_id,
+            request_data.template_id,
+            request_data.requirements
+        ),
+        "datadesign.template_generatedtl",
+        start_data={"message": "开始生成模板内容"},
+        user_id=current_user_id
     )
 
 
@@ -1,13 +1,16 @@
 import json
 import logging
-from typing import List, Callable, Optional, AsyncGenerator
+from typing import List, AsyncGenerator
 from app.core.ai.chat.base import IChatAIService, InputMessage # Assuming InputMessage & ChatRoleType in base
 from app.core.ai.dtos import ChatRoleType
+from app.core.ai.chat.completion_cache import completion_cache
 from app.core.exceptions import BusinessException
 from app.modules.tools.datadesign.enums import LanguageType, DatabaseType
 from app.modules.tools.datadesign.dtos import CodeTemplateGeneratorDto # Local DTO
 from app.modules.tools.datadesign.entities import CodeTemplateDtl # Local Entity
 
+_TEMPLATE_CACHE_SCOPE = "datadesign.code_templates"
+
 class CodeTemplateGeneratorService:
     """AI生成代码模板的服务"""
 
@@ -89,35 +92,35 @@ class CodeTemplateGeneratorService:
         language: LanguageType,
         database_type: DatabaseType,
         user_requirements: str,
-        on_chunk_received: Optional[Callable[[str], None]] = None
-    ) -> List[CodeTemplateDtl]:
+        template_dtls: List[CodeTemplateDtl]
+    ) -> AsyncGenerator[str, None]:
         """
-        生成代码模板
+        流式生成代码模板
 
         Args:
             template_id (int): 模板ID
             language (LanguageType): 编程语言
             database_type (DatabaseType): 数据库类型
             user_requirements (str): 用户的模板规范需求
-            on_chunk_received (Optional[Callable[[str], None]]): 接收到数据块时的回调函数
+            template_dtls (List[CodeTemplateDtl]): 生成完成后追加解析出的模板明细
 
-        Returns:
-            List[CodeTemplateDtl]: 生成的模板明细列表
+        Yields:
+            str: AI 输出的数据块
         """
         try:
             system_prompt = self._get_system_prompt(language, database_type)
             messages = [
-                InputMessage(role=ChatRoleType.SYSTEM, content=system_prompt),
-                InputMessage(role=ChatRoleType.USER, content=user_requirements)
+                InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt),
+                InputMessage.from_text(ChatRoleType.USER, user_requirements)
             ]
 
+            # 相同语言、数据库与需求生成的模板可以复用，启用补全缓存
             full_response = ""
-            if on_chunk_received:
-                async for chunk in self._ai_service.streaming_chat_completion_async(messages):
-                    full_response += chunk
-                    on_chunk_received(chunk)
-            else:
-                full_response = await self._ai_service.chat_completion_async(messages)
+            async for chunk in completion_cache.streaming_chat_completion_async(
+                self._ai_service, messages, scope=_TEMPLATE_CACHE_SCOPE
+            ):
+                full_response += chunk
+                yield chunk
             
             self._logger.info(f"AI response for template generation: {full_response}")
 
@@ -125,13 +128,14 @@ class CodeTemplateGeneratorService:
                 parsed_templates = json.loads(full_response)
             except json.JSONDecodeError as e:
                 self._logger.error(f"AI响应JSON解析失败: {e}. Response: {full_response}")
+                await completion_cache.invalidate_async(self._ai_service, messages, _TEMPLATE_CACHE_SCOPE)
                 raise BusinessException("AI响应JSON解析失败，请检查AI输出或提示词。")
 
             if not isinstance(parsed_templates, list) or not parsed_templates:
                 self._logger.warning(f"未能从AI响应中提取有效的模板列表. Response: {full_response}")
+                await completion_cache.invalidate_async(self._ai_service, messages, _TEMPLATE_CACHE_SCOPE)
                 raise BusinessException("未能从AI响应中提取有效的模板列表")
 
-            template_dtls: List[CodeTemplateDtl] = []
             for t_data in parsed_templates:
                 if not isinstance(t_data, dict):
                     self._logger.warning(f"模板数据项不是字典格式: {t_data}")
@@ -156,8 +160,6 @@ class CodeTemplateGeneratorService:
             if not template_dtls:
                  raise BusinessException("AI成功响应，但未能解析出任何有效的模板详情。")
 
-            return template_dtls
-
         except BusinessException:
             raise
         except Exception as ex:
@@ -1,11 +1,14 @@
 import logging
 import json
 import re
-from typing import List, Callable, Optional, AsyncGenerator
+from typing import List, Optional, AsyncGenerator
 
 from app.core.ai.chat.base import IChatAIService, InputMessage
 from app.core.ai.dtos import ChatRoleType
+from app.core.ai.json_stream import IncrementalJsonParser, JsonStreamItem
+from app.core.ai.summary import ConversationSummary, ConversationSummarizer
 from app.core.exceptions import BusinessException
+from app.core.sse import SSEEvent
 from app.modules.base.prompts.services import PromptTemplateService
 from app.modules.tools.datadesign.entities import DesignChat #, DesignTask
 from app.modules.tools.datadesign.enums import AssistantRoleType
@@ -14,11 +17,18 @@ from app.modules.tools.datadesign.repositories.design_chat_repository import Des
 from app.modules.tools.datadesign.dtos import (
     DesignChatRequestDto, 
     DesignDialogResultDto,
-    DatabaseDesignJsonDto # Use the JsonDto for parsing AI output
+    DatabaseDesignJsonDto, # Use the JsonDto for parsing AI output
+    TableDesignJsonDto,
+    TableRelationJsonDto
 )
 
 from app.modules.tools.datadesign.services.text_extraction_helper import AIResultTextExtractionHelper
 
+# 任务中较早的用户需求折叠为滚动摘要 (只折叠用户消息，AI 的分析与设计结果以最新版本为准)
+design_requirement_summarizer = ConversationSummarizer(
+    "datadesign", DesignChat, DesignChat.task_id, criteria=[DesignChat.role == ChatRoleType.USER]
+)
+
 class DataDesignAIService:
     """AI对话服务，处理数据设计相关的AI交互流程"""
 
@@ -50,7 +60,8 @@ class DataDesignAIService:
         self,
         current_user_message: str,
         latest_business_analysis_content: Optional[str],
-        user_history: List[DesignChat]
+        user_history: List[DesignChat],
+        summary: Optional[ConversationSummary] = None
     ) -> List[InputMessage]:
         """构建业务分析阶段的提示词消息列表"""
         messages: List[InputMessage] = []
@@ -60,49 +71,44 @@ class DataDesignAIService:
             system_prompt = await self._prompt_template_service.get_content_by_key_async(system_prompt_key)
             if not system_prompt:
                 raise BusinessException(f"提示词模板 '{system_prompt_key}' 未找到")
-            messages.append(InputMessage(role=ChatRoleType.SYSTEM, content=system_prompt))
-            messages.append(InputMessage(role=ChatRoleType.USER, content=current_user_message))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, current_user_message))
         else: # 非首次对话
             system_prompt_key = "DATADESIGN_BUSINESS_ANALYSIS_SECOND_PROMPT"
             system_prompt = await self._prompt_template_service.get_content_by_key_async(system_prompt_key)
             if not system_prompt:
                 raise BusinessException(f"提示词模板 '{system_prompt_key}' 未找到")
-            messages.append(InputMessage(role=ChatRoleType.SYSTEM, content=system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
+
+            if summary and summary.summary:
+                messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--用户较早需求的摘要：\n{summary.summary}"))
 
             user_history_text = "\n".join(
                 [f"- {msg.create_date.strftime('%Y-%m-%d %H:%M:%S')},{msg.content}" for msg in user_history if msg.role == ChatRoleType.USER]
             )
             if user_history_text:
-                messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--用户历史需求：\n{user_history_text}"))
+                messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--用户历史需求：\n{user_history_text}"))
             
             if latest_business_analysis_content:
-                messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--你(AI)的业务分析输出：\n{latest_business_analysis_content}"))
+                messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--你(AI)的业务分析输出：\n{latest_business_analysis_content}"))
             
-            messages.append(InputMessage(role=ChatRoleType.USER, content=f"--用户当前需求：\n{current_user_message}\n\n请根据我的新需求更新业务分析，首先列出变更点，然后使用标记输出完整的业务分析。"))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, f"--用户当前需求：\n{current_user_message}\n\n请根据我的新需求更新业务分析，首先列出变更点，然后使用标记输出完整的业务分析。"))
         
         return messages
 
-    async def _process_business_analysis_async(
+    async def _stream_stage_async(
         self,
-        task_id: int,
-        current_user_message: str,
-        latest_business_analysis_content: Optional[str],
-        user_history: List[DesignChat],
-        on_chunk_received: Optional[Callable[[str], None]]
-    ) -> DesignChat:
-        """处理业务分析阶段"""
-        messages = await self._build_business_analysis_prompt_messages(
-            current_user_message, latest_business_analysis_content, user_history
-        )
-        
-        analysis_content_full = ""
-        if on_chunk_received:
-            async for chunk in self._ai_service.streaming_chat_completion_async(messages):
-                analysis_content_full += chunk
-                on_chunk_received(f"business_analyst|{chunk}")
-        else:
-            analysis_content_full = await self._ai_service.chat_completion_async(messages)
-
+        messages: List[InputMessage],
+        role: str,
+        content_parts: List[str]
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """流式调用AI，数据块以 {"role", "content"} 形式产出并追加到 content_parts"""
+        async for chunk in self._ai_service.streaming_chat_completion_async(messages):
+            content_parts.append(chunk)
+            yield SSEEvent("chunk", {"role": role, "content": chunk})
+
+    async def _save_business_analysis_async(self, task_id: int, analysis_content_full: str) -> DesignChat:
+        """保存业务分析阶段的结果"""
         # 提取标记内的内容进行保存，如果标记不存在，则保存全部
         extracted_analysis_content = AIResultTextExtractionHelper.extract_complete_business_analysis(analysis_content_full, self._logger)
         
@@ -121,7 +127,8 @@ class DataDesignAIService:
         new_business_analysis_content: str,
         latest_business_analysis_content: Optional[str],
         latest_database_design_content: Optional[str],
-        user_history: List[DesignChat]
+        user_history: List[DesignChat],
+        summary: Optional[ConversationSummary] = None
     ) -> List[InputMessage]:
         """构建数据库设计阶段的提示词消息列表"""
         messages: List[InputMessage] = []
@@ -131,59 +138,40 @@ class DataDesignAIService:
             system_prompt = await self._prompt_template_service.get_content_by_key_async(system_prompt_key)
             if not system_prompt:
                  raise BusinessException(f"提示词模板 '{system_prompt_key}' 未找到")
-            messages.append(InputMessage(role=ChatRoleType.SYSTEM, content=system_prompt))
-            messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--用户需求：\n{current_user_message}")) # Use current_user_message for context
-            messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--业务分析结果：\n{new_business_analysis_content}"))
-            messages.append(InputMessage(role=ChatRoleType.USER, content="请根据上述业务分析，设计一个合适的数据库结构。请确保表结构清晰、规范、易于扩展，并使用标记输出完整的数据库设计。"))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--用户需求：\n{current_user_message}")) # Use current_user_message for context
+            messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--业务分析结果：\n{new_business_analysis_content}"))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, "请根据上述业务分析，设计一个合适的数据库结构。请确保表结构清晰、规范、易于扩展，并使用标记输出完整的数据库设计。"))
         else:
             system_prompt_key = "DATADESIGN_DBDESIGN_SECOND_PROMPT"
             system_prompt = await self._prompt_template_service.get_content_by_key_async(system_prompt_key)
             if not system_prompt:
                  raise BusinessException(f"提示词模板 '{system_prompt_key}' 未找到")
-            messages.append(InputMessage(role=ChatRoleType.SYSTEM, content=system_prompt))
+            messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
+
+            if summary and summary.summary:
+                messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--用户较早需求的摘要：\n{summary.summary}"))
 
             user_history_text = "\n".join(
                 [f"- {msg.create_date.strftime('%Y-%m-%d %H:%M:%S')},{msg.content}" for msg in user_history if msg.role == ChatRoleType.USER]
             )
             if user_history_text:
-                 messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--用户历史需求：\n{user_history_text}"))
+                 messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--用户历史需求：\n{user_history_text}"))
 
             if latest_business_analysis_content:
-                messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--之前的业务分析：\n{latest_business_analysis_content}"))
+                messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--之前的业务分析：\n{latest_business_analysis_content}"))
             
             if latest_database_design_content:
-                messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--之前的数据库设计：\n{latest_database_design_content}"))
+                messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--之前的数据库设计：\n{latest_database_design_content}"))
 
-            messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--用户当前需求：\n{current_user_message}"))
-            messages.append(InputMessage(role=ChatRoleType.ASSISTANT, content=f"--更新后的业务分析：\n{new_business_analysis_content}"))
-            messages.append(InputMessage(role=ChatRoleType.USER, content="请根据更新后的业务分析调整数据库设计，首先列出变更点，然后使用标记输出完整的数据库设计。"))
+            messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--用户当前需求：\n{current_user_message}"))
+            messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, f"--更新后的业务分析：\n{new_business_analysis_content}"))
+            messages.append(InputMessage.from_text(ChatRoleType.USER, "请根据更新后的业务分析调整数据库设计，首先列出变更点，然后使用标记输出完整的数据库设计。"))
         
         return messages
 
-    async def _process_database_design_async(
-        self,
-        task_id: int,
-        current_user_message: str,
-        new_business_analysis_content: str,
-        latest_business_analysis_content: Optional[str],
-        latest_database_design_content: Optional[str],
-        user_history: List[DesignChat],
-        on_chunk_received: Optional[Callable[[str], None]]
-    ) -> DesignChat:
-        """处理数据库设计阶段"""
-        messages = await self._build_database_design_prompt_messages(
-            current_user_message, new_business_analysis_content, 
-            latest_business_analysis_content, latest_database_design_content, user_history
-        )
-        
-        design_content_full = ""
-        if on_chunk_received:
-            async for chunk in self._ai_service.streaming_chat_completion_async(messages):
-                design_content_full += chunk
-                on_chunk_received(f"database_architect|{chunk}")
-        else:
-            design_content_full = await self._ai_service.chat_completion_async(messages)
-        
+    async def _save_database_design_async(self, task_id: int, design_content_full: str) -> DesignChat:
+        """保存数据库设计阶段的结果"""
         extracted_design_content = AIResultTextExtractionHelper.extract_complete_database_design(design_content_full, self._logger)
 
         database_design_chat = DesignChat(
@@ -195,41 +183,55 @@ class DataDesignAIService:
         )
         return await self._design_chat_repository.add_async(database_design_chat)
 
-    async def _process_json_structure_async(
-        self,
-        task_id: int,
-        database_design_content: str, # This should be the extracted, clean design
-        on_chunk_received: Optional[Callable[[str], None]]
-    ) -> DesignChat:
-        """处理数据库结构的JSON结构生成阶段"""
+    async def _build_json_structure_prompt_messages(self, database_design_content: str) -> List[InputMessage]:
+        """构建JSON结构生成阶段的提示词消息列表 (database_design_content 为提取后的数据库设计)"""
         system_prompt_key = "DATADESIGN_JSON_STRUCTURE_PROMPT"
         system_prompt = await self._prompt_template_service.get_content_by_key_async(system_prompt_key)
         if not system_prompt:
             raise BusinessException(f"提示词模板 '{system_prompt_key}' 未找到")
 
         messages = [
-            InputMessage(role=ChatRoleType.SYSTEM, content=system_prompt),
-            InputMessage(role=ChatRoleType.ASSISTANT, content=f"--数据库设计：\n{database_design_content}"),
-            InputMessage(role=ChatRoleType.USER, content="请将上述数据库设计转换为JSON结构格式。确保包含所有表、字段、索引和关系信息，并保持表名、字段名和注释的一致性。")
+            InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt),
+            InputMessage.from_text(ChatRoleType.ASSISTANT, f"--数据库设计：\n{database_design_content}"),
+            InputMessage.from_text(ChatRoleType.USER, "请将上述数据库设计转换为JSON结构格式。确保包含所有表、字段、索引和关系信息，并保持表名、字段名和注释的一致性。")
         ]
+        return messages
 
-        json_content_full = ""
-        if on_chunk_received:
-            async for chunk in self._ai_service.streaming_chat_completion_async(messages):
-                json_content_full += chunk
-                on_chunk_received(f"database_operator|{chunk}")
-        else:
-            json_content_full = await self._ai_service.chat_completion_async(messages)
-        
+    async def _stream_json_structure_async(
+        self,
+        messages: List[InputMessage],
+        content_parts: List[str],
+        structure_parser: IncrementalJsonParser
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """流式生成JSON结构，每张表、每个关系闭合后立即以 table/relation 事件推送"""
+        async for event in self._stream_stage_async(messages, "database_operator", content_parts):
+            yield event
+            for item in structure_parser.feed(event.data["content"]):
+                design_event = self._design_item_event(item)
+                if design_event is not None:
+                    yield design_event
+
+    async def _save_json_structure_async(
+        self,
+        task_id: int,
+        json_content_full: str,
+        structure_parser: Optional[IncrementalJsonParser] = None
+    ) -> DesignChat:
+        """保存JSON结构生成阶段的结果"""
         # Attempt to extract JSON block if AI wraps it in markdown
         try:
-            match = re.search(r"```json\s*([\s\S]+?)\s*```", json_content_full, re.DOTALL)
-            if match:
-                cleaned_json_content = match.group(1).strip()
-                self._logger.info(f"Extracted JSON block from AI response for JSON structure.")
+            if structure_parser and structure_parser.result is not None:
+                # 流式生成时已增量解析出完整的JSON
+                cleaned_json_content = structure_parser.raw
+                self._logger.info(f"Using incrementally parsed JSON block from AI response for JSON structure.")
             else:
-                cleaned_json_content = json_content_full.strip() # Assume it's raw JSON if no markdown
-                self._logger.info(f"No JSON markdown block found, using raw AI response for JSON structure.")
+                match = re.search(r"```json\s*([\s\S]+?)\s*```", json_content_full, re.DOTALL)
+                if match:
+                    cleaned_json_content = match.group(1).strip()
+                    self._logger.info(f"Extracted JSON block from AI response for JSON structure.")
+                else:
+                    cleaned_json_content = json_content_full.strip() # Assume it's raw JSON if no markdown
+                    self._logger.info(f"No JSON markdown block found, using raw AI response for JSON structure.")
         except Exception as e:
             self._logger.warning(f"Error cleaning JSON response, using raw: {e}")
             cleaned_json_content = json_content_full.strip()
@@ -244,6 +246,19 @@ class DataDesignAIService:
         )
         return await self._design_chat_repository.add_async(json_structure_chat)
 
+    def _design_item_event(self, item: JsonStreamItem) -> Optional[SSEEvent]:
+        """一张已闭合的表或一个关系的 table/relation 事件 (无效的项忽略，最终结果仍以完整JSON的解析为准)"""
+        group, index = item.path
+        try:
+            if group == "tables":
+                data = {"index": index, "table": TableDesignJsonDto.model_validate(item.value).model_dump(by_alias=True)}
+                return SSEEvent("table", data)
+            data = {"index": index, "relation": TableRelationJsonDto.model_validate(item.value).model_dump(by_alias=True)}
+            return SSEEvent("relation", data)
+        except Exception as ex:
+            self._logger.debug(f"流式设计项无效，已跳过: path={item.path}, 错误: {ex}")
+            return None
+
     def _extract_database_design_dto(self, json_content: Optional[str]) -> Optional[DatabaseDesignJsonDto]:
         """从JSON内容提取数据库设计DTO"""
         if not json_content:
@@ -263,18 +278,18 @@ class DataDesignAIService:
         self,
         user_id: int,
         request: DesignChatRequestDto,
-        on_chunk_received: Optional[Callable[[str], None]] = None,
-    ) -> DesignDialogResultDto:
+        result_dto: DesignDialogResultDto
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
-        处理对话 (包括业务分析, 数据库设计, JSON结构生成)
+        流式处理对话 (包括业务分析, 数据库设计, JSON结构生成)
 
         Args:
             user_id: 用户ID
             request: 聊天请求
-            on_chunk_received: 接收到数据块时的回调函数
+            result_dto: 处理完成后写入对话结果
 
-        Returns:
-            DesignDialogResultDto: 对话结果
+        Yields:
+            各阶段的数据块 (chunk，数据为 {"role", "content"}) 与闭合的表/关系 (table/relation)
         """
         try:
             task = await self._design_task_repository.get_by_id_async(request.task_id)
@@ -292,6 +307,9 @@ class DataDesignAIService:
 
             # 2. 获取历史和最新状态
             user_history = await self._design_chat_repository.get_user_message_history_async(request.task_id)
+            # 已并入摘要的需求不再逐条发送
+            summary = await design_requirement_summarizer.get_async(request.task_id)
+            user_history = design_requirement_summarizer.unsummarized(summary, user_history)
             latest_biz_analysis_chat = await self._design_chat_repository.get_latest_business_analysis_async(request.task_id)
             latest_db_design_chat = await self._design_chat_repository.get_latest_database_design_async(request.task_id)
             
@@ -299,45 +317,51 @@ class DataDesignAIService:
             latest_db_design_content = latest_db_design_chat.content if latest_db_design_chat else None
 
             # 3. 阶段1: 业务分析
-            current_business_analysis_chat = await self._process_business_analysis_async(
-                request.task_id, request.message, latest_biz_analysis_content, user_history, on_chunk_received
+            messages = await self._build_business_analysis_prompt_messages(
+                request.message, latest_biz_analysis_content, user_history, summary
             )
+            analysis_parts: List[str] = []
+            async for event in self._stream_stage_async(messages, "business_analyst", analysis_parts):
+                yield event
+            current_business_analysis_chat = await self._save_business_analysis_async(request.task_id, "".join(analysis_parts))
             
             # 4. 阶段2: 数据库设计
             # Use the content from the *newly generated* business analysis for this stage
-            current_database_design_chat = await self._process_database_design_async(
-                request.task_id, request.message, 
+            messages = await self._build_database_design_prompt_messages(
+                request.message, 
                 current_business_analysis_chat.content or "", # Use the newly generated analysis
                 latest_biz_analysis_content, # Pass previous for context if it's a modification
                 latest_db_design_content, 
                 user_history, 
-                on_chunk_received
+                summary
             )
+            design_parts: List[str] = []
+            async for event in self._stream_stage_async(messages, "database_architect", design_parts):
+                yield event
+            current_database_design_chat = await self._save_database_design_async(request.task_id, "".join(design_parts))
 
             # 5. 阶段3: JSON结构生成
             # Use the content from the *newly generated* database design for this stage
-            json_structure_chat = await self._process_json_structure_async(
-                request.task_id, 
-                current_database_design_chat.content or "", # Use the newly generated design
-                on_chunk_received
-            )
+            messages = await self._build_json_structure_prompt_messages(current_database_design_chat.content or "")
+            json_parts: List[str] = []
+            structure_parser = IncrementalJsonParser(["tables.*", "relations.*"], start_markers=("```json",))
+            async for event in self._stream_json_structure_async(messages, json_parts, structure_parser):
+                yield event
+            json_structure_chat = await self._save_json_structure_async(request.task_id, "".join(json_parts), structure_parser)
             
+            design_requirement_summarizer.maybe_schedule_fold(self._ai_service, request.task_id, user_history)
+
             # 6. 准备结果
-            result_dto = DesignDialogResultDto(
-                user_message=request.message,
-                business_analysis=current_business_analysis_chat.content,
-                database_design=current_database_design_chat.content,
-                json_structure=json_structure_chat.content
-            )
+            result_dto.user_message = request.message
+            result_dto.business_analysis = current_business_analysis_chat.content
+            result_dto.database_design = current_database_design_chat.content
+            result_dto.json_structure = json_structure_chat.content
 
             if json_structure_chat.content:
                 result_dto.database_design_dto = self._extract_database_design_dto(json_structure_chat.content)
                 if result_dto.database_design_dto is None:
                     self._logger.warning(f"Task {request.task_id}: Failed to parse DatabaseDesignJsonDto from AI's JSON structure output.")
 
-
-            return result_dto
-
         except BusinessException:
             raise
         except Exception as ex:
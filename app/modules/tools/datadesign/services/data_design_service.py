@@ -3,11 +3,12 @@ import datetime
 from pathlib import Path
 import pystache # For Mustache templating
 import math
-from typing import List, Callable, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncGenerator
 from fastapi import UploadFile
 import shutil # For file operations, if needed for UploadFile, though usually not
 
 from app.core.exceptions import BusinessException, NotFoundException
+from app.core.sse import SSEEvent
 from app.core.utils.snowflake import generate_id
 from app.modules.tools.datadesign.dtos import (
     CreateDesignTaskRequestDto, UpdateDesignTaskRequestDto, DesignTaskDetailDto,
@@ -39,7 +40,7 @@ from app.modules.tools.datadesign.repositories.design_chat_repository import Des
 from app.modules.tools.datadesign.repositories.code_template_repository import CodeTemplateRepository
 from app.modules.tools.datadesign.repositories.code_template_dtl_repository import CodeTemplateDtlRepository
 
-from app.modules.tools.datadesign.services.data_design_ai_service import DataDesignAIService
+from app.modules.tools.datadesign.services.data_design_ai_service import DataDesignAIService, design_requirement_summarizer
 from app.modules.tools.datadesign.services.coding.code_template_generator_service import CodeTemplateGeneratorService
 from app.modules.tools.datadesign.services.coding import template_database_ddl_helper, template_code_helper
 
@@ -121,6 +122,7 @@ class DataDesignService:
             # Python repositories will handle these individually.
             # Consider a transaction if these need to be atomic.
             await self.design_chat_repo.delete_by_task_id_async(task_id) # Also deletes task state
+            await design_requirement_summarizer.delete_async(task_id)
             await self.index_field_repo.delete_by_task_id_async(task_id)
             await self.index_design_repo.delete_by_task_id_async(task_id)
             await self.field_design_repo.delete_by_task_id_async(task_id)
@@ -373,17 +375,15 @@ class DataDesignService:
     async def streaming_chat_async(
         self,
         user_id: int,
-        request: DesignChatRequestDto,
-        on_chunk_received: Callable[[str], None]
-    ) -> DesignDialogResultDto:
-        """流式聊天"""
+        request: DesignChatRequestDto
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """流式聊天 (产出各角色的数据块与闭合的表/关系，完成后保存数据库设计)"""
         try:
-            dialog_result = await self.design_ai_service.process_async(
-                user_id, request, on_chunk_received
-            )
+            dialog_result = DesignDialogResultDto()
+            async for event in self.design_ai_service.process_async(user_id, request, dialog_result):
+                yield event
             if dialog_result.database_design_dto:
                 await self._save_database_design_async(request.task_id, dialog_result.database_design_dto)
-            return dialog_result
         except BusinessException:
             raise
         except Exception as ex:
@@ -830,10 +830,9 @@ class DataDesignService:
         self,
         user_id: int,
         template_id: int,
-        user_requirements: str,
-        on_chunk_received: Callable[[str], None]
-    ) -> List[CodeTemplateDetailDto]:
-        """使用AI为用户模板生成明细内容"""
+        user_requirements: str
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """使用AI为用户模板流式生成明细内容"""
         try:
             template = await self.code_template_repo.get_by_id_async(template_id)
             if not template or template.user_id != user_id or template.user_id == 0:
@@ -842,16 +841,16 @@ class DataDesignService:
             # Update prompt content for the user's template
             await self.code_template_repo.update_prompt_content_async(template_id, user_requirements)
 
-            generated_dtls_entities = await self.code_template_generator_service.generate_templates_async(
-                template_id, template.language, template.database_type, user_requirements, on_chunk_received
-            )
+            generated_dtls_entities: List[CodeTemplateDtl] = []
+            async for chunk in self.code_template_generator_service.generate_templates_async(
+                template_id, template.language, template.database_type, user_requirements, generated_dtls_entities
+            ):
+                yield SSEEvent("chunk", chunk)
 
             if generated_dtls_entities:
                 # Delete old details and add new ones
                 await self.code_template_dtl_repo.delete_by_template_async(template_id)
                 await self.code_template_dtl_repo.batch_add_async(generated_dtls_entities)
-            
-            return await self.get_code_template_dtls_async(user_id, template_id)
         except BusinessException:
             raise
         except Exception as ex:
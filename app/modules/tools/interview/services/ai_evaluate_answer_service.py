@@ -3,6 +3,7 @@ AI 评估面试结果服务实现
 
 基于AI能力评估面试回答，计算分数并给出评价，最终生成总体面试评估。
 """
+import asyncio
 import json
 from typing import List, Tuple, Optional, Dict, Any
 import logging
@@ -10,6 +11,8 @@ from datetime import datetime
 
 from app.core.ai.chat.base import IChatAIService
 from app.core.ai.chat.factory import get_chat_ai_service
+from app.core.ai.chat.deferred import deferred_ai_lane
+from app.core.ai.dtos import ChatRoleType, InputMessage
 
 from app.core.config.settings import Settings
 from app.modules.base.prompts.services import PromptTemplateService
@@ -60,10 +63,46 @@ class AIEvaluateAnswerService:
         Returns:
             评分和评语
         """
+        results = await self.evaluate_answers([(question, answer, standard_answer)], position_level)
+        return results[0]
+    
+    async def evaluate_answers(
+        self,
+        items: List[Tuple[str, str, str]],
+        position_level: QuestionDifficulty
+    ) -> List[Tuple[bool, int, Optional[str]]]:
+        """
+        批量评估回答 (同时提交到延迟通道，由通道打包执行)
+        
+        Args:
+            items: (问题, 回答, 标准答案) 列表
+            position_level: 职位级别
+            
+        Returns:
+            与 items 顺序一致的 (是否成功, 评分, 评语) 列表
+        """
         try:
             # 获取系统提示词模板
             system_prompt = await self.prompt_template_service.get_content_by_key_async("INTERVIEW_EVALUATE_ANSWER_PROMPT")
-            
+        except Exception as e:
+            error_msg = f"评估答案时发生错误: {str(e)}"
+            print(error_msg)
+            return [(False, 0, error_msg) for _ in items]
+        
+        return list(await asyncio.gather(*(
+            self._evaluate_answer_async(system_prompt, question, answer, standard_answer, position_level)
+            for question, answer, standard_answer in items
+        )))
+    
+    async def _evaluate_answer_async(
+        self,
+        system_prompt: str,
+        question: str,
+        answer: str,
+        standard_answer: str,
+        position_level: QuestionDifficulty
+    ) -> Tuple[bool, int, Optional[str]]:
+        try:
             # 构建评估提示词
             user_prompt = f"""请根据以下信息评估候选人的回答：
 
@@ -77,13 +116,13 @@ class AIEvaluateAnswerService:
             if standard_answer:
                 user_prompt += f"\n标准参考答案：{standard_answer}"
             
-            # 调用AI进行评估
+            # 调用AI进行评估 (不需要实时结果，经延迟通道与其他回答一起批量执行)
             messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
+                InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt),
+                InputMessage.from_text(ChatRoleType.USER, user_prompt)
             ]
             
-            response = await self.ai_service.chat_completion_async(messages)
+            response = await deferred_ai_lane.submit(self.ai_service, messages, scope="interview.evaluate_answer")
             
             try:
                 # 解析JSON响应
@@ -137,11 +176,11 @@ class AIEvaluateAnswerService:
             
             # 调用AI进行评估
             messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
+                InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt),
+                InputMessage.from_text(ChatRoleType.USER, user_prompt)
             ]
             
-            response = await self.ai_service.chat_completion_async(messages)
+            response = await deferred_ai_lane.submit(self.ai_service, messages, scope="interview.evaluate_overall")
             
             return response
             
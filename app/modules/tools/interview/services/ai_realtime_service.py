@@ -11,6 +11,7 @@ import datetime
 
 from app.core.config.settings import Settings
 from app.core.exceptions import BusinessException
+from app.core.http import HTTP_POOL_OPENAI, http_client_registry
 
 from app.modules.base.prompts.services import PromptTemplateService
 from app.modules.tools.interview.models import InterviewScenario, JobPosition, InterviewQuestion
@@ -224,37 +225,38 @@ class AIRealTimeService:
         }
         
         try:
-            # 发送请求
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/realtime/sessions",
-                    json=request_body,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {self.openai_api_key}"
-                    }
-                )
-                
-                if response.status_code != 200:
-                    print(f"OpenAI RealTime API 错误: {response.text}")
-                    raise BusinessException("创建OpenAI RealTime会话失败", response.status_code)
-                
-                result = response.json()
-                
-                # 转换为响应DTO
-                client_secret = result.get("client_secret", {})
-                session_response = RealTimeSessionResponse(
-                    id=result.get("id", ""),
-                    model=result.get("model", ""),
-                    modalities=result.get("modalities", []),
-                    instructions=result.get("instructions", ""),
-                    voice=result.get("voice", ""),
-                    client_secret_value=client_secret.get("value", ""),
-                    client_secret_expires_at=client_secret.get("expires_at", 0)
-                )
-                
-                return session_response
-                
+            # 发送请求 (复用 AI 提供者连接池)
+            client = http_client_registry.get(HTTP_POOL_OPENAI)
+            response = await client.post(
+                "https://api.openai.com/v1/realtime/sessions",
+                json=request_body,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {self.openai_api_key}"
+                },
+                timeout=30.0
+            )
+            
+            if response.status_code != 200:
+                print(f"OpenAI RealTime API 错误: {response.text}")
+                raise BusinessException("创建OpenAI RealTime会话失败", response.status_code)
+            
+            result = response.json()
+            
+            # 转换为响应DTO
+            client_secret = result.get("client_secret", {})
+            session_response = RealTimeSessionResponse(
+                id=result.get("id", ""),
+                model=result.get("model", ""),
+                modalities=result.get("modalities", []),
+                instructions=result.get("instructions", ""),
+                voice=result.get("voice", ""),
+                client_secret_value=client_secret.get("value", ""),
+                client_secret_expires_at=client_secret.get("expires_at", 0)
+            )
+            
+            return session_response
+            
         except httpx.RequestError as e:
             print(f"请求OpenAI RealTime API失败: {str(e)}")
             raise BusinessException(f"请求OpenAI RealTime API失败: {str(e)}")
@@ -540,24 +540,23 @@ class InterviewSessionService:
                         if question:
                             standard_answers[interaction.question_id] = question.standard_answer
             
-            # 为每个交互进行评估
+            # 为每个交互进行评估 (各回答同时提交，由延迟通道打包执行)
             evaluations = []
             total_score = 0
             
-            for interaction in interactions:
-                # 获取标准答案
-                standard_answer = ""
-                if interaction.question_id and interaction.question_id in standard_answers:
-                    standard_answer = standard_answers[interaction.question_id]
-                
-                # 评估回答
-                success, score, evaluation = await self.evaluate_service.evaluate_answer(
-                    interaction.question,
-                    interaction.answer,
-                    standard_answer,
-                    position.level
-                )
-                
+            results = await self.evaluate_service.evaluate_answers(
+                [
+                    (
+                        interaction.question,
+                        interaction.answer,
+                        standard_answers.get(interaction.question_id, "") if interaction.question_id else ""
+                    )
+                    for interaction in interactions
+                ],
+                position.level
+            )
+            
+            for interaction, (success, score, evaluation) in zip(interactions, results):
                 # 更新交互记录
                 interaction.score = score
                 interaction.evaluation = evaluation
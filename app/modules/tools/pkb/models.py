@@ -2,7 +2,7 @@
 个人知识库数据模型
 """
 import datetime
-from sqlalchemy import BigInteger, Column, String, Text, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database.session import Base 
@@ -33,6 +33,7 @@ class ChatHistory(Base):
     role: Mapped[str] = mapped_column(String(20), nullable=True, name="Role")
     content: Mapped[str] = mapped_column(Text, nullable=True, name="Content")
     vector_ids: Mapped[str] = mapped_column(String(1000), nullable=True, name="VectorIds")
+    token_count: Mapped[int] = mapped_column(Integer, nullable=True, name="TokenCount")  # 内容的令牌数缓存，为空时按需计算
     create_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, name="CreateDate")
     last_modify_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, name="LastModifyDate")
 
@@ -1,10 +1,8 @@
 """
 个人知识库API路由
 """
-import json
 import logging
 from typing import List, Optional, AsyncGenerator
-import uuid
 from fastapi import (
     APIRouter, 
     Depends, 
@@ -14,11 +12,11 @@ from fastapi import (
     BackgroundTasks, 
     status
 )
-from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database.session import get_db
 from app.core.config.settings import settings
+from app.core.sse import sse_response
 from app.core.dtos import ApiResponse, BaseIdRequestDto
 from app.core.exceptions import BusinessException
 from app.core.ai.chat.base import IChatAIService
@@ -339,7 +337,9 @@ async def chat(
 async def chat_streaming(
     request: ChatRequestDto = Body(...),
     user_id: int = Depends(get_current_active_user_id),
-    pkb_service: PKBService = Depends(_get_pkb_service)
+    user_docs_milvus_service: IUserDocsMilvusService = Depends(get_user_docs_milvus_service_from_state),
+    ai_service: IChatAIService = Depends(get_chatai_service_from_state),
+    redis_service = Depends(get_redis_service_from_state)
 ):
     """
     流式聊天
@@ -354,71 +354,15 @@ async def chat_streaming(
     if not request.message:
         return ApiResponse.fail(message="消息内容不能为空", code=status.HTTP_400_BAD_REQUEST)
     
-    async def event_generator():
-        # 创建事件ID
-        event_id = str(uuid.uuid4()).replace("-", "")
-        
-        try:
-            # 发送开始事件
-            yield f"id: {event_id}\n"
-            yield f"event: start\n"
-            yield f"data: {json.dumps({'message': '开始生成回复'})}\n\n"
-            
-            # 定义回调函数
-            async def on_chunk_received(chunk):
-                nonlocal event_id
-                yield f"id: {event_id}\n"
-                yield f"event: chunk\n"
-                yield f"data: {chunk}\n\n"
-            
-            # 包装回调函数使其可以在流中使用
-            buffer = []
-            
-            def callback(chunk):
-                buffer.append(chunk)
-            
-            # 调用流式聊天API
-            final_reply = await pkb_service.streaming_chat_async(
-                user_id,
-                request.session_id,
-                request.message,
-                callback
-            )
-            
-            # 发送缓冲的数据块
-            for chunk in buffer:
-                yield f"id: {event_id}\n"
-                yield f"event: chunk\n"
-                yield f"data: {chunk}\n\n"
-            
-            # 发送完成事件，包含完整回复（包括引用源）
-            yield f"id: {event_id}\n"
-            yield f"event: done\n"
-            yield f"data: {json.dumps(final_reply.dict(by_alias=True))}\n\n"
-            
-        except Exception as ex:
-            # 发生错误
-            error_message = str(ex)
-            if isinstance(ex, BusinessException):
-                error_message = ex.message
-            
-            yield f"id: {event_id}\n"
-            yield f"event: error\n"
-            yield f"data: {error_message}\n\n"
-        finally:
-            # 发送结束事件
-            yield f"id: {event_id}\n"
-            yield f"event: end\n"
-            yield f"data: \n\n"
-    
-    # 设置响应
-    return StreamingResponse(
-        content=event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive"
-        }
+    # 数据块随 AI 输出实时发送，完成后发送包含完整回复 (含引用源) 的 done 事件。
+    # 生成可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: _get_pkb_service(
+            db, user_docs_milvus_service, ai_service, redis_service
+        ).streaming_chat_async(user_id, request.session_id, request.message),
+        "pkb.chat",
+        start_data={"message": "开始生成回复"},
+        user_id=user_id
     )
 
 
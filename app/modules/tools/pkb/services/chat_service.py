@@ -5,13 +5,15 @@ import datetime
 import json
 import logging
 import uuid
-from typing import List, Tuple, Any, Dict, Optional, Callable, Set
-import asyncio
+from dataclasses import dataclass, field
+from typing import List, Tuple, Any, AsyncGenerator, Dict, Optional, Set
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.context_window import get_context_window_manager
+from app.core.ai.summary import ConversationSummary, ConversationSummarizer
 from app.core.ai.vector.base import IUserDocsMilvusService
-from app.core.ai.dtos import ChatRoleType, InputMessage, UserDocsVectorSearchResult
+from app.core.ai.dtos import InputMessage, UserDocsVectorSearchResult
 from app.core.config.settings import Settings
 from app.core.exceptions import BusinessException
 from app.core.utils.snowflake import generate_id
@@ -26,6 +28,17 @@ from app.modules.tools.pkb.repositories.interfaces.chat_history_repository impor
 
 logger = logging.getLogger(__name__)
 
+# 会话较早的消息折叠为滚动摘要
+_summarizer = ConversationSummarizer("pkb", ChatHistory, ChatHistory.session_id)
+
+
+@dataclass
+class StreamingChatResult:
+    """流式聊天结束后的结果 (由 ChatService.streaming_chat_async 写入)"""
+    reply: str = ""
+    reply_message_id: int = 0
+    search_results: List[UserDocsVectorSearchResult] = field(default_factory=list)
+
 
 class ChatService:
     """聊天服务"""
@@ -142,6 +155,7 @@ class ChatService:
         try:
             # 删除会话的所有聊天历史
             await self.chat_history_repository.delete_by_session_id_async(session_id)
+            await _summarizer.delete_async(session_id)
             
             # 删除会话
             return await self.chat_session_repository.delete_async(session_id)
@@ -241,9 +255,16 @@ class ChatService:
             if not session:
                 raise BusinessException(f"会话{session_id}不存在")
 
-            # 检查是否是首次聊天
-            history = await self.chat_history_repository.get_by_session_id_async(session_id, 1)
+            # 获取会话历史 (按时间倒序返回，在保存当前消息之前获取，不含当前消息)
+            history = await self.chat_history_repository.get_by_session_id_async(
+                session_id, self.max_context_messages * 2
+            )
             is_first_chat = len(history) == 0
+            history.reverse()
+
+            # 已并入摘要的消息不再原文发送
+            summary = await _summarizer.get_async(session_id)
+            history = _summarizer.unsummarized(summary, history)
 
             # 获取匹配的文档
             matched_vector_ids, search_results = await self.get_match_documents(
@@ -253,6 +274,12 @@ class ChatService:
             # 获取相关文本
             search_context = self._get_context_from_search_results(search_results)
 
+            # 构建聊天消息
+            context_manager = get_context_window_manager(self.ai_service)
+            messages = await self._build_chat_messages(
+                session.prompt or "", history, message, search_context, summary
+            )
+
             # 保存用户消息
             user_message = ChatHistory()
             user_message.session_id = session_id
@@ -260,19 +287,9 @@ class ChatService:
             user_message.role = "user"
             user_message.content = message
             user_message.vector_ids = matched_vector_ids
+            user_message.token_count = context_manager.cacheable_count(message)
             await self.chat_history_repository.add_async(user_message)
 
-            # 获取会话历史
-            history = await self.chat_history_repository.get_by_session_id_async(
-                session_id, self.max_context_messages * 2
-            )
-            history.sort(key=lambda h: h.create_date)
-
-            # 构建聊天消息
-            messages = await self._build_chat_messages(
-                session.prompt or "", history, message, search_context
-            )
-
             # 调用AI生成回复
             reply = await self.ai_service.chat_completion_async(messages)
 
@@ -283,7 +300,12 @@ class ChatService:
             assistant_message.role = "assistant"
             assistant_message.content = reply
             assistant_message.vector_ids = matched_vector_ids
+            assistant_message.token_count = context_manager.cacheable_count(reply)
             await self.chat_history_repository.add_async(assistant_message)
+            _summarizer.maybe_schedule_fold(
+                self.ai_service, session_id, history + [user_message, assistant_message],
+                window_limit=self.max_context_messages * 2
+            )
 
             # 如果是首次聊天且会话名称是默认的"新的会话"，则根据用户消息更新会话名称
             if is_first_chat and session.session_name == "新的会话":
@@ -301,21 +323,17 @@ class ChatService:
         user_id: int,
         session_id: int,
         message: str,
-        on_chunk_received: Callable[[str], None],
-        cancellation_token = None
-    ) -> Tuple[str, int, List[UserDocsVectorSearchResult]]:
+        result: StreamingChatResult
+    ) -> AsyncGenerator[str, None]:
         """
-        流式聊天
+        流式聊天，逐个产出回复的数据块。
+        关闭生成器 (如客户端断开) 时停止生成，不保存未完成的回复。
 
         Args:
             user_id: 用户ID
             session_id: 会话ID
             message: 用户消息
-            on_chunk_received: 接收到数据块时的回调函数
-            cancellation_token: 取消令牌
-
-        Returns:
-            (回复内容, 回复消息ID, 搜索结果列表)
+            result: 生成结束后写入 (回复内容, 回复消息ID, 搜索结果列表)
         """
         try:
             # 获取会话信息
@@ -323,9 +341,16 @@ class ChatService:
             if not session:
                 raise BusinessException(f"会话{session_id}不存在")
 
-            # 检查是否是首次聊天
-            history = await self.chat_history_repository.get_by_session_id_async(session_id, 1)
+            # 获取会话历史 (按时间倒序返回，在保存当前消息之前获取，不含当前消息)
+            history = await self.chat_history_repository.get_by_session_id_async(
+                session_id, self.max_context_messages * 2
+            )
             is_first_chat = len(history) == 0
+            history.reverse()
+
+            # 已并入摘要的消息不再原文发送
+            summary = await _summarizer.get_async(session_id)
+            history = _summarizer.unsummarized(summary, history)
 
             # 获取匹配的文档
             matched_vector_ids, search_results = await self.get_match_documents(
@@ -335,6 +360,12 @@ class ChatService:
             # 获取相关文本
             search_context = self._get_context_from_search_results(search_results)
 
+            # 构建聊天消息
+            context_manager = get_context_window_manager(self.ai_service)
+            messages = await self._build_chat_messages(
+                session.prompt or "", history, message, search_context, summary
+            )
+
             # 保存用户消息
             user_message = ChatHistory()
             user_message.session_id = session_id
@@ -342,29 +373,14 @@ class ChatService:
             user_message.role = "user"
             user_message.content = message
             user_message.vector_ids = matched_vector_ids
+            user_message.token_count = context_manager.cacheable_count(message)
             await self.chat_history_repository.add_async(user_message)
 
-            # 获取会话历史
-            history = await self.chat_history_repository.get_by_session_id_async(
-                session_id, self.max_context_messages * 2
-            )
-            history.sort(key=lambda h: h.create_date)
-
-            # 构建聊天消息
-            messages = await self._build_chat_messages(
-                session.prompt or "", history, message, search_context
-            )
-
             # 调用AI流式生成回复
             reply = ""
             async for chunk in self.ai_service.streaming_chat_completion_async(messages):
-                if cancellation_token and cancellation_token.cancelled:
-                    break
                 reply += chunk
-                on_chunk_received(chunk)
-                
-                # 简单的防止过长停顿
-                await asyncio.sleep(0)
+                yield chunk
 
             # 保存AI回复
             assistant_message = ChatHistory()
@@ -373,13 +389,20 @@ class ChatService:
             assistant_message.role = "assistant"
             assistant_message.content = reply
             assistant_message.vector_ids = matched_vector_ids
+            assistant_message.token_count = context_manager.cacheable_count(reply)
             await self.chat_history_repository.add_async(assistant_message)
+            _summarizer.maybe_schedule_fold(
+                self.ai_service, session_id, history + [user_message, assistant_message],
+                window_limit=self.max_context_messages * 2
+            )
 
             # 如果是首次聊天且会话名称是默认的"新的会话"，则根据用户消息更新会话名称
             if is_first_chat and session.session_name == "新的会话":
                 await self._update_session_name_from_first_message_async(session_id, message)
 
-            return reply, assistant_message.id, search_results
+            result.reply = reply
+            result.reply_message_id = assistant_message.id
+            result.search_results = search_results
         except Exception as ex:
             if isinstance(ex, BusinessException):
                 raise
@@ -450,118 +473,57 @@ class ChatService:
         return "\n".join(context)
 
     async def _build_chat_messages(
-        self, prompt: str, history: List[ChatHistory], message: str, context: str
+        self,
+        prompt: str,
+        history: List[ChatHistory],
+        message: str,
+        context: str,
+        summary: Optional[ConversationSummary] = None
     ) -> List[InputMessage]:
         """
-        构建聊天消息
+        构建聊天消息 (按模型令牌预算打包，规则见 ContextWindowManager)
 
         Args:
             prompt: 系统提示词
-            history: 历史消息
+            history: 历史消息 (按时间正序，不含当前消息与已并入摘要的消息)
             message: 当前消息
             context: 上下文
+            summary: 会话较早内容的滚动摘要
 
         Returns:
             聊天消息列表
         """
-        messages = []
-        
-        # 基础的系统提示词
-        messages.append(InputMessage(role=ChatRoleType.System, content=prompt))
+        context_manager = get_context_window_manager(self.ai_service)
+        summary_prompt = _summarizer.summary_prompt(summary)
 
-        # 构建完整的系统提示词，明确告知AI是否有找到相关内容 
+        # 明确告知AI是否有找到相关内容：找到时上下文放入知识提示词模板，超出预算时只截断上下文部分
         if context:
             knowledge_prompt = await self.prompt_template_service.get_content_by_key_async("PKB_MATCH_KNOWLEDGE_PROMPT")
-            knowledge_prompt = knowledge_prompt.replace("{Context}", context)
+            packed = context_manager.pack(
+                [prompt, summary_prompt],
+                message,
+                history,
+                context=context,
+                max_history_messages=self.max_context_messages * 2,
+                context_template=knowledge_prompt
+            )
         else:
             # 当找不到相关知识库内容时
             knowledge_prompt = await self.prompt_template_service.get_content_by_key_async("PKB_MATCH_NOT_KNOWLEDGE_PROMPT")
+            packed = context_manager.pack(
+                [prompt, summary_prompt, knowledge_prompt],
+                message,
+                history,
+                max_history_messages=self.max_context_messages * 2
+            )
 
-        messages.append(InputMessage(role=ChatRoleType.System, content=knowledge_prompt))
-
-        # 智能选择历史消息
-        selected_history = self._select_relevant_history(history, message, self.max_context_messages)
-
-        # 添加选择的历史消息
-        for item in selected_history:
-            if item.role == "user":
-                messages.append(InputMessage(role=ChatRoleType.User, content=item.content or ""))
-            else:
-                messages.append(InputMessage(role=ChatRoleType.Assistant, content=item.content or ""))
-
-        # 如果当前消息不在历史记录中，添加它
-        current_message_in_history = any(h.role == "user" and h.content == message for h in selected_history)
-        if not current_message_in_history:
-            messages.append(InputMessage(role=ChatRoleType.User, content=message))
-
-        return messages
-
-    def _select_relevant_history(
-        self, history: List[ChatHistory], current_message: str, max_messages: int
-    ) -> List[ChatHistory]:
-        """
-        智能选择相关历史消息
-
-        Args:
-            history: 所有历史消息
-            current_message: 当前消息
-            max_messages: 最大消息数量
-
-        Returns:
-            选择的历史消息
-        """
-        if not history:
-            return []
-
-        # 对历史按时间排序
-        ordered_history = sorted(history, key=lambda h: h.create_date)
-
-        # 估算消息token总数
-        ESTIMATED_TOKENS_PER_CHARACTER = 4  # 每个字符大约4个token
-        MAX_TOTAL_TOKENS = 8000  # 最大token数，根据模型调整
-        MINIMUM_RECENT_TURNS = 3  # 至少保留最近的3轮对话
-
-        # 选择策略：
-        # 1. 总是包含最近的几轮对话
-        # 2. 如果空间允许，添加更早的对话
-        # 3. 如果总大小超过限制，截断较早的对话
-
-        result = []
-        remaining_tokens = MAX_TOTAL_TOKENS
-
-        # 计算当前消息的token数
-        current_message_tokens = len(current_message or "") * ESTIMATED_TOKENS_PER_CHARACTER
-        remaining_tokens -= current_message_tokens
-
-        # 确保最近的几轮对话被包
-        # 确保最近的几轮对话被包含
-        recent_messages = ordered_history[-min(len(ordered_history), MINIMUM_RECENT_TURNS * 2):]
-        for msg in recent_messages:
-            result.append(msg)
-            remaining_tokens -= len(msg.content or "") * ESTIMATED_TOKENS_PER_CHARACTER
-
-        # 如果还有空间，添加更早的对话
-        if remaining_tokens > 0 and len(ordered_history) > len(recent_messages):
-            earlier_messages = ordered_history[:-len(recent_messages)]
-
-            # 从最近到最早尝试添加
-            for i in range(len(earlier_messages) - 1, -1, -1):
-                msg = earlier_messages[i]
-                msg_tokens = len(msg.content or "") * ESTIMATED_TOKENS_PER_CHARACTER
-
-                if msg_tokens <= remaining_tokens:
-                    result.insert(0, msg)  # 插入到最前面，保持时间顺序
-                    remaining_tokens -= msg_tokens
-                else:
-                    # 如果这条消息太大，跳过并继续检查更早的消息
-                    continue
-
-                # 如果已经达到最大消息数，停止添加
-                if len(result) >= max_messages:
-                    break
-
-        # 确保结果按时间排序
-        return sorted(result, key=lambda h: h.create_date)
+        if packed.context_truncated or packed.message_truncated or packed.history_dropped:
+            logger.info(
+                f"聊天上下文已按预算裁剪: {packed.prompt_tokens}/{packed.budget} tokens, "
+                f"历史保留 {packed.history_used} 条/丢弃 {packed.history_dropped} 条, "
+                f"上下文截断={packed.context_truncated}, 消息截断={packed.message_truncated}"
+            )
+        return packed.messages
 
     async def get_session_history_async(self, session_id: int, limit: int = 20) -> List[ChatHistory]:
         """
@@ -1,7 +1,9 @@
 """
 个人知识库服务接口
 """
-from typing import List, Optional, Protocol, Tuple, Callable
+from typing import AsyncGenerator, List, Optional, Protocol, Tuple
+
+from app.core.sse import SSEEvent
 from app.modules.tools.pkb.dtos.chat_message import ChatMessageDto, ChatReplyDto
 from app.modules.tools.pkb.dtos.chat_session import ChatSessionInfoDto
 from app.modules.tools.pkb.dtos.share_session import ShareSessionResponseDto
@@ -122,14 +124,12 @@ class IPKBService(Protocol):
         """
         ...
 
-    async def streaming_chat_async(
+    def streaming_chat_async(
         self, 
         user_id: int, 
         session_id: int, 
-        message: str, 
-        on_chunk_received: Callable[[str], None],
-        cancellation_token = None
-    ) -> ChatReplyDto:
+        message: str
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
         流式聊天
 
@@ -137,11 +137,9 @@ class IPKBService(Protocol):
             user_id: 用户ID
             session_id: 会话ID
             message: 用户消息
-            on_chunk_received: 接收到数据块时的回调函数
-            cancellation_token: 取消令牌
 
-        Returns:
-            AI回复
+        Yields:
+            回复的数据块 (chunk 事件)，结束后为包含完整回复 (含引用源) 的 done 事件
         """
         ...
 
@@ -2,20 +2,21 @@
 个人知识库服务实现
 """
 import logging
-from typing import List, Optional, Callable, Dict, Any
+from typing import List, Optional, AsyncGenerator, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config.settings import Settings
 from app.core.exceptions import BusinessException
 from app.core.dtos import DocumentAppType
 from app.core.ai.dtos import UserDocsVectorSearchResult
+from app.core.sse import SSEEvent
 
 from app.modules.base.knowledge.repositories.document_repository import DocumentRepository
 from app.modules.tools.pkb.dtos.chat_message import ChatMessageDto, ChatReplyDto, SourceReferenceDto
 from app.modules.tools.pkb.dtos.chat_session import ChatSessionInfoDto
 from app.modules.tools.pkb.dtos.share_session import ShareSessionResponseDto
 from app.modules.tools.pkb.services.interfaces.pkb_service import IPKBService
-from app.modules.tools.pkb.services.chat_service import ChatService
+from app.modules.tools.pkb.services.chat_service import ChatService, StreamingChatResult
 
 
 logger = logging.getLogger(__name__)
@@ -249,10 +250,8 @@ class PKBService(IPKBService):
         self, 
         user_id: int, 
         session_id: int, 
-        message: str, 
-        on_chunk_received: Callable[[str], None],
-        cancellation_token = None
-    ) -> ChatReplyDto:
+        message: str
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
         流式聊天
 
@@ -260,19 +259,17 @@ class PKBService(IPKBService):
             user_id: 用户ID
             session_id: 会话ID
             message: 用户消息
-            on_chunk_received: 接收到数据块时的回调函数
-            cancellation_token: 取消令牌
 
-        Returns:
-            AI回复
+        Yields:
+            回复的数据块 (chunk 事件)，结束后为包含完整回复 (含引用源) 的 done 事件
         """
-        reply, reply_message_id, search_results = await self.chat_service.streaming_chat_async(
-            user_id, session_id, message, on_chunk_received, cancellation_token
-        )
+        result = StreamingChatResult()
+        async for chunk in self.chat_service.streaming_chat_async(user_id, session_id, message, result):
+            yield SSEEvent("chunk", chunk)
         
         # 构建回复DTO
-        chat_reply = await self._build_chat_reply(session_id, reply, reply_message_id, search_results)
-        return chat_reply
+        chat_reply = await self._build_chat_reply(session_id, result.reply, result.reply_message_id, result.search_results)
+        yield SSEEvent("done", chat_reply.model_dump(mode="json", by_alias=True))
 
     async def _build_chat_reply(
         self, session_id: int, reply: str, reply_message_id: int, search_results: List[UserDocsVectorSearchResult]
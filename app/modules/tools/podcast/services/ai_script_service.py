@@ -7,13 +7,13 @@ import logging
 from typing import List, Dict, Any, Optional
 
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.chat.deferred import deferred_ai_lane
 
-from app.core.ai.dtos import ChatRoleType
+from app.core.ai.dtos import ChatRoleType, InputMessage
 from app.core.utils.json_helper import safe_parse_json
 from app.modules.base.prompts.services import PromptTemplateService
 
 from app.core.exceptions import BusinessException
-from app.modules.tools.pkb.dtos.chat_message import ChatMessageDto
 from app.modules.tools.podcast.dtos import (
     PodcastDetailDto, PodcastScriptRawItemDto, TtsVoiceDefinition
 )
@@ -99,13 +99,13 @@ class AIScriptService:
         
         # 准备消息
         messages = [
-            ChatMessageDto(role=ChatRoleType.SYSTEM, content=system_prompt),
-            ChatMessageDto(role=ChatRoleType.SYSTEM, content=scene_prompt),
-            ChatMessageDto(role=ChatRoleType.USER, content=f"以下是我要制作成播客的内容：\n\n{source_content}")
+            InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt),
+            InputMessage.from_text(ChatRoleType.SYSTEM, scene_prompt),
+            InputMessage.from_text(ChatRoleType.USER, f"以下是我要制作成播客的内容：\n\n{source_content}")
         ]
         
-        # 调用AI生成脚本
-        script_json = await self.ai_service.chat_completion_async(messages)
+        # 调用AI生成脚本 (后台任务，经延迟通道批量执行)
+        script_json = await deferred_ai_lane.submit(self.ai_service, messages, scope="podcast.script")
         logger.info(f"播客{podcast_dtl.id}，AI生成的脚本：{script_json}")
         
         # 提取JSON部分
@@ -10,6 +10,7 @@ from app.core.ai.speech.base import ISpeechService
 from app.core.ai.speech.factory import get_speech_service
 from app.core.storage.base import IStorageService, StorageProviderType
 from app.core.exceptions import BusinessException
+from app.core.redis.service import RedisService
 from app.modules.tools.podcast.repositories import PodcastVoiceRepository
 from app.modules.tools.podcast.models import PodcastVoiceDefinition
 from app.modules.tools.podcast.dtos import TtsVoiceDefinition
@@ -18,6 +19,18 @@ from app.modules.tools.podcast.config import podcast_settings
 
 logger = logging.getLogger(__name__)
 
+# 语音角色列表缓存 (很少变化，所有播客任务共用)
+VOICE_CACHE_KEY_PREFIX = "podcast:voices:"
+VOICE_CACHE_SECONDS = 600
+
+
+def _dump_voices(voices: List[TtsVoiceDefinition]) -> List[Dict[str, Any]]:
+    return [v.model_dump(by_alias=True, mode="json") for v in voices]
+
+
+def _load_voices(data: List[Dict[str, Any]]) -> List[TtsVoiceDefinition]:
+    return [TtsVoiceDefinition(**item) for item in data]
+
 
 class AISpeechService:
     """AI语音合成服务"""
@@ -26,7 +39,8 @@ class AISpeechService:
         self,
         db,
         voice_repository: PodcastVoiceRepository,
-        storage_service: Optional[IStorageService] = None
+        storage_service: Optional[IStorageService] = None,
+        redis_service: Optional[RedisService] = None
     ):
         """
         初始化AI语音服务
@@ -35,10 +49,12 @@ class AISpeechService:
             db: 数据库会话
             voice_repository: 语音仓储
             storage_service: 存储服务
+            redis_service: Redis 服务 (用于缓存语音角色列表，默认使用共享连接池)
         """
         self.db = db
         self.voice_repository = voice_repository
         self.storage_service = storage_service
+        self.redis_service = redis_service or RedisService()
         
         # 从配置中获取设置
         self.storage_provider = podcast_settings.voice_cdn_storage_provider
@@ -119,8 +135,17 @@ class AISpeechService:
             语音角色列表
         """
         try:
-            voices = await self.voice_repository.get_all_active_voices_async(self.voice_type)
-            return self._map_to_voice_definition_dtos(voices)
+            async def _load() -> List[TtsVoiceDefinition]:
+                voices = await self.voice_repository.get_all_active_voices_async(self.voice_type)
+                return self._map_to_voice_definition_dtos(voices)
+
+            return await self.redis_service.get_or_set_async(
+                f"{VOICE_CACHE_KEY_PREFIX}{self.voice_type}",
+                _load,
+                expiry_seconds=VOICE_CACHE_SECONDS,
+                serializer=_dump_voices,
+                deserializer=_load_voices
+            )
         except Exception as e:
             logger.exception(f"获取支持的语音角色列表失败: {e}")
             raise BusinessException(f"获取语音角色列表失败: {str(e)}")
@@ -139,10 +164,19 @@ class AISpeechService:
             if not locale:
                 raise BusinessException("语言/地区参数不能为空")
             
-            voices = await self.voice_repository.get_active_voices_by_locale_async(
-                self.voice_type, locale
+            async def _load() -> List[TtsVoiceDefinition]:
+                voices = await self.voice_repository.get_active_voices_by_locale_async(
+                    self.voice_type, locale
+                )
+                return self._map_to_voice_definition_dtos(voices)
+
+            return await self.redis_service.get_or_set_async(
+                f"{VOICE_CACHE_KEY_PREFIX}{self.voice_type}:{locale}",
+                _load,
+                expiry_seconds=VOICE_CACHE_SECONDS,
+                serializer=_dump_voices,
+                deserializer=_load_voices
             )
-            return self._map_to_voice_definition_dtos(voices)
         except Exception as e:
             if not isinstance(e, BusinessException):
                 logger.exception(f"获取指定语言的语音角色列表失败，语言: {locale}: {e}")
@@ -11,6 +11,7 @@ from app.core.dtos import PagedResultDto, DocumentAppType, BaseIdResponseDto
 from app.core.utils.snowflake import generate_id
 from app.core.exceptions import BusinessException, NotFoundException
 from app.core.job.services import JobPersistenceService
+from app.core.job.lease import heartbeat_current_job
 
 from app.modules.base.knowledge.services.document_service import DocumentService
 
@@ -474,7 +475,8 @@ class PodcastService:
             await self.job_persistence_service.create_job(
                 task_type="podcast.generate",
                 params_id=podcast_id,
-                params_data=None
+                params_data=None,
+                user_id=user_id
             )
             
             return result
@@ -518,6 +520,9 @@ class PodcastService:
             # 1. 生成播客脚本
             await self._generate_script_async(podcast.generate_id, podcast_detail, voices)
             
+            # 脚本生成耗时较长，进入语音合成前续约一次
+            await heartbeat_current_job()
+            
             # 2. 根据脚本生成音频
             await self._generate_audio_async(podcast, voices)
             
@@ -624,6 +629,8 @@ class PodcastService:
         i = 0
         total_scripts = len(script_items)
         for item in script_items:
+            # 逐条合成期间保持任务租约
+            await heartbeat_current_job()
             try:
                 # 更新状态为处理中
                 await self.podcast_script_repository.update_audio_status_async(
@@ -2,16 +2,14 @@
 import datetime
 import logging
 from typing import List, Optional, Dict, Any, Callable
-import asyncio
 from fastapi import (
     APIRouter, Depends, File, Form, UploadFile, Body, 
     Request, Response, HTTPException, BackgroundTasks, status
 )
-from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-import json
 
 from app.core.database.session import get_db
+from app.core.sse import sse_response
 from app.api.dependencies import (
     get_current_active_user_id,
     get_chatai_service_from_state,
@@ -332,44 +330,14 @@ class SSEItem:
 
 async def get_chat_service_instance(db: AsyncSession, request: Request) -> AIChatService:
     """获取AIChatService实例，不作为FastAPI依赖项"""
-    # 获取必要的依赖
-    ai_service = getattr(request.app.state, 'ai_services', None)
-    storage_service = getattr(request.app.state, 'storage_service', None)
-    
-    # 创建仓储实例
-    session_repository = PrototypeSessionRepository(db)
-    page_repository = PrototypePageRepository(db)
-    page_history_repository = PrototypePageHistoryRepository(db)
-    message_repository = PrototypeMessageRepository(db)
-    resource_repository = PrototypeResourceRepository(db)
-    
-    # 获取提示词服务
-    from app.modules.base.prompts.services import PromptTemplateService
-    from app.modules.base.prompts.repositories import PromptTemplateRepository
-    prompt_repo = PromptTemplateRepository(db)
-    redis_service = getattr(request.app.state, 'redis_service', None)
-    prompt_service = PromptTemplateService(db=db, repository=prompt_repo, redis_service=redis_service)
-    
-    # 创建并返回服务实例
-    return AIChatService(
-        db=db,
-        ai_service=ai_service,
-        storage_service=storage_service,
-        prompt_service=prompt_service,
-        session_repository=session_repository,
-        page_repository=page_repository,
-        page_history_repository=page_history_repository,
-        message_repository=message_repository,
-        resource_repository=resource_repository,
-        logger=logger
-    )
+    return _create_chat_service(db, request.app.state)
 
 
-async def get_chat_service_instance(db: AsyncSession, request: Request) -> AIChatService:
-    """获取AIChatService实例，不作为FastAPI依赖项"""
+def _create_chat_service(db: AsyncSession, app_state) -> AIChatService:
+    """在给定的数据库会话中创建AIChatService (可续接流在独立会话中创建，不依赖请求对象)"""
     # 获取必要的依赖
-    ai_service = getattr(request.app.state, 'ai_services', None)
-    storage_service = getattr(request.app.state, 'storage_service', None)
+    ai_service = getattr(app_state, 'ai_services', None)
+    storage_service = getattr(app_state, 'storage_service', None)
     
     # 创建仓储实例
     session_repository = PrototypeSessionRepository(db)
@@ -382,7 +350,7 @@ async def get_chat_service_instance(db: AsyncSession, request: Request) -> AICha
     from app.modules.base.prompts.services import PromptTemplateService
     from app.modules.base.prompts.repositories import PromptTemplateRepository
     prompt_repo = PromptTemplateRepository(db)
-    redis_service = getattr(request.app.state, 'redis_service', None)
+    redis_service = getattr(app_state, 'redis_service', None)
     prompt_service = PromptTemplateService(db=db, repository=prompt_repo, redis_service=redis_service)
     
     # 创建并返回服务实例
@@ -410,8 +378,7 @@ async def get_chat_service_instance(db: AsyncSession, request: Request) -> AICha
 async def send_ai_chat_streaming(
     req: Request,  # 将非默认参数移到前面
     request: AIChatRequestDto = Body(...),
-    user_id: int = Depends(get_current_active_user_id),
-    db: AsyncSession = Depends(get_db)
+    user_id: int = Depends(get_current_active_user_id)
 ):
     """
     发送AI对话消息接口，使用Server-Sent Events流式返回
@@ -422,58 +389,14 @@ async def send_ai_chat_streaming(
     
     *需要有效的登录令牌*
     """
-    # 手动创建服务实例，绕过FastAPI的依赖解析
-    ai_chat_service = await get_chat_service_instance(db, req)
-    
-    # 使用异步生成器创建SSE流
-    async def event_generator():
-        # 创建事件ID
-        import uuid
-        event_id = str(uuid.uuid4())
-        
-        try:
-            # 发送开始事件
-            yield f"id: {event_id}\nevent: start\ndata: {json.dumps({'message': '开始生成回复'})}\n\n"
-            
-            # 记录收集到的块
-            chunks = []
-            
-            # 定义块接收回调
-            def on_chunk_received(chunk: str):
-                chunks.append(chunk)
-                return f"id: {event_id}\nevent: chunk\ndata: {chunk}\n\n"
-            
-            # 调用流式聊天API并获取结果
-            response = await ai_chat_service.send_ai_chat_async(
-                user_id,
-                request,
-                on_chunk_received
-            )
-            
-            # 对于每个收到的块，生成事件
-            for chunk_event in chunks:
-                yield chunk_event
-            
-            # 发送完成事件
-            yield f"id: {event_id}\nevent: done\ndata: \n\n"
-        except asyncio.CancelledError:
-            # 用户取消请求
-            yield f"id: {event_id}\nevent: canceled\ndata: 请求已取消\n\n"
-        except Exception as ex:
-            # 发生错误
-            yield f"id: {event_id}\nevent: error\ndata: {str(ex)}\n\n"
-        finally:
-            # 发送结束事件
-            yield f"id: {event_id}\nevent: end\ndata: \n\n"
-    
-    # 返回流式响应
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
+    app_state = req.app.state
+    # 服务每输出一个数据块即发送一个 chunk 事件，完成后发送 done 事件。
+    # 页面生成耗时较长，可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: _create_chat_service(db, app_state).send_ai_chat_async(user_id, request),
+        "prototype.chat",
+        start_data={"message": "开始生成回复"},
+        user_id=user_id
     )
 
 @router.post(
@@ -1,6 +1,6 @@
 # app/modules/tools/prototype/services/ai_chat_service.py
 import re
-from typing import List, Optional, Tuple, Dict, Any, Callable, AsyncGenerator
+from typing import List, Optional, Tuple, Dict, AsyncGenerator
 import json
 import logging
 import datetime
@@ -12,8 +12,11 @@ from app.core.ai.chat.base import IChatAIService, InputMessage
 from app.core.ai.chat.factory import ChatAIProviderType, get_chat_ai_service
 
 from app.core.ai.dtos import ChatRoleType
+from app.core.ai.image_preprocess import image_message_async
+from app.core.ai.json_stream import IncrementalJsonParser, JsonStreamItem
 from app.core.config.settings import settings
 from app.core.exceptions import BusinessException, ForbiddenException
+from app.core.sse import SSEEvent
 # app/modules/tools/prototype/services/ai_chat_service.py (continued)
 from app.core.storage.base import IStorageService, StorageProviderType
 
@@ -23,7 +26,7 @@ from app.modules.tools.prototype.constants import (
     PrototypeMessageType, PrototypePageStatus, PrototypeSessionStatus, CurrentStageType
 )
 from app.modules.tools.prototype.dtos import (
-    AIChatRequestDto, MessageDto, SessionStageDto, PageStructureDto, PageInfoDto
+    AIChatRequestDto, SessionStageDto, PageStructureDto, PageInfoDto
 )
 from app.modules.tools.prototype.models import (
     PrototypeSession, PrototypePage, PrototypePageHistory, PrototypeMessage, PrototypeResource
@@ -91,19 +94,17 @@ class AIChatService:
     async def send_ai_chat_async(
     self, 
     user_id: int, 
-    request: AIChatRequestDto, 
-    on_chunk_received: Optional[Callable[[str], str]] = None
-) -> MessageDto:
+    request: AIChatRequestDto
+) -> AsyncGenerator[SSEEvent, None]:
       """
       发送AI对话消息
       
       Args:
             user_id: 用户ID
             request: AI对话请求
-            on_chunk_received: 数据块接收回调，接收数据块并返回事件字符串
                   
-      Returns:
-            AI回复消息DTO
+      Yields:
+            AI回复的数据块 (chunk) 与设计阶段闭合的页面定义 (page)，结束后为 done 事件
       """
       try:
             # 检查用户权限
@@ -120,21 +121,10 @@ class AIChatService:
             if session.is_generating_code:
                   raise BusinessException("我正在编写页面代码中，请稍候跟我对话...")
             
-            ai_message_id, ai_response = await self._ai_generate_flow_async(
-                  request, on_chunk_received
-            )
-            
-            # 创建回复DTO
-            response_dto = MessageDto(
-                  id=ai_message_id,
-                  session_id=request.session_id,
-                  message_type=PrototypeMessageType.AI,
-                  message_type_description="AI",
-                  content=ai_response,
-                  create_date=datetime.datetime.now()
-            )
+            async for event in self._ai_generate_flow_async(request):
+                  yield event
             
-            return response_dto
+            yield SSEEvent("done", "")
             
       except Exception as ex:
             if isinstance(ex, ForbiddenException):
@@ -209,20 +199,16 @@ class AIChatService:
     
     async def _ai_generate_flow_async(
         self,
-        request: AIChatRequestDto,
-        on_chunk_received: Optional[Callable[[str], str]] = None,
-        cancel_token: Any = None
-    ) -> Tuple[int, str]:
+        request: AIChatRequestDto
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
-        AI生成内容的流程
+        AI生成内容的流程 (流式生成，自动进入下一阶段时继续产出后续阶段的事件)
         
         Args:
             request: AI对话请求
-            on_chunk_received: 数据块接收回调
-            cancel_token: 取消令牌
             
-        Returns:
-            (消息ID, AI回复内容)
+        Yields:
+            AI回复的数据块 (chunk) 与设计阶段闭合的页面定义 (page)
         """
         # 获取会话信息
         session = await self.session_repository.get_by_id_async(request.session_id)
@@ -230,17 +216,16 @@ class AIChatService:
         # 构建发送给AI的消息体
         messages = await self._build_send_messages(session, request)
         
-        # 调用AI服务获取回复
+        # 流式生成；设计阶段的页面结构增量解析，每个页面闭合后立即以 page 事件推送
         ai_response = ""
-        if on_chunk_received:
-            # 流式生成
-            async for chunk in self.ai_service.streaming_chat_completion_async(messages):
-                if on_chunk_received:
-                    on_chunk_received(chunk)
-                ai_response += chunk
-        else:
-            # 一次性生成
-            ai_response = await self.ai_service.chat_completion_async(messages)
+        structure_parser = IncrementalJsonParser(["pages.*"], start_markers=("```json",))
+        async for chunk in self.ai_service.streaming_chat_completion_async(messages):
+            yield SSEEvent("chunk", chunk)
+            for item in structure_parser.feed(chunk):
+                event = self._page_designed_event(item)
+                if event is not None:
+                    yield event
+            ai_response += chunk
         
         # 存储AI回复
         ai_message_entity = PrototypeMessage(
@@ -249,7 +234,7 @@ class AIChatService:
             message_type=PrototypeMessageType.AI,
             content=ai_response
         )
-        ai_message_id = await self.message_repository.add_async(ai_message_entity)
+        await self.message_repository.add_async(ai_message_entity)
         
         # 从AI回复中提取阶段信息
         stage_data = self._extract_stage_info(ai_response)
@@ -260,11 +245,13 @@ class AIChatService:
         try:
             # 处理特定阶段的自动操作
             if stage_data.current_stage == CurrentStageType.COLLECTING:
-                await self._deal_stage_collecting(session, stage_data, ai_response, on_chunk_received, cancel_token)
+                async for event in self._deal_stage_collecting(session, stage_data, ai_response):
+                    yield event
             elif stage_data.current_stage == CurrentStageType.ANALYZING:
-                await self._deal_stage_analyzing(session, stage_data, ai_response, on_chunk_received, cancel_token)
+                async for event in self._deal_stage_analyzing(session, stage_data, ai_response):
+                    yield event
             elif stage_data.current_stage == CurrentStageType.DESIGNING:
-                await self._deal_stage_designing(session, stage_data, ai_response)
+                await self._deal_stage_designing(session, stage_data, ai_response, structure_parser.raw)
             elif stage_data.current_stage == CurrentStageType.GENERATING:
                 await self._deal_stage_generating(session, stage_data, ai_response)
             elif stage_data.current_stage == CurrentStageType.EDITING:
@@ -273,8 +260,6 @@ class AIChatService:
                 await self._deal_stage_completed(session, stage_data, ai_response)
         except Exception as ex:
             print(f"自动处理下一步时出错: {str(ex)}")
-        
-        return ai_message_id, ai_response
     
     async def _build_send_messages(
         self, session: PrototypeSession, request: AIChatRequestDto
@@ -408,12 +393,12 @@ class AIChatService:
                             pass
                 
                 if not attachment_ids:  # 没有图片
-                    chat_messages.append(InputMessage(ChatRoleType.USER, message.content or ""))
+                    chat_messages.append(InputMessage.from_text(ChatRoleType.USER, message.content or ""))
                 else:
                     # 如果有图片，则加入到会话上下文中
                     await self._add_image_source_to_messages(attachment_ids, chat_messages)
             else:
-                chat_messages.append(InputMessage(ChatRoleType.ASSISTANT, message.content or ""))
+                chat_messages.append(InputMessage.from_text(ChatRoleType.ASSISTANT, message.content or ""))
         
         return chat_messages
     
@@ -428,20 +413,22 @@ class AIChatService:
         if attachments:
             resources = await self.resource_repository.get_by_ids_async(attachments)
             if resources:
-                  image_urls = []
-                  for resource in resources:
-                        if self.chat_ai_provider_type == ChatAIProviderType.GEMINI:
-                              image_urls.append(resource.gemini_url)
-                        else:
-                              image_urls.append(resource.url)
-            
-                
-                  messages.append(InputMessage.from_text_and_image_urls(
-    role=ChatRoleType.USER,
-    text="我上传了参考图片，请结合图片内容来设计。",
-    image_urls=image_urls,
-    media_type="image/jpeg"  # Adjust this based on your image types
-))
+                text = "我上传了参考图片，请结合图片内容来设计。"
+                if self.chat_ai_provider_type == ChatAIProviderType.GEMINI:
+                    # Gemini 使用已上传的文件地址，按原样引用
+                    messages.append(InputMessage.from_text_and_image_urls(
+                        role=ChatRoleType.USER,
+                        text=text,
+                        image_urls=[resource.gemini_url for resource in resources],
+                        media_type="image/jpeg"
+                    ))
+                else:
+                    messages.append(await image_message_async(
+                        ChatRoleType.USER,
+                        text,
+                        [resource.url for resource in resources],
+                        "prototype.reference"
+                    ))
     
     async def _get_stage_prompt(self, session: PrototypeSession) -> str:
         """
@@ -549,19 +536,15 @@ class AIChatService:
         self,
         session: PrototypeSession,
         stage_data: SessionStageDto,
-        ai_response: str,
-        on_chunk_received: Optional[Callable[[str], None]] = None,
-        cancel_token: Any = None
-    ) -> None:
+        ai_response: str
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
-        处理收集阶段的动作
+        处理收集阶段的动作 (自动进入分析阶段时产出其生成事件)
         
         Args:
             session: 会话
             stage_data: 阶段数据
             ai_response: AI回复
-            on_chunk_received: 数据块接收回调
-            cancel_token: 取消令牌
         """
         # 如果明确指示进入分析阶段，自动进行处理
         if stage_data.next_stage == CurrentStageType.ANALYZING:
@@ -572,32 +555,27 @@ class AIChatService:
             await self._update_session_status_based_on_stage(session.id, CurrentStageType.ANALYZING)
             
             # 自动发送继续消息，进入需求分析阶段
-            await self._ai_generate_flow_async(
+            async for event in self._ai_generate_flow_async(
                 AIChatRequestDto(
                     session_id=session.id,
                     user_message="$$SYSTEM_CONTINUE$$"
-                ),
-                on_chunk_received,
-                cancel_token
-            )
+                )
+            ):
+                yield event
     
     async def _deal_stage_analyzing(
         self,
         session: PrototypeSession,
         stage_data: SessionStageDto,
-        ai_response: str,
-        on_chunk_received: Optional[Callable[[str], None]] = None,
-        cancel_token: Any = None
-    ) -> None:
+        ai_response: str
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
-        处理分析阶段的动作
+        处理分析阶段的动作 (自动进入设计阶段时产出其生成事件)
         
         Args:
             session: 会话
             stage_data: 阶段数据
             ai_response: AI回复
-            on_chunk_received: 数据块接收回调
-            cancel_token: 取消令牌
         """
         # 提取需求分析结果
         requirement_pattern = r"```需求分析结果\s*([\s\S]*?)\s*```"
@@ -620,20 +598,20 @@ class AIChatService:
             await self._update_session_status_based_on_stage(session.id, CurrentStageType.DESIGNING)
             
             # 自动发送继续消息，进入页面结构设计阶段
-            await self._ai_generate_flow_async(
+            async for event in self._ai_generate_flow_async(
                 AIChatRequestDto(
                     session_id=session.id,
                     user_message="$$SYSTEM_CONTINUE$$"
-                ),
-                on_chunk_received,
-                cancel_token
-            )
+                )
+            ):
+                yield event
     
     async def _deal_stage_designing(
         self,
         session: PrototypeSession,
         stage_data: SessionStageDto,
-        ai_response: str
+        ai_response: str,
+        page_structure_json: Optional[str] = None
     ) -> None:
         """
         处理设计阶段的动作
@@ -642,9 +620,10 @@ class AIChatService:
             session: 会话
             stage_data: 阶段数据
             ai_response: AI回复
+            page_structure_json: 流式生成时已增量解析出的页面结构JSON
         """
         # 尝试提取JSON结构
-        page_structure = self._extract_json_from_markdown(ai_response)
+        page_structure = page_structure_json or self._extract_json_from_markdown(ai_response)
         if page_structure:
             try:
                 # 验证JSON有效性
@@ -1155,6 +1134,22 @@ class AIChatService:
         # 如果无法识别代码块，返回原始文本
         return text
     
+    def _page_designed_event(self, item: JsonStreamItem) -> Optional[SSEEvent]:
+        """
+        一个已闭合的页面定义的 page 事件 (无效的页面忽略，页面结构仍以完整回复的解析为准)
+        
+        Args:
+            item: 增量解析出的页面
+        """
+        if not isinstance(item.value, dict):
+            return None
+        try:
+            page = PageInfoDto(**item.value)
+        except Exception as ex:
+            self.logger.debug(f"流式页面定义无效，已跳过: {str(ex)}")
+            return None
+        return SSEEvent("page", {"index": item.path[1], "page": page.model_dump(by_alias=True)})
+    
     def _extract_json_from_markdown(self, markdown: str) -> str:
         """
         从Markdown文本中提取JSON代码块
@@ -1,6 +1,5 @@
-from typing import List, Optional
-import asyncio
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Request, BackgroundTasks
+from typing import Callable, List, Optional
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -9,6 +8,7 @@ from app.api.dependencies import (
     get_chatai_service_from_state,
     get_current_active_user_id,
     get_job_persistence_service,
+    get_redis_service_from_state,
     get_storage_service_from_state,
     get_user_docs_milvus_service_from_state,
 
@@ -17,9 +17,11 @@ from app.core.ai.chat.base import IChatAIService
 from app.core.ai.vector.base import IUserDocsMilvusService
 from app.core.database.session import get_db
 from app.core.storage.base import IStorageService
+from app.core.redis.service import RedisService
 from app.core.job.services import JobPersistenceService
 from app.core.job.decorators import job_endpoint
 from app.core.config.settings import settings
+from app.core.sse import sse_response
 from app.core.dtos import ApiResponse, BaseIdRequestDto, BaseIdResponseDto
 
 from app.modules.tools.social_content.repositories.platform_repository import PlatformRepository
@@ -57,10 +59,11 @@ def _get_task_repository(db: AsyncSession = Depends(get_db)) -> TaskRepository:
 
 def _get_platform_service(
     db: AsyncSession = Depends(get_db),
-    platform_repository: PlatformRepository = Depends(_get_platform_repository)
+    platform_repository: PlatformRepository = Depends(_get_platform_repository),
+    redis_service: RedisService = Depends(get_redis_service_from_state)
 ) -> PlatformService:
     """内部依赖项工厂：创建并返回 PlatformService 实例"""
-    return PlatformService(db=db)
+    return PlatformService(db=db, redis_service=redis_service)
 
 
 def _get_ai_generate_service(
@@ -100,6 +103,20 @@ def _get_task_service(
     )
 
 
+def _get_task_service_factory(
+    ai_service: IChatAIService = Depends(get_chatai_service_from_state),
+    user_docs_service: IUserDocsMilvusService = Depends(get_user_docs_milvus_service_from_state),
+    storage_service: IStorageService = Depends(get_storage_service_from_state)
+) -> Callable[[AsyncSession], TaskService]:
+    """内部依赖项工厂：返回在给定数据库会话中创建 TaskService 的工厂 (可续接流在独立会话中生成)"""
+    def create(db: AsyncSession) -> TaskService:
+        ai_generate_service = _get_ai_generate_service(
+            db, ai_service, PlatformRepository(db), TaskRepository(db), user_docs_service, storage_service
+        )
+        return _get_task_service(db, TaskRepository(db), PlatformRepository(db), ai_generate_service, storage_service)
+    return create
+
+
 # API 路由实现
 # 平台相关API
 @router.post("/platform/list")
@@ -214,97 +231,19 @@ async def create_task(
     return ApiResponse[BaseIdResponseDto].success(BaseIdResponseDto(id=task.id), "任务创建成功")
 
 
-class SSEResponse:
-    """服务端事件响应封装"""
-    
-    def __init__(self):
-        """初始化事件响应"""
-        self.queue = asyncio.Queue()
-    
-    async def send_event(self, event_type: str, data: str, event_id: str):
-        """
-        发送事件
-        
-        Args:
-            event_type: 事件类型
-            data: 事件数据
-            event_id: 事件ID
-        """
-        message = f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
-        await self.queue.put(message)
-    
-    async def iterator(self):
-        """事件迭代器"""
-        try:
-            while True:
-                message = await self.queue.get()
-                yield message
-                if message.startswith("id:") and "event: end" in message:
-                    break
-        except asyncio.CancelledError:
-            # 客户端取消请求
-            pass
-
-
 @router.post("/task/add/stream")
 async def create_task_stream(
     request: CreateTaskRequestDto,
-    background_tasks: BackgroundTasks,
-    task_service: TaskService = Depends(_get_task_service),
+    task_service_factory: Callable[[AsyncSession], TaskService] = Depends(_get_task_service_factory),
     user_id: int = Depends(get_current_active_user_id)
 ) -> StreamingResponse:
     """流式创建文案生成任务"""
-    # 创建SSE响应
-    sse = SSEResponse()
-    event_id = str(asyncio.create_task(asyncio.sleep(0)).get_name())  # 生成唯一ID
-    
-    # 定义回调函数
-    async def on_chunk_received(chunk: str):
-        await sse.send_event("chunk", chunk, event_id)
-    
-
-    async def process_task():
-        try:
-            # 发送开始事件
-            await sse.send_event("start", '{"message": "开始生成文案"}', event_id)
-            
-            # 调用流式API - 移除 cancel_token 参数
-            result = await task_service.streaming_create_task_async(
-                user_id,
-                request,
-                on_chunk_received
-                # 删除这个参数: cancel_token
-            )
-            
-            # 序列化结果为JSON字符串
-            import json
-            from pydantic import json
-            
-            result_json = json.dumps(result.dict(by_alias=True))
-            
-            # 发送完成事件
-            await sse.send_event("done", result_json, event_id)
-        except asyncio.CancelledError:
-            # 用户取消请求
-            await sse.send_event("canceled", "请求已取消", event_id)
-        except Exception as ex:
-            # 发生错误
-            await sse.send_event("error", str(ex), event_id)
-        finally:
-            # 发送结束事件
-            await sse.send_event("end", "", event_id)
-    
-    # 添加后台任务
-    background_tasks.add_task(process_task)
-    
-    # 返回流式响应
-    return StreamingResponse(
-        sse.iterator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
+    # 生成可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: task_service_factory(db).streaming_create_task_async(user_id, request),
+        "social_content.create_task",
+        start_data={"message": "开始生成文案"},
+        user_id=user_id
     )
 
 @router.post("/task/dtl")
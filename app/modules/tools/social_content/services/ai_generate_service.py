@@ -1,10 +1,12 @@
-from typing import List, Optional, Dict, Any, Callable
+from typing import AsyncGenerator, List, Dict, Any
 import logging
 from datetime import datetime
 import asyncio # Keep asyncio import
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.dtos import ChatRoleType, InputMessage
+from app.core.ai.image_preprocess import image_message_async
 from app.core.ai.vector.base import IUserDocsMilvusService # Assuming this exists
 from app.core.storage.base import IStorageService # Assuming this exists
 from app.core.config.settings import settings
@@ -46,21 +48,22 @@ class AIGenerateService:
         task_platform: GenerationTaskPlatform,
         task_images: List[GenerationTaskImage],
         related_contents: List[str],
-        on_chunk_received: Optional[Callable[[str], None]] = None
-        # Removed cancellation_token: Optional[asyncio.CancelToken] = None
-    ) -> List[GeneratedContent]:
+        generated_contents_list: List[GeneratedContent],
+        stream: bool = False
+    ) -> AsyncGenerator[str, None]:
         """
-        为平台生成内容
+        为平台生成内容，生成的内容追加到 generated_contents_list
 
         Args:
             task: 任务
             task_platform: 任务平台
             task_images: 任务图片列表
             related_contents: 相关内容
-            on_chunk_received: 接收到数据块时的回调函数
+            generated_contents_list: 接收生成内容的列表
+            stream: 是否流式生成 (为 False 时不产出数据块)
 
-        Returns:
-            生成内容列表
+        Yields:
+            流式生成时的数据块
         """
         try:
             platform = await self.platform_repository.get_platform_async(task_platform.platform_id)
@@ -77,8 +80,6 @@ class AIGenerateService:
                 context = "以下是一些相关参考内容，你可以借鉴它们的风格和表达方式：\n\n"
                 context += "\n\n---\n\n".join(related_contents)
 
-            generated_contents_list = [] # Renamed to avoid conflict
-
             for i in range(task_platform.content_count):
                 messages = []
                 sensitive_prompt = f"\n请确保生成的内容不能包含如下内容或敏感信息：{self.sensitive_categories}等内容。"
@@ -106,26 +107,17 @@ class AIGenerateService:
                 })
 
                 content_str = "" # Renamed to avoid conflict
-                if not on_chunk_received:
+                if not stream:
                     content_str = await self.ai_service.chat_completion_async(messages)
                 else:
-                    on_chunk_received(f"---开始生成第 {i + 1} 个内容---\n\n")
+                    yield f"---开始生成第 {i + 1} 个内容---\n\n"
                     content_chunks = []
-                    try:
-                        async for chunk in self.ai_service.streaming_chat_completion_async(messages):
-                            content_chunks.append(chunk)
-                            on_chunk_received(chunk)
-                    except asyncio.CancelledError:
-                        self.logger.info(f"内容生成任务 (平台ID: {task_platform.platform_id}, 索引: {i+1}) 被取消。")
-                        # Decide how to handle partial generation:
-                        # Option 1: Stop and return what's generated so far (if any)
-                        # Option 2: Raise CancelledError to propagate
-                        # Option 3: Log and continue to next content item if applicable
-                        # For now, we'll let it break out of this specific content item's loop
-                        break # Break from async for chunk loop
+                    async for chunk in self.ai_service.streaming_chat_completion_async(messages):
+                        content_chunks.append(chunk)
+                        yield chunk
                     content_str = "".join(content_chunks)
                 
-                if not content_str and (not on_chunk_received or (on_chunk_received and not content_chunks)): # if content is empty and not due to cancellation handled above
+                if not content_str: # if content is empty
                     self.logger.warning(f"AI未返回内容，任务ID：{task.id}, 平台ID：{task_platform.platform_id}, 索引：{i+1}")
                     # Optionally, add a placeholder or skip this content item
                     # For now, we skip adding an empty content
@@ -140,8 +132,6 @@ class AIGenerateService:
                     content=content_str
                 )
                 generated_contents_list.append(generated_content_item)
-            
-            return generated_contents_list
         except asyncio.CancelledError:
             self.logger.info(f"为平台生成内容任务被取消，任务ID：{task.id}, 平台ID：{task_platform.platform_id}")
             raise # Re-raise so the caller (e.g., job endpoint) can handle it
@@ -163,17 +153,13 @@ class AIGenerateService:
                     image_url = self.task_img_storage_service.get_url(image_url)
 
                 messages = [
-                    {
-                        "role": "system",
-                        "content": "请对提供的图片进行详细描述，包括图片中的主要内容、物品、人物、场景、色彩等。描述要全面但简洁，不要超过200字。"
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": f"图片编号：{image.id}"},
-                            {"type": "image_url", "image_url": {"url": image_url}}
-                        ]
-                    }
+                    InputMessage.from_text(
+                        ChatRoleType.SYSTEM,
+                        "请对提供的图片进行详细描述，包括图片中的主要内容、物品、人物、场景、色彩等。描述要全面但简洁，不要超过200字。"
+                    ),
+                    await image_message_async(
+                        ChatRoleType.USER, f"图片编号：{image.id}", [image_url], "social_content.image_description"
+                    )
                 ]
                 description = await self.ai_service.chat_completion_async(messages)
                 await self.task_repository.update_task_image_description_async(image.id, description)
@@ -4,6 +4,7 @@ import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.exceptions import BusinessException
+from app.core.redis.service import RedisService
 from app.modules.tools.social_content.repositories.platform_repository import PlatformRepository
 from app.modules.tools.social_content.models import Platform, PlatformTemplate, PlatformTemplateUser
 from app.modules.tools.social_content.dtos.platform_dtos import (
@@ -14,15 +15,20 @@ from app.modules.tools.social_content.dtos.platform_dtos import (
 
 class PlatformService:
     """平台服务实现"""
+
+    PLATFORMS_CACHE_KEY = "socialcontent:platforms"
+    PLATFORMS_CACHE_SECONDS = 600
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, redis_service: Optional[RedisService] = None):
         """
         初始化平台服务
         
         Args:
             db: 数据库会话
+            redis_service: Redis 服务 (用于缓存平台列表，默认使用共享连接池)
         """
         self.db = db
+        self.redis_service = redis_service or RedisService()
         self.platform_repository = PlatformRepository(db)
         self.logger = logging.getLogger(__name__)
     
@@ -34,17 +40,26 @@ class PlatformService:
             平台列表
         """
         try:
-            platforms = await self.platform_repository.get_all_platforms_async()
-            return [
-                PlatformDto(
-                    id=p.id,
-                    name=p.name,
-                    code=p.code,
-                    icon=p.icon,
-                    description=p.description
-                )
-                for p in platforms
-            ]
+            async def _load() -> List[PlatformDto]:
+                platforms = await self.platform_repository.get_all_platforms_async()
+                return [
+                    PlatformDto(
+                        id=p.id,
+                        name=p.name,
+                        code=p.code,
+                        icon=p.icon,
+                        description=p.description
+                    )
+                    for p in platforms
+                ]
+
+            return await self.redis_service.get_or_set_async(
+                self.PLATFORMS_CACHE_KEY,
+                _load,
+                expiry_seconds=self.PLATFORMS_CACHE_SECONDS,
+                serializer=lambda items: [item.model_dump(by_alias=True, mode="json") for item in items],
+                deserializer=lambda data: [PlatformDto(**item) for item in data]
+            )
         except Exception as ex:
             print(f"获取所有平台失败: {str(ex)}")
             raise
@@ -89,8 +104,8 @@ class PlatformService:
         try:
             user_prompts = await self.platform_repository.get_user_prompts_async(user_id, platform_id)
             
-            # 获取所有平台
-            platforms = await self.platform_repository.get_all_platforms_async()
+            # 获取所有平台 (走缓存)
+            platforms = await self.get_all_platforms_async()
             platform_dict = {p.id: p.name for p in platforms}
             
             return [
@@ -1,5 +1,6 @@
 # app/modules/tools/social_content/services/task_service.py
-from typing import List, Optional, Dict, Any, Callable, Tuple
+from dataclasses import dataclass
+from typing import AsyncGenerator, List, Optional, Dict, Any, Tuple
 import os
 import logging
 import asyncio # Keep asyncio import
@@ -10,6 +11,7 @@ from app.core.exceptions import BusinessException, NotFoundException # Added Not
 from app.core.storage.base import IStorageService
 from app.core.utils.snowflake import generate_id # Ensure this path is correct
 from app.core.dtos import PagedResultDto # Assuming this is the generic one
+from app.core.sse import SSEEvent
 
 from app.modules.tools.social_content.repositories.task_repository import TaskRepository
 from app.modules.tools.social_content.repositories.platform_repository import PlatformRepository
@@ -24,6 +26,12 @@ from app.modules.tools.social_content.dtos.task_dtos import (
 )
 
 
+@dataclass
+class TaskProcessResult:
+    """任务处理结果 (由 TaskService._process_task_stream_async 写入)"""
+    success: bool = False
+
+
 class TaskService:
     """任务服务实现"""
 
@@ -253,24 +261,32 @@ class TaskService:
             total_pages=( (total_count + request.page_size - 1) // request.page_size if request.page_size > 0 else 0 ) if total_count > 0 else 0
         )
 
-    async def process_task_async(
+    async def process_task_async(self, task_id: int) -> bool:
+        """处理任务 (非流式生成)，返回是否成功"""
+        result = TaskProcessResult()
+        async for _ in self._process_task_stream_async(task_id, result, stream=False):
+            pass
+        return result.success
+
+    async def _process_task_stream_async(
         self,
         task_id: int,
-        on_chunk_received: Optional[Callable[[str], None]] = None
-        # Removed cancellation_token: Optional[asyncio.CancelToken] = None
-    ) -> bool:
+        result: TaskProcessResult,
+        stream: bool
+    ) -> AsyncGenerator[str, None]:
+        """处理任务，流式生成时逐个产出内容的数据块；处理结果写入 result"""
         task = await self.task_repository.get_task_async(task_id)
         if not task:
             self.logger.warning(f"任务处理失败：任务不存在，任务ID：{task_id}")
             await self.task_repository.update_task_status_async(task_id, GenerationTaskStatus.FAILED, "任务不存在")
-            return False
+            return
         if task.status != GenerationTaskStatus.PENDING:
             self.logger.warning(
                 f"任务处理失败：任务状态不正确，任务ID：{task_id}, 状态：{task.status}"
             )
             # Optionally update message if already processing or completed/failed
             # await self.task_repository.update_task_status_async(task_id, task.status, "任务状态不正确，无法重复处理")
-            return False
+            return
 
         try:
             await self.task_repository.update_task_status_async(
@@ -298,10 +314,11 @@ class TaskService:
                     await self.task_repository.update_task_platform_status_async(
                         tp_entity.id, GenerationTaskStatus.PROCESSING
                     )
-                    generated_contents = await self.ai_generate_service.generate_platform_contents_async(
-                        task, tp_entity, task_images, related_contents, on_chunk_received
-                        # Removed cancellation_token
-                    )
+                    generated_contents: List[GeneratedContent] = []
+                    async for chunk in self.ai_generate_service.generate_platform_contents_async(
+                        task, tp_entity, task_images, related_contents, generated_contents, stream
+                    ):
+                        yield chunk
                     if generated_contents: # Only add if list is not empty
                         await self.task_repository.add_generated_contents_async(generated_contents)
 
@@ -344,7 +361,7 @@ class TaskService:
             await self.task_repository.update_task_status_async(
                 task_id, final_status, final_message, 100.0 # Completion rate is 100% of processing attempt
             )
-            return final_status == GenerationTaskStatus.COMPLETED or processed_platforms > 0
+            result.success = final_status == GenerationTaskStatus.COMPLETED or processed_platforms > 0
 
         except asyncio.CancelledError:
             self.logger.info(f"任务处理被取消，任务ID：{task_id}")
@@ -352,38 +369,34 @@ class TaskService:
                 task_id, GenerationTaskStatus.FAILED, "任务处理被取消", # Or a CANCELLED status
                 task.completion_rate # Keep last known rate or reset
             )
-            return False # Or re-raise if caller needs to know it was cancelled
         except Exception as ex_task:
             print(f"处理任务失败，任务ID：{task_id}: {str(ex_task)}")
             await self.task_repository.update_task_status_async(
                 task_id, GenerationTaskStatus.FAILED, f"处理失败：{str(ex_task)}",
                 task.completion_rate if task else 0.0
             )
-            return False
 
     async def streaming_create_task_async(
         self,
         user_id: int,
-        request: CreateTaskRequestDto,
-        on_chunk_received: Callable[[str], None]
- 
-    ) -> TaskDetailResponseDto:
-
+        request: CreateTaskRequestDto
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """创建任务并流式生成内容：逐个产出数据块 (chunk 事件)，结束后为包含任务详情的 done 事件"""
         task = await self.create_task_async(user_id, request) # Images are not passed here from original C#
         if not task or not task.id: # Defensive check
             raise BusinessException("任务创建失败，未能获取任务ID")
 
         try:
-            await self.process_task_async(task.id, on_chunk_received)
-             # Removed cancellation_token
+            async for chunk in self._process_task_stream_async(task.id, TaskProcessResult(), stream=True):
+                yield SSEEvent("chunk", chunk)
         except asyncio.CancelledError:
             self.logger.info(f"流式创建并处理任务被取消，任务ID：{task.id}")
-
+            raise
         except Exception:
             print(f"流式创建并处理任务过程中发生错误，任务ID：{task.id}")
 
-
-        return await self.get_task_async(user_id, task.id)
+        task_detail = await self.get_task_async(user_id, task.id)
+        yield SSEEvent("done", task_detail.model_dump(mode="json", by_alias=True))
 
     def _calculate_completion_rate(self, processed: int, total: int) -> float:
         if total <= 0:
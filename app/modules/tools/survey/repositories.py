@@ -4,7 +4,7 @@ from sqlalchemy import select, func, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import Select
 
-from app.core.utils.snowflake import generate_id
+from app.core.utils.snowflake import generate_id, generate_ids
 from app.modules.tools.survey.models import (
     SurveyTask, SurveyTab, SurveyField, SurveyResponse, 
     SurveyResponseDetail, SurveyDesignHistory
@@ -242,9 +242,10 @@ class SurveyTabRepository:
         """
         # 确保所有Tab页都有ID和时间戳
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for tab in tabs if not tab.id)))
         for tab in tabs:
             if not tab.id:
-                tab.id = generate_id()
+                tab.id = next(new_ids)
             tab.create_date = now
             tab.last_modify_date = now
         
@@ -392,9 +393,10 @@ class SurveyFieldRepository:
         """
         # 确保所有字段都有ID和时间戳
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for field in fields if not field.id)))
         for field in fields:
             if not field.id:
-                field.id = generate_id()
+                field.id = next(new_ids)
             field.create_date = now
             field.last_modify_date = now
         
@@ -818,9 +820,10 @@ class SurveyResponseDetailRepository:
         """
         # 确保所有详情都有ID和时间戳
         now = datetime.datetime.now()
+        new_ids = iter(generate_ids(sum(1 for detail in details if not detail.id)))
         for detail in details:
             if not detail.id:
-                detail.id = generate_id()
+                detail.id = next(new_ids)
             detail.create_date = now
         
         self.db.add_all(details)
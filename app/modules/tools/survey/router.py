@@ -3,10 +3,9 @@ from typing import List, Optional, Union, Any
 from urllib import response
 from fastapi import APIRouter, Depends, Body, Query, status, Response, Request
 from fastapi.responses import StreamingResponse
-import asyncio
-import json
 
 from app.core.database.session import get_db
+from app.core.sse import sse_response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import (
@@ -314,124 +313,24 @@ async def get_task_by_share_code(
 async def ai_design_streaming(
     request: AIDesignRequestDto = Body(...),
     user_id: int = Depends(get_current_active_user_id),
-    design_service: SurveyDesignService = Depends(_get_design_service),
+    ai_service = Depends(get_chatai_service_from_state),
+    redis_service = Depends(get_redis_service_from_state),
     rate_limiter: None = Depends(RateLimiter(limit=10, period_seconds=60, limit_type="user"))
 ):
     """
     流式AI设计问卷
     """
-    async def event_generator():
-        event_id = f"survey_design_{request.task_id}"
-        
-        try:
-            # Send start event
-            start_message = json.dumps({"message": "开始生成设计"}, ensure_ascii=False)
-            yield f"id: {event_id}\nevent: start\ndata: {start_message}\n\n"
-            
-            # Buffer for accumulating chunks
-            chunk_buffer = []
-            buffer_size = 0
-            max_buffer_size = 100  # Characters threshold for sending
-            
-            response_complete = asyncio.Event()
-            final_response = None
-            
-            # Chunk processing with buffering
-            def on_chunk_received(chunk):
-                nonlocal chunk_buffer, buffer_size
-                chunk_buffer.append(chunk)
-                buffer_size += len(chunk)
-                
-                # Send buffered content when threshold is reached
-                if buffer_size >= max_buffer_size:
-                    asyncio.create_task(flush_buffer())
-            
-            async def flush_buffer():
-                nonlocal chunk_buffer, buffer_size
-                if chunk_buffer:
-                    combined_chunk = ''.join(chunk_buffer)
-                    chunk_buffer.clear()
-                    buffer_size = 0
-                    
-                    # Send combined chunk without Unicode encoding
-                    chunk_data = combined_chunk
-                    await send_event(f"id: {event_id}\nevent: chunk\ndata: {chunk_data}\n\n")
-            
-            # Event sending queue to maintain order
-            event_queue = asyncio.Queue()
-            
-            async def send_event(event_data):
-                await event_queue.put(event_data)
-            
-            async def event_sender():
-                while True:
-                    try:
-                        event_data = await asyncio.wait_for(event_queue.get(), timeout=0.1)
-                        yield event_data
-                        event_queue.task_done()
-                    except asyncio.TimeoutError:
-                        if response_complete.is_set() and event_queue.empty():
-                            break
-                        # Send heartbeat if no activity
-                        heartbeat_data = json.dumps({"heartbeat": True}, ensure_ascii=False)
-                        yield f"id: {event_id}\nevent: heartbeat\ndata: {heartbeat_data}\n\n"
-            
-            # Start AI task
-            async def ai_task():
-                nonlocal final_response
-                try:
-                    final_response = await design_service.streaming_ai_design_fields_async(
-                        user_id=user_id,
-                        request=request,
-                        on_chunk_received=on_chunk_received,
-                        cancellation_token=None
-                    )
-                    
-                    # Flush any remaining buffer
-                    if chunk_buffer:
-                        await flush_buffer()
-                        
-                finally:
-                    response_complete.set()
-            
-            # Start AI task
-            ai_task_handle = asyncio.create_task(ai_task())
-            
-            # Process events
-            async for event in event_sender():
-                yield event
-            
-            # Wait for AI task completion
-            await ai_task_handle
-            
-            # Send final response
-            if final_response:
-                final_data = json.dumps({
-                    "message": final_response.message,
-                    "tabs": [tab.model_dump() for tab in final_response.tabs] if final_response.tabs else []
-                }, ensure_ascii=False)
-                yield f"id: {event_id}\nevent: complete\ndata: {final_data}\n\n"
-            
-        except asyncio.CancelledError:
-            cancel_data = json.dumps({"message": "请求已取消"}, ensure_ascii=False)
-            yield f"id: {event_id}\nevent: canceled\ndata: {cancel_data}\n\n"
-        except Exception as ex:
-            error_message = str(ex)
-            logger.error(f"AI设计问卷失败: {error_message}")
-            error_data = json.dumps({"error": error_message}, ensure_ascii=False)
-            yield f"id: {event_id}\nevent: error\ndata: {error_data}\n\n"
-        finally:
-            yield f"id: {event_id}\nevent: end\ndata: \n\n"
-    
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "Content-Type": "text/event-stream; charset=utf-8"
-        }
+    # 生成可能在连接断开后继续 (可续接流)，因此在独立的数据库会话中创建服务
+    return sse_response(
+        lambda db: _get_design_service(db, ai_service, redis_service).streaming_ai_design_fields_async(
+            user_id=user_id,
+            request=request
+        ),
+        "survey.ai_design",
+        start_data={"message": "开始生成设计"},
+        user_id=user_id,
+        stream_id=f"survey_design_{request.task_id}",
+        format_error=lambda message: {"error": message}
     )
 
 @router.post("/design/history", response_model=ApiResponse[PagedResultDto[DesignHistoryMessageDto]])
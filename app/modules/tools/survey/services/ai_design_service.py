@@ -1,12 +1,14 @@
 import json
 import datetime
 import re
-from typing import List, Dict, Any, Optional, Tuple, Callable
+from typing import List, Dict, Any, AsyncGenerator, Optional, Tuple
 import logging
 
 from app.core.ai.chat.base import IChatAIService
 from app.core.ai.chat.factory import get_chat_ai_service
 from app.core.ai.dtos import ChatRoleType, InputMessage
+from app.core.ai.json_stream import IncrementalJsonParser, JsonStreamItem
+from app.core.sse import SSEEvent
 
 from app.modules.base.prompts.services import PromptTemplateService
 from app.modules.tools.survey.repositories import SurveyDesignHistoryRepository
@@ -49,13 +51,13 @@ class AIDesignService:
     user_id: int,
     task: SurveyTask,
     user_message: str,
-    on_chunk_received: Callable[[str], None],
+    response: AIDesignResponseDto,
     tabs: Optional[List[SurveyTab]] = None,
-    fields: Optional[List[SurveyField]] = None,
-    cancellation_token = None
-) -> AIDesignResponseDto:
+    fields: Optional[List[SurveyField]] = None
+) -> AsyncGenerator[SSEEvent, None]:
         """
-        流式AI设计问卷字段
+        流式AI设计问卷字段：产出回复的数据块 (chunk) 与每个闭合的 Tab 设计 (tab)，
+        结束后把最终结果写入 response。
         """
         try:
             # 构建智能聊天上下文
@@ -64,13 +66,17 @@ class AIDesignService:
             # 用于构建完整响应
             complete_response = []
 
+            # 增量解析回复中的 Tab 设计，每个 Tab 闭合后立即以 tab 事件推送
+            parser = IncrementalJsonParser(["*"], start_markers=("```json", "<json>"))
+
             # 调用流式AI服务
             async for chunk in self.ai_service.streaming_chat_completion_async(messages):
                 complete_response.append(chunk)
-                on_chunk_received(chunk)
-                
-                if cancellation_token and cancellation_token.cancelled:
-                    break
+                yield SSEEvent("chunk", chunk)
+                for item in parser.feed(chunk):
+                    event = self._tab_designed_event(item)
+                    if event is not None:
+                        yield event
 
             # 合并所有响应块
             ai_response = ''.join(complete_response)
@@ -99,10 +105,8 @@ class AIDesignService:
                     user_id, task.id, ChatRoleType.ASSISTANT, text_response, json_config
                 )
 
-                return AIDesignResponseDto(
-                    message=text_response,
-                    tabs=tabs_design
-                )
+                response.message = text_response
+                response.tabs = tabs_design
             else:
                 # 保存AI回复到历史 - Fix: Use enum value
                 ai_history_id = await self.save_design_history_message(
@@ -110,14 +114,23 @@ class AIDesignService:
                 )
 
                 # 如果AI回复不包含JSON，则返回文本响应
-                return AIDesignResponseDto(
-                    message=ai_response,
-                    tabs=[]
-                )
+                response.message = ai_response
+                response.tabs = []
         except Exception as ex:
             logger.error(f"流式AI设计问卷字段失败: {str(ex)}")
             raise
 
+    def _tab_designed_event(self, item: JsonStreamItem) -> Optional[SSEEvent]:
+        """一个已闭合的 Tab 设计的 tab 事件 (无效的 Tab 忽略，最终结果仍以完整回复的解析为准)"""
+        if not isinstance(item.value, dict):
+            return None
+        try:
+            tab = TabDesignDto(**item.value)
+        except Exception as ex:
+            logger.debug(f"流式 Tab 设计无效，已跳过: {str(ex)}")
+            return None
+        return SSEEvent("tab", {"index": item.path[0], "tab": tab.model_dump()})
+
     def parse_ai_response(self, ai_response: str) -> Tuple[str, List[TabDesignDto]]:
         """
         解析AI响应
@@ -1,11 +1,12 @@
 import json
 import datetime
-from typing import List, Optional, Callable
+from typing import AsyncGenerator, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.utils.snowflake import generate_id
 from app.core.exceptions import BusinessException, NotFoundException
 from app.core.dtos import PagedResultDto
+from app.core.sse import SSEEvent
 
 from app.modules.tools.survey.models import SurveyTask, SurveyTab, SurveyField, SurveyDesignHistory
 from app.modules.tools.survey.repositories import (
@@ -41,11 +42,9 @@ class SurveyDesignService:
     async def streaming_ai_design_fields_async(
         self,
         user_id: int,
-        request: AIDesignRequestDto,
-        on_chunk_received: Callable[[str], None],
-        cancellation_token = None
-    ) -> AIDesignResponseDto:
-        """流式AI设计问卷字段"""
+        request: AIDesignRequestDto
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """流式AI设计问卷字段：产出数据块与 Tab 设计事件，保存后以 complete 事件返回最终结果"""
         
         # 验证任务权限
         task = await self.task_repository.get_by_id_async(request.task_id)
@@ -60,18 +59,22 @@ class SurveyDesignService:
         fields = await self.field_repository.get_by_task_id_async(request.task_id)
         
         # 调用AI设计服务
-        response = await self.ai_design_service.ai_design_fields_async(
+        response = AIDesignResponseDto(message="", tabs=[])
+        async for event in self.ai_design_service.ai_design_fields_async(
             user_id=user_id,
             task=task,
             user_message=request.message,
-            on_chunk_received=on_chunk_received,
+            response=response,
             tabs=tabs,
-            fields=fields,
-            cancellation_token=cancellation_token
-        )
+            fields=fields
+        ):
+            yield event
         
         await self.db.commit()
-        return response
+        yield SSEEvent("complete", {
+            "message": response.message,
+            "tabs": [tab.model_dump() for tab in response.tabs] if response.tabs else []
+        })
 
     async def get_design_history_async(
         self,
@@ -1,14 +1,17 @@
 """
 AI分析服务实现
 """
+import asyncio
 import os
 import json
 import logging
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Optional
 
 
 from app.core.ai.chat.base import IChatAIService
+from app.core.ai.dtos import ChatRoleType, InputMessage
+from app.core.ai.image_preprocess import image_message_async
 from app.modules.base.prompts.services import PromptTemplateService
 from app.modules.tools.videomixer.dtos import SceneFrameInfo, AIAnalysisResult, AnalysisRequest
 
@@ -139,7 +142,7 @@ class AIAnalysisService:
         self, 
         frames: List[SceneFrameInfo], 
         request: AnalysisRequest
-    ) -> List[Dict[str, Any]]:
+    ) -> List[InputMessage]:
         """
         构建消息列表
         
@@ -164,7 +167,7 @@ class AIAnalysisService:
                 "对于每个选定的场景，请提供详细的解说词，语言风格要符合要求。"
             )
         
-        messages.append({"role": "system", "content": system_prompt})
+        messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, system_prompt))
         
         # 变量提示词
         variable_prompt = f"""目标关键词：@keywords = {request.scene_keywords}
@@ -172,42 +175,32 @@ class AIAnalysisService:
 目标时长（秒）：@targetDuration = {request.target_duration}
 期望风格：@narrationStyle = {request.narration_style}"""
         
-        messages.append({"role": "system", "content": variable_prompt})
+        messages.append(InputMessage.from_text(ChatRoleType.SYSTEM, variable_prompt))
         
         # 帧数据上下文
         context_message = f"**帧数据：**\n总共有 {len(frames)} 帧待分析"
-        messages.append({"role": "user", "content": context_message})
+        messages.append(InputMessage.from_text(ChatRoleType.USER, context_message))
         
-        # 添加每一帧的图片
-        for frame in frames:
-            if frame.image_url:
-                frame_message = {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"帧图片编号：{frame.id}; 时长：{frame.duration.total_seconds():.1f}秒\n"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": frame.image_url
-                            }
-                        }
-                    ]
-                }
-                messages.append(frame_message)
+        # 添加每一帧的图片 (优先使用本地帧文件，预处理时无需再下载；各帧并发预处理)
+        frame_messages = [
+            image_message_async(
+                ChatRoleType.USER,
+                f"帧图片编号：{frame.id}; 时长：{frame.duration.total_seconds():.1f}秒\n",
+                [frame.image_path if frame.image_path and os.path.isfile(frame.image_path) else frame.image_url],
+                "videomixer.scene_frame"
+            )
+            for frame in frames if frame.image_url
+        ]
+        messages.extend(await asyncio.gather(*frame_messages))
         
         # 请求分析
-        messages.append({
-            "role": "user",
-            "content": (
-                f"请分析以上视频帧，基于关键词\"{request.scene_keywords}\"选择相关度最高的场景，"
-                f"总时长接近{request.target_duration}秒。"
-                f"为每个场景生成风格为\"{request.narration_style}\"的解说词。"
-                f"请以JSON格式回复，包含场景ID、时间、描述、相关度、解说词等信息。"
-            )
-        })
+        messages.append(InputMessage.from_text(
+            ChatRoleType.USER,
+            f"请分析以上视频帧，基于关键词\"{request.scene_keywords}\"选择相关度最高的场景，"
+            f"总时长接近{request.target_duration}秒。"
+            f"为每个场景生成风格为\"{request.narration_style}\"的解说词。"
+            f"请以JSON格式回复，包含场景ID、时间、描述、相关度、解说词等信息。"
+        ))
         
         return messages
     
@@ -2,7 +2,6 @@
 音频服务实现
 """
 import os
-import subprocess
 import logging
 import datetime
 from typing import Tuple, Optional
@@ -10,6 +9,7 @@ from typing import Tuple, Optional
 
 from app.core.ai.speech.speech_service import AISpeechService
 from app.core.config.settings import settings
+from app.core.utils.process import check_output_async, run_process_async
 
 logger = logging.getLogger(__name__)
 
@@ -100,16 +100,9 @@ class AudioHelper:
                 output_path
             ]
             
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout, stderr = process.communicate()
+            returncode, stdout, stderr = await run_process_async(cmd)
             
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.error(f"音频转换失败: {stderr}")
                 return False
             
@@ -144,16 +137,9 @@ class AudioHelper:
                 output_path
             ]
             
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout, stderr = process.communicate()
+            returncode, stdout, stderr = await run_process_async(cmd)
             
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.error(f"音量调整失败: {stderr}")
                 return False
             
@@ -186,7 +172,7 @@ class AudioHelper:
                 input_path
             ]
             
-            original_duration = float(subprocess.check_output(cmd_duration, universal_newlines=True).strip())
+            original_duration = float((await check_output_async(cmd_duration)).strip())
             
             # 计算需要重复的次数
             repetitions = int(target_duration.total_seconds() / original_duration) + 1
@@ -214,16 +200,9 @@ class AudioHelper:
                 output_path
             ]
             
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout, stderr = process.communicate()
+            returncode, stdout, stderr = await run_process_async(cmd)
             
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.error(f"创建循环版本失败: {stderr}")
                 return False
             
@@ -262,7 +241,7 @@ class AudioHelper:
                 input_path
             ]
             
-            original_duration = float(subprocess.check_output(cmd_duration, universal_newlines=True).strip())
+            original_duration = float((await check_output_async(cmd_duration)).strip())
             
             # 构建淡入淡出滤镜
             fade_filter = (
@@ -281,16 +260,9 @@ class AudioHelper:
                 output_path
             ]
             
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            stdout, stderr = process.communicate()
+            returncode, stdout, stderr = await run_process_async(cmd)
             
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.error(f"应用淡入淡出效果失败: {stderr}")
                 return False
             
@@ -5,10 +5,10 @@ import os
 import re
 import json
 import logging
-import subprocess
 import datetime
 from typing import List, Dict, Tuple, Optional, Any
 
+from app.core.utils.process import check_output_async, run_process_async
 from app.modules.tools.videomixer.dtos import VideoMetadata, SceneFrameInfo
 
 logger = logging.getLogger(__name__)
@@ -45,7 +45,7 @@ class VideoAnalysisService:
             ]
             
             # 执行命令并获取输出
-            output = subprocess.check_output(cmd, universal_newlines=True)
+            output = (await check_output_async(cmd))
             media_info = json.loads(output)
             
             # 提取视频流信息
@@ -139,33 +139,20 @@ class VideoAnalysisService:
                 output_pattern
             ]
             
-            # 执行命令并捕获标准错误输出
-            process = subprocess.Popen(
-                cmd,
-                stderr=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                universal_newlines=True
-            )
+            # 执行命令并捕获标准错误输出 (不阻塞事件循环)
+            returncode, _, stderr = await run_process_async(cmd)
             
-            # 读取stderr并解析信息
-            while True:
-                line = process.stderr.readline()
-                if not line and process.poll() is not None:
-                    break
-                
-                # 解析帧信息
+            # 解析stderr中的帧信息
+            for line in stderr.splitlines():
                 match = info_regex.search(line)
                 if match:
                     frame_number = int(match.group(1))
                     pts_time = float(match.group(2))
                     pts_mapping[frame_number] = pts_time
             
-            # 等待进程完成
-            process.wait()
-            
             # 检查进程是否成功
-            if process.returncode != 0:
-                raise RuntimeError(f"场景检测失败，FFmpeg返回代码: {process.returncode}")
+            if returncode != 0:
+                raise RuntimeError(f"场景检测失败，FFmpeg返回代码: {returncode}")
             
             if not pts_mapping:
                 raise ValueError("场景PTS帧检测失败，未能找到帧映射信息")
@@ -6,12 +6,13 @@ import re
 import json
 import logging
 import datetime
-import subprocess
 from typing import List, Dict, Tuple, Optional, Any, Union
 from fastapi import UploadFile, HTTPException
 
 from app.core.utils.snowflake import generate_id
 from app.core.exceptions import BusinessException, NotFoundException
+from app.core.utils.process import run_process_async
+from app.core.job.lease import heartbeat_current_job
 
 from app.modules.tools.videomixer.entities import (
     MixProject, SourceVideo, SceneFrame, SelectedScene, SelectedSceneNarration,
@@ -320,6 +321,8 @@ class VideoMixerService:
             await self.scene_frame_repository.delete_by_project_async(project_id)
             
             for video in source_videos:
+                await heartbeat_current_job()
+                
                 # 检查视频文件是否存在
                 if not os.path.exists(video.file_path):
                     raise FileNotFoundError(f"视频文件不存在: {video.file_path}")
@@ -772,6 +775,9 @@ class VideoMixerService:
                 scene_file_name = f"scene_{scene.id}.mp4"
                 video_segment_path = os.path.join(scenes_dir, scene_file_name)
                 
+                # 每个场景渲染前续约 (在任务上下文中执行时)
+                await heartbeat_current_job()
+                
                 # 提取场景视频片段
                 await self._extract_and_compose_scene_async(video_segment_path, scene, source_video, scenes_dir)
                 
@@ -789,7 +795,9 @@ class VideoMixerService:
             final_video_path = os.path.join(final_dir, final_video_file_name)
             
             # 合并场景视频
+            await heartbeat_current_job()
             await self._merge_scenes_async(selected_scenes, scene_video_paths, background_music_path, final_video_path)
+            await heartbeat_current_job()
             
             # 上传最终视频到CDN
             cdn_path = f"video-mixer/{project_id}/final/{final_video_file_name}"
@@ -1000,16 +1008,9 @@ class VideoMixerService:
                 output_path
             ]
             
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
+            returncode, stdout, stderr = await run_process_async(cmd)
             
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.warning(f"场景 {scene.id} 视频片段提取失败: {stderr}")
                 raise RuntimeError(f"场景视频片段提取失败: {stderr}")
             
@@ -1048,16 +1049,9 @@ class VideoMixerService:
                     ])
                     
                     # 执行命令
-                    process = subprocess.Popen(
-                        cmd_args, 
-                        stdout=subprocess.PIPE, 
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True
-                    )
+                    returncode, stdout, stderr = await run_process_async(cmd_args)
                     
-                    stdout, stderr = process.communicate()
-                    
-                    if process.returncode != 0:
+                    if returncode != 0:
                         logger.warning(f"场景 {scene.id} 视频合成失败: {stderr}")
                         # 如果合成失败，使用原始提取的片段
                         return output_path
@@ -1231,24 +1225,11 @@ class VideoMixerService:
                 cmd_str = cmd_str[:index] + audio_filter + " " + cmd_str[index:]
                 
                 # 使用shell模式执行命令
-                process = subprocess.Popen(
-                    cmd_str,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True
-                )
+                returncode, stdout, stderr = await run_process_async(cmd_str, shell=True)
             else:
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True
-                )
-            
-            stdout, stderr = process.communicate()
+                returncode, stdout, stderr = await run_process_async(cmd)
             
-            if process.returncode != 0:
+            if returncode != 0:
                 logger.error(f"场景合并失败: {stderr}")
                 raise RuntimeError(f"场景合并失败: {stderr}")
             
@@ -0,0 +1,162 @@
+# tests/core/redis/test_get_or_set.py
+"""
+RedisService.get_or_set_async 的防击穿检查：缓存过期后大量并发读取，回源 (数据库查询) 只执行一次。
+- 同一节点：进程内 single-flight；
+- 多个节点：跨节点短锁，未抢到锁的节点等待持锁节点写入缓存。
+
+Redis 以进程内的内存实现代替 (支持 GET/SET NX PX EX/SETEX/EVAL 释放锁与键过期)，
+每条命令都让出事件循环，模拟网络往返时的协程交错。
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("pydantic_settings")
+
+from app.core.redis.service import RedisService  # noqa: E402
+
+CONCURRENCY = 50
+KEY = "test:get_or_set:expired"
+LOAD_SECONDS = 0.05
+
+
+class InMemoryRedis:
+    """get_or_set_async 用到的 Redis 命令的内存实现；clock_offset 用于让键提前过期"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self.clock_offset = 0.0
+
+    def _now(self) -> float:
+        return time.monotonic() + self.clock_offset
+
+    def _alive(self, key: str) -> bool:
+        item = self._data.get(key)
+        if item is None:
+            return False
+        if item[1] is not None and item[1] <= self._now():
+            del self._data[key]
+            return False
+        return True
+
+    async def get(self, key: str):
+        await asyncio.sleep(0)
+        return self._data[key][0] if self._alive(key) else None
+
+    async def set(self, key: str, value: Any, nx: bool = False, px: Optional[int] = None, ex: Optional[int] = None):
+        await asyncio.sleep(0)
+        if nx and self._alive(key):
+            return None
+        ttl = px / 1000 if px else ex
+        self._data[key] = (value, self._now() + ttl if ttl else None)
+        return True
+
+    async def setex(self, key: str, seconds: int, value: Any):
+        return await self.set(key, value, ex=seconds)
+
+    async def eval(self, script: str, numkeys: int, key: str, token: str):
+        # 仅支持释放锁脚本：锁仍属于调用方时删除
+        await asyncio.sleep(0)
+        if self._alive(key) and self._data[key][0] == token:
+            del self._data[key]
+            return 1
+        return 0
+
+
+def _node() -> RedisService:
+    """一个“节点”：single-flight 状态按实例隔离，共享同一个 Redis"""
+    node = RedisService()
+    node._inflight = {}
+    node._refreshing = set()
+    return node
+
+
+class CountingLoader:
+    """模拟数据库查询，记录执行次数"""
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(LOAD_SECONDS)
+        return self.value
+
+
+@pytest.fixture
+def fake_redis():
+    original = RedisService._pool
+    RedisService._pool = InMemoryRedis()
+    try:
+        yield RedisService._pool
+    finally:
+        RedisService._pool = original
+
+
+async def _expire(redis: InMemoryRedis, node: RedisService):
+    """写入旧值后推进时钟使其过期"""
+    await node.set_cached_async(KEY, {"version": 0}, expiry_seconds=1)
+    redis.clock_offset += 2
+    assert await redis.get(KEY) is None
+
+
+def test_same_node_concurrent_reads_load_once(fake_redis):
+    async def scenario() -> Tuple[List[Any], CountingLoader]:
+        node = _node()
+        await _expire(fake_redis, node)
+        loader = CountingLoader({"version": 1})
+        results = await asyncio.gather(*(
+            node.get_or_set_async(KEY, loader, expiry_seconds=60) for _ in range(CONCURRENCY)
+        ))
+        return results, loader
+
+    results, loader = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert results == [{"version": 1}] * CONCURRENCY
+
+
+def test_peer_holding_lock_serves_its_value(fake_redis):
+    async def scenario() -> Tuple[List[Any], CountingLoader, CountingLoader]:
+        node, peer = _node(), _node()
+        await _expire(fake_redis, node)
+        local_loader = CountingLoader({"version": "local"})
+        peer_loader = CountingLoader({"version": "peer"})
+
+        async def peer_reload():
+            # 对端节点已持有回源锁，回源完成后写入缓存并释放锁
+            await fake_redis.set(f"lock:{KEY}", "peer-token", nx=True, px=10_000)
+            value = await peer_loader()
+            await peer.set_cached_async(KEY, value, expiry_seconds=60)
+            await fake_redis.eval("", 1, f"lock:{KEY}", "peer-token")
+
+        peer_task = asyncio.create_task(peer_reload())
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(*(
+            node.get_or_set_async(KEY, local_loader, expiry_seconds=60) for _ in range(CONCURRENCY)
+        ))
+        await peer_task
+        return results, local_loader, peer_loader
+
+    results, local_loader, peer_loader = asyncio.run(scenario())
+    assert local_loader.calls == 0
+    assert peer_loader.calls == 1
+    assert results == [{"version": "peer"}] * CONCURRENCY
+
+
+def test_two_nodes_racing_load_once(fake_redis):
+    async def scenario() -> Tuple[List[Any], CountingLoader]:
+        nodes = [_node(), _node()]
+        await _expire(fake_redis, nodes[0])
+        loader = CountingLoader({"version": 1})
+        results = await asyncio.gather(*(
+            nodes[i % 2].get_or_set_async(KEY, loader, expiry_seconds=60) for i in range(CONCURRENCY)
+        ))
+        return results, loader
+
+    results, loader = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert results == [{"version": 1}] * CONCURRENCY